@@ -0,0 +1,75 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark GitHub App installation tokens shared through the token cache.
+
+Handles a series of events, each with a new client like a hook process,
+authenticated as a GitHub App against a local fake GitHub API, and reports
+the installation tokens minted, requests and wall time per event without and
+with the on-disk installation token cache. The JWT is not signed, PyJWT is
+not needed to run it.
+
+    python benchmarks/bench_app_tokens.py --events 100 --owners 4
+"""
+
+import argparse
+import tempfile
+import time
+from typing import Optional
+from unittest import mock
+
+from gerrit_to_platform.cache import ResponseCache
+from gerrit_to_platform.fake_github import FakeGitHub, make_workflows
+from gerrit_to_platform.github import GitHubApp, GitHubClient
+
+
+def measure(
+    server: FakeGitHub, cache: Optional[ResponseCache], events: int, owners: int
+) -> None:
+    """Print installation tokens minted, requests and wall time per event."""
+    server.reset_counters()
+    minted = len(server.app_tokens)
+    start = time.perf_counter()
+    for event in range(events):
+        client = GitHubClient(None, server.url, app=GitHubApp("1", "KEY", cache))
+        client.list_repo_workflows(f"org-{event % owners}", "repository")
+        client.close()
+    elapsed = time.perf_counter() - start
+    print(
+        f"  {(len(server.app_tokens) - minted) / events:.2f} tokens minted, "
+        f"{server.requests / events:.2f} requests, "
+        f"{elapsed / events * 1000:.2f} ms per event"
+    )
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--owners", type=int, default=4)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds per API response"
+    )
+    args = parser.parse_args()
+
+    server = FakeGitHub(make_workflows(3), latency=args.latency)
+    server.installations = {f"org-{index}": index for index in range(args.owners)}
+    jwt = mock.patch("gerrit_to_platform.github._app_jwt", return_value="APP_JWT")
+    with server, jwt, tempfile.TemporaryDirectory() as directory:
+        print("without the token cache:")
+        measure(server, None, args.events, args.owners)
+
+        print("with the token cache:")
+        cache = ResponseCache(directory, ttl=0, max_entries=256)
+        measure(server, cache, args.events, args.owners)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark handling many events on one event loop.
+
+Dispatches a batch of events, each replicated to a few organizations,
+against a local fake GitHub API that sleeps before every response. Compares
+the blocking find_and_dispatch handling the events one after the other with
+async_find_and_dispatch handling all of them concurrently on one loop.
+
+    python benchmarks/bench_async.py --events 50 --owners 3 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+from unittest import mock
+
+from gerrit_to_platform.config import Platform
+from gerrit_to_platform.fake_github import FakeGitHub, make_workflows
+from gerrit_to_platform.github import GitHubClient
+from gerrit_to_platform.helpers import async_find_and_dispatch, find_and_dispatch
+
+INPUTS = {
+    "GERRIT_BRANCH": "master",
+    "GERRIT_CHANGE_NUMBER": "1",
+    "GERRIT_PATCHSET_NUMBER": "1",
+}
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--owners", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    remotes = {
+        "github": {
+            f"github-{index}": {
+                "owner": f"org-{index}",
+                "remotenamestyle": "dash",
+                "repo": "${name}",
+            }
+            for index in range(args.owners)
+        }
+    }
+    workflows = make_workflows(2, ["gerrit-verify", "gerrit-required-verify"])
+
+    with FakeGitHub(workflows, latency=args.latency) as server:
+        client = GitHubClient("A_TOKEN", server.url)
+        with contextlib.ExitStack() as stack:
+            settings = mock.Mock(return_value={"dispatch_limits": {}})
+            stack.enter_context(
+                mock.patch.multiple(
+                    "gerrit_to_platform.helpers",
+                    get_replication_remotes=mock.Mock(return_value=remotes),
+                    get_required_workflow_cache=mock.Mock(return_value=None),
+                    get_settings=settings,
+                )
+            )
+            stack.enter_context(
+                mock.patch.multiple(
+                    "gerrit_to_platform.github",
+                    get_client=mock.Mock(return_value=client),
+                    get_workflow_cache=mock.Mock(return_value=None),
+                )
+            )
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+
+            settings.return_value["dispatch_limits"] = {
+                platform.value: {"concurrency": 1, "owner_concurrency": 1}
+                for platform in Platform
+            }
+            start = time.perf_counter()
+            serial = sum(
+                find_and_dispatch(f"project-{event}", "verify", dict(INPUTS))
+                for event in range(args.events)
+            )
+            serial_elapsed = time.perf_counter() - start
+
+            settings.return_value["dispatch_limits"] = {
+                platform.value: {
+                    "concurrency": args.concurrency,
+                    "owner_concurrency": args.concurrency,
+                }
+                for platform in Platform
+            }
+
+            async def events() -> int:
+                counts = await asyncio.gather(
+                    *(
+                        async_find_and_dispatch(
+                            f"project-{event}", "verify", dict(INPUTS)
+                        )
+                        for event in range(args.events)
+                    )
+                )
+                return sum(counts)
+
+            start = time.perf_counter()
+            concurrent = asyncio.run(events())
+            async_elapsed = time.perf_counter() - start
+        client.close()
+
+    print(
+        f"blocking, one event at a time: {serial} dispatched, "
+        f"{serial_elapsed:.2f} s, {args.events / serial_elapsed:.1f} events/s"
+    )
+    print(
+        f"async, one event loop:         {concurrent} dispatched, "
+        f"{async_elapsed:.2f} s, {args.events / async_elapsed:.1f} events/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
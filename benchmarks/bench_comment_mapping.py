@@ -0,0 +1,91 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark comment-added keyword mapping.
+
+Compares the previous per-key ``re.findall`` loop with the precompiled
+MappingMatcher on large bot style comments and large mapping tables.
+
+    python benchmarks/bench_comment_mapping.py --keys 300 --lines 5000
+"""
+
+import argparse
+import random
+import re
+import time
+from typing import Callable, Dict, List
+
+from gerrit_to_platform.comment_added import get_mapping_matcher
+
+
+def legacy_match(mapping: Dict[str, str], comment: str) -> List[str]:
+    """Match the way comment_added did before the combined matcher."""
+    filters = []
+    for mapper in mapping:
+        if not re.findall(mapper, comment):
+            continue
+        filters.append(mapping[mapper])
+    return filters
+
+
+def build_comment(lines: int, trigger: str) -> str:
+    """Build a bot report comment with a trigger keyword on the last line."""
+    report = [f"Patch Set {random.randint(1, 20)}:", ""]
+    for line in range(lines):
+        report.append(
+            f"job-{line % 97} build #{line}: SUCCESS in {random.randint(1, 900)}s "
+            f"https://jenkins.example.org/job/job-{line % 97}/{line}/"
+        )
+    report.append(trigger)
+    return "\n".join(report)
+
+
+def timed(function: Callable[[], List[str]], rounds: int) -> float:
+    """Time function over rounds, returning ms per call."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        function()
+    return (time.perf_counter() - start) * 1000 / rounds
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=300)
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    mapping = {"recheck": "verify", "reverify": "verify", "remerge": "merge"}
+    for key in range(args.keys - len(mapping)):
+        if key % 10 == 0:
+            # a minority of keys are regular expressions
+            mapping[f"^run-{key}-(fast|full)$"] = f"job{key % 50}"
+        else:
+            mapping[f"rerun-job{key}"] = f"job{key % 50}"
+
+    matcher = get_mapping_matcher(mapping)
+    print(f"keys: {len(mapping)}, comment lines: {args.lines}")
+    print(f"{'comment':<12} {'legacy ms':>10} {'matcher ms':>11} {'dispatches':>11}")
+    for name, trigger in (
+        ("no trigger", "looks good to me"),
+        ("recheck", "recheck reverify"),
+    ):
+        comment = build_comment(args.lines, trigger)
+        legacy = timed(lambda: legacy_match(mapping, comment), args.rounds)
+        compiled = timed(lambda: matcher.match(comment), args.rounds)
+        dispatches = (
+            f"{len(legacy_match(mapping, comment))}->{len(matcher.match(comment))}"
+        )
+        print(f"{name:<12} {legacy:>10.2f} {compiled:>11.2f} {dispatches:>11}")
+
+
+if __name__ == "__main__":
+    main()
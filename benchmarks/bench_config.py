@@ -0,0 +1,158 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark configuration parsing per event.
+
+Runs find_and_dispatch against a generated replication.config with the GitHub
+API stubbed out and reports how many times the configuration files were parsed
+and the wall time per event, with the parse cache disabled (the previous
+behaviour) and enabled.
+
+    python benchmarks/bench_config.py --remotes 300 --events 20
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from typing import Any, Dict, Iterator, Tuple
+from unittest import mock
+
+import gerrit_to_platform.config as config
+import gerrit_to_platform.github as github
+from gerrit_to_platform.helpers import find_and_dispatch
+
+
+def workflow(workflow_id: int, name: str, path: str) -> Dict[str, Any]:
+    """Build a workflow entry shaped like the list_repo_workflows response."""
+    return {
+        "id": workflow_id,
+        "node_id": f"W_{workflow_id}",
+        "name": name,
+        "path": path,
+        "state": "active",
+        "created_at": "2023-01-01T00:00:00.000Z",
+        "updated_at": "2023-01-01T00:00:00.000Z",
+        "url": "",
+        "html_url": "",
+        "badge_url": "",
+    }
+
+
+WORKFLOWS = [
+    (1, "Gerrit Verify", ".github/workflows/gerrit-verify.yaml"),
+    (2, "Gerrit Required Verify", ".github/workflows/gerrit-required-verify.yaml"),
+]
+
+
+INPUTS = {
+    "GERRIT_BRANCH": "master",
+    "GERRIT_CHANGE_ID": "I308b4eda73ff90ee486f14e01db145684889eaae",
+    "GERRIT_CHANGE_NUMBER": "1",
+    "GERRIT_CHANGE_URL": "https://gerrit.example.org/r/c/example/project/+/1",
+    "GERRIT_EVENT_TYPE": "patchset-created",
+    "GERRIT_PATCHSET_NUMBER": "1",
+    "GERRIT_PATCHSET_REVISION": "7f0f8a2b05546d5956b0bb1431ba13c8cbe94631",
+    "GERRIT_PROJECT": "example/project",
+    "GERRIT_REFSPEC": "refs/changes/01/1/1",
+}
+
+
+def write_configs(directory: str, remotes: int) -> Dict[str, str]:
+    """Write a gerrit_to_platform.ini and a replication.config with remotes."""
+    ini = os.path.join(directory, "gerrit_to_platform.ini")
+    with open(ini, "w") as ini_file:
+        ini_file.write('[mapping "comment-added"]\nrecheck = verify\n\n')
+        ini_file.write("[github.com]\ntoken = A_TOKEN\n")
+
+    replication = os.path.join(directory, "replication.config")
+    with open(replication, "w") as replication_file:
+        replication_file.write("[gerrit]\n    autoreload = true\n\n")
+        for remote in range(remotes):
+            # one in ten remotes is not a GitHub remote
+            host = "example.org" if remote % 10 == 9 else "github.com"
+            replication_file.write(
+                f'[remote "mirror{remote}"]\n'
+                f"    authGroup = GitHub Replication {remote}\n"
+                "    push = +refs/*:refs/*\n"
+                "    remoteNameStyle = dash\n"
+                f"    url = git@{host}:org{remote}/${{name}}.git\n\n"
+            )
+
+    return {config.CONFIG: ini, config.REPLICATION: replication}
+
+
+@contextlib.contextmanager
+def uncached() -> Iterator[None]:
+    """Re-parse on every access, like get_config did before the cache."""
+    load_config = config._load_config
+
+    def load_uncached(config_type: str):
+        config.clear_config_cache()
+        return load_config(config_type)
+
+    with mock.patch.object(config, "_load_config", load_uncached):
+        yield
+
+
+def run(events: int) -> Tuple[int, float]:
+    """Run events through find_and_dispatch returning parses and seconds."""
+    api = mock.MagicMock()
+    api.actions.list_repo_workflows.side_effect = lambda *args: {
+        "workflows": [workflow(*entry) for entry in WORKFLOWS]
+    }
+    read_file = mock.patch.object(
+        config.ConfigParser,
+        "read_file",
+        autospec=True,
+        side_effect=config.ConfigParser.read_file,
+    )
+
+    config.clear_config_cache()
+    with read_file as parses, mock.patch.object(github, "GhApi", return_value=api):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(events):
+                find_and_dispatch("example/project", "verify", dict(INPUTS))
+        elapsed = time.perf_counter() - start
+
+    return parses.call_count, elapsed
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--remotes", type=int, default=300)
+    parser.add_argument("--events", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        config_files = write_configs(directory, args.remotes)
+        with mock.patch.object(config, "CONFIG_FILES", config_files):
+            with uncached():
+                before_parses, before_time = run(args.events)
+            after_parses, after_time = run(args.events)
+
+    print(f"remotes: {args.remotes}, events: {args.events}")
+    print(f"{'mode':<10} {'parses/event':>14} {'ms/event':>10}")
+    for mode, parses, elapsed in (
+        ("uncached", before_parses, before_time),
+        ("cached", after_parses, after_time),
+    ):
+        print(
+            f"{mode:<10} {parses / args.events:>14.1f} "
+            f"{elapsed * 1000 / args.events:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark the ChatOps cooldown check with a million tracked cooldowns.
+
+Seeds the SQLite cooldown store with --keys cooldowns, half of them expired,
+then times acquiring keys that are cooling down and new keys, and the bulk
+removal of the expired ones. The opportunistic expiry of acquire is disabled
+while timing so the bulk removal is measured on its own. The per-file markers the store replaced are
+timed on --files marker files in a temporary directory, one inode each.
+
+    python benchmarks/bench_cooldown.py --keys 1000000 --files 20000
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from typing import Callable, List
+from unittest import mock
+
+from gerrit_to_platform.cooldown import SQLiteCooldownStore
+
+COOLDOWN = 300
+
+
+def file_check(directory: str, key: str) -> bool:
+    """Check a cooldown the way the per-file markers did."""
+    path = os.path.join(directory, f"gha_cooldown_{key}")
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+        return True
+    except FileExistsError:
+        if time.time() - os.stat(path).st_mtime < COOLDOWN:
+            return False
+        os.unlink(path)
+        return True
+
+
+def measure(label: str, check: Callable[[int], object], keys: List[int]) -> None:
+    """Print the latency percentiles of check over keys."""
+    timings = []
+    for key in keys:
+        start = time.perf_counter()
+        check(key)
+        timings.append(time.perf_counter() - start)
+    cuts = statistics.quantiles(timings, n=100)
+    print(
+        f"{label:<32} p50 {cuts[49] * 1e6:7.1f} us  p99 {cuts[98] * 1e6:7.1f} us  "
+        f"max {max(timings) * 1e6:9.1f} us"
+    )
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--files", type=int, default=20_000)
+    parser.add_argument("--checks", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cooldown.sqlite3")
+        store = SQLiteCooldownStore(path)
+        now = time.time()
+        start = time.perf_counter()
+        with sqlite3.connect(path) as connection:
+            connection.executemany(
+                "INSERT INTO cooldowns (key, expires) VALUES (?, ?)",
+                (
+                    (f"{key}/verify", now + (COOLDOWN if key % 2 else -1))
+                    for key in range(args.keys)
+                ),
+            )
+        print(
+            f"Seeded {len(store)} cooldowns in {time.perf_counter() - start:.1f} s, "
+            f"{os.path.getsize(path) / 2**20:.0f} MiB"
+        )
+
+        step = max(args.keys // args.checks, 1)
+        expiry = mock.patch("gerrit_to_platform.cooldown.EXPIRE_PROBABILITY", 0)
+        expiry.start()
+        measure(
+            "sqlite, cooling down",
+            lambda key: store.acquire(f"{key}/verify", COOLDOWN),
+            list(range(1, args.keys, step * 2))[: args.checks],
+        )
+        measure(
+            "sqlite, new key",
+            lambda key: store.acquire(f"{key}/merge", COOLDOWN),
+            list(range(0, args.keys, step))[: args.checks],
+        )
+        expiry.stop()
+        start = time.perf_counter()
+        expired = store.expire()
+        print(
+            f"Expired {expired} cooldowns in "
+            f"{(time.perf_counter() - start) * 1000:.0f} ms, {len(store)} left"
+        )
+        store.close()
+
+        markers = os.path.join(directory, "markers")
+        os.mkdir(markers)
+        for key in range(args.files):
+            file_check(markers, f"{key}_verify")
+        measure(
+            f"files ({args.files}), cooling down",
+            lambda key: file_check(markers, f"{key}_verify"),
+            list(range(args.files))[: args.checks],
+        )
+        measure(
+            f"files ({args.files}), new key",
+            lambda key: file_check(markers, f"{key}_merge"),
+            list(range(args.files))[: args.checks],
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark handing hook events to the dispatcher daemon.
+
+Starts an EventServer with event processing stubbed out and measures the
+socket round trip, sustained throughput from concurrent clients and the wall
+time of a whole hook process in daemon mode compared with only starting the
+in-process hook command.
+
+    python benchmarks/bench_daemon.py --events 5000 --clients 8
+"""
+
+import argparse
+import os
+import statistics
+import subprocess  # nosec B404
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from unittest import mock
+
+from gerrit_to_platform.daemon import EventServer
+from gerrit_to_platform.events import PATCHSET_CREATED, Event, send_to_daemon
+
+ARGUMENTS = {
+    "change": "example/project~master~I308b4eda73ff90ee486f14e01db145684889eaae",
+    "kind": "REWORK",
+    "change_url": "https://gerrit.example.org/r/c/example/project/+/1",
+    "change_owner": "Foo <foo@example.org>",
+    "change_owner_username": "foo",
+    "project": "example/project",
+    "branch": "master",
+    "topic": "",
+    "uploader": "Foo <foo@example.org>",
+    "uploader_username": "foo",
+    "commit": "7f0f8a2b05546d5956b0bb1431ba13c8cbe94631",
+    "patchset": "1",
+}
+
+HOOK = (
+    "import sys; from gerrit_to_platform.events import run_hook; "
+    "run_hook('patchset-created', sys.argv[1:])"
+)
+
+
+def hook_argv() -> List[str]:
+    """Build the hook arguments for the benchmark event."""
+    argv = []
+    for name, value in ARGUMENTS.items():
+        argv.append(f"--{name.replace('_', '-')}={value}")
+    return argv
+
+
+def process_wall_time(command: List[str], env: dict, runs: int) -> float:
+    """Median wall time in ms of running command in a new process."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, env=env, capture_output=True)  # nosec
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    event: Event = {"type": PATCHSET_CREATED, "arguments": ARGUMENTS}
+    processed = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "daemon.sock")
+        config_file = os.path.join(directory, "gerrit_to_platform.ini")
+        with open(config_file, "w") as ini:
+            ini.write(f"[daemon]\nsocket = {socket_path}\n")
+
+        with mock.patch(
+            "gerrit_to_platform.daemon.process_event", side_effect=processed.append
+        ):
+            server = EventServer(socket_path, workers=4)
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+
+            round_trips = []
+            for _ in range(1000):
+                start = time.perf_counter()
+                send_to_daemon(socket_path, event)
+                round_trips.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.clients) as clients:
+                accepted = sum(
+                    clients.map(
+                        lambda _: send_to_daemon(socket_path, event),
+                        range(args.events),
+                    )
+                )
+            elapsed = time.perf_counter() - start
+
+            env = dict(os.environ, XDG_CONFIG_HOME=directory)
+            env.pop("PYTHONDONTWRITEBYTECODE", None)
+            os.makedirs(os.path.join(directory, "gerrit_to_platform"))
+            os.rename(
+                config_file,
+                os.path.join(directory, "gerrit_to_platform", "gerrit_to_platform.ini"),
+            )
+            daemon_hook = process_wall_time(
+                [sys.executable, "-c", HOOK] + hook_argv(), env, args.runs
+            )
+            command_start = process_wall_time(
+                [sys.executable, "-c", "import gerrit_to_platform.patchset_created"],
+                env,
+                args.runs,
+            )
+
+            server.shutdown()
+            thread.join()
+            server.server_close()
+
+    print(f"round trip: p50 {statistics.median(round_trips) * 1e6:.0f} us")
+    print(
+        f"throughput: {accepted} events accepted from {args.clients} clients, "
+        f"{accepted / elapsed:.0f} events/s"
+    )
+    print(f"hook process, daemon mode:          {daemon_hook:.1f} ms")
+    print(f"hook process, in-process start only: {command_start:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark coalescing bursts of patchsets with the debouncer.
+
+Replays pushes of several patchsets per change, a fraction of a second
+apart, through a Debouncer and reports the verify fan-outs started and the
+delay added before the newest patchset is processed, for several windows.
+
+    python benchmarks/bench_debounce.py --changes 20 --patchsets 4 --gap 0.05
+"""
+
+import argparse
+import contextlib
+import io
+import statistics
+import threading
+import time
+from typing import Dict, List
+
+from gerrit_to_platform.events import (
+    EVENT_ARGUMENTS,
+    PATCHSET_CREATED,
+    Debouncer,
+    Event,
+)
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--changes", type=int, default=20)
+    parser.add_argument("--patchsets", type=int, default=4)
+    parser.add_argument(
+        "--gap", type=float, default=0.05, help="seconds between two pushes"
+    )
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 0.1, 0.5])
+    args = parser.parse_args()
+
+    for window in args.windows:
+        pushed: Dict[str, float] = {}
+        delays: List[float] = []
+        lock = threading.Lock()
+        fanouts = 0
+
+        def release(event: Event) -> None:
+            nonlocal fanouts
+            with lock:
+                fanouts += 1
+                delays.append(
+                    time.monotonic() - pushed[event["arguments"]["change_url"]]
+                )
+
+        debouncer = Debouncer(window, release)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for patchset in range(1, args.patchsets + 1):
+                for change in range(args.changes):
+                    arguments = {name: "" for name in EVENT_ARGUMENTS[PATCHSET_CREATED]}
+                    arguments.update(change_url=str(change), patchset=str(patchset))
+                    event: Event = {"type": PATCHSET_CREATED, "arguments": arguments}
+                    pushed[arguments["change_url"]] = time.monotonic()
+                    if not debouncer.submit(event):
+                        release(event)
+                time.sleep(args.gap)
+            time.sleep(window * 2)
+            debouncer.close()
+
+        print(
+            f"window {window:.2f} s: {fanouts} fan-outs for "
+            f"{args.changes * args.patchsets} patchsets, newest processed after "
+            f"{statistics.median(delays) * 1000:.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
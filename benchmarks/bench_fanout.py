@@ -0,0 +1,104 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark concurrent discovery and dispatch in find_and_dispatch.
+
+Mirrors a project to several GitHub organizations served by a local fake
+GitHub API that sleeps before every response, and compares the wall time of
+one event with the serial loop (concurrency 1) and with concurrent fan-out.
+
+    python benchmarks/bench_fanout.py --owners 6 --latency 0.1
+"""
+
+import argparse
+import contextlib
+import io
+import time
+from unittest import mock
+
+from gerrit_to_platform.config import Platform
+from gerrit_to_platform.fake_github import FakeGitHub, make_workflows
+from gerrit_to_platform.github import GitHubClient
+from gerrit_to_platform.helpers import find_and_dispatch_report
+
+INPUTS = {
+    "GERRIT_BRANCH": "master",
+    "GERRIT_CHANGE_NUMBER": "1",
+    "GERRIT_PATCHSET_NUMBER": "1",
+}
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--owners", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--owner-concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    remotes = {
+        "github": {
+            f"github-{index}": {
+                "owner": f"org-{index}",
+                "remotenamestyle": "dash",
+                "repo": "${name}",
+            }
+            for index in range(args.owners)
+        }
+    }
+    workflows = make_workflows(
+        3, ["gerrit-verify", "gerrit-verify-docs", "gerrit-required-verify"]
+    )
+
+    with FakeGitHub(workflows, latency=args.latency) as server:
+        client = GitHubClient("A_TOKEN", server.url)
+        for concurrency in args.concurrency:
+            limits = {
+                platform.value: {
+                    "concurrency": concurrency,
+                    "owner_concurrency": min(concurrency, args.owner_concurrency),
+                }
+                for platform in Platform
+            }
+            server.reset_counters()
+            with contextlib.ExitStack() as stack:
+                stack.enter_context(
+                    mock.patch.multiple(
+                        "gerrit_to_platform.helpers",
+                        get_replication_remotes=mock.Mock(return_value=remotes),
+                        get_required_workflow_cache=mock.Mock(return_value=None),
+                        get_settings=mock.Mock(
+                            return_value={"dispatch_limits": limits}
+                        ),
+                    )
+                )
+                stack.enter_context(
+                    mock.patch.multiple(
+                        "gerrit_to_platform.github",
+                        get_client=mock.Mock(return_value=client),
+                        get_workflow_cache=mock.Mock(return_value=None),
+                    )
+                )
+                stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+                start = time.perf_counter()
+                report = find_and_dispatch_report("project", "verify", dict(INPUTS))
+                elapsed = time.perf_counter() - start
+
+            print(
+                f"concurrency {concurrency:>2}: {report['dispatched']} dispatched, "
+                f"{len(report['errors'])} errors, {server.requests} requests, "
+                f"{elapsed * 1000:.0f} ms per event"
+            )
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark GitHub API connection reuse per hook event.
+
+Runs the workflow lookups and dispatches of one event (several remotes, each
+with a regular and a required workflow search) against a local fake GitHub
+API and reports the connections opened and the wall time per event, first
+with a new client for every API call (what creating a GhApi per call did) and
+then with the shared pooled client.
+
+    python benchmarks/bench_github_client.py --events 50 --remotes 5
+"""
+
+import argparse
+import time
+from typing import Callable
+
+from gerrit_to_platform.fake_github import FakeGitHub, make_workflows
+from gerrit_to_platform.github import GitHubClient
+
+
+def run_event(client_for_call: Callable[[], GitHubClient], remotes: int) -> None:
+    """Look up and dispatch the workflows of one event on every remote."""
+    for remote in range(remotes):
+        owner = f"org-{remote}"
+        for repository in ("project", ".github"):
+            client_for_call().list_repo_workflows(owner, repository)
+            client_for_call().create_workflow_dispatch(
+                owner, repository, "1000", "refs/heads/main", {"GERRIT_BRANCH": "x"}
+            )
+
+
+def measure(
+    server: FakeGitHub,
+    client_for_call: Callable[[], GitHubClient],
+    events: int,
+    remotes: int,
+) -> None:
+    """Print connections opened and wall time per event."""
+    server.reset_counters()
+    start = time.perf_counter()
+    for _ in range(events):
+        run_event(client_for_call, remotes)
+    elapsed = time.perf_counter() - start
+    print(
+        f"  {server.requests / events:.0f} requests, "
+        f"{server.connections / events:.1f} connections opened, "
+        f"{elapsed / events * 1000:.2f} ms per event"
+    )
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--remotes", type=int, default=5)
+    parser.add_argument("--workflows", type=int, default=20)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds per API response"
+    )
+    args = parser.parse_args()
+
+    with FakeGitHub(make_workflows(args.workflows), latency=args.latency) as server:
+        print("new client per API call:")
+        measure(
+            server,
+            lambda: GitHubClient("A_TOKEN", server.url),
+            args.events,
+            args.remotes,
+        )
+
+        shared = GitHubClient("A_TOKEN", server.url)
+        print("shared pooled client:")
+        measure(server, lambda: shared, args.events, args.remotes)
+        shared.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark hook startup import time.
+
+Imports each module in a fresh interpreter with ``-X importtime`` and reports
+the cumulative import time. Cold runs use an empty bytecode cache so every
+module is compiled, warm runs reuse the cache the cold run populated. The
+heavy platform dependencies pulled in by each import are listed so a module
+that starts loading them eagerly again is easy to spot.
+
+    python benchmarks/bench_import_time.py --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess  # nosec B404
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+MODULES = [
+    "gerrit_to_platform.patchset_created",
+    "gerrit_to_platform.comment_added",
+    "gerrit_to_platform.change_merged",
+    "gerrit_to_platform.helpers",
+    "gerrit_to_platform.config",
+    "gerrit_to_platform.github",
+]
+
+HEAVY = ["typer", "http.client", "gerrit_to_platform.github", "importlib.metadata"]
+
+REPORT = "import sys; print(','.join(m for m in {heavy!r} if m in sys.modules))"
+
+
+def import_time(module: str, pycache: str) -> Tuple[int, List[str]]:
+    """Import module in a new interpreter, returning microseconds and heavy deps."""
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache)
+    # the warm runs need the bytecode the cold run writes
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    result = subprocess.run(  # nosec B603
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import {module}; " + REPORT.format(heavy=HEAVY),
+        ],
+        capture_output=True,
+        check=True,
+        env=env,
+        text=True,
+    )
+    cumulative = 0
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            cumulative = int(fields[1])
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    return cumulative, loaded
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    args = parser.parse_args()
+
+    results: Dict[str, Tuple[int, float, List[str]]] = {}
+    for module in args.modules:
+        with tempfile.TemporaryDirectory() as pycache:
+            cold, loaded = import_time(module, pycache)
+            warm = statistics.median(
+                import_time(module, pycache)[0] for _ in range(args.repeat)
+            )
+        results[module] = (cold, warm, loaded)
+
+    print(f"{'module':<38} {'cold ms':>8} {'warm ms':>8}  heavy imports")
+    for module, (cold, warm, loaded) in results.items():
+        print(
+            f"{module:<38} {cold / 1000:>8.1f} {warm / 1000:>8.1f}  "
+            f"{', '.join(loaded) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark the cost of the stage metrics for a hook process.
+
+Times recording the samples of one event (config load, remote resolution,
+and a discovery and a dispatch per owner), then the write of the textfile
+collector file a hook does before exiting, with the file already holding the
+samples of --owners owners.
+
+    python benchmarks/bench_metrics.py --owners 50 --events 1000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from gerrit_to_platform.metrics import DISCOVERIES, DISPATCHES, REGISTRY, STAGE_SECONDS
+
+
+def record_event(owners: int) -> None:
+    """Record the samples of one event fanned out to owners."""
+    labels = {"event": "patchset-created", "platform": "github"}
+    STAGE_SECONDS.observe(0.002, stage="config", event=labels["event"])
+    STAGE_SECONDS.observe(0.001, stage="remotes", event=labels["event"])
+    for owner in range(owners):
+        owner_labels = dict(labels, owner=f"owner-{owner}")
+        with STAGE_SECONDS.time(stage="discovery", **owner_labels):
+            pass
+        DISCOVERIES.inc(source="api", **owner_labels)
+        with STAGE_SECONDS.time(stage="dispatch", **owner_labels):
+            pass
+        DISPATCHES.inc(result="dispatched", **owner_labels)
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--owners", type=int, default=50)
+    parser.add_argument("--events", type=int, default=1000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for _ in range(args.events):
+        record_event(args.owners)
+    recording = (time.perf_counter() - start) / args.events
+    print(f"Recording one event with {args.owners} owners: {recording * 1e6:.0f} us")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "gerrit_to_platform.prom")
+        REGISTRY.write_textfile(path)
+        timings = []
+        for _ in range(min(args.events, 200)):
+            record_event(args.owners)
+            start = time.perf_counter()
+            REGISTRY.write_textfile(path)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(
+            f"Textfile write ({os.path.getsize(path) / 1024:.0f} KiB): "
+            f"p50 {timings[len(timings) // 2] * 1000:.2f} ms, "
+            f"max {timings[-1] * 1000:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
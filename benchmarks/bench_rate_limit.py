@@ -0,0 +1,91 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark dispatches from concurrent hook processes under a secondary limit.
+
+Starts several processes at once, like Gerrit does during a push storm, each
+dispatching workflows against a local fake GitHub API that refuses POSTs
+beyond a sliding window limit with a 429. Reports the 429 responses, lost
+dispatches and wall time without a rate limiter, with a limiter per process
+and with the limiter budget shared through one state file.
+
+    python benchmarks/bench_rate_limit.py --processes 8 --dispatches 10 --limit 20
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Optional, Tuple
+
+from gerrit_to_platform.fake_github import FakeGitHub
+from gerrit_to_platform.github import GitHubClient, GitHubError, RateLimiter
+
+
+def hook_process(job: Tuple[str, int, Optional[str], float]) -> int:
+    """Dispatch like one hook process, returning the dispatches lost."""
+    url, dispatches, state_path, write_rate = job
+    limiter = None
+    if state_path is not None:
+        limiter = RateLimiter(state_path, write_rate, 1, max_wait=120)
+    client = GitHubClient("A_TOKEN", url, rate_limiter=limiter)
+    lost = 0
+    for workflow in range(dispatches):
+        try:
+            client.create_workflow_dispatch(
+                "example", "repository", str(workflow), "refs/heads/main", {}
+            )
+        except GitHubError:
+            lost += 1
+    client.close()
+    return lost
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--dispatches", type=int, default=10)
+    parser.add_argument(
+        "--limit", type=int, default=20, help="dispatches the API accepts per second"
+    )
+    args = parser.parse_args()
+
+    # a fresh interpreter per process, like the hook processes of Gerrit
+    context = multiprocessing.get_context("spawn")
+    with FakeGitHub() as server, tempfile.TemporaryDirectory() as directory:
+        server.write_limit = (args.limit, 1.0)
+        server.retry_after = 1
+        modes = {
+            "no rate limiter": lambda _: None,
+            "limiter per process": lambda n: os.path.join(directory, f"own-{n}.json"),
+            "shared limiter": lambda _: os.path.join(directory, "shared.json"),
+        }
+        for label, state_path in modes.items():
+            server.reset_counters()
+            server.writes.clear()
+            # leave some headroom below the limit enforced by the server
+            jobs = [
+                (server.url, args.dispatches, state_path(n), args.limit * 60 * 0.9)
+                for n in range(args.processes)
+            ]
+            with context.Pool(args.processes) as pool:
+                start = time.perf_counter()
+                lost = sum(pool.map(hook_process, jobs))
+                elapsed = time.perf_counter() - start
+            print(
+                f"{label}: {len(server.dispatches)} dispatched, {lost} lost, "
+                f"{server.rate_limited} rate limited responses, {elapsed:.2f} s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark project to remote resolution.
+
+Generates a replication.config where every remote carries projects filters
+(exact names, globs and regular expressions) and compares, for every project,
+the number of remotes find_and_dispatch would visit (one list_repo_workflows
+call each) and the lookup time without and with the remote index.
+
+    python benchmarks/bench_remote_index.py --projects 5000 --remotes 300
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from unittest import mock
+
+import gerrit_to_platform.config as config
+
+
+def write_replication_config(path: str, remotes: int, groups: int) -> None:
+    """Write a replication.config with projects filters on every remote."""
+    with open(path, "w") as replication_file:
+        for remote in range(remotes):
+            group = remote % groups
+            replication_file.write(
+                f'[remote "github-{remote}"]\n'
+                "    authGroup = GitHub Replication\n"
+                "    remoteNameStyle = dash\n"
+                f"    url = git@github.com:org{remote}/${{name}}.git\n"
+            )
+            if remote % 3 == 0:
+                replication_file.write(f"    projects = group{group}/*\n")
+            elif remote % 3 == 1:
+                replication_file.write(f"    projects = ^group{group}/(app|lib)-.*$\n")
+            else:
+                for project in range(5):
+                    replication_file.write(
+                        f"    projects = group{group}/svc-{project}\n"
+                    )
+            replication_file.write("\n")
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--projects", type=int, default=5000)
+    parser.add_argument("--remotes", type=int, default=300)
+    parser.add_argument("--groups", type=int, default=100)
+    args = parser.parse_args()
+
+    kinds = ["app", "lib", "svc", "doc"]
+    projects = [
+        f"group{random.randrange(args.groups)}/{random.choice(kinds)}-{number % 7}"
+        for number in range(args.projects)
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        replication = os.path.join(directory, "replication.config")
+        write_replication_config(replication, args.remotes, args.groups)
+        config_files = {config.CONFIG: "", config.REPLICATION: replication}
+
+        with mock.patch.object(config, "CONFIG_FILES", config_files):
+            config.clear_config_cache()
+            start = time.perf_counter()
+            all_remotes = config.get_replication_remotes()
+            build = time.perf_counter() - start
+
+            before = sum(len(all_remotes.get("github", {})) for _ in projects)
+
+            start = time.perf_counter()
+            after = sum(
+                len(config.get_replication_remotes(project).get("github", {}))
+                for project in projects
+            )
+            cold = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for project in projects:
+                config.get_replication_remotes(project)
+            warm = time.perf_counter() - start
+
+    print(f"projects: {args.projects}, remotes: {args.remotes}")
+    print(f"parse and index build: {build * 1000:.2f} ms")
+    print(
+        f"remotes visited without index: {before} ({before / len(projects):.1f}/project)"
+    )
+    print(
+        f"remotes visited with index:    {after} ({after / len(projects):.1f}/project)"
+    )
+    print(f"lookup cold: {cold * 1e6 / len(projects):.1f} us/project")
+    print(f"lookup warm: {warm * 1e6 / len(projects):.1f} us/project")
+
+
+if __name__ == "__main__":
+    main()
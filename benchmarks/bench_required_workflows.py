@@ -0,0 +1,124 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark the per-owner memo of required workflow discovery.
+
+Handles a series of events for projects mirrored to several organizations,
+some of them under two remotes, against a local fake GitHub API and reports
+the .github listing requests and wall time per event with the required
+workflows only shared within an event and with a required_ttl.
+
+    python benchmarks/bench_required_workflows.py --events 100 --owners 4
+"""
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from typing import Optional
+from unittest import mock
+
+from gerrit_to_platform.cache import ResponseCache
+from gerrit_to_platform.config import Platform
+from gerrit_to_platform.fake_github import FakeGitHub, make_workflows
+from gerrit_to_platform.github import GitHubClient
+from gerrit_to_platform.helpers import find_and_dispatch
+
+INPUTS = {
+    "GERRIT_BRANCH": "master",
+    "GERRIT_CHANGE_NUMBER": "1",
+    "GERRIT_PATCHSET_NUMBER": "1",
+}
+
+
+def measure(
+    server: FakeGitHub,
+    remotes: dict,
+    workflow_cache: ResponseCache,
+    required_cache: Optional[ResponseCache],
+    events: int,
+) -> None:
+    """Print .github listing requests and wall time per event."""
+    limits = {
+        platform.value: {"concurrency": 1, "owner_concurrency": 1}
+        for platform in Platform
+    }
+    server.reset_counters()
+    start = time.perf_counter()
+    for event in range(events):
+        # every hook process starts with a new client
+        client = GitHubClient("A_TOKEN", server.url)
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(
+                mock.patch.multiple(
+                    "gerrit_to_platform.helpers",
+                    get_replication_remotes=mock.Mock(return_value=remotes),
+                    get_required_workflow_cache=mock.Mock(return_value=required_cache),
+                    get_settings=mock.Mock(return_value={"dispatch_limits": limits}),
+                )
+            )
+            stack.enter_context(
+                mock.patch.multiple(
+                    "gerrit_to_platform.github",
+                    get_client=mock.Mock(return_value=client),
+                    get_workflow_cache=mock.Mock(return_value=workflow_cache),
+                )
+            )
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            find_and_dispatch(f"project-{event}", "verify", dict(INPUTS))
+        client.close()
+    elapsed = time.perf_counter() - start
+    magic = sum(
+        1
+        for method, path in server.request_log
+        if method == "GET" and "/.github/" in path
+    )
+    print(
+        f"  {magic / events:.2f} .github listings, "
+        f"{server.requests / events:.2f} requests, "
+        f"{elapsed / events * 1000:.2f} ms per event"
+    )
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--owners", type=int, default=4)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds per API response"
+    )
+    args = parser.parse_args()
+
+    remotes = {"github": {}}
+    for index in range(args.owners):
+        for style in ("dash", "underscore"):
+            remotes["github"][f"github-{index}-{style}"] = {
+                "owner": f"org-{index}",
+                "remotenamestyle": style,
+                "repo": "${name}",
+            }
+    workflows = make_workflows(2, ["gerrit-verify", "gerrit-required-verify"])
+
+    server = FakeGitHub(workflows, latency=args.latency)
+    with server, tempfile.TemporaryDirectory() as directory:
+        print("within an event only (required_ttl 0):")
+        workflow_cache = ResponseCache(f"{directory}/w0", ttl=0, max_entries=1024)
+        measure(server, remotes, workflow_cache, None, args.events)
+
+        print("required_ttl 300:")
+        workflow_cache = ResponseCache(f"{directory}/w1", ttl=0, max_entries=1024)
+        required_cache = ResponseCache(f"{directory}/r", ttl=300, max_entries=1024)
+        measure(server, remotes, workflow_cache, required_cache, args.events)
+
+
+if __name__ == "__main__":
+    main()
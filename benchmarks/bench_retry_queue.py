@@ -0,0 +1,103 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark the recovery of failed dispatches through the retry queue.
+
+Dispatches workflows against a local fake GitHub API that fails a burst of
+them with a 502, queues the failed ones, then drains the queue until it is
+empty. Reports the dispatches lost without the queue, the cost of queueing a
+failure in the hook process, and the drains and retry latency needed to
+recover all of them.
+
+    python benchmarks/bench_retry_queue.py --dispatches 200 --failures 50
+"""
+
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from unittest import mock
+
+from gerrit_to_platform.fake_github import FakeGitHub
+from gerrit_to_platform.github import GitHubClient, GitHubError
+from gerrit_to_platform.helpers import drain_retry_queue
+from gerrit_to_platform.retry import RetryQueue
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dispatches", type=int, default=200)
+    parser.add_argument("--failures", type=int, default=50)
+    parser.add_argument(
+        "--outage", type=int, default=20, help="retries failing after the burst"
+    )
+    args = parser.parse_args()
+
+    with FakeGitHub() as server, tempfile.TemporaryDirectory() as directory:
+        client = GitHubClient("A_TOKEN", server.url)
+        retry_queue = RetryQueue(f"{directory}/retry.sqlite3", 10, 0.01, 0.1)
+        server.dispatch_failures = args.failures
+        queueing = 0.0
+        for workflow in range(args.dispatches):
+            try:
+                client.create_workflow_dispatch(
+                    "example", "repository", str(workflow), "refs/heads/main", {}
+                )
+            except GitHubError as error:
+                start = time.perf_counter()
+                retry_queue.enqueue(
+                    "github",
+                    "example",
+                    "repository",
+                    str(workflow),
+                    "refs/heads/main",
+                    {},
+                    error,
+                )
+                queueing += time.perf_counter() - start
+        lost = args.dispatches - len(server.dispatches)
+        print(
+            f"{lost} of {args.dispatches} dispatches lost without the queue, "
+            f"{queueing / max(lost, 1) * 1000:.2f} ms to queue each"
+        )
+
+        server.dispatch_failures = args.outage
+        drains = 0
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(
+                mock.patch(
+                    "gerrit_to_platform.helpers.choose_dispatch",
+                    return_value=client.create_workflow_dispatch,
+                )
+            )
+            stack.enter_context(
+                mock.patch(
+                    "gerrit_to_platform.retry.get_retry_queue", return_value=retry_queue
+                )
+            )
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            while retry_queue.stats()["depth"]:
+                drain_retry_queue()
+                drains += 1
+                time.sleep(0.01)
+        stats = retry_queue.stats()
+        client.close()
+        print(
+            f"{stats['retried']} recovered in {drains} drains, "
+            f"{stats['dropped']} given up, retry latency "
+            f"avg {stats['retry_latency_avg'] * 1000:.0f} ms, "
+            f"max {stats['retry_latency_max'] * 1000:.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
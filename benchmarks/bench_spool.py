@@ -0,0 +1,84 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark the hook latency of spool mode against dispatching in the hook.
+
+Measures the time a hook spends handing off an event: spooling it with and
+without fsync, and listing plus dispatching one workflow against a local
+fake GitHub API answering with the given latency. Also reports the events
+per second a worker drains from the spool.
+
+    python benchmarks/bench_spool.py --events 1000 --latency 0.2
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from typing import Callable, List
+
+from gerrit_to_platform.events import EVENT_ARGUMENTS, PATCHSET_CREATED, Event
+from gerrit_to_platform.fake_github import FakeGitHub, make_workflows
+from gerrit_to_platform.github import GitHubClient
+from gerrit_to_platform.spool import Spool
+
+EVENT: Event = {
+    "type": PATCHSET_CREATED,
+    "arguments": {name: "1" for name in EVENT_ARGUMENTS[PATCHSET_CREATED]},
+}
+
+
+def report(label: str, call: Callable[[], None], events: int) -> None:
+    """Print the median and p99 wall time of call."""
+    timings: List[float] = []
+    for _ in range(events):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(
+        f"{label}: p50 {statistics.median(timings) * 1e6:.0f} us, "
+        f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} us"
+    )
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="seconds per API response"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        spool = Spool(f"{directory}/spool")
+        report("spool", lambda: spool.append(EVENT), args.events)
+        synced = Spool(f"{directory}/synced", fsync=True)
+        report("spool with fsync", lambda: synced.append(EVENT), args.events)
+
+        start = time.perf_counter()
+        drained = spool.drain(lambda batch: None, batch_size=100)
+        elapsed = time.perf_counter() - start
+        print(f"worker drain: {drained / elapsed:.0f} events per second")
+
+    with FakeGitHub(make_workflows(1), latency=args.latency) as server:
+        client = GitHubClient("A_TOKEN", server.url)
+
+        def dispatch() -> None:
+            client.list_repo_workflows("example", "project")
+            client.create_workflow_dispatch("example", "project", "1", "main", {})
+
+        report("dispatch in the hook", dispatch, max(args.events // 100, 5))
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
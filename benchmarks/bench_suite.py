@@ -0,0 +1,318 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+End-to-end benchmark suite against a local fake GitHub Actions API.
+
+For every size (remotes x workflows per repository) writes a real
+gerrit_to_platform.ini and replication.config pointing at a local fake
+GitHub API, then runs find_and_dispatch and the three event handlers through
+the same code as the hooks: configuration parsing, remote resolution, the
+workflow cache, the rate limiters and the HTTP client. The fake API sleeps
+--latency seconds per request, sends rate limit headers, answers 404 for
+--missing of the remotes and lists the requested number of workflows.
+
+Reports the throughput and the p50/p95/p99 latency of each scenario, and
+writes them as JSON with --output so runs on different commits can be
+compared with --compare:
+
+    python benchmarks/bench_suite.py --output before.json
+    git checkout topic
+    python benchmarks/bench_suite.py --output after.json --compare before.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess  # nosec B404
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+from unittest import mock
+
+import gerrit_to_platform.config
+from gerrit_to_platform.config import CONFIG, REPLICATION, clear_config_cache
+from gerrit_to_platform.events import (
+    CHANGE_MERGED,
+    COMMENT_ADDED,
+    EVENT_ARGUMENTS,
+    PATCHSET_CREATED,
+    Event,
+    process_event,
+)
+from gerrit_to_platform.fake_github import FakeGitHub, make_workflows
+from gerrit_to_platform.helpers import find_and_dispatch
+
+PROJECT = "example/project"
+REPOSITORY = "example-project"
+
+SCENARIOS = ("find_and_dispatch", PATCHSET_CREATED, COMMENT_ADDED, CHANGE_MERGED)
+
+ARGUMENTS = {
+    "change": f"{PROJECT}~master~I308b4eda73ff90ee486f14e01db145684889eaae",
+    "kind": "REWORK",
+    "change_url": "https://gerrit.example.org/r/c/example/project/+/1",
+    "change_owner": "Foo <foo@example.org>",
+    "change_owner_username": "foo",
+    "project": PROJECT,
+    "branch": "master",
+    "topic": "",
+    "uploader": "Foo <foo@example.org>",
+    "uploader_username": "foo",
+    "author": "Foo <foo@example.org>",
+    "author_username": "foo",
+    "submitter": "Foo <foo@example.org>",
+    "submitter_username": "foo",
+    "commit": "7f0f8a2b05546d5956b0bb1431ba13c8cbe94631",
+    "newrev": "7f0f8a2b05546d5956b0bb1431ba13c8cbe94631",
+    "patchset": "1",
+    "comment": "Patch Set 1:\n\nrecheck",
+}
+
+INPUTS = {
+    "GERRIT_BRANCH": "master",
+    "GERRIT_CHANGE_NUMBER": "1",
+    "GERRIT_PATCHSET_NUMBER": "1",
+}
+
+
+def make_event(event_type: str) -> Event:
+    """Build a valid event of a type."""
+    return {
+        "type": event_type,
+        "arguments": {name: ARGUMENTS[name] for name in EVENT_ARGUMENTS[event_type]},
+    }
+
+
+def write_config(directory: str, api_url: str, remotes: int) -> Dict[str, str]:
+    """Write the configuration files of a size, return the CONFIG_FILES."""
+    config_path = os.path.join(directory, "gerrit_to_platform.ini")
+    with open(config_path, "w") as config_file:
+        config_file.write(
+            '[mapping "comment-added"]\n'
+            "recheck = verify\n"
+            "[github.com]\n"
+            "token = A_TOKEN\n"
+            f"api_url = {api_url}\n"
+            # measure the client, not the secondary rate limit pacing
+            "write_rate = 1000000\n"
+            "write_burst = 1000000\n"
+            "[cache]\n"
+            f"directory = {directory}/cache\n"
+            "[retry]\n"
+            "queue =\n"
+            "[cooldown]\n"
+            "backend = memory\n"
+        )
+
+    replication_path = os.path.join(directory, "replication.config")
+    with open(replication_path, "w") as replication_file:
+        for index in range(remotes):
+            replication_file.write(
+                f'[remote "github-{index}"]\n'
+                "    remoteNameStyle = dash\n"
+                f"    url = git@github.com:org-{index}/${{name}}.git\n"
+            )
+    return {CONFIG: config_path, REPLICATION: replication_path}
+
+
+def workflow_names(count: int) -> List[str]:
+    """Get workflow names, a third verify, a third merge, a third others."""
+    kinds = ("gerrit-verify", "gerrit-merge", "release")
+    return [f"{kinds[index % 3]}-{index}" for index in range(count)]
+
+
+def percentile(timings: List[float], share: float) -> float:
+    """Get the nearest-rank percentile of sorted timings."""
+    index = max(int(round(share * len(timings) + 0.5)) - 1, 0)
+    return timings[min(index, len(timings) - 1)]
+
+
+def run_scenario(
+    server: FakeGitHub, scenario: str, events: int
+) -> Tuple[List[float], float, Dict[str, float]]:
+    """Run the events of a scenario, return the latencies, cold and totals."""
+    run: Callable[[], Any]
+    if scenario == "find_and_dispatch":
+
+        def run() -> Any:
+            return find_and_dispatch(PROJECT, "verify", dict(INPUTS))
+
+    else:
+        event = make_event(scenario)
+
+        def run() -> Any:
+            return process_event(event)
+
+    server.reset_counters()
+    start = time.perf_counter()
+    run()
+    cold = time.perf_counter() - start
+
+    server.reset_counters()
+    timings = []
+    for _ in range(events):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return (
+        timings,
+        cold,
+        {
+            "requests": server.requests,
+            "not_modified": server.not_modified,
+            "dispatches": len(server.dispatches),
+        },
+    )
+
+
+def commit() -> str:
+    """Get the checked out commit, empty outside of a git checkout."""
+    try:
+        return subprocess.run(  # nosec B603 B607
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> None:
+    """Print the change of every scenario against a baseline run."""
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    before = {
+        (result["scenario"], result["remotes"], result["workflows"]): result
+        for result in baseline["results"]
+    }
+    print(f"\nAgainst {baseline.get('commit') or baseline_path}:")
+    for result in results:
+        old = before.get((result["scenario"], result["remotes"], result["workflows"]))
+        if old is None:
+            continue
+        print(
+            f"{result['scenario']:<18} {result['remotes']:>4} {result['workflows']:>5}"
+            f"  throughput x{result['throughput'] / old['throughput']:.2f}"
+            f"  p50 x{result['p50_ms'] / old['p50_ms']:.2f}"
+            f"  p99 x{result['p99_ms'] / old['p99_ms']:.2f}"
+        )
+
+
+def main() -> None:
+    """Run the benchmark suite."""
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--remotes", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--workflows", type=int, nargs="+", default=[6, 60])
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument(
+        "--missing", type=float, default=0.0, help="share of remotes answering 404"
+    )
+    parser.add_argument(
+        "--rate-limit", type=int, default=1_000_000, help="API budget of the token"
+    )
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    args = parser.parse_args()
+
+    results = []
+    print(
+        f"{'scenario':<18} {'rem':>4} {'wfs':>5} {'ev/s':>8} {'p50 ms':>8} "
+        f"{'p95 ms':>8} {'p99 ms':>8} {'cold ms':>8} {'req/ev':>7} {'disp/ev':>7}"
+    )
+    for remotes in args.remotes:
+        for workflows in args.workflows:
+            with contextlib.ExitStack() as stack:
+                directory = stack.enter_context(tempfile.TemporaryDirectory())
+                server = stack.enter_context(
+                    FakeGitHub(
+                        make_workflows(workflows, workflow_names(workflows)),
+                        latency=args.latency,
+                    )
+                )
+                server.rate_limit_remaining = args.rate_limit
+                server.missing = {
+                    f"org-{index}/{REPOSITORY}"
+                    for index in range(int(remotes * args.missing))
+                }
+                stack.enter_context(
+                    mock.patch.object(
+                        gerrit_to_platform.config,
+                        "CONFIG_FILES",
+                        write_config(directory, server.url, remotes),
+                    )
+                )
+                stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+                clear_config_cache()
+
+                runs = []
+                for scenario in args.scenarios:
+                    runs.append(
+                        (scenario,) + run_scenario(server, scenario, args.events)
+                    )
+            clear_config_cache()
+
+            for scenario, timings, cold, totals in runs:
+                timings.sort()
+                result = {
+                    "scenario": scenario,
+                    "remotes": remotes,
+                    "workflows": workflows,
+                    "events": len(timings),
+                    "throughput": len(timings) / sum(timings),
+                    "mean_ms": sum(timings) / len(timings) * 1000,
+                    "p50_ms": percentile(timings, 0.50) * 1000,
+                    "p95_ms": percentile(timings, 0.95) * 1000,
+                    "p99_ms": percentile(timings, 0.99) * 1000,
+                    "cold_ms": cold * 1000,
+                    "requests_per_event": totals["requests"] / len(timings),
+                    "not_modified_per_event": totals["not_modified"] / len(timings),
+                    "dispatches_per_event": totals["dispatches"] / len(timings),
+                }
+                results.append(result)
+                print(
+                    f"{scenario:<18} {remotes:>4} {workflows:>5} "
+                    f"{result['throughput']:8.1f} {result['p50_ms']:8.2f} "
+                    f"{result['p95_ms']:8.2f} {result['p99_ms']:8.2f} "
+                    f"{result['cold_ms']:8.2f} {result['requests_per_event']:7.1f} "
+                    f"{result['dispatches_per_event']:7.1f}"
+                )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(
+                {
+                    "commit": commit(),
+                    "python": platform.python_version(),
+                    "timestamp": time.time(),
+                    "parameters": {
+                        name: value
+                        for name, value in vars(args).items()
+                        if name not in ("output", "compare")
+                    },
+                    "results": results,
+                },
+                output_file,
+                indent=2,
+            )
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
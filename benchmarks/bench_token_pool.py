@@ -0,0 +1,78 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark the GitHub requests served with a pool of tokens.
+
+Lists workflows against a local fake GitHub API that gives every token the
+same small rate limit budget, and reports the requests served before the
+budget runs out and how they were spread over the tokens, for pools of one
+and more tokens.
+
+    python benchmarks/bench_token_pool.py --tokens 1 2 4 --budget 100
+"""
+
+import argparse
+import collections
+import tempfile
+import time
+
+from gerrit_to_platform.fake_github import FakeGitHub, make_workflows
+from gerrit_to_platform.github import (
+    GitHubClient,
+    GitHubRateLimitError,
+    RateLimiter,
+    TokenPool,
+)
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--budget", type=int, default=100)
+    args = parser.parse_args()
+
+    with FakeGitHub(make_workflows(3)) as server:
+        for count in args.tokens:
+            tokens = [f"TOKEN_{index}" for index in range(count)]
+            server.reset_counters()
+            server.token_limits = {token: args.budget for token in tokens}
+            with tempfile.TemporaryDirectory() as directory:
+                pool = TokenPool(
+                    {
+                        token: RateLimiter(
+                            f"{directory}/{token}.json", 0, 1, max_wait=0
+                        )
+                        for token in tokens
+                    }
+                )
+                client = GitHubClient(tokens[0], server.url, token_pool=pool)
+                served = 0
+                start = time.perf_counter()
+                try:
+                    while True:
+                        client.list_repo_workflows("example", f"repo-{served}")
+                        served += 1
+                except GitHubRateLimitError:
+                    pass
+                elapsed = time.perf_counter() - start
+                client.close()
+
+            spread = collections.Counter(server.tokens_used)
+            print(
+                f"{count} tokens: {served} requests served, "
+                f"{server.rate_limited} refused, "
+                f"{min(spread.values())}-{max(spread.values())} per token, "
+                f"{elapsed / max(served, 1) * 1000:.2f} ms per request"
+            )
+
+
+if __name__ == "__main__":
+    main()
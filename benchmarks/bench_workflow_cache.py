@@ -0,0 +1,84 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark the on-disk workflow listing cache.
+
+Looks up the workflows of the project and .github repositories on a set of
+busy repositories against a local fake GitHub API, the way one hook event
+per process does, and reports full listings transferred, 304 responses and
+wall time per event without the cache, with ETag revalidation only and with
+a TTL.
+
+    python benchmarks/bench_workflow_cache.py --events 200 --workflows 100
+"""
+
+import argparse
+import tempfile
+import time
+from typing import Optional
+from unittest import mock
+
+from gerrit_to_platform.cache import ResponseCache
+from gerrit_to_platform.fake_github import FakeGitHub, make_workflows
+from gerrit_to_platform.github import GitHubClient, get_workflows
+
+
+def measure(
+    server: FakeGitHub, cache: Optional[ResponseCache], events: int, repos: int
+) -> None:
+    """Print discovery traffic and wall time per event."""
+    server.reset_counters()
+    start = time.perf_counter()
+    for event in range(events):
+        # every hook process starts with a new client
+        client = GitHubClient("A_TOKEN", server.url)
+        with mock.patch("gerrit_to_platform.github.get_client", return_value=client):
+            with mock.patch(
+                "gerrit_to_platform.github.get_workflow_cache", return_value=cache
+            ):
+                get_workflows("example", f"repo-{event % repos}")
+                get_workflows("example", ".github")
+        client.close()
+    elapsed = time.perf_counter() - start
+    full = server.requests - server.not_modified
+    print(
+        f"  {full / events:.2f} full listings, "
+        f"{server.not_modified / events:.2f} 304s, "
+        f"{elapsed / events * 1000:.2f} ms per event"
+    )
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--repos", type=int, default=10)
+    parser.add_argument("--workflows", type=int, default=100)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds per API response"
+    )
+    args = parser.parse_args()
+
+    server = FakeGitHub(make_workflows(args.workflows), latency=args.latency)
+    with server, tempfile.TemporaryDirectory() as directory:
+        print("no cache:")
+        measure(server, None, args.events, args.repos)
+
+        print("ETag revalidation (ttl 0):")
+        cache = ResponseCache(f"{directory}/etag", ttl=0, max_entries=1024)
+        measure(server, cache, args.events, args.repos)
+
+        print("ttl 60:")
+        cache = ResponseCache(f"{directory}/ttl", ttl=60, max_entries=1024)
+        measure(server, cache, args.events, args.repos)
+
+
+if __name__ == "__main__":
+    main()
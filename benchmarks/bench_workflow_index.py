@@ -0,0 +1,115 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Micro-benchmark filtering workflow listings with the workflow index.
+
+Filters synthetic listings, a share of which are gerrit workflows, with many
+search filters the way a long running process handles events, and compares
+the four filter() passes of the original filter_workflows, one filter_path
+pass per lookup and a WorkflowIndex built once and looked up per filter.
+
+    python benchmarks/bench_workflow_index.py --workflows 1000 5000 --filters 50
+"""
+
+import argparse
+import time
+from typing import Callable, Dict, List
+
+from gerrit_to_platform.fake_github import make_workflows
+from gerrit_to_platform.github import WorkflowIndex, filter_path
+
+
+def four_passes(
+    workflows: List[Dict[str, str]], search_filter: str, search_required: bool
+) -> List[Dict[str, str]]:
+    """Filter workflows like filter_workflows originally did."""
+    filtered = list(filter(lambda x: filter_path(search_filter, x), workflows))
+    filtered = list(filter(lambda x: filter_path("gerrit", x), filtered))
+    if search_required:
+        return list(filter(lambda x: filter_path("required", x), filtered))
+    return list(filter(lambda x: not filter_path("required", x), filtered))
+
+
+def one_pass(
+    workflows: List[Dict[str, str]], search_filter: str, search_required: bool
+) -> List[Dict[str, str]]:
+    """Filter workflows with a single filter_path pass."""
+    return [
+        workflow
+        for workflow in workflows
+        if filter_path(search_filter, workflow)
+        and filter_path("gerrit", workflow)
+        and filter_path("required", workflow) == search_required
+    ]
+
+
+def synthetic_workflows(count: int, filters: List[str]) -> List[Dict[str, str]]:
+    """Generate count workflows, one in four of them gerrit workflows."""
+    names = []
+    for index in range(count):
+        search_filter = filters[index % len(filters)]
+        if index % 4 == 0:
+            names.append(f"gerrit-{search_filter}-{index}")
+        elif index % 4 == 1:
+            names.append(f"gerrit-required-{search_filter}-{index}")
+        else:
+            names.append(f"build-{search_filter}-{index}")
+    return make_workflows(count, names)
+
+
+def measure(label: str, lookups: int, call: Callable[[], int]) -> None:
+    """Print the wall time per lookup of call."""
+    start = time.perf_counter()
+    found = call()
+    elapsed = time.perf_counter() - start
+    print(f"  {label}: {found} matches, {elapsed / lookups * 1e6:.1f} us per lookup")
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workflows", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--filters", type=int, default=50)
+    parser.add_argument("--events", type=int, default=20)
+    args = parser.parse_args()
+
+    filters = ["verify", "merge"] + [f"keyword{n}" for n in range(args.filters - 2)]
+    lookups = args.events * len(filters) * 2
+
+    for count in args.workflows:
+        workflows = synthetic_workflows(count, filters)
+        print(f"{count} workflows, {len(filters)} filters, {args.events} events:")
+
+        def run(function: Callable) -> int:
+            return sum(
+                len(function(workflows, search_filter, required))
+                for _ in range(args.events)
+                for search_filter in filters
+                for required in (False, True)
+            )
+
+        measure("four filter() passes", lookups, lambda: run(four_passes))
+        measure("one filter_path pass", lookups, lambda: run(one_pass))
+
+        start = time.perf_counter()
+        index = WorkflowIndex(workflows)
+        build = time.perf_counter() - start
+        print(f"  index build: {len(index)} gerrit workflows, {build * 1000:.2f} ms")
+        measure(
+            "index lookup",
+            lookups,
+            lambda: run(
+                lambda _, search_filter, required: index.lookup(search_filter, required)
+            ),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""
+Benchmark paginated workflow discovery on repositories with many workflows.
+
+Serves synthetic repositories with hundreds of workflows, a few of which are
+gerrit verify workflows spread over the listing, from a local fake GitHub
+API. Reports the gerrit workflows found when only the first default sized
+page is read (the previous behaviour), then requests, peak memory and wall
+time of a full paginated listing, a streaming filter and a filter that stops
+at the first match.
+
+    python benchmarks/bench_workflow_pages.py --workflows 300 1000
+"""
+
+import argparse
+import time
+import tracemalloc
+from typing import Callable, List
+from unittest import mock
+
+from gerrit_to_platform.fake_github import FakeGitHub, make_workflows
+from gerrit_to_platform.github import (
+    GitHubClient,
+    filter_path,
+    filter_workflows,
+    get_workflows,
+)
+
+GERRIT_EVERY = 50
+
+
+def synthetic_workflows(count: int) -> List[dict]:
+    """Generate count workflows with a gerrit verify workflow every so often."""
+    names = []
+    for index in range(count):
+        if index % GERRIT_EVERY == GERRIT_EVERY - 1:
+            names.append(f"gerrit-verify-{index}")
+        else:
+            names.append(f"build-{index}")
+    return make_workflows(count, names)
+
+
+def measure(server: FakeGitHub, label: str, call: Callable[[], list]) -> None:
+    """Print requests, peak memory and wall time of call."""
+    server.reset_counters()
+    tracemalloc.start()
+    start = time.perf_counter()
+    found = call()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"  {label}: {len(found)} workflows, {server.requests} requests, "
+        f"peak {peak / 1024:.0f} KiB, {elapsed * 1000:.2f} ms"
+    )
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workflows", type=int, nargs="+", default=[300, 1000])
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds per API response"
+    )
+    args = parser.parse_args()
+
+    for count in args.workflows:
+        workflows = synthetic_workflows(count)
+        with FakeGitHub(workflows, latency=args.latency) as server:
+            client = GitHubClient("A_TOKEN", server.url)
+            print(f"{count} workflows, {count // GERRIT_EVERY} gerrit verify:")
+
+            _, _, first_page = client.request(
+                "GET", "/repos/example/repository/actions/workflows"
+            )
+            found = [
+                workflow
+                for workflow in first_page["workflows"]
+                if filter_path("gerrit", workflow)
+            ]
+            print(f"  first default page only: {len(found)} gerrit workflows")
+
+            with mock.patch.multiple(
+                "gerrit_to_platform.github",
+                get_client=mock.Mock(return_value=client),
+                get_workflow_cache=mock.Mock(return_value=None),
+            ):
+                measure(
+                    server,
+                    "get_workflows",
+                    lambda: get_workflows("example", "repository"),
+                )
+                measure(
+                    server,
+                    "filter_workflows",
+                    lambda: filter_workflows("example", "repository", "verify"),
+                )
+                measure(
+                    server,
+                    "filter_workflows limit=1",
+                    lambda: filter_workflows(
+                        "example", "repository", "verify", limit=1
+                    ),
+                )
+            client.close()
+
+
+if __name__ == "__main__":
+    main()
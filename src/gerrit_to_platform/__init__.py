@@ -7,13 +7,23 @@
 # distribution, and is available at
 # https://opensource.org/licenses/Apache-2.0
 ##############################################################################
-from importlib.metadata import PackageNotFoundError, version  # pragma: no cover
 
-try:
-    # Change here if project is renamed and does not equal the package name
-    dist_name = __name__
-    __version__ = version(dist_name)
-except PackageNotFoundError:  # pragma: no cover
-    __version__ = "unknown"
-finally:
-    del version, PackageNotFoundError
+
+def __getattr__(name: str) -> str:
+    """
+    Resolve __version__ on first use.
+
+    importlib.metadata is slow to import and every hook invocation imports
+    this package, so the version lookup is deferred until it is asked for.
+    """
+    if name != "__version__":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        # Change here if project is renamed and does not equal the package name
+        dist_name = __name__
+        return version(dist_name)
+    except PackageNotFoundError:  # pragma: no cover
+        return "unknown"
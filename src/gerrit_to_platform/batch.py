@@ -0,0 +1,195 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Processing of many events in one process, eg: backfills after an outage."""
+
+import contextvars
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypedDict
+
+from gerrit_to_platform.events import Event, from_stream_event, load_event
+from gerrit_to_platform.github import discovery_session
+from gerrit_to_platform.helpers import collect_dispatch_report
+
+
+class BatchResult(TypedDict):
+    """Outcome of one event of a batch."""
+
+    line: int
+    type: Optional[str]
+    project: Optional[str]
+    change_url: Optional[str]
+    status: str
+    dispatched: int
+    queued: int
+    errors: List[str]
+    seconds: float
+
+
+# Statuses of a BatchResult
+DISPATCHED = "dispatched"
+NOTHING_DISPATCHED = "nothing-dispatched"
+PARTIAL = "partial"
+FAILED = "failed"
+INVALID = "invalid"
+
+
+def read_batch(lines: Iterable[str]) -> List[Tuple[int, Optional[Event]]]:
+    """
+    Read the events of a batch, one JSON document per line.
+
+    Lines may be events serialized by the hooks, as found in the spool, or
+    Gerrit stream-events records. Empty lines are skipped.
+
+    Args:
+        lines (Iterable[str]): the batch file lines
+
+    Returns:
+        List[Tuple[int, Optional[Event]]]: line number and event of every
+            line, None for the lines that are not a valid event
+    """
+    events: List[Tuple[int, Optional[Event]]] = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            events.append((number, None))
+            continue
+        events.append((number, load_event(data) or from_stream_event(data)))
+    return events
+
+
+def group_by_project(
+    events: Iterable[Tuple[int, Event]],
+) -> Dict[str, List[Tuple[int, Event]]]:
+    """
+    Group events by Gerrit project, keeping their order.
+
+    The project decides the owners and repositories an event is dispatched
+    to through the replication remotes, so the events of a group share all
+    of their workflow discoveries.
+
+    Args:
+        events (Iterable[Tuple[int, Event]]): line numbers and events
+
+    Returns:
+        Dict[str, List[Tuple[int, Event]]]: the events of each project
+    """
+    groups: Dict[str, List[Tuple[int, Event]]] = {}
+    for number, event in events:
+        groups.setdefault(event["arguments"]["project"], []).append((number, event))
+    return groups
+
+
+def _result(
+    number: int, event: Optional[Event], status: str, seconds: float = 0.0
+) -> BatchResult:
+    """Create the result of an event."""
+    arguments = event["arguments"] if event is not None else {}
+    return {
+        "line": number,
+        "type": event["type"] if event is not None else None,
+        "project": arguments.get("project"),
+        "change_url": arguments.get("change_url"),
+        "status": status,
+        "dispatched": 0,
+        "queued": 0,
+        "errors": [],
+        "seconds": seconds,
+    }
+
+
+def process_batch_event(
+    number: int, event: Event, process: Callable[[Event], Any]
+) -> BatchResult:
+    """
+    Process an event of a batch and report its dispatches.
+
+    Args:
+        number (int): line number of the event
+        event (Event): the event
+        process (Callable[[Event], Any]): the event processor
+
+    Returns:
+        BatchResult: the dispatches and errors of the event
+    """
+    start = time.perf_counter()
+    with collect_dispatch_report() as report:
+        try:
+            process(event)
+            failure = None
+        except Exception as e:
+            failure = f"{e.__class__.__name__}: {e}"
+
+    result = _result(number, event, FAILED, time.perf_counter() - start)
+    result["dispatched"] = report["dispatched"]
+    result["queued"] = report["queued"]
+    result["errors"] = [
+        f"{error['platform']}:{error['owner']}/{error['repository']}: " + error["error"]
+        for error in report["errors"]
+    ]
+    if failure is not None:
+        result["errors"].append(failure)
+    elif report["errors"]:
+        result["status"] = PARTIAL if report["dispatched"] else FAILED
+    else:
+        result["status"] = DISPATCHED if report["dispatched"] else NOTHING_DISPATCHED
+    return result
+
+
+def run_batch(
+    events: List[Tuple[int, Optional[Event]]],
+    process: Callable[[Event], Any],
+    workers: int = 1,
+) -> List[BatchResult]:
+    """
+    Process a batch of events in this process.
+
+    The events are grouped by project and the first event of every project
+    is processed before the others, so each workflow listing is discovered
+    once: the following events of the project use the listings fetched or
+    revalidated by the first one. Up to workers events are processed at a
+    time, the API calls of each event are further bounded by the platform
+    concurrency and rate limits.
+
+    Args:
+        events (List[Tuple[int, Optional[Event]]]): line numbers and events,
+            as read by read_batch
+        process (Callable[[Event], Any]): the event processor
+        workers (int): number of events processed concurrently
+
+    Returns:
+        List[BatchResult]: the result of every event in line order
+    """
+    results: List[BatchResult] = [
+        _result(number, None, INVALID) for number, event in events if event is None
+    ]
+    groups = group_by_project(
+        (number, event) for number, event in events if event is not None
+    )
+
+    def run(number: int, event: Event) -> BatchResult:
+        # every event gets a context of its own for its dispatch report
+        return contextvars.Context().run(process_batch_event, number, event, process)
+
+    with discovery_session(), ThreadPoolExecutor(max_workers=workers) as executor:
+        first = [executor.submit(run, *group[0]) for group in groups.values()]
+        results.extend(future.result() for future in first)
+        rest = [
+            executor.submit(run, number, event)
+            for group in groups.values()
+            for number, event in group[1:]
+        ]
+        results.extend(future.result() for future in rest)
+
+    return sorted(results, key=lambda result: result["line"])
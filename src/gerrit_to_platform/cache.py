@@ -0,0 +1,266 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""On-disk cache of platform API responses shared between hook processes."""
+
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple, TypedDict
+
+from gerrit_to_platform.config import get_settings
+
+# GitHub App installation tokens kept, one per owner
+APP_TOKEN_CACHE_SIZE = 256
+
+# Share of the puts that count the entries even if the cache seems to fit,
+# entries stored by other processes are only seen by counting
+EVICT_PROBABILITY = 0.05
+
+# Share of max_entries evicted below the limit so that a full cache is not
+# counted again on the next put
+EVICT_SLACK = 0.1
+
+
+class CacheEntry(TypedDict):
+    """Cached API response."""
+
+    etag: str
+    fetched: float
+    data: Any
+
+
+class ResponseCache:
+    """
+    Size bounded cache of API responses with their ETag.
+
+    Each entry is a JSON file named after the hash of its key. Files are
+    replaced atomically so concurrent hook processes never read a partial
+    entry, and reading an entry bumps its modification time so that the least
+    recently used entries are the ones evicted once max_entries is exceeded.
+
+    Counting the entries lists the directory, so the cache keeps an
+    approximate count of them, its last count plus the entries it stored
+    since, and only counts again once that goes over max_entries or, as other
+    processes store entries too, on a random share of the puts.
+    """
+
+    def __init__(self, directory: str, ttl: int, max_entries: int):
+        """
+        Create the cache.
+
+        Args:
+            directory (str): directory holding the entries, created on demand
+            ttl (int): seconds an entry is used without revalidating it
+            max_entries (int): entries kept before the oldest are evicted
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # None until the entries are counted
+        self._entries: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        """Get the file holding the entry for key."""
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        Get an entry.
+
+        Args:
+            key (str): entry key eg: github.com/owner/repository
+
+        Returns:
+            Optional[CacheEntry]: the entry or None if it is not cached
+        """
+        path = self._path(key)
+        try:
+            with open(path) as entry_file:
+                entry: CacheEntry = json.load(entry_file)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """
+        Indicate if an entry may be used without revalidating it.
+
+        Args:
+            entry (CacheEntry): the cached entry
+
+        Returns:
+            bool: True if the entry is younger than the TTL
+        """
+        return time.time() - entry["fetched"] < self.ttl
+
+    def put(self, key: str, etag: str, data: Any) -> None:
+        """
+        Store an entry, evicting the least recently used ones if needed.
+
+        Args:
+            key (str): entry key eg: github.com/owner/repository
+            etag (str): ETag of the response
+            data (Any): JSON serializable response body
+        """
+        entry: CacheEntry = {"etag": etag, "fetched": time.time(), "data": data}
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(handle, "w") as entry_file:
+                json.dump(entry, entry_file)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            return
+
+        if self._over_limit():
+            self._evict()
+
+    def delete(self, key: str) -> None:
+        """
+        Remove an entry.
+
+        Args:
+            key (str): entry key
+        """
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    def refresh(self, key: str, entry: CacheEntry) -> None:
+        """
+        Restart the TTL of an entry that the server confirmed unchanged.
+
+        Args:
+            key (str): entry key
+            entry (CacheEntry): the revalidated entry
+        """
+        if self.ttl > 0:
+            self.put(key, entry["etag"], entry["data"])
+
+    def _over_limit(self) -> bool:
+        """Count a stored entry, indicate if the entries should be counted."""
+        with self._lock:
+            if self._entries is not None:
+                self._entries += 1
+                if self._entries > self.max_entries:
+                    return True
+        return random.random() < EVICT_PROBABILITY  # nosec
+
+    def _evict(self) -> None:
+        """Count the entries, removing the least recently used above the limit."""
+        try:
+            with os.scandir(self.directory) as scan:
+                entries = [
+                    (item.stat().st_mtime_ns, item.path)
+                    for item in scan
+                    if item.name.endswith(".json")
+                ]
+        except OSError:
+            return
+
+        count = len(entries)
+        if count > self.max_entries:
+            count = self.max_entries - int(self.max_entries * EVICT_SLACK)
+            entries.sort()
+            for _, path in entries[: len(entries) - count]:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+        with self._lock:
+            self._entries = count
+
+
+_CACHES: Dict[str, Tuple[Tuple[str, int, int], ResponseCache]] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def _get_cache(name: str, ttl: int, max_entries: int) -> Optional[ResponseCache]:
+    """
+    Get a named cache under the configured cache directory.
+
+    Args:
+        name (str): sub directory of the cache
+        ttl (int): seconds an entry is used without revalidating it
+        max_entries (int): entries kept, 0 disables the cache
+
+    Returns:
+        Optional[ResponseCache]: the cache or None when it is disabled
+    """
+    if max_entries <= 0:
+        return None
+
+    options = (
+        os.path.join(get_settings()["cache_directory"], name),
+        ttl,
+        max_entries,
+    )
+    with _CACHES_LOCK:
+        cached = _CACHES.get(name)
+        if cached is None or cached[0] != options:
+            cached = (options, ResponseCache(*options))
+            _CACHES[name] = cached
+        return cached[1]
+
+
+def get_workflow_cache() -> Optional[ResponseCache]:
+    """
+    Get the workflow listing cache for the current settings.
+
+    Returns:
+        Optional[ResponseCache]: the cache or None when it is disabled
+    """
+    settings = get_settings()
+    return _get_cache(
+        "workflows",
+        settings["workflow_cache_ttl"],
+        settings["workflow_cache_size"],
+    )
+
+
+def get_required_workflow_cache() -> Optional[ResponseCache]:
+    """
+    Get the cache of required workflows found in the magic repositories.
+
+    Returns:
+        Optional[ResponseCache]: the cache or None when it is disabled
+    """
+    settings = get_settings()
+    if settings["required_workflow_cache_ttl"] <= 0:
+        return None
+
+    return _get_cache(
+        "required",
+        settings["required_workflow_cache_ttl"],
+        settings["workflow_cache_size"],
+    )
+
+
+def get_app_token_cache() -> Optional[ResponseCache]:
+    """
+    Get the cache of GitHub App installation tokens.
+
+    Entries are only readable by the owner of the cache directory, they are
+    valid until the expiry stored with each token.
+
+    Returns:
+        Optional[ResponseCache]: the cache
+    """
+    return _get_cache("app_tokens", 0, APP_TOKEN_CACHE_SIZE)
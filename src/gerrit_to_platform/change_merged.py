@@ -7,11 +7,9 @@
 # distribution, and is available at
 # https://opensource.org/licenses/Apache-2.0
 ##############################################################################
-"""Handler for patchset-created events."""
+"""Handler for change-merged events."""
 
-from typing import Annotated
-
-import typer
+from typing import Annotated, Any
 
 from gerrit_to_platform.helpers import (
     find_and_dispatch,
@@ -19,38 +17,86 @@ from gerrit_to_platform.helpers import (
     get_change_number,
 )
 
-app = typer.Typer()
-
-
-@app.command()
-def change_merged(
-    change: Annotated[str, typer.Option(help="change id")],
-    change_url: Annotated[str, typer.Option(help="change url")],
-    change_owner: Annotated[str, typer.Option(help="change owner")],
-    change_owner_username: Annotated[str, typer.Option(help="username")],
-    project: Annotated[str, typer.Option(help="project name")],
-    branch: Annotated[str, typer.Option(help="branch")],
-    topic: Annotated[str, typer.Option(help="topic")],
-    submitter: Annotated[str, typer.Option(help="submitter")],
-    submitter_username: Annotated[str, typer.Option(help="username")],
-    commit: Annotated[str, typer.Option(help="sha1")],
-    newrev: Annotated[str, typer.Option(help="sha1")],
-):
+
+def _command() -> Any:
+    """Build the typer app of the hook command, typer is only loaded for it."""
+    import typer
+
+    app = typer.Typer()
+
+    @app.command()
+    def change_merged(
+        change: Annotated[str, typer.Option(help="change id")],
+        change_url: Annotated[str, typer.Option(help="change url")],
+        change_owner: Annotated[str, typer.Option(help="change owner")],
+        change_owner_username: Annotated[str, typer.Option(help="username")],
+        project: Annotated[str, typer.Option(help="project name")],
+        branch: Annotated[str, typer.Option(help="branch")],
+        topic: Annotated[str, typer.Option(help="topic")],
+        submitter: Annotated[str, typer.Option(help="submitter")],
+        submitter_username: Annotated[str, typer.Option(help="username")],
+        commit: Annotated[str, typer.Option(help="sha1")],
+        newrev: Annotated[str, typer.Option(help="sha1")],
+    ):
+        """
+        Handle change-merged hook.
+
+        Args:
+            change (str): change ID
+            change_url (str): change URL
+            change_owner (str): change owner eg: 'Foo <foo@example.com>'
+            change_owner_username (str): change owner username eg: 'foo'
+            project (str): Gerrit project name
+            branch (str): branch change is against
+            topic (str): topic change is part of
+            submitter (str): submitter of change eg: 'Foo <foo@example.com>'
+            submitter_username (str): submitter of change username eg: 'foo'
+            commit (str): SHA1 of commit
+            newrev (str): SHA1 of commit
+        """
+        process_change_merged(
+            change,
+            change_url,
+            change_owner,
+            change_owner_username,
+            project,
+            branch,
+            topic,
+            submitter,
+            submitter_username,
+            commit,
+            newrev,
+        )
+
+    return app
+
+
+def __getattr__(name: str) -> Any:
+    """Build app, the hook command, on first use, see _command."""
+    if name == "app":
+        app = globals()["app"] = _command()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def process_change_merged(
+    change: str,
+    change_url: str,
+    change_owner: str,
+    change_owner_username: str,
+    project: str,
+    branch: str,
+    topic: str,
+    submitter: str,
+    submitter_username: str,
+    commit: str,
+    newrev: str,
+) -> None:
     """
-    Handle change-merged hook.
-
-    Args:
-        change (str): change ID
-        change_url (str): change URL
-        change_owner (str): change owner eg: 'Foo <foo@example.com>'
-        change_owner_username (str): change owner username eg: 'foo'
-        project (str): Gerrit project name
-        branch (str): branch change is against
-        topic (str): topic change is part of
-        submitter (str): submitter of change eg: 'Foo <foo@example.com>'
-        submitter_username (str): submitter of change username eg: 'foo'
-        commit (str): SHA1 of commit
-        newrev (str): SHA1 of commit
+    Dispatch the merge workflows for a change-merged event.
+
+    Used by the hook command and by anything else that has the hook
+    arguments, such as the daemon. Arguments are those of the hook.
     """
 
     change_id = get_change_id(change)
@@ -78,4 +124,4 @@ def change_merged(
 
 
 if __name__ == "__main__":
-    app()
+    _command()()
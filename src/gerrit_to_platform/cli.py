@@ -0,0 +1,584 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Commands working through the spool and retry queue, reporting and replay."""
+
+import json
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, redirect_stdout
+from typing import Annotated, Callable, Dict, Iterable, List, Optional
+
+import typer
+
+from gerrit_to_platform.batch import DISPATCHED, FAILED, INVALID, read_batch, run_batch
+from gerrit_to_platform.config import get_settings
+from gerrit_to_platform.events import Debouncer, Event, process_event
+from gerrit_to_platform.helpers import drain_retry_queue
+from gerrit_to_platform.metrics import serve
+from gerrit_to_platform.profiling import merge_profiles, profile_directory
+from gerrit_to_platform.replay import (
+    DEFAULT_COMMENTS,
+    fake_platform,
+    generate_events,
+    parse_mix,
+    read_events,
+    run_load,
+)
+from gerrit_to_platform.retry import QueueStats, get_retry_queue
+from gerrit_to_platform.spool import Spool
+from gerrit_to_platform.stream import Checkpoint, consume, read_lines
+
+app = typer.Typer()
+
+DEFAULT_WORKERS = 4
+
+# Seconds between two polls of the spool by the worker
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+@app.callback()
+def main():
+    """Work through the spooled events and the retry queue."""
+
+
+def print_stats(stats: QueueStats) -> None:
+    """Print the retry queue depth and retry latency."""
+    print(
+        f"Retry queue: {stats['depth']} pending, {stats['due']} due, "
+        + f"{stats['dead']} given up, oldest {stats['oldest_age']:.0f} s"
+    )
+    print(
+        f"Retried {stats['retried']} dispatches, "
+        + f"latency avg {stats['retry_latency_avg']:.1f} s, "
+        + f"max {stats['retry_latency_max']:.1f} s, "
+        + f"gave up {stats['dropped']}"
+    )
+
+
+@app.command()
+def batch(
+    events_file: Annotated[
+        typer.FileText,
+        typer.Argument(
+            metavar="FILE",
+            help="JSON lines of hook events or stream-events, - for stdin",
+        ),
+    ],
+    workers: Annotated[
+        int, typer.Option(help="events processed concurrently")
+    ] = DEFAULT_WORKERS,
+    report: Annotated[
+        Optional[typer.FileTextWrite],
+        typer.Option(help="write the result of every event as JSON lines"),
+    ] = None,
+    verbose: Annotated[
+        bool, typer.Option("--verbose", help="show the handler output")
+    ] = False,
+):
+    """
+    Process a file of events in one process, eg: to backfill after an outage.
+
+    Instead of running a hook command for every missed event, the events are
+    grouped by project and each workflow listing is discovered once for the
+    whole batch, then dispatched with --workers events at a time within the
+    configured platform concurrency and rate limits. Exits with 1 when an
+    event is invalid or failed.
+
+    Args:
+        events_file (typer.FileText): events, one JSON document per line, as
+            written by the hooks in the spool or by gerrit stream-events
+        workers (int): number of events processed concurrently
+        report (Optional[typer.FileTextWrite]): file receiving the result of
+            every event
+        verbose (bool): show the output of the handlers
+    """
+    events = read_batch(events_file)
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        if not verbose:
+            stack.enter_context(
+                redirect_stdout(stack.enter_context(open(os.devnull, "w")))
+            )
+        results = run_batch(events, process_event, max(workers, 1))
+    seconds = time.perf_counter() - start
+
+    for result in results:
+        if report is not None:
+            report.write(json.dumps(result) + "\n")
+        elif result["status"] != DISPATCHED:
+            print(
+                f"Line {result['line']}: {result['status']} "
+                + f"{result['type'] or ''} {result['change_url'] or ''}".rstrip()
+            )
+            for error in result["errors"]:
+                print(f"    {error}")
+
+    statuses: Dict[str, int] = {}
+    for result in results:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    print(
+        f"Processed {len(results)} events in {seconds:.1f} s: "
+        + ", ".join(f"{count} {status}" for status, count in sorted(statuses.items()))
+    )
+    print(
+        f"Dispatched {sum(result['dispatched'] for result in results)} workflows, "
+        + f"{sum(result['queued'] for result in results)} queued for retry"
+    )
+    if statuses.get(FAILED) or statuses.get(INVALID):
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def drain(
+    limit: Annotated[
+        Optional[int], typer.Option(help="most dispatches to retry")
+    ] = None,
+):
+    """
+    Retry the queued dispatches that are due.
+
+    Args:
+        limit (Optional[int]): most dispatches to retry, all due when None
+    """
+    retry_queue = get_retry_queue()
+    if retry_queue is None:
+        print("The retry queue is disabled")
+        raise typer.Exit(code=1)
+
+    report = drain_retry_queue(limit)
+    print(
+        f"Retried {report['retried']} dispatches, "
+        + f"rescheduled {report['rescheduled']}, gave up {report['dropped']}"
+    )
+    print_stats(retry_queue.stats())
+
+
+@app.command()
+def stats(
+    as_json: Annotated[bool, typer.Option("--json", help="print JSON")] = False,
+):
+    """
+    Show the retry queue depth and retry latency.
+
+    Args:
+        as_json (bool): print the statistics as JSON
+    """
+    retry_queue = get_retry_queue()
+    if retry_queue is None:
+        print("The retry queue is disabled")
+        raise typer.Exit(code=1)
+
+    queue_stats = retry_queue.stats()
+    if as_json:
+        print(json.dumps(queue_stats))
+    else:
+        print_stats(queue_stats)
+
+
+@app.command()
+def profile_report(
+    directory: Annotated[
+        Optional[str],
+        typer.Argument(help="profile directory, defaults to the configured one"),
+    ] = None,
+    top: Annotated[int, typer.Option(help="functions and stages listed")] = 20,
+    as_json: Annotated[bool, typer.Option("--json", help="print JSON")] = False,
+):
+    """
+    Merge the hook profiles into a ranked hot path report.
+
+    Args:
+        directory (Optional[str]): directory of the profiles, defaults to
+            G2P_PROFILE_DIR or the [profile] directory option
+        top (int): number of stages, API calls and functions listed
+        as_json (bool): print the report as JSON
+    """
+    directory = directory or profile_directory()
+    if not directory:
+        print("No profile directory given and no [profile] directory configured")
+        raise typer.Exit(code=1)
+
+    report = merge_profiles(directory, top)
+    if as_json:
+        print(json.dumps(report))
+        return
+
+    print(f"{report['profiles']} profiled hook invocations in {directory}")
+    for title, summaries in (
+        ("Stages", report["stages"]),
+        ("API calls", report["api_calls"]),
+    ):
+        print(f"\n{title} by total wall time:")
+        print(f"{'total s':>10} {'calls':>7} {'avg ms':>9} {'max ms':>9}  name")
+        for summary in summaries[:top]:
+            print(
+                f"{summary['total']:10.3f} {summary['calls']:7d} "
+                + f"{summary['total'] / summary['calls'] * 1000:9.1f} "
+                + f"{summary['max'] * 1000:9.1f}  {summary['stage']}"
+            )
+
+    print("\nFunctions by cumulative time:")
+    print(f"{'cum s':>10} {'own s':>9} {'calls':>9}  function")
+    for function in report["functions"]:
+        print(
+            f"{function['cumtime']:10.3f} {function['tottime']:9.3f} "
+            + f"{function['calls']:9d}  {function['function']}"
+        )
+
+
+@app.command()
+def replay(
+    events_file: Annotated[
+        Optional[typer.FileText],
+        typer.Argument(
+            metavar="FILE",
+            help="stream-events or spooled events JSON lines, - for stdin",
+        ),
+    ] = None,
+    synthetic: Annotated[
+        int, typer.Option(help="generate this many synthetic events instead")
+    ] = 0,
+    rate: Annotated[
+        float, typer.Option(help="events started per second, 0 for the maximum")
+    ] = 0.0,
+    workers: Annotated[
+        int, typer.Option(help="events processed concurrently")
+    ] = DEFAULT_WORKERS,
+    fake_api: Annotated[
+        bool,
+        typer.Option(
+            "--fake-api/--configured-api",
+            help="dispatch to a local fake GitHub API or to the configured one",
+        ),
+    ] = True,
+    latency: Annotated[
+        float, typer.Option(help="seconds the fake API takes to answer")
+    ] = 0.0,
+    workflow: Annotated[
+        Optional[List[str]],
+        typer.Option(help="workflow of every fake repository, repeatable"),
+    ] = None,
+    mix: Annotated[
+        str, typer.Option(help="synthetic event type weights")
+    ] = "patchset-created=6,comment-added=3,change-merged=1",
+    project: Annotated[
+        Optional[List[str]],
+        typer.Option(help="synthetic event project, repeatable, busiest first"),
+    ] = None,
+    skew: Annotated[
+        float, typer.Option(help="Zipf exponent of the synthetic projects")
+    ] = 1.0,
+    comment: Annotated[
+        Optional[List[str]],
+        typer.Option(help="synthetic comment-added comment, repeatable"),
+    ] = None,
+    changes: Annotated[int, typer.Option(help="synthetic open changes")] = 100,
+    seed: Annotated[
+        Optional[int], typer.Option(help="seed of the synthetic events")
+    ] = None,
+    verbose: Annotated[
+        bool, typer.Option("--verbose", help="show the handler output")
+    ] = False,
+    as_json: Annotated[bool, typer.Option("--json", help="print JSON")] = False,
+):
+    """
+    Replay recorded or synthetic events through the handlers.
+
+    Runs the patchset-created, comment-added and change-merged processing of
+    the current configuration at a target or the maximum rate, and reports
+    the throughput, dispatches and latency percentiles. By default the
+    dispatches go to a local fake GitHub API and the cache, cooldowns and
+    retry queue live in a temporary directory.
+
+    Args:
+        events_file (Optional[typer.FileText]): recorded events, one JSON
+            document per line
+        synthetic (int): number of synthetic events to generate
+        rate (float): events started per second, 0 for the maximum rate
+        workers (int): number of events processed concurrently
+        fake_api (bool): dispatch to a local fake GitHub API
+        latency (float): seconds the fake API takes to answer
+        workflow (Optional[List[str]]): workflow names of the fake API
+        mix (str): synthetic event type weights, eg: comment-added=1
+        project (Optional[List[str]]): synthetic event projects
+        skew (float): Zipf exponent of the synthetic project distribution
+        comment (Optional[List[str]]): synthetic comment-added comments
+        changes (int): number of synthetic open changes
+        seed (Optional[int]): seed of the synthetic events
+        verbose (bool): show the output of the handlers
+        as_json (bool): print the report as JSON
+    """
+    events: Iterable[Event]
+    if synthetic > 0:
+        try:
+            weights = parse_mix(mix)
+        except ValueError as e:
+            print(f"Invalid --mix: {e}")
+            raise typer.Exit(code=1)
+        events = generate_events(
+            synthetic,
+            project or ["example/project"],
+            weights,
+            comment or DEFAULT_COMMENTS,
+            skew,
+            changes,
+            seed,
+        )
+    elif events_file is not None:
+        events = read_events(events_file)
+    else:
+        print("Give an events FILE or a number of --synthetic events")
+        raise typer.Exit(code=1)
+
+    with ExitStack() as stack:
+        server = None
+        if fake_api:
+            server = stack.enter_context(fake_platform(workflow, latency))
+        if not verbose:
+            stack.enter_context(
+                redirect_stdout(stack.enter_context(open(os.devnull, "w")))
+            )
+        report = run_load(events, rate, max(workers, 1))
+
+    if as_json:
+        print(json.dumps(report))
+        return
+
+    target = f"{report['target_rate']:g}/s" if report["target_rate"] else "max"
+    print(
+        f"Processed {report['events']} events in {report['seconds']:.2f} s, "
+        + f"{report['throughput']:.1f}/s (target {target}), "
+        + f"{report['failed']} failed"
+    )
+    print(
+        "Events: "
+        + ", ".join(f"{count} {name}" for name, count in report["by_type"].items())
+    )
+    print(
+        f"Latency p50 {report['latency_p50'] * 1000:.1f} ms, "
+        + f"p95 {report['latency_p95'] * 1000:.1f} ms, "
+        + f"p99 {report['latency_p99'] * 1000:.1f} ms, "
+        + f"max {report['latency_max'] * 1000:.1f} ms, "
+        + f"start lag max {report['lag_max'] * 1000:.1f} ms"
+    )
+    print(
+        f"Dispatches: {report['dispatched']} dispatched, "
+        + f"{report['queued']} queued for retry, {report['dispatch_failed']} failed"
+    )
+    if server is not None:
+        print(f"Fake API: {server.requests} requests")
+    for error, count in sorted(report["errors"].items(), key=lambda item: -item[1]):
+        print(f"{count:6d} x {error}")
+
+
+def _process(event: Event) -> None:
+    """Process an event, reporting its failure."""
+    try:
+        process_event(event)
+    except Exception as e:
+        print(f"Failed to process {event['type']} event: {e}")
+
+
+@app.command()
+def stream(
+    source: Annotated[
+        str, typer.Argument(help="stream-events FIFO or file, - for stdin")
+    ] = "-",
+    follow: Annotated[
+        bool,
+        typer.Option("--follow", help="keep reading at the end of the input"),
+    ] = False,
+    workers: Annotated[
+        int, typer.Option(help="events processed concurrently")
+    ] = DEFAULT_WORKERS,
+    checkpoint_path: Annotated[
+        Optional[str],
+        typer.Option(
+            "--checkpoint", help="checkpoint file, defaults to [stream] checkpoint"
+        ),
+    ] = None,
+):
+    """
+    Process a Gerrit stream-events feed instead of hook invocations.
+
+    Reads stream-events JSON lines, eg: piped from ssh gerrit stream-events,
+    and processes the patchset-created, comment-added and change-merged
+    events like the hooks, with the configuration, connections and caches
+    kept warm. The position in the stream is checkpointed by event creation
+    time in the [stream] checkpoint file, so a restart reading the same
+    events again skips those already processed. Failed dispatches queued for
+    a retry are retried every [retry] interval seconds. The metrics are
+    served over HTTP when the [metrics] listen option is set.
+
+    Args:
+        source (str): path of the FIFO or file to read, - for stdin
+        follow (bool): wait for the next writer of a FIFO, or for the lines
+            appended to a file
+        workers (int): number of events processed concurrently
+        checkpoint_path (Optional[str]): path of the checkpoint file
+    """
+    settings = get_settings()
+    checkpoint = Checkpoint(
+        checkpoint_path or settings["stream_checkpoint"], settings["stream_window"]
+    )
+    # SIGTERM interrupts the blocking reads like SIGINT
+    previous_handler = signal.signal(signal.SIGTERM, signal.default_int_handler)
+    stopping = threading.Event()
+    metrics_server = None
+    if settings["metrics_listen"]:
+        metrics_server = serve(settings["metrics_listen"])
+        print(f"Serving metrics on {settings['metrics_listen']}")
+    retrier = None
+    if settings["retry_interval"] > 0:
+        retrier = threading.Thread(
+            target=_retry, args=(settings["retry_interval"], stopping), daemon=True
+        )
+        retrier.start()
+
+    try:
+        stream_stats = consume(
+            read_lines(source, follow, stopping), checkpoint, process_event, workers
+        )
+    except OSError as e:
+        print(f"Failed to read {source}: {e}")
+        raise typer.Exit(code=1)
+    finally:
+        stopping.set()
+        signal.signal(signal.SIGTERM, previous_handler)
+        if retrier is not None:
+            retrier.join()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+    print(
+        f"Read {stream_stats['read']} events: {stream_stats['processed']} "
+        + f"processed, {stream_stats['skipped']} skipped as already processed, "
+        + f"{stream_stats['failed']} failed"
+    )
+
+
+def _retry(interval: int, stopping: threading.Event) -> None:
+    """Drain the retry queue every interval seconds until stopping is set."""
+    while not stopping.wait(interval):
+        try:
+            drain_retry_queue()
+        except Exception as e:
+            print(f"Failed to drain the retry queue: {e}")
+
+
+@app.command()
+def worker(
+    workers: Annotated[
+        int, typer.Option(help="events processed concurrently")
+    ] = DEFAULT_WORKERS,
+    interval: Annotated[
+        float, typer.Option(help="seconds between two polls of the spool")
+    ] = DEFAULT_POLL_INTERVAL,
+    once: Annotated[
+        bool, typer.Option("--once", help="exit once the spool is empty")
+    ] = False,
+):
+    """
+    Process the events spooled by the hooks.
+
+    The hooks only append their event to the [spool] directory, this worker
+    runs the workflow discovery and dispatches for them, and retries the
+    queued failed dispatches every [retry] interval seconds. With a
+    [debounce] window, only the newest of the patchsets of a change spooled
+    within the window is processed. The metrics are served over HTTP when the
+    [metrics] listen option is set.
+
+    Args:
+        workers (int): number of events processed concurrently
+        interval (float): seconds between two polls of the spool
+        once (bool): process the spooled events and exit
+    """
+    settings = get_settings()
+    if not settings["spool_directory"]:
+        print("No [spool] directory configured")
+        raise typer.Exit(code=1)
+
+    spool = Spool(settings["spool_directory"])
+    stopping = threading.Event()
+    if not once:
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    metrics_server = None
+    if not once and settings["metrics_listen"]:
+        metrics_server = serve(settings["metrics_listen"])
+        print(f"Serving metrics on {settings['metrics_listen']}")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        debouncer = None
+        if settings["debounce_window"] > 0:
+            # the spool checkpoints the held patchsets, they are saved until
+            # processed so a crashed worker still dispatches them
+            debouncer = Debouncer(
+                settings["debounce_window"],
+                lambda event: executor.submit(_process, event),
+                spool.held_path,
+            )
+
+        def process(batch: List[Event]) -> None:
+            if debouncer is not None:
+                batch = [event for event in batch if not debouncer.submit(event)]
+            list(executor.map(_process, batch))
+
+        try:
+            _work(spool, process, workers, interval, once, stopping)
+        finally:
+            if debouncer is not None:
+                debouncer.close()
+                debounced = debouncer.stats()
+                print(
+                    f"Debounced patchsets: {debounced['released']} released, "
+                    + f"{debounced['suppressed']} superseded"
+                )
+            if metrics_server is not None:
+                metrics_server.shutdown()
+
+
+def _work(
+    spool: Spool,
+    process: Callable[[List[Event]], None],
+    batch_size: int,
+    interval: float,
+    once: bool,
+    stopping: threading.Event,
+) -> None:
+    """Drain the spool, and the retry queue when due, until stopped."""
+    last_retry = time.monotonic()
+    while True:
+        try:
+            spool.drain(process, batch_size)
+        except OSError as e:
+            print(f"Failed to read the spool: {e}")
+
+        retry_interval = get_settings()["retry_interval"]
+        if retry_interval > 0 and time.monotonic() - last_retry >= retry_interval:
+            last_retry = time.monotonic()
+            try:
+                drain_retry_queue()
+            except Exception as e:
+                print(f"Failed to drain the retry queue: {e}")
+
+        if once:
+            return
+        try:
+            if stopping.wait(interval):
+                return
+        except KeyboardInterrupt:
+            return
+
+
+if __name__ == "__main__":
+    app()
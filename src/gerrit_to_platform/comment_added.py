@@ -7,25 +7,22 @@
 # distribution, and is available at
 # https://opensource.org/licenses/Apache-2.0
 ##############################################################################
-"""Handler for patchset-created events."""
+"""Handler for comment-added events."""
 
-import os
+import functools
 import re
 import time
-from pathlib import Path
-from typing import Annotated
-
-import typer
+from typing import Annotated, Any, Dict, List, Pattern, Tuple
 
 from gerrit_to_platform.config import get_mapping
+from gerrit_to_platform.cooldown import CooldownError, get_cooldown_store
 from gerrit_to_platform.helpers import (
     find_and_dispatch,
     get_change_id,
     get_change_number,
     get_change_refspec,
 )
-
-app = typer.Typer()
+from gerrit_to_platform.metrics import COOLDOWN_CHECKS, current_event, stage
 
 # Cooldown period in seconds (5 minutes)
 COOLDOWN_SECONDS = 300
@@ -37,10 +34,154 @@ GHA_PATTERN = re.compile(r"^gha-(\w+)\s+([\w-]+)", re.IGNORECASE)
 GHA_GENERIC_HANDLER = "comment-handler"
 
 
+# Characters that make a mapping key a regular expression instead of a keyword
+REGEX_CHARACTERS = frozenset(".^$*+?{}[]\\|()")
+
+
+def _keyword_trie(keywords: List[str]) -> Tuple[str, Dict[int, str]]:
+    """
+    Build one regular expression matching any of the keywords.
+
+    The keywords are arranged as a prefix tree so the regex engine follows a
+    single branch per character instead of trying every keyword at every
+    position. An empty group marks the end of each keyword.
+
+    Args:
+        keywords (List[str]): literal keywords to match
+
+    Returns:
+        Tuple[str, Dict[int, str]]: the expression and a map of its marker
+            group numbers to keywords
+    """
+    root: Dict[str, Any] = {}
+    for keyword in keywords:
+        node = root
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = keyword
+
+    markers: Dict[int, str] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        alternatives = []
+        for char in sorted(key for key in node if key):
+            alternatives.append(re.escape(char) + build(node[char]))
+        if "" in node:
+            markers[len(markers) + 1] = node[""]
+            alternatives.append("()")
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return "(?:" + "|".join(alternatives) + ")"
+
+    return build(root), markers
+
+
+class MappingMatcher:
+    """
+    Precompiled matcher for the comment-added keyword mapping.
+
+    Plain keyword keys are compiled into one prefix tree expression so the
+    comment is scanned once for all of them instead of once per key. After a
+    hit, keywords for workflow filters already found are dropped and the scan
+    resumes from the same position, so overlapping keywords are still seen.
+    Keys that are regular expressions are compiled once and only searched for
+    when their workflow filter has not been found yet.
+    """
+
+    def __init__(self, mapping: Dict[str, str]):
+        """
+        Compile the mapping.
+
+        Args:
+            mapping (Dict[str, str]): keyword regex to workflow filter mapping
+        """
+        self._mapping = dict(mapping)
+        self._filters = list(dict.fromkeys(mapping.values()))
+        self._keywords = [
+            key for key in mapping if key and not REGEX_CHARACTERS.intersection(key)
+        ]
+        self._patterns = [
+            (re.compile(key), mapping[key])
+            for key in mapping
+            if key not in self._keywords
+        ]
+        self._tries: Dict[Tuple[str, ...], Tuple[Pattern[str], Dict[int, str]]] = {}
+
+    def _trie(self, keywords: Tuple[str, ...]) -> Tuple[Pattern[str], Dict[int, str]]:
+        """Get the compiled prefix tree expression for a set of keywords."""
+        if keywords not in self._tries:
+            if len(self._tries) >= 64:
+                self._tries.clear()
+            expression, markers = _keyword_trie(list(keywords))
+            self._tries[keywords] = (re.compile(expression), markers)
+        return self._tries[keywords]
+
+    def match(self, comment: str) -> List[str]:
+        """
+        Get the workflow filters triggered by a comment.
+
+        Args:
+            comment (str): the comment added to the change
+
+        Returns:
+            List[str]: deduplicated workflow filters in mapping order
+        """
+        found = set()
+        position = 0
+
+        while True:
+            keywords = tuple(
+                key for key in self._keywords if self._mapping[key] not in found
+            )
+            if not keywords:
+                break
+
+            pattern, markers = self._trie(keywords)
+            keyword_match = pattern.search(comment, position)
+            if keyword_match is None:
+                break
+
+            found.add(self._mapping[markers[keyword_match.lastindex]])  # type: ignore
+            # No remaining keyword matched before this point, so resume here
+            position = keyword_match.start()
+
+        for pattern, workflow_filter in self._patterns:
+            if workflow_filter not in found and pattern.search(comment):
+                found.add(workflow_filter)
+
+        return [
+            workflow_filter
+            for workflow_filter in self._filters
+            if workflow_filter in found
+        ]
+
+
+@functools.lru_cache(maxsize=16)
+def _compile_mapping(mapping_items: Tuple[Tuple[str, str], ...]) -> MappingMatcher:
+    """Compile and memoize a mapping given as a tuple of items."""
+    return MappingMatcher(dict(mapping_items))
+
+
+def get_mapping_matcher(mapping: Dict[str, str]) -> MappingMatcher:
+    """
+    Get the compiled matcher for a keyword mapping.
+
+    Args:
+        mapping (Dict[str, str]): keyword regex to workflow filter mapping
+
+    Returns:
+        MappingMatcher: the matcher, compiled once per distinct mapping
+    """
+    return _compile_mapping(tuple(mapping.items()))
+
+
 def check_cooldown(change_number: str, workflow_name: str) -> bool:
     """
     Check if workflow trigger is within cooldown period.
 
+    Allowed triggers start the cooldown in the [cooldown] store atomically,
+    so of two hooks racing for the same trigger only one is allowed.
+
     Args:
         change_number: Gerrit change number
         workflow_name: Name of the workflow to trigger
@@ -48,129 +189,143 @@ def check_cooldown(change_number: str, workflow_name: str) -> bool:
     Returns:
         bool: True if trigger is allowed, False if still in cooldown
     """
-    # Issue 1 Fix: Input validation to prevent path injection (CWE-22)
+    event = current_event()
+
+    # Issue 1 Fix: Input validation, keys stay <change number>/<workflow name>
     if not change_number.isdigit():
         print(f"Invalid change number: {change_number}")
+        COOLDOWN_CHECKS.inc(event=event, result="invalid")
         return False
 
     # Workflow name must be alphanumeric with hyphens only
     if not re.match(r"^[\w-]+$", workflow_name):
         print(f"Invalid workflow name: {workflow_name}")
+        COOLDOWN_CHECKS.inc(event=event, result="invalid")
         return False
 
-    # /tmp/ is intentional for ephemeral cooldown files with path validation below
-    cooldown_file = Path(
-        f"/tmp/gha_cooldown_{change_number}_{workflow_name}"
-    )  # nosec B108
-
-    # Verify the resolved path is still within /tmp (path traversal protection)
-    try:
-        # Path traversal protection - validate resolved path stays in /tmp
-        if not str(cooldown_file.resolve()).startswith("/tmp/"):  # nosec B108
-            print(f"Path traversal attempt detected: {cooldown_file}")
-            return False
-    except OSError as e:
-        # Issue 13 Fix: Filesystem error handling - fail open
-        print(f"Warning: Cooldown path validation failed: {e}")
-        return True
-
     try:
-        # Issue 2 Fix: Atomic file creation to prevent race condition (TOCTOU)
-        # Try to create the file atomically with O_CREAT | O_EXCL
-        try:
-            fd = os.open(
-                str(cooldown_file), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644
+        with stage("cooldown", event=event):
+            remaining = get_cooldown_store().acquire(
+                f"{change_number}/{workflow_name}", COOLDOWN_SECONDS, time.time()
             )
-            os.close(fd)
-            # File created successfully - cooldown starts now
-            return True
-        except FileExistsError:
-            # File exists - check if still in cooldown
-            last_trigger = cooldown_file.stat().st_mtime
-            time_since_trigger = time.time() - last_trigger
-
-            if time_since_trigger < COOLDOWN_SECONDS:
-                remaining = int(COOLDOWN_SECONDS - time_since_trigger)
-                print(
-                    f"Cooldown active for workflow '{workflow_name}' on change {change_number}. "
-                    f"Retry in {remaining} seconds."
-                )
-                return False
-            else:
-                # Issue 9 Fix: Opportunistic cleanup - delete expired file
-                try:
-                    cooldown_file.unlink()
-                except OSError:
-                    pass  # Ignore deletion errors
-
-                # Create new cooldown file
-                try:
-                    fd = os.open(
-                        str(cooldown_file), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644
-                    )
-                    os.close(fd)
-                except FileExistsError:
-                    # Race condition - another process created it, treat as in cooldown
-                    return False
-
-                return True
-
-    except OSError as e:
-        # Issue 13 Fix: Filesystem error handling - fail open for non-critical feature
-        print(f"Warning: Cooldown check failed due to filesystem error: {e}")
+    except (OSError, CooldownError, ValueError) as e:
+        # Issue 13 Fix: Cooldown store errors - fail open for non-critical feature
+        print(f"Warning: Cooldown check failed: {e}")
         print(f"Allowing workflow to proceed for change {change_number}")
+        COOLDOWN_CHECKS.inc(event=event, result="error")
         return True
 
-
-@app.command(
-    context_settings={"allow_extra_args": True, "ignore_unknown_options": True}
-)
-def comment_added(
-    context: typer.Context,
-    change: Annotated[str, typer.Option(help="change id")],
-    change_url: Annotated[str, typer.Option(help="change url")],
-    change_owner: Annotated[str, typer.Option(help="change owner")],
-    change_owner_username: Annotated[str, typer.Option(help="username")],
-    project: Annotated[str, typer.Option(help="project name")],
-    branch: Annotated[str, typer.Option(help="branch")],
-    topic: Annotated[str, typer.Option(help="topic")],
-    author: Annotated[str, typer.Option(help="comment author")],
-    author_username: Annotated[str, typer.Option(help="username")],
-    commit: Annotated[str, typer.Option(help="sha1")],
-    comment: Annotated[str, typer.Option(help="comment")],
-):
+    if remaining > 0:
+        print(
+            f"Cooldown active for workflow '{workflow_name}' on change {change_number}. "
+            f"Retry in {int(remaining)} seconds."
+        )
+        COOLDOWN_CHECKS.inc(event=event, result="blocked")
+        return False
+    COOLDOWN_CHECKS.inc(event=event, result="allowed")
+    return True
+
+
+def _command() -> Any:
+    """Build the typer app of the hook command, typer is only loaded for it."""
+    import typer
+
+    app = typer.Typer()
+
+    @app.command(
+        context_settings={"allow_extra_args": True, "ignore_unknown_options": True}
+    )
+    def comment_added(
+        context: typer.Context,
+        change: Annotated[str, typer.Option(help="change id")],
+        change_url: Annotated[str, typer.Option(help="change url")],
+        change_owner: Annotated[str, typer.Option(help="change owner")],
+        change_owner_username: Annotated[str, typer.Option(help="username")],
+        project: Annotated[str, typer.Option(help="project name")],
+        branch: Annotated[str, typer.Option(help="branch")],
+        topic: Annotated[str, typer.Option(help="topic")],
+        author: Annotated[str, typer.Option(help="comment author")],
+        author_username: Annotated[str, typer.Option(help="username")],
+        commit: Annotated[str, typer.Option(help="sha1")],
+        comment: Annotated[str, typer.Option(help="comment")],
+    ):
+        """
+        Handle comment-added hook.
+
+        Supports two trigger mechanisms:
+        1. gha-<action> <workflow_name> pattern for direct workflow triggering
+           Example: "gha-run csit-2n-perftest nic=intel-e810cq drv=avf"
+           The full command line is passed to the workflow via GERRIT_COMMENT input
+           for parameter parsing by the GitHub Actions workflow.
+        2. Keyword mapping from config file (legacy behavior)
+
+        Approval scores should be added as --<approval category id> <score>
+
+        When a score is removed it should be --<approval category id>-oldValue <score>
+
+        Multiple scores and old scores may be passed
+
+        ex: --Code-Review +1 --Code-Review-oldValue 0
+
+        Args:
+            context (typer.Context): handler for the typer context to allow for
+                extra non-defined parameters (code scores, see above)
+            change (str): change ID
+            change_url (str): change URL
+            change_owner (str): change owner eg: 'Foo <foo@example.com>'
+            change_owner_username (str): change owner username eg: 'foo'
+            project (str): Gerrit project name
+            branch (str): branch change is against
+            topic (str): topic change is part of
+            submitter (str): submitter of change eg: 'Foo <foo@example.com>'
+            submitter_username (str): submitter of change username eg: 'foo'
+            commit (str): SHA1 of commit
+            comment (str): the comment added to the change
+        """
+        process_comment_added(
+            change,
+            change_url,
+            change_owner,
+            change_owner_username,
+            project,
+            branch,
+            topic,
+            author,
+            author_username,
+            commit,
+            comment,
+        )
+
+    return app
+
+
+def __getattr__(name: str) -> Any:
+    """Build app, the hook command, on first use, see _command."""
+    if name == "app":
+        app = globals()["app"] = _command()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def process_comment_added(
+    change: str,
+    change_url: str,
+    change_owner: str,
+    change_owner_username: str,
+    project: str,
+    branch: str,
+    topic: str,
+    author: str,
+    author_username: str,
+    commit: str,
+    comment: str,
+) -> None:
     """
-    Handle comment-added hook.
-
-    Supports two trigger mechanisms:
-    1. gha-<action> <workflow_name> pattern for direct workflow triggering
-       Example: "gha-run csit-2n-perftest nic=intel-e810cq drv=avf"
-       The full command line is passed to the workflow via GERRIT_COMMENT input
-       for parameter parsing by the GitHub Actions workflow.
-    2. Keyword mapping from config file (legacy behavior)
-
-    Approval scores should be added as --<approval category id> <score>
+    Dispatch the workflows triggered by a comment-added event.
 
-    When a score is removed it should be --<approval category id>-oldValue <score>
-
-    Multiple scores and old scores may be passed
-
-    ex: --Code-Review +1 --Code-Review-oldValue 0
-
-    Args:
-        context (typer.Context): handler for the typer context to allow for
-            extra non-defined parameters (code scores, see above)
-        change (str): change ID
-        change_url (str): change URL
-        change_owner (str): change owner eg: 'Foo <foo@example.com>'
-        change_owner_username (str): change owner username eg: 'foo'
-        project (str): Gerrit project name
-        branch (str): branch change is against
-        topic (str): topic change is part of
-        submitter (str): submitter of change eg: 'Foo <foo@example.com>'
-        submitter_username (str): submitter of change username eg: 'foo'
-        commit (str): SHA1 of commit
-        comment (str): the comment added to the change
+    Used by the hook command and by anything else that has the hook
+    arguments, such as the daemon. Arguments are those of the hook, approval
+    scores are not used.
     """
     change_id = get_change_id(change)
     change_number = get_change_number(change_url)
@@ -255,12 +410,9 @@ def comment_added(
     if mapping is None:
         return
 
-    for mapper in mapping:
-        if not re.findall(mapper, comment):
-            continue
-
-        find_and_dispatch(project, mapping[mapper], inputs)
+    for workflow_filter in get_mapping_matcher(mapping).match(comment):
+        find_and_dispatch(project, workflow_filter, inputs)
 
 
 if __name__ == "__main__":
-    app()
+    _command()()
@@ -10,19 +10,35 @@
 """Configuration subsystem."""
 
 import configparser
+import fnmatch
+import os
 import os.path
 import re
+import threading
 from configparser import ConfigParser, NoOptionError
 from enum import Enum
-from typing import Dict, Optional, TypedDict, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Pattern,
+    Tuple,
+    TypedDict,
+    TypeVar,
+    Union,
+)
 
-from xdg import XDG_CONFIG_HOME
+from xdg import XDG_CACHE_HOME, XDG_CONFIG_HOME
 
 # CONSTANTS
 CONFIG = "config"
 REPLICATION = "replication"
 DEFAULT_CONFIG = CONFIG
 
+T = TypeVar("T")
+
 
 # Type Definitions
 class Remote(TypedDict):
@@ -43,6 +59,53 @@ class ReplicationRemotes(TypedDict, total=False):
     gitlab: PlatformType
 
 
+class DispatchLimits(TypedDict):
+    """Concurrent API calls allowed against a platform."""
+
+    concurrency: int
+    owner_concurrency: int
+
+
+class Settings(TypedDict):
+    """Typed snapshot of the gerrit_to_platform configuration file."""
+
+    cache_directory: str
+    cooldown_backend: str
+    cooldown_path: str
+    daemon_socket: Optional[str]
+    debounce_window: float
+    dispatch_limits: Dict[str, DispatchLimits]
+    github_api_url: str
+    github_app_id: Optional[str]
+    github_app_private_key: Optional[str]
+    github_owner_tokens: Dict[str, List[str]]
+    github_rate_limit_wait: int
+    github_token: Optional[str]
+    github_tokens: List[str]
+    github_write_burst: int
+    github_write_rate: float
+    mappings: Dict[str, Dict[str, str]]
+    metrics_listen: Optional[str]
+    metrics_textfile: Optional[str]
+    profile_directory: Optional[str]
+    required_workflow_cache_ttl: int
+    retry_backoff: float
+    retry_interval: int
+    retry_max_attempts: int
+    retry_max_backoff: float
+    retry_queue: Optional[str]
+    spool_directory: Optional[str]
+    spool_fsync: bool
+    stream_checkpoint: Optional[str]
+    stream_window: float
+    workflow_cache_size: int
+    workflow_cache_ttl: int
+
+
+# (path, inode, size, mtime_ns) of a configuration file when it was parsed
+FileSignature = Tuple[str, int, int, int]
+
+
 class Platform(Enum):
     """Enumeration of all platforms recognized by the app."""
 
@@ -64,10 +127,245 @@ CONFIG_FILES = {
 }
 
 
+DEFAULT_CACHE_DIRECTORY = os.path.join(XDG_CACHE_HOME, "gerrit_to_platform")
+
+# Store of the ChatOps trigger cooldowns, see gerrit_to_platform.cooldown
+DEFAULT_COOLDOWN_BACKEND = "sqlite"
+
+# Seconds a patchset-created event waits for a newer patchset of its change
+# in the daemon and the worker, 0 processes every patchset
+DEFAULT_DEBOUNCE_WINDOW = 0.0
+
+DEFAULT_GITHUB_API_URL = "https://api.github.com"
+
+# Seconds a GitHub request may wait for the rate limit budget before failing
+DEFAULT_GITHUB_RATE_LIMIT_WAIT = 300
+
+# Content-creating GitHub requests (workflow dispatches) sent at once and per
+# minute, GitHub's secondary rate limits allow 80 per minute
+DEFAULT_GITHUB_WRITE_BURST = 10
+DEFAULT_GITHUB_WRITE_RATE = 80.0
+
+# Seconds required workflows found in a magic repository are reused across
+# events, 0 only shares them between the remotes of one event
+DEFAULT_REQUIRED_WORKFLOW_CACHE_TTL = 0
+
+# Seconds before the first retry of a failed dispatch, doubled on every
+# further failure up to the maximum
+DEFAULT_RETRY_BACKOFF = 30.0
+DEFAULT_RETRY_MAX_BACKOFF = 3600.0
+
+# Seconds between two drains of the retry queue by the daemon
+DEFAULT_RETRY_INTERVAL = 30
+
+# Attempts, the original dispatch included, before a dispatch is given up
+DEFAULT_RETRY_MAX_ATTEMPTS = 10
+
+# Seconds of completed stream-events remembered below the checkpoint, so
+# events Gerrit emits out of order are neither lost nor dispatched twice
+DEFAULT_STREAM_WINDOW = 300.0
+
+# Workflow listings kept in the on-disk cache, 0 disables the cache
+DEFAULT_WORKFLOW_CACHE_SIZE = 1024
+
+# Seconds a cached workflow listing is used without revalidating its ETag
+DEFAULT_WORKFLOW_CACHE_TTL = 0
+
+MAPPING_SECTION_REGEX = re.compile(r'^mapping "(.*)"$')
+
+GITHUB_OWNER_SECTION_REGEX = re.compile(r'^github\.com "(.*)"$')
+
+# Upper bound on memoized project lookups kept by a RemoteIndex
+PROJECT_LOOKUP_CACHE_SIZE = 4096
+
+
+class _MultiOptionDict(dict):
+    """
+    Option store that keeps every value of a repeated option.
+
+    Gerrit's replication.config is a git-config file where options such as
+    projects and push may be given more than once. ConfigParser keeps raw
+    values as lists of lines while reading, so repeated options are appended
+    and end up as one newline separated value.
+    """
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if isinstance(value, list) and isinstance(self.get(key), list):
+            self[key].extend(value)
+        else:
+            super().__setitem__(key, value)
+
+
+class RemoteIndex:
+    """
+    Compiled project to remotes index built from replication.config.
+
+    Remotes without a projects filter replicate every project. Otherwise each
+    projects pattern is an exact name, a glob (eg: ``foo/*``) or a regular
+    expression when it starts with ``^``, matching the whole project name.
+    A pattern that is not a valid expression is skipped with a warning.
+    """
+
+    def __init__(self, remotes: ReplicationRemotes, projects: Dict[str, List[str]]):
+        """
+        Build the index.
+
+        Args:
+            remotes (ReplicationRemotes): all of the known replication remotes
+            projects (Dict[str, List[str]]): projects patterns keyed by remote
+                name, remotes without patterns replicate every project
+        """
+        self._remotes = remotes
+        self._always: List[Tuple[str, str]] = []
+        self._exact: Dict[str, List[Tuple[str, str]]] = {}
+        self._patterns: List[Tuple[Pattern[str], Tuple[str, str]]] = []
+        self._lookups: Dict[str, ReplicationRemotes] = {}
+        self._order: Dict[Tuple[str, str], int] = {}
+
+        for platform_type, platform_remotes in remotes.items():
+            for remote in platform_remotes:  # type: ignore
+                key = (platform_type, remote)
+                self._order[key] = len(self._order)
+                patterns = projects.get(remote, [])
+                if not patterns:
+                    self._always.append(key)
+                    continue
+
+                expressions = []
+                for pattern in patterns:
+                    if pattern.startswith("^"):
+                        expression = pattern
+                    elif any(char in pattern for char in "*?["):
+                        expression = fnmatch.translate(pattern)
+                    else:
+                        self._exact.setdefault(pattern, []).append(key)
+                        continue
+                    try:
+                        re.compile(expression)
+                    except re.error as e:
+                        # only this pattern is lost, not every event
+                        print(
+                            f"Warning: skipping projects = {pattern} of {remote}: {e}"
+                        )
+                        continue
+                    expressions.append(expression)
+
+                if not expressions:
+                    continue
+                try:
+                    combined = "|".join(f"(?:{expr})" for expr in expressions)
+                    self._patterns.append((re.compile(combined), key))
+                except re.error:
+                    # valid alone but not together, eg: the same group name
+                    self._patterns.extend(
+                        (re.compile(expr), key) for expr in expressions
+                    )
+
+    @property
+    def remotes(self) -> ReplicationRemotes:
+        """All of the remotes in the index."""
+        return self._remotes
+
+    def lookup(self, project: str) -> ReplicationRemotes:
+        """
+        Get the remotes that replicate a project.
+
+        Args:
+            project (str): Gerrit project name
+
+        Returns:
+            ReplicationRemotes: the subset of remotes replicating the project,
+                in configuration order
+        """
+        cached = self._lookups.get(project)
+        if cached is not None:
+            return cached
+
+        keys = set(self._always)
+        keys.update(self._exact.get(project, []))
+        for pattern, key in self._patterns:
+            if key not in keys and pattern.fullmatch(project):
+                keys.add(key)
+
+        remotes: ReplicationRemotes = {}
+        for platform_type, remote in sorted(keys, key=self._order.__getitem__):
+            platform_remotes = self._remotes[platform_type]  # type: ignore
+            remotes.setdefault(platform_type, {})[remote] = platform_remotes[remote]  # type: ignore
+
+        if len(self._lookups) >= PROJECT_LOOKUP_CACHE_SIZE:
+            self._lookups.clear()
+        self._lookups[project] = remotes
+        return remotes
+
+
+_CACHE_LOCK = threading.Lock()
+_CONFIG_CACHE: Dict[str, Tuple[FileSignature, ConfigParser]] = {}
+_SETTINGS_CACHE: Dict[str, Tuple[FileSignature, Settings]] = {}
+_REMOTES_CACHE: Dict[str, Tuple[FileSignature, RemoteIndex]] = {}
+
+
+def _file_signature(conf_file: str) -> FileSignature:
+    """
+    Get the signature used to decide if a configuration file has changed.
+
+    Args:
+        conf_file (str): path to the configuration file
+
+    Returns:
+        FileSignature: the path, inode, size and modification time of the file
+    """
+    stat = os.stat(conf_file)
+    return (conf_file, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def _load_config(config_type: str) -> Tuple[FileSignature, ConfigParser]:
+    """
+    Load a configuration file, reusing the cached parse if it is unchanged.
+
+    Args:
+        config_type (str): Type of configuration file to load
+
+    Returns:
+        Tuple[FileSignature, ConfigParser]: the signature of the file that was
+            parsed and the parsed configuration
+    """
+    conf_file = CONFIG_FILES[config_type]
+    signature = _file_signature(conf_file)
+
+    with _CACHE_LOCK:
+        cached = _CONFIG_CACHE.get(config_type)
+        if cached is not None and cached[0] == signature:
+            return cached
+
+        if config_type == REPLICATION:
+            config = configparser.ConfigParser(
+                dict_type=_MultiOptionDict, strict=False  # type: ignore
+            )
+        else:
+            config = configparser.ConfigParser()
+        with open(conf_file) as config_file:
+            config.read_file(config_file, conf_file)
+        _CONFIG_CACHE[config_type] = (signature, config)
+
+    return signature, config
+
+
+def clear_config_cache() -> None:
+    """Drop all cached configuration so the next access re-parses from disk."""
+    with _CACHE_LOCK:
+        _CONFIG_CACHE.clear()
+        _SETTINGS_CACHE.clear()
+        _REMOTES_CACHE.clear()
+
+
 def get_config(config_type: str = DEFAULT_CONFIG) -> ConfigParser:
     """
     Get the config object.
 
+    The parsed object is shared for the whole process and is only re-parsed
+    when the file on disk changes (mtime, size or inode), callers must treat
+    it as read-only.
+
     Args:
         config_type (str): Type of configuration file that the parser should use
 
@@ -75,11 +373,188 @@ def get_config(config_type: str = DEFAULT_CONFIG) -> ConfigParser:
         ConfigParser: A loaded ConfigParser object with the requested
             configuration file
     """
-    config = configparser.ConfigParser()
-    conf_file = CONFIG_FILES[config_type]
-    with open(conf_file) as config_file:
-        config.read_file(config_file, conf_file)
-    return config
+    return _load_config(config_type)[1]
+
+
+def _section_tokens(config: ConfigParser, section: str) -> List[str]:
+    """
+    Get the tokens of a section, its token followed by its list of tokens.
+
+    Args:
+        config (ConfigParser): the parsed configuration
+        section (str): the section to read
+
+    Returns:
+        List[str]: the distinct tokens in the order they are configured
+    """
+    tokens = [config.get(section, "token", fallback="")]
+    tokens.extend(
+        re.split(r"[\s,]+", config.get(section, "tokens", fallback="").strip())
+    )
+    return list(dict.fromkeys(token for token in tokens if token))
+
+
+def _typed_option(
+    getter: Callable[..., T], section: str, option: str, fallback: T
+) -> T:
+    """
+    Get a typed option, falling back to the default when its value is invalid.
+
+    An invalid value only affects the feature using the option instead of
+    failing every event processed with the configuration.
+
+    Args:
+        getter (Callable[..., T]): the ConfigParser getter eg: config.getint
+        section (str): the section of the option
+        option (str): the option
+        fallback (T): the default of the option
+
+    Returns:
+        T: the value of the option, or the default when it is unset or invalid
+    """
+    try:
+        return getter(section, option, fallback=fallback)
+    except ValueError as e:
+        print(f"Warning: invalid {option} in [{section}], using {fallback}: {e}")
+        return fallback
+
+
+def get_settings() -> Settings:
+    """
+    Get a typed snapshot of the gerrit_to_platform configuration.
+
+    The snapshot is rebuilt only when the configuration file changes and is
+    shared between the handlers and the platform modules, callers must treat
+    it as read-only. An option with an invalid value is replaced by its
+    default, with a warning.
+
+    Returns:
+        Settings: the current settings snapshot
+    """
+    signature, config = _load_config(CONFIG)
+
+    with _CACHE_LOCK:
+        cached = _SETTINGS_CACHE.get(CONFIG)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        mappings: Dict[str, Dict[str, str]] = {}
+        github_owner_tokens: Dict[str, List[str]] = {}
+        for section in config.sections():
+            mapping_match = MAPPING_SECTION_REGEX.match(section)
+            if mapping_match:
+                mappings[mapping_match.group(1)] = dict(config.items(section))
+            owner_match = GITHUB_OWNER_SECTION_REGEX.match(section)
+            if owner_match:
+                owner_tokens = _section_tokens(config, section)
+                if owner_tokens:
+                    github_owner_tokens[owner_match.group(1).lower()] = owner_tokens
+
+        dispatch_limits: Dict[str, DispatchLimits] = {}
+        for platform in Platform:
+            section = f"{platform.value}.com"
+            concurrency = max(
+                _typed_option(config.getint, section, "concurrency", 1), 1
+            )
+            dispatch_limits[platform.value] = {
+                "concurrency": concurrency,
+                "owner_concurrency": max(
+                    _typed_option(
+                        config.getint, section, "owner_concurrency", concurrency
+                    ),
+                    1,
+                ),
+            }
+
+        cache_directory = config.get(
+            "cache", "directory", fallback=DEFAULT_CACHE_DIRECTORY
+        )
+        settings: Settings = {
+            "cache_directory": cache_directory,
+            "cooldown_backend": config.get(
+                "cooldown", "backend", fallback=DEFAULT_COOLDOWN_BACKEND
+            ),
+            "cooldown_path": config.get(
+                "cooldown",
+                "path",
+                fallback=os.path.join(cache_directory, "cooldown.sqlite3"),
+            ),
+            "daemon_socket": config.get("daemon", "socket", fallback=None),
+            "debounce_window": _typed_option(
+                config.getfloat, "debounce", "window", DEFAULT_DEBOUNCE_WINDOW
+            ),
+            "dispatch_limits": dispatch_limits,
+            "github_api_url": config.get(
+                "github.com", "api_url", fallback=DEFAULT_GITHUB_API_URL
+            ),
+            "github_app_id": config.get("github.com", "app_id", fallback=None),
+            "github_app_private_key": config.get(
+                "github.com", "app_private_key", fallback=None
+            ),
+            "github_owner_tokens": github_owner_tokens,
+            "github_rate_limit_wait": _typed_option(
+                config.getint,
+                "github.com",
+                "rate_limit_wait",
+                DEFAULT_GITHUB_RATE_LIMIT_WAIT,
+            ),
+            "github_token": config.get("github.com", "token", fallback=None),
+            "github_tokens": _section_tokens(config, "github.com"),
+            "github_write_burst": _typed_option(
+                config.getint, "github.com", "write_burst", DEFAULT_GITHUB_WRITE_BURST
+            ),
+            "github_write_rate": _typed_option(
+                config.getfloat, "github.com", "write_rate", DEFAULT_GITHUB_WRITE_RATE
+            ),
+            "mappings": mappings,
+            "metrics_listen": config.get("metrics", "listen", fallback=None),
+            "metrics_textfile": config.get("metrics", "textfile", fallback=None),
+            "profile_directory": config.get("profile", "directory", fallback=None),
+            "required_workflow_cache_ttl": _typed_option(
+                config.getint,
+                "cache",
+                "required_ttl",
+                DEFAULT_REQUIRED_WORKFLOW_CACHE_TTL,
+            ),
+            "retry_backoff": _typed_option(
+                config.getfloat, "retry", "backoff", DEFAULT_RETRY_BACKOFF
+            ),
+            "retry_interval": _typed_option(
+                config.getint, "retry", "interval", DEFAULT_RETRY_INTERVAL
+            ),
+            "retry_max_attempts": _typed_option(
+                config.getint, "retry", "max_attempts", DEFAULT_RETRY_MAX_ATTEMPTS
+            ),
+            "retry_max_backoff": _typed_option(
+                config.getfloat, "retry", "max_backoff", DEFAULT_RETRY_MAX_BACKOFF
+            ),
+            "retry_queue": config.get(
+                "retry",
+                "queue",
+                fallback=os.path.join(cache_directory, "retry.sqlite3"),
+            )
+            or None,
+            "spool_directory": config.get("spool", "directory", fallback=None),
+            "spool_fsync": _typed_option(config.getboolean, "spool", "fsync", False),
+            "stream_checkpoint": config.get(
+                "stream",
+                "checkpoint",
+                fallback=os.path.join(cache_directory, "stream-checkpoint.json"),
+            )
+            or None,
+            "stream_window": _typed_option(
+                config.getfloat, "stream", "window", DEFAULT_STREAM_WINDOW
+            ),
+            "workflow_cache_size": _typed_option(
+                config.getint, "cache", "workflow_size", DEFAULT_WORKFLOW_CACHE_SIZE
+            ),
+            "workflow_cache_ttl": _typed_option(
+                config.getint, "cache", "workflow_ttl", DEFAULT_WORKFLOW_CACHE_TTL
+            ),
+        }
+        _SETTINGS_CACHE[CONFIG] = (signature, settings)
+
+    return settings
 
 
 def get_mapping(mapping_section: str) -> Union[Dict[str, str], None]:
@@ -93,25 +568,25 @@ def get_mapping(mapping_section: str) -> Union[Dict[str, str], None]:
         Optional(Dict[str,str]): The key / value mapping object or None if it
             does not exist
     """
-    config = get_config()
-
-    section = f'mapping "{mapping_section}"'
-    if section in config.sections():
-        return dict(config.items(section))
+    mapping = get_settings()["mappings"].get(mapping_section)
+    if mapping is not None:
+        return dict(mapping)
 
     return None
 
 
-def get_replication_remotes() -> ReplicationRemotes:
+def _build_remote_index(remotes_config: ConfigParser) -> RemoteIndex:
     """
-    Get the replication remotes available.
+    Build the remote index from a parsed replication.config.
+
+    Args:
+        remotes_config (ConfigParser): the parsed replication configuration
 
     Returns:
-        ReplicationRemotes: All the replication remotes defined the Gerrit
-            configuration file
+        RemoteIndex: the index of all platform remotes
     """
-    remotes_config = get_config(REPLICATION)
     remotes: ReplicationRemotes = {}
+    projects: Dict[str, List[str]] = {}
 
     for section in remotes_config.sections():
         if 'remote "' not in section:
@@ -162,7 +637,54 @@ def get_replication_remotes() -> ReplicationRemotes:
                 }
             }
 
-    return remotes
+        projects[subsection] = [
+            project.strip()
+            for project in remotes_config.get(section, "projects", fallback="").split(
+                "\n"
+            )
+            if project.strip()
+        ]
+
+    return RemoteIndex(remotes, projects)
+
+
+def get_remote_index() -> RemoteIndex:
+    """
+    Get the compiled remote index for the current replication.config.
+
+    Returns:
+        RemoteIndex: the index, rebuilt only when replication.config changes
+    """
+    signature, remotes_config = _load_config(REPLICATION)
+
+    with _CACHE_LOCK:
+        cached = _REMOTES_CACHE.get(REPLICATION)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        index = _build_remote_index(remotes_config)
+        _REMOTES_CACHE[REPLICATION] = (signature, index)
+
+    return index
+
+
+def get_replication_remotes(project: Optional[str] = None) -> ReplicationRemotes:
+    """
+    Get the replication remotes available.
+
+    Args:
+        project (Optional[str]): only return the remotes whose projects
+            filters replicate this Gerrit project
+
+    Returns:
+        ReplicationRemotes: All the replication remotes defined the Gerrit
+            configuration file, or only those replicating project when given
+    """
+    index = get_remote_index()
+    if project is None:
+        return index.remotes
+
+    return index.lookup(project)
 
 
 def has_section(section: str) -> bool:
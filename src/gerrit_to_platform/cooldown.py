@@ -0,0 +1,243 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Stores of the ChatOps trigger cooldowns."""
+
+import abc
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from gerrit_to_platform.config import Settings, get_settings
+
+# Share of the acquisitions that also remove every expired cooldown
+EXPIRE_PROBABILITY = 0.01
+
+
+class CooldownError(Exception):
+    """A cooldown store could not be read or updated."""
+
+
+class CooldownStore(abc.ABC):
+    """
+    Keys that may only be acquired once per cooldown period.
+
+    acquire is an atomic check-and-set, two callers racing for a key can not
+    both acquire it.
+    """
+
+    @abc.abstractmethod
+    def acquire(self, key: str, ttl: float, now: Optional[float] = None) -> float:
+        """
+        Start the cooldown of a key unless it is already cooling down.
+
+        Args:
+            key (str): the cooldown key eg: 12345/csit-perftest
+            ttl (float): seconds the cooldown lasts
+            now (Optional[float]): the current time, defaults to time.time()
+
+        Returns:
+            float: 0 if the key was acquired, otherwise the seconds left
+                before it can be acquired again
+
+        Raises:
+            CooldownError: the store could not be read or updated
+        """
+
+    @abc.abstractmethod
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        Remove every expired cooldown.
+
+        Args:
+            now (Optional[float]): the current time, defaults to time.time()
+
+        Returns:
+            int: the number of cooldowns removed
+
+        Raises:
+            CooldownError: the store could not be read or updated
+        """
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Count the tracked cooldowns, expired ones included."""
+
+
+class MemoryCooldownStore(CooldownStore):
+    """
+    Cooldowns kept in the memory of the process.
+
+    Only suitable for the daemon and the worker, each hook process starts
+    with an empty store.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty store."""
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, ttl: float, now: Optional[float] = None) -> float:
+        """Start the cooldown of a key unless it is already cooling down."""
+        now = time.time() if now is None else now
+        with self._lock:
+            expires = self._expires.get(key, 0.0)
+            if expires > now:
+                return expires - now
+            self._expires[key] = now + ttl
+            if random.random() < EXPIRE_PROBABILITY:  # nosec
+                self._expire(now)
+        return 0.0
+
+    def _expire(self, now: float) -> int:
+        """Remove the expired cooldowns, holding the lock."""
+        expired = [key for key, expires in self._expires.items() if expires <= now]
+        for key in expired:
+            del self._expires[key]
+        return len(expired)
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Remove every expired cooldown."""
+        with self._lock:
+            return self._expire(time.time() if now is None else now)
+
+    def __len__(self) -> int:
+        """Count the tracked cooldowns, expired ones included."""
+        return len(self._expires)
+
+
+class SQLiteCooldownStore(CooldownStore):
+    """
+    Cooldowns in a SQLite database shared by the hook processes.
+
+    Each key is one row of a table indexed by expiry, acquiring a key is a
+    single upsert that only replaces an expired row, and expired rows are
+    removed in bulk through the index.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open the store, creating its database on first use.
+
+        Args:
+            path (str): path of the SQLite database
+
+        Raises:
+            CooldownError: the database could not be opened
+        """
+        # Imported here, the hooks only load sqlite3 when they use the store
+        import sqlite3
+
+        self._errors = sqlite3.Error
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._translate_errors():
+            self._connection: Any = sqlite3.connect(
+                path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS cooldowns "
+                + "(key TEXT PRIMARY KEY, expires REAL NOT NULL) WITHOUT ROWID"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS cooldowns_expires ON cooldowns (expires)"
+            )
+
+    @contextmanager
+    def _translate_errors(self) -> Iterator[None]:
+        """Raise the SQLite errors of the block as CooldownError."""
+        try:
+            yield
+        except self._errors as e:
+            raise CooldownError(str(e)) from e
+
+    def acquire(self, key: str, ttl: float, now: Optional[float] = None) -> float:
+        """Start the cooldown of a key unless it is already cooling down."""
+        now = time.time() if now is None else now
+        with self._lock, self._translate_errors():
+            cursor = self._connection.execute(
+                "INSERT INTO cooldowns (key, expires) VALUES (?, ?) "
+                + "ON CONFLICT (key) DO UPDATE SET expires = excluded.expires "
+                + "WHERE cooldowns.expires <= ?",
+                (key, now + ttl, now),
+            )
+            if cursor.rowcount == 1:
+                if random.random() < EXPIRE_PROBABILITY:  # nosec
+                    self._connection.execute(
+                        "DELETE FROM cooldowns WHERE expires <= ?", (now,)
+                    )
+                return 0.0
+
+            row = self._connection.execute(
+                "SELECT expires FROM cooldowns WHERE key = ?", (key,)
+            ).fetchone()
+        # the row may have expired and been removed in between
+        return max(row[0] - now, 0.0) if row else 0.0
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Remove every expired cooldown."""
+        now = time.time() if now is None else now
+        with self._lock, self._translate_errors():
+            cursor = self._connection.execute(
+                "DELETE FROM cooldowns WHERE expires <= ?", (now,)
+            )
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        """Count the tracked cooldowns, expired ones included."""
+        with self._lock, self._translate_errors():
+            (count,) = self._connection.execute(
+                "SELECT count(*) FROM cooldowns"
+            ).fetchone()
+        return count
+
+    def close(self) -> None:
+        """Close the database."""
+        self._connection.close()
+
+
+# Backend name: factory building the store from the settings
+COOLDOWN_BACKENDS: Dict[str, Callable[[Settings], CooldownStore]] = {
+    "memory": lambda settings: MemoryCooldownStore(),
+    "sqlite": lambda settings: SQLiteCooldownStore(settings["cooldown_path"]),
+}
+
+_STORE: Optional[Tuple[Tuple[str, str], CooldownStore]] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_cooldown_store() -> CooldownStore:
+    """
+    Get the cooldown store for the current settings.
+
+    Returns:
+        CooldownStore: the store of the [cooldown] backend
+
+    Raises:
+        ValueError: the configured backend does not exist
+    """
+    global _STORE
+
+    settings = get_settings()
+    options = (settings["cooldown_backend"], settings["cooldown_path"])
+    with _STORE_LOCK:
+        if _STORE is None or _STORE[0] != options:
+            factory = COOLDOWN_BACKENDS.get(options[0])
+            if factory is None:
+                raise ValueError(f"Unknown cooldown backend: {options[0]}")
+            _STORE = (options, factory(settings))
+        return _STORE[1]
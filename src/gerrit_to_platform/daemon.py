@@ -0,0 +1,257 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Long-running dispatcher daemon for Gerrit hook events."""
+
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import threading
+from typing import Annotated, List, Optional
+
+import typer
+
+from gerrit_to_platform.config import get_settings
+from gerrit_to_platform.events import Debouncer, Event, load_event, process_event
+from gerrit_to_platform.helpers import drain_retry_queue
+from gerrit_to_platform.metrics import serve
+
+app = typer.Typer()
+
+DEFAULT_WORKERS = 4
+
+# Events waiting for a worker before new events are refused
+QUEUE_SIZE = 1000
+
+
+class EventRequestHandler(socketserver.StreamRequestHandler):
+    """Read newline delimited JSON events and acknowledge each one."""
+
+    server: "EventServer"
+
+    def handle(self) -> None:
+        """Queue every event on the connection."""
+        for line in self.rfile:
+            try:
+                event = load_event(json.loads(line))
+            except ValueError:
+                event = None
+
+            accepted = event is not None and self.server.queue_event(event)
+            self.wfile.write(json.dumps({"accepted": accepted}).encode() + b"\n")
+
+
+class EventServer(socketserver.ThreadingUnixStreamServer):
+    """
+    Unix socket server that queues hook events for worker threads.
+
+    Events are acknowledged as soon as they are queued so hooks return
+    immediately, the workers process them with the same code the hook
+    commands use while the configuration, connections and caches stay warm.
+    """
+
+    daemon_threads = True
+    # Hooks arrive in bursts and a full backlog makes their connect fail
+    request_queue_size = socket.SOMAXCONN
+
+    def __init__(
+        self,
+        socket_path: str,
+        workers: int = DEFAULT_WORKERS,
+        retry_interval: int = 0,
+        debounce_window: float = 0,
+    ):
+        """
+        Bind the socket and start the workers.
+
+        Args:
+            socket_path (str): path of the Unix socket to listen on
+            workers (int): number of events processed concurrently
+            retry_interval (int): seconds between two drains of the retry
+                queue, 0 leaves the queue to the drain command
+            debounce_window (float): seconds a patchset-created event waits
+                for a newer patchset of its change, 0 processes every one
+        """
+        self.socket_path = socket_path
+        self.events: "queue.Queue[Optional[Event]]" = queue.Queue(QUEUE_SIZE)
+        remove_stale_socket(socket_path)
+        super().__init__(socket_path, EventRequestHandler)
+        os.chmod(socket_path, 0o600)
+
+        self.workers: List[threading.Thread] = []
+        for _ in range(workers):
+            worker = threading.Thread(target=self._work, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+        self.debouncer: Optional[Debouncer] = None
+        if debounce_window > 0:
+            self.debouncer = Debouncer(debounce_window, self.events.put)
+
+        self._stopping = threading.Event()
+        self._retrier: Optional[threading.Thread] = None
+        if retry_interval > 0:
+            self._retrier = threading.Thread(
+                target=self._retry, args=(retry_interval,), daemon=True
+            )
+            self._retrier.start()
+
+    def queue_event(self, event: Event) -> bool:
+        """
+        Queue an event for the workers.
+
+        Args:
+            event (Event): the event to process
+
+        Returns:
+            bool: True if queued, False if the queue is full
+        """
+        if self.debouncer is not None and self.debouncer.submit(event):
+            return True
+
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            return False
+        return True
+
+    def _work(self) -> None:
+        """Process queued events until told to stop."""
+        while True:
+            event = self.events.get()
+            try:
+                if event is None:
+                    return
+                process_event(event)
+            except Exception as e:
+                print(f"Failed to process {event['type']} event: {e}")  # type: ignore
+            finally:
+                self.events.task_done()
+
+    def _retry(self, interval: int) -> None:
+        """Drain the retry queue every interval seconds until told to stop."""
+        while not self._stopping.wait(interval):
+            try:
+                report = drain_retry_queue()
+            except Exception as e:
+                print(f"Failed to drain the retry queue: {e}")
+                continue
+            if any(report.values()):
+                print(
+                    f"Retried {report['retried']} dispatches, "
+                    + f"rescheduled {report['rescheduled']}, "
+                    + f"gave up {report['dropped']}"
+                )
+
+    def server_close(self) -> None:
+        """Finish the queued events, stop the workers and remove the socket."""
+        super().server_close()
+        if self.debouncer is not None:
+            self.debouncer.close()
+            stats = self.debouncer.stats()
+            print(
+                f"Debounced patchsets: {stats['released']} released, "
+                + f"{stats['suppressed']} superseded"
+            )
+        self._stopping.set()
+        if self._retrier is not None:
+            self._retrier.join()
+        for _ in self.workers:
+            self.events.put(None)
+        for worker in self.workers:
+            worker.join()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+def remove_stale_socket(socket_path: str) -> None:
+    """
+    Remove a socket left behind by a daemon that is no longer running.
+
+    Args:
+        socket_path (str): path of the Unix socket
+
+    Raises:
+        RuntimeError: if another daemon is listening on the socket
+    """
+    if not os.path.exists(socket_path):
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            os.unlink(socket_path)
+            return
+
+    raise RuntimeError(f"A daemon is already listening on {socket_path}")
+
+
+@app.command()
+def daemon(
+    socket_path: Annotated[
+        Optional[str],
+        typer.Option("--socket", help="socket path, defaults to [daemon] socket"),
+    ] = None,
+    workers: Annotated[
+        int, typer.Option(help="events processed concurrently")
+    ] = DEFAULT_WORKERS,
+):
+    """
+    Run the dispatcher daemon.
+
+    Hooks hand their events to the daemon over a Unix socket when the
+    [daemon] socket option is set, and process them themselves when the
+    daemon is not running. Failed dispatches queued for a retry are retried
+    every [retry] interval seconds. The metrics are served over HTTP when the
+    [metrics] listen option is set.
+
+    Args:
+        socket_path (Optional[str]): path of the Unix socket to listen on
+        workers (int): number of events processed concurrently
+    """
+    socket_path = socket_path or get_settings()["daemon_socket"]
+    if not socket_path:
+        print("No socket given and no [daemon] socket configured")
+        raise typer.Exit(code=1)
+
+    settings = get_settings()
+    server = EventServer(
+        socket_path,
+        workers,
+        settings["retry_interval"],
+        settings["debounce_window"],
+    )
+    signal.signal(
+        signal.SIGTERM,
+        lambda signum, frame: threading.Thread(target=server.shutdown).start(),
+    )
+    print(f"Listening on {socket_path}")
+    metrics_server = None
+    if settings["metrics_listen"]:
+        metrics_server = serve(settings["metrics_listen"])
+        print(f"Serving metrics on {settings['metrics_listen']}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,551 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Gerrit event routing shared by the hooks and the long-running modes."""
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from importlib import import_module
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypedDict
+
+from gerrit_to_platform.config import get_settings
+from gerrit_to_platform.metrics import REGISTRY, event_context, stage
+from gerrit_to_platform.profiling import profiled
+
+# CONSTANTS
+PATCHSET_CREATED = "patchset-created"
+COMMENT_ADDED = "comment-added"
+CHANGE_MERGED = "change-merged"
+
+# Seconds a hook waits on the daemon before dispatching in-process
+DAEMON_TIMEOUT = 1.0
+
+
+# Type Definitions
+class Event(TypedDict):
+    """Serialized Gerrit hook event."""
+
+    type: str
+    arguments: Dict[str, str]
+
+
+# Hook arguments used by each event type, in the order the handlers take them
+EVENT_ARGUMENTS: Dict[str, Tuple[str, ...]] = {
+    PATCHSET_CREATED: (
+        "change",
+        "kind",
+        "change_url",
+        "change_owner",
+        "change_owner_username",
+        "project",
+        "branch",
+        "topic",
+        "uploader",
+        "uploader_username",
+        "commit",
+        "patchset",
+    ),
+    COMMENT_ADDED: (
+        "change",
+        "change_url",
+        "change_owner",
+        "change_owner_username",
+        "project",
+        "branch",
+        "topic",
+        "author",
+        "author_username",
+        "commit",
+        "comment",
+    ),
+    CHANGE_MERGED: (
+        "change",
+        "change_url",
+        "change_owner",
+        "change_owner_username",
+        "project",
+        "branch",
+        "topic",
+        "submitter",
+        "submitter_username",
+        "commit",
+        "newrev",
+    ),
+}
+
+# Module and function processing each event type, imported on first use
+EVENT_HANDLERS: Dict[str, Tuple[str, str]] = {
+    PATCHSET_CREATED: (
+        "gerrit_to_platform.patchset_created",
+        "process_patchset_created",
+    ),
+    COMMENT_ADDED: ("gerrit_to_platform.comment_added", "process_comment_added"),
+    CHANGE_MERGED: ("gerrit_to_platform.change_merged", "process_change_merged"),
+}
+
+
+def parse_hook_arguments(event_type: str, argv: List[str]) -> Optional[Dict[str, str]]:
+    """
+    Parse hook arguments without loading the command line framework.
+
+    Gerrit always passes hook arguments as ``--name value`` pairs. Arguments
+    the event does not use, such as comment-added approval scores, are
+    dropped.
+
+    Args:
+        event_type (str): the Gerrit event type
+        argv (List[str]): the hook arguments
+
+    Returns:
+        Optional[Dict[str, str]]: the event arguments, or None if argv is not
+            a complete set of event arguments (eg: --help)
+    """
+    arguments: Dict[str, str] = {}
+    position = 0
+
+    while position < len(argv):
+        option = argv[position]
+        if not option.startswith("--"):
+            return None
+
+        if "=" in option:
+            name, value = option[2:].split("=", 1)
+            position += 1
+        elif position + 1 < len(argv):
+            name, value = option[2:], argv[position + 1]
+            position += 2
+        else:
+            return None
+
+        arguments[name.replace("-", "_")] = value
+
+    if any(name not in arguments for name in EVENT_ARGUMENTS[event_type]):
+        return None
+
+    return {name: arguments[name] for name in EVENT_ARGUMENTS[event_type]}
+
+
+def load_event(data: Any) -> Optional[Event]:
+    """
+    Validate deserialized event data.
+
+    Args:
+        data (Any): the deserialized JSON event
+
+    Returns:
+        Optional[Event]: the event, or None if it is not a valid event
+    """
+    if not isinstance(data, dict):
+        return None
+
+    event_type = data.get("type")
+    arguments = data.get("arguments")
+    if event_type not in EVENT_ARGUMENTS or not isinstance(arguments, dict):
+        return None
+
+    for name in EVENT_ARGUMENTS[event_type]:
+        if not isinstance(arguments.get(name), str):
+            return None
+
+    return {
+        "type": event_type,
+        "arguments": {name: arguments[name] for name in EVENT_ARGUMENTS[event_type]},
+    }
+
+
+def _account(data: Any) -> Dict[str, str]:
+    """Get the hook arguments of a stream-events account."""
+    if not isinstance(data, dict):
+        data = {}
+    name = str(data.get("name", ""))
+    email = str(data.get("email", ""))
+    return {
+        "display": f"{name} <{email}>" if email else name,
+        "username": str(data.get("username", "")),
+    }
+
+
+def from_stream_event(data: Any) -> Optional[Event]:
+    """
+    Convert a Gerrit stream-events record into the hook arguments of an event.
+
+    Args:
+        data (Any): the deserialized stream-events JSON line
+
+    Returns:
+        Optional[Event]: the event, or None if it is not a patchset-created,
+            comment-added or change-merged record
+    """
+    if not isinstance(data, dict) or data.get("type") not in EVENT_ARGUMENTS:
+        return None
+    change = data.get("change")
+    patchset = data.get("patchSet")
+    if not isinstance(change, dict) or not isinstance(patchset, dict):
+        return None
+
+    owner = _account(change.get("owner"))
+    project = str(change.get("project", ""))
+    branch = str(change.get("branch", ""))
+    arguments = {
+        "change": f"{project}~{branch}~{change.get('id', '')}",
+        "kind": str(patchset.get("kind", "REWORK")),
+        "change_url": str(change.get("url", "")),
+        "change_owner": owner["display"],
+        "change_owner_username": owner["username"],
+        "project": project,
+        "branch": branch,
+        "topic": str(change.get("topic", "")),
+        "commit": str(patchset.get("revision", "")),
+        "patchset": str(patchset.get("number", "")),
+        "comment": str(data.get("comment", "")),
+        "newrev": str(data.get("newRev", patchset.get("revision", ""))),
+    }
+    for role in ("uploader", "author", "submitter"):
+        account = _account(data.get(role))
+        arguments[role] = account["display"]
+        arguments[f"{role}_username"] = account["username"]
+
+    return load_event({"type": data["type"], "arguments": arguments})
+
+
+def process_event(event: Event) -> None:
+    """
+    Process an event in this process.
+
+    Args:
+        event (Event): the event to process
+    """
+    with event_context(event["type"]):
+        with stage("config", event=event["type"]):
+            get_settings()
+        _handle(event)
+
+
+def _handle(event: Event) -> None:
+    """Call the handler of an event."""
+    module_name, function_name = EVENT_HANDLERS[event["type"]]
+    getattr(import_module(module_name), function_name)(**event["arguments"])
+
+
+class DebounceStats(TypedDict):
+    """Counters of a Debouncer."""
+
+    held: int
+    released: int
+    suppressed: int
+
+
+class Debouncer:
+    """
+    Hold patchset-created events briefly and release only the newest ones.
+
+    An event is held for window seconds, restarted by every newer patchset
+    of the same change, which replaces it. Superseded patchsets are never
+    released, so a burst of pushes dispatches one verify fan-out. Other
+    events, and patchsets without a valid number, are not held.
+
+    With a path, the held events are saved to it before submit returns and
+    until their release is done, a Future returned by release is waited for,
+    so a consumer can record them as processed once submit returns. A new debouncer with the
+    same path holds the events saved by a stopped one again.
+    """
+
+    def __init__(
+        self,
+        window: float,
+        release: Callable[[Event], Any],
+        path: Optional[str] = None,
+    ):
+        """
+        Create the debouncer and start its release thread.
+
+        Args:
+            window (float): seconds a patchset waits for a newer one
+            release (Callable[[Event], Any]): called with every event to
+                process, from the release thread
+            path (Optional[str]): file keeping the held events across
+                restarts, None keeps them in memory
+        """
+        self.window = window
+        self.release = release
+        self.path = path
+        # change URL: (deadline, event)
+        self._held: Dict[str, Tuple[float, Event]] = {}
+        # released events whose release is not done yet
+        self._releasing: List[Event] = []
+        self._released = 0
+        self._suppressed = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        for event in self._load():
+            self._held[event["arguments"]["change_url"]] = (
+                time.monotonic() + window,
+                event,
+            )
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, event: Event) -> bool:
+        """
+        Hold an event if it is a patchset that may be superseded.
+
+        Args:
+            event (Event): the event
+
+        Returns:
+            bool: True if the event is held or superseded, False if it has to
+                be processed now
+        """
+        if event["type"] != PATCHSET_CREATED or self.window <= 0:
+            return False
+
+        try:
+            key = event["arguments"]["change_url"]
+            patchset = int(event["arguments"]["patchset"])
+        except (KeyError, ValueError):
+            return False
+        with self._condition:
+            if self._closed:
+                return False
+            held = self._held.get(key)
+            if held is not None:
+                self._suppressed += 1
+                held_patchset = int(held[1]["arguments"]["patchset"])
+                if held_patchset > patchset:
+                    print(f"Skipping patchset {patchset} of {key}, superseded")
+                    return True
+                print(f"Skipping patchset {held_patchset} of {key}, superseded")
+            self._held[key] = (time.monotonic() + self.window, event)
+            self._save()
+            self._condition.notify()
+        return True
+
+    def _load(self) -> List[Event]:
+        """Read the events saved by a previous debouncer."""
+        if self.path is None:
+            return []
+        try:
+            with open(self.path) as held_file:
+                data = json.load(held_file)
+        except FileNotFoundError:
+            return []
+        except ValueError as e:
+            print(f"Ignoring the invalid held events {self.path}: {e}")
+            return []
+
+        events = [load_event(event) for event in data]
+        return [event for event in events if event is not None]
+
+    def _save(self) -> None:
+        """Write the held events, called with the condition held."""
+        if self.path is None:
+            return
+
+        events = [event for _, event in self._held.values()] + self._releasing
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w") as held_file:
+                json.dump(events, held_file)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Failed to save the held events: {e}")
+
+    def _done(self, event: Event) -> None:
+        """Forget an event once its release is done."""
+        with self._condition:
+            self._releasing.remove(event)
+            self._save()
+
+    def stats(self) -> DebounceStats:
+        """Get the events currently held, released and suppressed."""
+        with self._condition:
+            return {
+                "held": len(self._held),
+                "released": self._released,
+                "suppressed": self._suppressed,
+            }
+
+    def _run(self) -> None:
+        """Release the events whose window is over."""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                due = [
+                    key
+                    for key, (deadline, _) in self._held.items()
+                    if deadline <= now or self._closed
+                ]
+                for key in due:
+                    _, event = self._held.pop(key)
+                    self._releasing.append(event)
+                    self._released += 1
+                    self._condition.release()
+                    result: Any = None
+                    try:
+                        result = self.release(event)
+                    except Exception as e:
+                        print(f"Failed to release {event['type']} event: {e}")
+                    finally:
+                        if hasattr(result, "add_done_callback"):
+                            result.add_done_callback(
+                                lambda _, event=event: self._done(event)
+                            )
+                        else:
+                            self._done(event)
+                        self._condition.acquire()
+                if self._closed and not self._held:
+                    return
+                if not due:
+                    deadlines = [deadline for deadline, _ in self._held.values()]
+                    self._condition.wait(min(deadlines) - now if deadlines else None)
+
+    def close(self) -> None:
+        """Release the held events now and stop the release thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+
+def send_to_daemon(socket_path: str, event: Event) -> bool:
+    """
+    Hand an event to the dispatcher daemon.
+
+    Once the event is written to the daemon it may be queued there, a reply
+    missing after that counts as accepted: processing the event here too
+    could dispatch it twice.
+
+    Args:
+        socket_path (str): the daemon's Unix socket
+        event (Event): the event to send
+
+    Returns:
+        bool: True if the daemon accepted the event, or did not answer after
+            receiving it, False if it is not running or refused it
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(DAEMON_TIMEOUT)
+        try:
+            client.connect(socket_path)
+            client.sendall(json.dumps(event).encode() + b"\n")
+        except OSError:
+            return False
+
+        try:
+            reply = client.makefile("rb").readline()
+        except OSError as e:
+            print(f"No reply from the daemon, assuming the event is queued: {e}")
+            return True
+
+    try:
+        return json.loads(reply).get("accepted") is not False
+    except (ValueError, AttributeError):
+        print("No reply from the daemon, assuming the event is queued")
+        return True
+
+
+def submit_event(event: Event) -> bool:
+    """
+    Hand an event off to the configured spool or long-running dispatcher.
+
+    Args:
+        event (Event): the event to submit
+
+    Returns:
+        bool: True if the event was handed off, False if it has to be
+            processed in this process
+    """
+    settings = get_settings()
+    if settings["spool_directory"]:
+        # Imported here so hooks handing events to the daemon skip it
+        from gerrit_to_platform.spool import Spool
+
+        try:
+            Spool(settings["spool_directory"], settings["spool_fsync"]).append(event)
+            return True
+        except OSError as e:
+            print(f"Failed to spool event: {e}")
+
+    socket_path = settings["daemon_socket"]
+    if socket_path and send_to_daemon(socket_path, event):
+        return True
+
+    return False
+
+
+def run_hook(event_type: str, argv: Optional[List[str]] = None) -> None:
+    """
+    Run a Gerrit hook.
+
+    The event is appended to the spool when one is configured, or handed to
+    the daemon when one is configured and running, otherwise its handler
+    processes it in this process. The command line framework is only loaded
+    for --help and invalid arguments. The metrics recorded meanwhile are
+    then added to the [metrics] textfile. When the G2P_PROFILE_DIR
+    environment variable or the [profile] directory option is set, the
+    invocation is profiled into that directory.
+
+    Args:
+        event_type (str): the Gerrit event type
+        argv (Optional[List[str]]): the hook arguments, defaults to sys.argv
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    with event_context(event_type):
+        try:
+            # timed before profiling starts, the profile directory is a setting
+            with stage("config", event=event_type):
+                get_settings()
+        except OSError:
+            # the command reports it, unless it is only asked for --help
+            pass
+
+        with profiled(event_type):
+            try:
+                arguments = parse_hook_arguments(event_type, argv)
+                if arguments is None:
+                    # --help or invalid arguments, left to the command
+                    import_module(EVENT_HANDLERS[event_type][0]).app(args=argv)
+                    return
+
+                event: Event = {"type": event_type, "arguments": arguments}
+                if not submit_event(event):
+                    _handle(event)
+            finally:
+                write_metrics_textfile()
+
+
+def write_metrics_textfile() -> None:
+    """Add the metrics of this process to the [metrics] textfile, if set."""
+    try:
+        textfile = get_settings()["metrics_textfile"]
+        if textfile:
+            REGISTRY.write_textfile(textfile)
+    except OSError as e:
+        print(f"Failed to write the metrics textfile: {e}")
+
+
+def patchset_created_hook() -> None:
+    """Entry point for the patchset-created hook."""
+    run_hook(PATCHSET_CREATED)
+
+
+def comment_added_hook() -> None:
+    """Entry point for the comment-added hook."""
+    run_hook(COMMENT_ADDED)
+
+
+def change_merged_hook() -> None:
+    """Entry point for the change-merged hook."""
+    run_hook(CHANGE_MERGED)
@@ -0,0 +1,360 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Local stand-in for the GitHub Actions API used by tests and benchmarks."""
+
+import collections
+import hashlib
+import json
+import re
+import socket
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+WORKFLOWS_PATH = re.compile(
+    r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/actions/workflows$"
+)
+DISPATCH_PATH = re.compile(
+    r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/actions/workflows/(?P<workflow>[^/]+)"
+    r"/dispatches$"
+)
+INSTALLATION_PATH = re.compile(r"^/(?P<kind>orgs|users)/(?P<owner>[^/]+)/installation$")
+ACCESS_TOKENS_PATH = re.compile(r"^/app/installations/(?P<id>[0-9]+)/access_tokens$")
+
+
+def make_workflows(count: int, names: Optional[List[str]] = None) -> List[dict]:
+    """
+    Generate active workflow records shaped like the GitHub API returns them.
+
+    Args:
+        count (int): number of workflows to generate when names is not given
+        names (Optional[List[str]]): workflow file names (without extension)
+
+    Returns:
+        List[dict]: workflow records
+    """
+    if names is None:
+        names = [f"workflow-{index}" for index in range(count)]
+
+    workflows = []
+    for index, name in enumerate(names):
+        workflows.append(
+            {
+                "id": 1000 + index,
+                "node_id": f"W_{index}",
+                "name": name,
+                "path": f".github/workflows/{name}.yaml",
+                "state": "active",
+                "created_at": "2023-01-01T00:00:00.000Z",
+                "updated_at": "2023-01-01T00:00:00.000Z",
+                "url": "",
+                "html_url": "",
+                "badge_url": "",
+            }
+        )
+    return workflows
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    """Answer workflow list and dispatch requests from the server state."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, without this the delayed ACK
+    # of the client stalls every response on a kept alive connection
+    disable_nagle_algorithm = True
+    server: "FakeGitHub"
+    # rate limit budget left for the token of the current request
+    remaining: Optional[int] = None
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Keep the test and benchmark output quiet."""
+
+    def setup(self) -> None:
+        """Count and track every accepted connection."""
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+            self.server.open_sockets.add(self.connection)
+
+    def finish(self) -> None:
+        """Stop tracking the connection."""
+        with self.server.lock:
+            self.server.open_sockets.discard(self.connection)
+        super().finish()
+
+    def _reply(
+        self, status: int, body: Any = None, headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        """Send a JSON response keeping the connection alive."""
+        payload = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if self.remaining is not None:
+            self.send_header("X-RateLimit-Remaining", str(self.remaining))
+            self.send_header(
+                "X-RateLimit-Reset", str(int(self.server.rate_limit_reset))
+            )
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _record(self, method: str) -> bool:
+        """
+        Count the request and apply the simulated latency and rate limits.
+
+        Returns:
+            bool: True if the request was answered with a rate limit refusal
+        """
+        token = self.headers.get("Authorization", "").partition(" ")[2] or None
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.request_log.append((method, self.path))
+            self.server.tokens_used.append(token)
+            throttled = self.server.throttled > 0
+            if throttled:
+                self.server.throttled -= 1
+            elif method == "POST" and self.server.write_limit is not None:
+                count, window = self.server.write_limit
+                now = time.monotonic()
+                writes = self.server.writes
+                while writes and writes[0] <= now - window:
+                    writes.popleft()
+                throttled = len(writes) >= count
+                if not throttled:
+                    writes.append(now)
+            budgets = self.server.token_limits
+            self.remaining = budgets.get(token, self.server.rate_limit_remaining)
+            exhausted = self.remaining == 0
+            if self.remaining and not throttled:
+                self.remaining -= 1
+                if token in budgets:
+                    budgets[token] = self.remaining
+                else:
+                    self.server.rate_limit_remaining = self.remaining
+            if throttled or exhausted:
+                self.server.rate_limited += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if throttled:
+            self._reply(
+                429,
+                {"message": "You have exceeded a secondary rate limit."},
+                headers={"Retry-After": str(self.server.retry_after)},
+            )
+        elif exhausted:
+            self._reply(403, {"message": "API rate limit exceeded"})
+        return throttled or exhausted
+
+    def do_GET(self) -> None:
+        """List a page of repository workflows."""
+        if self._record("GET"):
+            return
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        match = INSTALLATION_PATH.match(url.path)
+        if match:
+            installation = self.server.installations.get(match["owner"])
+            is_user = match["owner"] in self.server.users
+            if installation is None or is_user != (match["kind"] == "users"):
+                self._reply(404, {"message": "Not Found"})
+            else:
+                self._reply(200, {"id": installation, "account": match["owner"]})
+            return
+
+        match = WORKFLOWS_PATH.match(url.path)
+        if not match or self.server.is_missing(match["owner"], match["repo"]):
+            self._reply(404, {"message": "Not Found"})
+            return
+
+        workflows = self.server.workflows.get(
+            (match["owner"], match["repo"]), self.server.default_workflows
+        )
+        per_page = min(int(query.get("per_page", ["30"])[0]), 100)
+        page = int(query.get("page", ["1"])[0])
+        body = {
+            "total_count": len(workflows),
+            "workflows": workflows[(page - 1) * per_page : page * per_page],
+        }
+        etag = '"' + hashlib.sha1(json.dumps(body).encode()).hexdigest() + '"'  # nosec
+        if self.headers.get("If-None-Match") == etag:
+            with self.server.lock:
+                self.server.not_modified += 1
+            self._reply(304, headers={"ETag": etag})
+            return
+
+        self._reply(200, body, headers={"ETag": etag})
+
+    def do_POST(self) -> None:
+        """Record a workflow dispatch or mint an installation token."""
+        length = int(self.headers.get("Content-Length", 0))
+        data = json.loads(self.rfile.read(length) or b"{}")
+        if self._record("POST"):
+            return
+        match = ACCESS_TOKENS_PATH.match(self.path)
+        if match:
+            with self.server.lock:
+                token = f"ghs_{match['id']}_{len(self.server.app_tokens)}"
+                self.server.app_tokens.append(token)
+            expires = time.gmtime(time.time() + self.server.app_token_lifetime)
+            self._reply(
+                201,
+                {
+                    "token": token,
+                    "expires_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", expires),
+                },
+            )
+            return
+
+        match = DISPATCH_PATH.match(self.path)
+        if not match or self.server.is_missing(match["owner"], match["repo"]):
+            self._reply(404, {"message": "Not Found"})
+            return
+
+        with self.server.lock:
+            failing = self.server.dispatch_failures > 0
+            if failing:
+                self.server.dispatch_failures -= 1
+        if failing:
+            self._reply(self.server.failure_status, {"message": "Server Error"})
+            return
+
+        with self.server.lock:
+            self.server.dispatches.append(
+                {
+                    "owner": match["owner"],
+                    "repository": match["repo"],
+                    "workflow_id": match["workflow"],
+                    "ref": data.get("ref"),
+                    "inputs": data.get("inputs", {}),
+                }
+            )
+        self._reply(204)
+
+
+class FakeGitHub(ThreadingHTTPServer):
+    """
+    HTTP/1.1 keep-alive server mimicking the GitHub Actions API.
+
+    Every repository lists default_workflows unless overridden in workflows,
+    repositories named in missing, by name or owner/name, answer 404.
+    Workflow listings carry an ETag and answer 304 to a matching
+    If-None-Match. Setting rate_limit_remaining
+    adds the X-RateLimit headers and refuses requests with a 403 once it
+    reaches 0, token_limits does the same for the requests of each token in
+    it. The next throttled requests are refused with a 429 and a Retry-After
+    of retry_after seconds, as are POST requests beyond write_limit (count,
+    seconds) in a sliding window. Owners in installations (owner: id) have
+    the GitHub App installed, which mints installation tokens valid for
+    app_token_lifetime seconds, owners in users are user accounts rather
+    than organizations. The next dispatch_failures dispatches fail with
+    failure_status. Accepted connections, requests, the tokens used, 304 and
+    rate limit responses, dispatches and minted installation tokens are
+    recorded so callers can measure client behaviour.
+    """
+
+    daemon_threads = True
+    request_queue_size = socket.SOMAXCONN
+
+    def __init__(
+        self,
+        default_workflows: Optional[List[dict]] = None,
+        latency: float = 0.0,
+        address: Tuple[str, int] = ("127.0.0.1", 0),
+    ):
+        """
+        Create the server, listening on an ephemeral port by default.
+
+        Args:
+            default_workflows (Optional[List[dict]]): workflows every repository has
+            latency (float): seconds to sleep before answering each request
+            address (Tuple[str, int]): address to listen on
+        """
+        super().__init__(address, FakeGitHubHandler)
+        self.default_workflows = default_workflows or []
+        self.workflows: Dict[Tuple[str, str], List[dict]] = {}
+        self.missing: Set[str] = set()
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.not_modified = 0
+        self.rate_limited = 0
+        self.rate_limit_remaining: Optional[int] = None
+        self.token_limits: Dict[Optional[str], int] = {}
+        self.tokens_used: List[Optional[str]] = []
+        self.rate_limit_reset = time.time() + 3600
+        self.throttled = 0
+        self.retry_after = 1
+        self.write_limit: Optional[Tuple[int, float]] = None
+        self.writes: Deque[float] = collections.deque()
+        self.request_log: List[Tuple[str, str]] = []
+        self.dispatches: List[dict] = []
+        self.dispatch_failures = 0
+        self.failure_status = 502
+        self.installations: Dict[str, int] = {}
+        self.users: Set[str] = set()
+        self.app_token_lifetime = 3600
+        self.app_tokens: List[str] = []
+        self.open_sockets: Set[socket.socket] = set()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL to configure as the GitHub API URL."""
+        return f"http://{self.server_address[0]!s}:{self.server_address[1]}"
+
+    def is_missing(self, owner: str, repository: str) -> bool:
+        """Tell if a repository answers 404."""
+        return repository in self.missing or f"{owner}/{repository}" in self.missing
+
+    def reset_counters(self) -> None:
+        """Forget recorded connections, requests and dispatches."""
+        with self.lock:
+            self.connections = 0
+            self.requests = 0
+            self.not_modified = 0
+            self.rate_limited = 0
+            self.request_log = []
+            self.tokens_used = []
+            self.dispatches = []
+
+    def drop_connections(self) -> None:
+        """Close every open connection, like a server timing out idle ones."""
+        with self.lock:
+            open_sockets = list(self.open_sockets)
+        for open_socket in open_sockets:
+            try:
+                open_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def start(self) -> "FakeGitHub":
+        """Serve from a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the listening socket."""
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeGitHub":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
@@ -9,15 +9,1237 @@
 ##############################################################################
 """Github connection module."""
 
-from typing import Any, Dict, List
+import asyncio
+import base64
+import concurrent.futures
+import datetime
+import fcntl
+import hashlib
+import http.client
+import json
+import math
+import os
+import re
+import select
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
-from fastcore.net import HTTP404NotFoundError  # type: ignore
-from ghapi.all import GhApi  # type: ignore
+from gerrit_to_platform.cache import (
+    ResponseCache,
+    get_app_token_cache,
+    get_workflow_cache,
+)
+from gerrit_to_platform.config import get_settings
+from gerrit_to_platform.metrics import WORKFLOW_CACHE
+from gerrit_to_platform.profiling import profile_thread, profiled_call, record_api_call
 
-from gerrit_to_platform.config import get_setting
+# CONSTANTS
+API_VERSION = "2022-11-28"
+USER_AGENT = "gerrit-to-platform"
 
+# Largest page size the GitHub API accepts
+PER_PAGE = 100
 
-def dispatch_workflow(
+# Idle keep-alive connections kept per client
+POOL_SIZE = 8
+
+# Requests sent at once by the clients of the process, each blocks a worker
+# thread
+MAX_REQUESTS = 32
+
+# Seconds to wait on a single API request
+REQUEST_TIMEOUT = 30
+
+# Methods without side effects, replayed when a kept alive connection fails
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+
+# Workflow indexes kept in memory by long running processes
+INDEX_SIZE = 256
+
+# Times a rate limited request is sent again once the limit allows it
+RATE_LIMIT_RETRIES = 3
+
+# Seconds to pause after a secondary rate limit response without Retry-After
+SECONDARY_LIMIT_BACKOFF = 60
+
+# Seconds a GitHub App JWT is valid, GitHub accepts at most 10 minutes
+APP_JWT_LIFETIME = 540
+
+# Seconds before its expiry an installation token is replaced
+APP_TOKEN_REFRESH_MARGIN = 300
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+_OWNER_PATH = re.compile(r"^/(?:repos|orgs|users)/([^/]+)")
+
+T = TypeVar("T")
+
+
+class GitHubError(Exception):
+    """Error response from the GitHub API."""
+
+    def __init__(self, status: int, reason: str, body: Any = None):
+        """
+        Create the error.
+
+        Args:
+            status (int): HTTP status code
+            reason (str): HTTP reason phrase
+            body (Any): decoded response body, if any
+        """
+        super().__init__(f"HTTP {status} {reason}")
+        self.status = status
+        self.reason = reason
+        self.body = body
+
+    @property
+    def retryable(self) -> bool:
+        """Indicate if the same request may succeed later."""
+        return self.status in (408, 429) or self.status >= 500
+
+
+class GitHubNotFoundError(GitHubError):
+    """The requested GitHub resource does not exist."""
+
+
+class GitHubRateLimitError(GitHubError):
+    """The request was refused, or would wait too long, for rate limits."""
+
+    @property
+    def retryable(self) -> bool:
+        """Rate limited requests succeed once the budget is back."""
+        return True
+
+
+def _decode_body(
+    status: int, reason: str, headers: Dict[str, str], payload: bytes
+) -> Any:
+    """
+    Decode the JSON body of a response.
+
+    Raises:
+        GitHubError: the body is not JSON, eg: the HTML page of a proxy or of
+            a 502 Bad Gateway, the error keeps the status of the response
+    """
+    if not payload:
+        return None
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "application/json" or content_type.endswith("+json"):
+        try:
+            return json.loads(payload)
+        except ValueError:
+            pass
+    raise GitHubError(status, reason, payload.decode("utf-8", "replace"))
+
+
+def _rate_limited(status: int, headers: Dict[str, str], body: Any) -> bool:
+    """Indicate if a response is a primary or secondary rate limit refusal."""
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+
+    message = body.get("message", "") if isinstance(body, dict) else ""
+    return (
+        "retry-after" in headers
+        or headers.get("x-ratelimit-remaining") == "0"
+        or "rate limit" in str(message).lower()
+    )
+
+
+class RateLimiter:
+    """
+    Pace GitHub API requests within the rate limits, across processes.
+
+    The primary limit is followed from the X-RateLimit-Remaining and
+    X-RateLimit-Reset headers of every response, content-creating requests
+    such as workflow dispatches are paced by a token bucket to stay under the
+    secondary limits and a rate limit response pauses every request until
+    its Retry-After. The state lives in a file under an exclusive lock so all
+    the hook processes using a token draw from one budget and back off
+    together instead of each retrying on its own.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        write_rate: float,
+        write_burst: int,
+        max_wait: float,
+    ):
+        """
+        Create the limiter.
+
+        Args:
+            path (Optional[str]): state file shared by the processes, None
+                keeps the state in this process
+            write_rate (float): content-creating requests per minute, 0 does
+                not pace them
+            write_burst (int): content-creating requests sent at once
+            max_wait (float): seconds a request may wait for the budget
+        """
+        self.path = path
+        self.write_rate = write_rate
+        self.write_burst = max(write_burst, 1)
+        self.max_wait = max_wait
+        # the state last read from path, or the state itself without a path
+        self._state: Dict[str, float] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _update(self, function: Callable[[Dict[str, float], float], T]) -> T:
+        """
+        Apply function to the shared state and the current time.
+
+        The state file is read and, only if function changed the state,
+        rewritten under a single exclusive lock.
+        """
+        with self._lock:
+            now = time.time()
+            if self.path is None:
+                return function(self._state, now)
+
+            try:
+                os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+                handle = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            except OSError:
+                return function(self._state, now)
+
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                with os.fdopen(handle, "r+", closefd=False) as state_file:
+                    try:
+                        state = json.load(state_file)
+                    except ValueError:
+                        state = {}
+                    original = dict(state)
+                    result = function(state, now)
+                    if state != original:
+                        state_file.seek(0)
+                        state_file.truncate()
+                        json.dump(state, state_file)
+            finally:
+                # closing the file releases the lock
+                os.close(handle)
+            self._state = state
+            self._loaded = True
+            return result
+
+    def budget(self) -> Tuple[float, float]:
+        """
+        Get the state of the budget without reserving anything.
+
+        The budget is the state this process last read or wrote, updated by
+        every acquire and record, the state file is only read when there is
+        none yet.
+
+        Returns:
+            Tuple[float, float]: seconds before a request may be sent and the
+                requests remaining until the reset, infinite when unknown
+        """
+
+        def peek(state: Dict[str, float], now: float) -> Tuple[float, float]:
+            wait = max(state.get("blocked_until", 0.0) - now, 0.0)
+            if state.get("reset", 0.0) <= now or "remaining" not in state:
+                return wait, math.inf
+            if state["remaining"] <= 0:
+                wait = max(wait, state["reset"] - now)
+            return wait, state["remaining"]
+
+        with self._lock:
+            if self._loaded or self.path is None:
+                return peek(self._state, time.time())
+        return self._update(peek)
+
+    def acquire(self, write: bool) -> float:
+        """
+        Reserve a request in the shared budget.
+
+        Args:
+            write (bool): if the request creates content, eg: a dispatch
+
+        Returns:
+            float: seconds to wait before sending the request
+
+        Raises:
+            GitHubRateLimitError: the budget allows the request only after
+                more than max_wait seconds
+        """
+
+        def reserve(state: Dict[str, float], now: float) -> float:
+            wait = max(state.get("blocked_until", 0.0) - now, 0.0)
+            if state.get("reset", 0.0) <= now:
+                state.pop("remaining", None)
+            elif state.get("remaining", 1) <= 0:
+                wait = max(wait, state["reset"] - now)
+
+            tokens = None
+            if write and self.write_rate > 0:
+                rate = self.write_rate / 60
+                tokens = (
+                    min(
+                        state.get("tokens", self.write_burst)
+                        + (now - state.get("updated", now)) * rate,
+                        self.write_burst,
+                    )
+                    - 1
+                )
+                wait = max(wait, -tokens / rate)
+
+            if wait > self.max_wait:
+                return wait
+
+            if tokens is not None:
+                state["tokens"] = tokens
+                state["updated"] = now
+            if "remaining" in state:
+                state["remaining"] -= 1
+            return wait
+
+        wait = self._update(reserve)
+        if wait > self.max_wait:
+            raise GitHubRateLimitError(
+                429, f"Rate limited for another {wait:.0f} seconds"
+            )
+        return wait
+
+    def record(self, headers: Dict[str, str], limited: bool) -> None:
+        """
+        Record the rate limit state of a response.
+
+        Args:
+            headers (Dict[str, str]): lower cased response headers
+            limited (bool): if the response is a rate limit refusal
+        """
+        if not limited and "x-ratelimit-remaining" not in headers:
+            # nothing to record, leave the state file alone
+            return
+
+        def update(state: Dict[str, float], now: float) -> None:
+            try:
+                state["remaining"] = int(headers["x-ratelimit-remaining"])
+                state["reset"] = float(headers["x-ratelimit-reset"])
+            except (KeyError, ValueError):
+                pass
+
+            if not limited:
+                return
+
+            try:
+                until = now + float(headers["retry-after"])
+            except (KeyError, ValueError):
+                if state.get("remaining") == 0 and state.get("reset", 0.0) > now:
+                    until = state["reset"]
+                else:
+                    until = now + SECONDARY_LIMIT_BACKOFF
+            state["blocked_until"] = max(state.get("blocked_until", 0.0), until)
+
+        self._update(update)
+
+
+_EXECUTOR: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _request_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """Get the worker threads sending the requests of every client."""
+    global _EXECUTOR
+
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+                MAX_REQUESTS, thread_name_prefix="github-request"
+            )
+        return _EXECUTOR
+
+
+def _https_proxy(host: str) -> Optional[urllib.parse.SplitResult]:
+    """Get the HTTPS_PROXY of the environment for host, None if NO_PROXY."""
+    # only needed when connecting, keeps urllib.request off the hook startup
+    import urllib.request
+
+    proxy = urllib.request.getproxies().get("https")
+    if not proxy or urllib.request.proxy_bypass(host):
+        return None
+    if "//" not in proxy:
+        proxy = "http://" + proxy
+    return urllib.parse.urlsplit(proxy)
+
+
+def _proxy_headers(proxy: urllib.parse.SplitResult) -> Dict[str, str]:
+    """Get the CONNECT headers authenticating to the proxy, if it has a user."""
+    if not proxy.username:
+        return {}
+    credentials = ":".join(
+        urllib.parse.unquote(part or "") for part in (proxy.username, proxy.password)
+    )
+    return {
+        "Proxy-Authorization": "Basic "
+        + base64.b64encode(credentials.encode()).decode()
+    }
+
+
+def _is_dropped(connection: http.client.HTTPConnection) -> bool:
+    """Indicate if the server closed an idle connection."""
+    if connection.sock is None:
+        # closed on our side, http.client reconnects it
+        return False
+    # an idle connection is only readable once the server closed it
+    readable, _, _ = select.select([connection.sock], [], [], 0)
+    return bool(readable)
+
+
+class TokenPool:
+    """
+    GitHub tokens a client rotates between, each with its own budget.
+
+    Every request uses the token of its owner, or of the shared tokens, that
+    can be used soonest and has the most requests remaining, so exhausting
+    one token moves the following requests to the others. The budgets are the
+    states the rate limiters last read, a token is chosen and reserved under
+    one lock so concurrent requests see each other's reservations.
+    """
+
+    def __init__(
+        self,
+        tokens: Dict[str, Optional[RateLimiter]],
+        owner_tokens: Optional[Dict[str, Dict[str, Optional[RateLimiter]]]] = None,
+    ):
+        """
+        Create the pool.
+
+        Args:
+            tokens (Dict[str, Optional[RateLimiter]]): the shared tokens and
+                the rate limiter tracking each one, in order of preference
+            owner_tokens (Optional[Dict[str, Dict[str, Optional[RateLimiter]]]]):
+                tokens used instead of the shared ones for an owner, keyed by
+                lower cased owner
+        """
+        self.tokens = tokens
+        self.owner_tokens = owner_tokens or {}
+        self._lock = threading.Lock()
+
+    def choose(
+        self, owner: Optional[str] = None
+    ) -> Tuple[Optional[str], Optional[RateLimiter]]:
+        """
+        Choose the token of a request.
+
+        Args:
+            owner (Optional[str]): owner the request is about, if any
+
+        Returns:
+            Tuple[Optional[str], Optional[RateLimiter]]: the token and its
+                rate limiter, None when the pool has no token
+        """
+        candidates = self.tokens
+        if owner is not None:
+            candidates = self.owner_tokens.get(owner.lower(), self.tokens)
+        if not candidates:
+            return None, None
+
+        if len(candidates) == 1:
+            return next(iter(candidates.items()))
+
+        def budget(token: str) -> Tuple[float, float]:
+            limiter = candidates[token]
+            if limiter is None:
+                return 0.0, -math.inf
+            wait, remaining = limiter.budget()
+            return wait, -remaining
+
+        token = min(candidates, key=budget)
+        return token, candidates[token]
+
+    def acquire(
+        self, owner: Optional[str], write: bool
+    ) -> Tuple[Optional[str], Optional[RateLimiter], float]:
+        """
+        Choose the token of a request and reserve the request in its budget.
+
+        Args:
+            owner (Optional[str]): owner the request is about, if any
+            write (bool): if the request creates content, eg: a dispatch
+
+        Returns:
+            Tuple[Optional[str], Optional[RateLimiter], float]: the token, its
+                rate limiter and the seconds to wait before sending the
+                request
+
+        Raises:
+            GitHubRateLimitError: the chosen token allows the request only
+                after more than max_wait seconds
+        """
+        with self._lock:
+            token, limiter = self.choose(owner)
+            if limiter is None:
+                return token, None, 0.0
+            return token, limiter, limiter.acquire(write)
+
+
+def _app_jwt(app_id: str, private_key: str, now: float) -> str:
+    """
+    Sign the JWT authenticating as a GitHub App.
+
+    Args:
+        app_id (str): the App ID
+        private_key (str): PEM encoded private key of the App
+        now (float): the current time
+
+    Returns:
+        str: the encoded JWT
+
+    Raises:
+        ImportError: PyJWT with its crypto extra is not installed
+    """
+    try:
+        import jwt  # type: ignore
+    except ImportError as error:
+        raise ImportError(
+            "GitHub App authentication requires PyJWT with cryptography, "
+            + "install gerrit-to-platform[github-app]"
+        ) from error
+
+    payload = {
+        # allow for clock drift between this host and GitHub
+        "iat": int(now) - 60,
+        "exp": int(now) + APP_JWT_LIFETIME,
+        "iss": app_id,
+    }
+    return jwt.encode(payload, private_key, algorithm="RS256")
+
+
+class GitHubApp:
+    """
+    GitHub App credentials minting an installation token per owner.
+
+    Installation tokens are kept in memory and in the on-disk token cache
+    until shortly before they expire, so hook processes only sign a JWT and
+    exchange it for a token about once an hour per owner. The rate limit of
+    each installation is tracked by its own rate limiter.
+    """
+
+    def __init__(
+        self,
+        app_id: str,
+        private_key: str,
+        cache: Optional[ResponseCache] = None,
+        limiter_factory: Optional[Callable[[str], Optional[RateLimiter]]] = None,
+    ):
+        """
+        Create the credentials.
+
+        Args:
+            app_id (str): the App ID
+            private_key (str): PEM encoded private key of the App
+            cache (Optional[ResponseCache]): cache of installation tokens
+                shared by the processes
+            limiter_factory (Optional[Callable[[str], Optional[RateLimiter]]]):
+                makes the rate limiter of an owner's installation
+        """
+        self.app_id = app_id
+        self.private_key = private_key
+        self.cache = cache
+        self.limiter_factory = limiter_factory
+        self._jwt: Tuple[str, float] = ("", 0.0)
+        self._tokens: Dict[str, Tuple[str, float]] = {}
+        self._limiters: Dict[str, Optional[RateLimiter]] = {}
+        self._lock = threading.Lock()
+
+    def jwt(self) -> str:
+        """Get a JWT authenticating as the App, signed again near expiry."""
+        now = time.time()
+        with self._lock:
+            token, expires = self._jwt
+            if expires - 60 > now:
+                return token
+
+        token = _app_jwt(self.app_id, self.private_key, now)
+        with self._lock:
+            self._jwt = (token, now + APP_JWT_LIFETIME)
+        return token
+
+    def rate_limiter(self, owner: str) -> Optional[RateLimiter]:
+        """Get the rate limiter of the installation of an owner."""
+        owner = owner.lower()
+        with self._lock:
+            if owner not in self._limiters:
+                self._limiters[owner] = (
+                    self.limiter_factory(owner) if self.limiter_factory else None
+                )
+            return self._limiters[owner]
+
+    async def installation_token(self, client: "AsyncGitHubClient", owner: str) -> str:
+        """
+        Get an installation token of the App for an owner.
+
+        Args:
+            client (AsyncGitHubClient): client making the token requests
+            owner (str): GitHub owner (entity or organization)
+
+        Returns:
+            str: a token valid for at least APP_TOKEN_REFRESH_MARGIN seconds
+
+        Raises:
+            GitHubNotFoundError: the App is not installed for the owner
+        """
+        owner = owner.lower()
+        key = f"{client.api_url}/app/{self.app_id}/installation/{owner}"
+        now = time.time()
+        with self._lock:
+            token, expires = self._tokens.get(owner, ("", 0.0))
+        if expires - APP_TOKEN_REFRESH_MARGIN > now:
+            return token
+
+        # the caches are files, read and written off the event loop
+        entry = (
+            await asyncio.to_thread(self.cache.get, key)
+            if self.cache is not None
+            else None
+        )
+        if (
+            entry is not None
+            and entry["data"]["expires"] - APP_TOKEN_REFRESH_MARGIN > now
+        ):
+            token, expires = entry["data"]["token"], entry["data"]["expires"]
+        else:
+            authorization = {"Authorization": f"Bearer {self.jwt()}"}
+            try:
+                _, _, installation = await client.request(
+                    "GET", f"/orgs/{owner}/installation", headers=authorization
+                )
+            except GitHubNotFoundError:
+                _, _, installation = await client.request(
+                    "GET", f"/users/{owner}/installation", headers=authorization
+                )
+            _, _, response = await client.request(
+                "POST",
+                f"/app/installations/{installation['id']}/access_tokens",
+                headers=authorization,
+            )
+            token = response["token"]
+            expires = (
+                datetime.datetime.strptime(response["expires_at"], "%Y-%m-%dT%H:%M:%SZ")
+                .replace(tzinfo=datetime.timezone.utc)
+                .timestamp()
+            )
+            if self.cache is not None:
+                await asyncio.to_thread(
+                    self.cache.put, key, "", {"token": token, "expires": expires}
+                )
+
+        with self._lock:
+            self._tokens[owner] = (token, expires)
+        return token
+
+
+class AsyncGitHubClient:
+    """
+    Asynchronous GitHub REST API client with a pool of keep-alive connections.
+
+    One client is shared by workflow discovery and dispatch for the life of
+    the process (or daemon) so consecutive API calls reuse the same HTTPS
+    connection instead of each opening a new one. Requests are sent with
+    http.client from worker threads, so the client can be shared between
+    event loops and threads. HTTPS connections are tunnelled through the
+    HTTPS_PROXY of the environment, unless the host is in NO_PROXY.
+    """
+
+    def __init__(
+        self,
+        token: Optional[str],
+        api_url: str,
+        pool_size: int = POOL_SIZE,
+        rate_limiter: Optional[RateLimiter] = None,
+        token_pool: Optional[TokenPool] = None,
+        app: Optional[GitHubApp] = None,
+    ):
+        """
+        Create the client.
+
+        Args:
+            token (Optional[str]): token used to authenticate requests
+            api_url (str): base URL of the API eg: https://api.github.com
+            pool_size (int): idle connections kept for reuse
+            rate_limiter (Optional[RateLimiter]): paces the requests, and
+                retries rate limited ones, when given
+            token_pool (Optional[TokenPool]): tokens to rotate between, with
+                their rate limiters, used instead of token and rate_limiter
+            app (Optional[GitHubApp]): App whose installation tokens are
+                used for the requests about an owner without its own tokens
+                in the token pool
+        """
+        url = urllib.parse.urlsplit(api_url)
+        self.token = token
+        self.api_url = api_url
+        self.pool_size = pool_size
+        self.rate_limiter = rate_limiter
+        self.token_pool = token_pool
+        self.app = app
+        self._not_installed: Set[str] = set()
+        self.connections_opened = 0
+        self._ssl = url.scheme != "http"
+        self._host = url.hostname or ""
+        self._port = url.port or (443 if self._ssl else 80)
+        self._base_path = url.path.rstrip("/")
+        self._ssl_context = ssl.create_default_context() if self._ssl else None
+        self._proxy = _https_proxy(self._host) if self._ssl else None
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def _connection(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """Get an idle pooled connection, or a new one, and if it was reused."""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    self.connections_opened += 1
+                    break
+                connection = self._idle.pop()
+            if not _is_dropped(connection):
+                return connection, True
+            connection.close()
+
+        host, port = self._host, self._port
+        if self._proxy is not None:
+            host, port = self._proxy.hostname or "", self._proxy.port or 80
+        if self._ssl:
+            connection = http.client.HTTPSConnection(
+                host, port, timeout=REQUEST_TIMEOUT, context=self._ssl_context
+            )
+        else:
+            connection = http.client.HTTPConnection(host, port, timeout=REQUEST_TIMEOUT)
+        if self._proxy is not None:
+            connection.set_tunnel(
+                self._host, self._port, headers=_proxy_headers(self._proxy)
+            )
+        return connection, False
+
+    def _release(self, connection: http.client.HTTPConnection) -> None:
+        """Return a connection to the pool, closing it if the pool is full."""
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close(self) -> None:
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def _exchange(
+        self, verb: str, url: str, headers: Dict[str, str], body: Optional[bytes]
+    ) -> Tuple[int, str, Dict[str, str], bytes]:
+        """
+        Send one request on a pooled connection and read its response.
+
+        Returns:
+            Tuple[int, str, Dict[str, str], bytes]: status, reason, lower cased
+                headers and body
+        """
+        while True:
+            connection, reused = self._connection()
+            try:
+                connection.request(verb, url, body=body, headers=headers)
+                response = connection.getresponse()
+                payload = response.read()
+            except socket.timeout as e:
+                connection.close()
+                # not a TimeoutError before Python 3.10
+                raise TimeoutError(
+                    f"No response to the {verb} request in {REQUEST_TIMEOUT} s"
+                ) from e
+            except (ConnectionError, http.client.HTTPException) as e:
+                connection.close()
+                if not reused:
+                    if isinstance(e, ConnectionError):
+                        raise
+                    # eg: IncompleteRead, not an OSError so the retry queue
+                    # would take it for a permanent failure
+                    raise ConnectionResetError(
+                        f"Incomplete response to the {verb} request: {e!r}"
+                    ) from e
+                # The server closed a keep-alive connection, the request
+                # most likely never reached it. Only requests without side
+                # effects are sent again, a dispatch the server did receive
+                # would start its workflow twice.
+                if verb in IDEMPOTENT_METHODS:
+                    continue
+                raise ConnectionResetError(
+                    f"Connection lost during the {verb} request, not replayed"
+                ) from e
+            except BaseException:
+                connection.close()
+                raise
+            break
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+
+        response_headers = {
+            name.lower(): value for name, value in response.getheaders()
+        }
+        return response.status, response.reason, response_headers, payload
+
+    async def _send(
+        self, verb: str, url: str, headers: Dict[str, str], body: Optional[bytes]
+    ) -> Tuple[int, str, Dict[str, str], bytes]:
+        """Send one request, see _exchange, from a worker thread."""
+        return await asyncio.get_running_loop().run_in_executor(
+            _request_executor(), profiled_call, self._exchange, verb, url, headers, body
+        )
+
+    @staticmethod
+    async def _reserve(
+        token: Optional[str], rate_limiter: Optional[RateLimiter], write: bool
+    ) -> Tuple[Optional[str], Optional[RateLimiter], float]:
+        """Reserve a request of token in the budget of its rate limiter."""
+        if rate_limiter is None:
+            return token, None, 0.0
+        # the limiter state is a locked file, kept off the loop
+        return token, rate_limiter, await asyncio.to_thread(rate_limiter.acquire, write)
+
+    async def _credentials(
+        self, path: str, write: bool
+    ) -> Tuple[Optional[str], Optional[RateLimiter], float]:
+        """
+        Choose the token and rate limiter of a request to path.
+
+        Returns:
+            Tuple[Optional[str], Optional[RateLimiter], float]: the token, its
+                rate limiter and the seconds to wait before sending the
+                request, which is reserved in the budget of the token
+        """
+        match = _OWNER_PATH.match(path)
+        owner = match.group(1) if match else None
+
+        if (
+            self.app is not None
+            and owner is not None
+            and owner.lower() not in self._not_installed
+            and (
+                self.token_pool is None
+                or owner.lower() not in self.token_pool.owner_tokens
+            )
+        ):
+            try:
+                token = await self.app.installation_token(self, owner)
+            except GitHubNotFoundError:
+                if self.token_pool is None or not self.token_pool.tokens:
+                    raise
+                # not installed for this owner, use the configured tokens
+                self._not_installed.add(owner.lower())
+            else:
+                return await self._reserve(token, self.app.rate_limiter(owner), write)
+
+        if self.token_pool is None:
+            return await self._reserve(self.token, self.rate_limiter, write)
+
+        return await asyncio.to_thread(self.token_pool.acquire, owner, write)
+
+    async def request(
+        self,
+        verb: str,
+        path: str,
+        query: Optional[Dict[str, Any]] = None,
+        data: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Tuple[int, Dict[str, str], Any]:
+        """
+        Make an API request.
+
+        Args:
+            verb (str): HTTP method
+            path (str): API path eg: /repos/{owner}/{repo}/actions/workflows
+            query (Optional[Dict[str, Any]]): query string parameters
+            data (Optional[Any]): JSON serializable request body
+            headers (Optional[Dict[str, str]]): extra request headers
+
+        Returns:
+            Tuple[int, Dict[str, str], Any]: status, lower cased response
+                headers and decoded JSON body (None when empty)
+
+        Raises:
+            GitHubNotFoundError: the resource does not exist
+            GitHubRateLimitError: the request was still rate limited after
+                RATE_LIMIT_RETRIES retries, or the rate limiter would wait
+                too long to send it
+            GitHubError: any other error response, or a response whose body
+                is not JSON
+        """
+        url = self._base_path + path
+        if query:
+            url += "?" + urllib.parse.urlencode(query)
+
+        request_headers = {
+            "Accept": "application/vnd.github+json",
+            "User-Agent": USER_AGENT,
+            "X-GitHub-Api-Version": API_VERSION,
+        }
+        if headers:
+            request_headers.update(headers)
+
+        body = None
+        if data is not None:
+            body = json.dumps(data).encode()
+            request_headers["Content-Type"] = "application/json"
+
+        retries = 0
+        status = 0
+        start = time.perf_counter()
+        try:
+            while True:
+                if "Authorization" in request_headers:
+                    # already authenticated, eg: as a GitHub App
+                    token, rate_limiter, wait = None, None, 0.0
+                else:
+                    token, rate_limiter, wait = await self._credentials(
+                        path, verb not in ("GET", "HEAD")
+                    )
+                if wait > 0:
+                    await asyncio.sleep(wait)
+
+                send_headers = request_headers
+                if token:
+                    send_headers = dict(request_headers)
+                    send_headers["Authorization"] = f"Bearer {token}"
+                status, reason, response_headers, payload = await self._send(
+                    verb, url, send_headers, body
+                )
+                decoded = _decode_body(status, reason, response_headers, payload)
+                limited = _rate_limited(status, response_headers, decoded)
+                if rate_limiter is None:
+                    break
+
+                await asyncio.to_thread(rate_limiter.record, response_headers, limited)
+                if not limited or retries >= RATE_LIMIT_RETRIES:
+                    break
+                retries += 1
+        finally:
+            record_api_call(verb, path, status, start)
+
+        if status == 404:
+            raise GitHubNotFoundError(status, reason, decoded)
+        if limited:
+            raise GitHubRateLimitError(status, reason, decoded)
+        if status >= 400:
+            raise GitHubError(status, reason, decoded)
+
+        return status, response_headers, decoded
+
+    async def list_repo_workflows(
+        self,
+        owner: str,
+        repository: str,
+        page: int = 1,
+        per_page: int = PER_PAGE,
+        etag: Optional[str] = None,
+    ) -> Tuple[int, Dict[str, str], Any]:
+        """
+        List one page of the workflows of a repository.
+
+        Args:
+            owner (str): GitHub owner (entity or organization)
+            repository (str): target repository
+            page (int): page number, starting at 1
+            per_page (int): workflows per page, at most 100
+            etag (Optional[str]): ETag of a cached copy of the page, the
+                response is a 304 without body if it is unchanged
+
+        Returns:
+            Tuple[int, Dict[str, str], Any]: status, headers and the API
+                response with the total_count and the page of workflows
+        """
+        return await self.request(
+            "GET",
+            f"/repos/{owner}/{repository}/actions/workflows",
+            query={"per_page": per_page, "page": page},
+            headers={"If-None-Match": etag} if etag else None,
+        )
+
+    async def create_workflow_dispatch(
+        self,
+        owner: str,
+        repository: str,
+        workflow_id: str,
+        ref: str,
+        inputs: Dict[str, str],
+    ) -> Any:
+        """
+        Trigger a workflow_dispatch event.
+
+        Args:
+            owner (str): GitHub owner (entity or organization)
+            repository (str): target repository
+            workflow_id (str): ID of the workflow to trigger
+            ref (str): the commit ref to trigger with
+            inputs (Dict[str, str]): the workflow inputs
+
+        Returns:
+            Any: the decoded response body, None for GitHub's empty reply
+        """
+        _, _, response = await self.request(
+            "POST",
+            f"/repos/{owner}/{repository}/actions/workflows/{workflow_id}/dispatches",
+            data={"ref": ref, "inputs": inputs},
+        )
+        return response
+
+
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_LOOP_LOCK = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Get the event loop that runs the synchronous API calls."""
+    global _LOOP
+
+    with _LOOP_LOCK:
+        if _LOOP is None or _LOOP.is_closed():
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(
+                target=_LOOP.run_forever, name="github-io", daemon=True
+            ).start()
+        return _LOOP
+
+
+def run_sync(awaitable: Awaitable[T]) -> T:
+    """
+    Run a coroutine on the background event loop and wait for its result.
+
+    Args:
+        awaitable (Awaitable[T]): the coroutine to run
+
+    Returns:
+        T: the result of the coroutine
+
+    Raises:
+        RuntimeError: called from a coroutine of the background loop, which
+            would wait forever on itself, use the async API there instead
+    """
+    loop = _background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise RuntimeError(
+            "run_sync called from the background event loop, await the coroutine"
+        )
+
+    return asyncio.run_coroutine_threadsafe(_profiled(awaitable), loop).result()
+
+
+async def _profiled(awaitable: Awaitable[T]) -> T:
+    """Await in profile_thread, the loop thread is not otherwise profiled."""
+    with profile_thread():
+        return await awaitable
+
+
+class GitHubClient:
+    """
+    Blocking facade over AsyncGitHubClient.
+
+    Requests run on a shared background event loop so the blocking API and
+    the asynchronous one share the same keep-alive connection pool. It is
+    safe to use from several threads.
+    """
+
+    def __init__(
+        self,
+        token: Optional[str],
+        api_url: str,
+        pool_size: int = POOL_SIZE,
+        rate_limiter: Optional[RateLimiter] = None,
+        token_pool: Optional[TokenPool] = None,
+        app: Optional[GitHubApp] = None,
+    ):
+        """
+        Create the client.
+
+        Args:
+            token (Optional[str]): token used to authenticate requests
+            api_url (str): base URL of the API eg: https://api.github.com
+            pool_size (int): idle connections kept for reuse
+            rate_limiter (Optional[RateLimiter]): paces the requests, and
+                retries rate limited ones, when given
+            token_pool (Optional[TokenPool]): tokens to rotate between, with
+                their rate limiters, used instead of token and rate_limiter
+            app (Optional[GitHubApp]): App whose installation tokens are
+                used for the requests about an owner without its own tokens
+        """
+        self.async_client = AsyncGitHubClient(
+            token, api_url, pool_size, rate_limiter, token_pool, app
+        )
+
+    @property
+    def token(self) -> Optional[str]:
+        """Token used to authenticate requests."""
+        return self.async_client.token
+
+    @property
+    def api_url(self) -> str:
+        """Base URL of the API."""
+        return self.async_client.api_url
+
+    @property
+    def connections_opened(self) -> int:
+        """Connections opened since the client was created."""
+        return self.async_client.connections_opened
+
+    def close(self) -> None:
+        """Close all idle connections."""
+        self.async_client.close()
+
+    def request(self, *args: Any, **kwargs: Any) -> Tuple[int, Dict[str, str], Any]:
+        """Make an API request, see AsyncGitHubClient.request."""
+        return run_sync(self.async_client.request(*args, **kwargs))
+
+    def list_repo_workflows(
+        self, *args: Any, **kwargs: Any
+    ) -> Tuple[int, Dict[str, str], Any]:
+        """List one page of workflows, see AsyncGitHubClient.list_repo_workflows."""
+        return run_sync(self.async_client.list_repo_workflows(*args, **kwargs))
+
+    def create_workflow_dispatch(self, *args: Any, **kwargs: Any) -> Any:
+        """Trigger a workflow, see AsyncGitHubClient.create_workflow_dispatch."""
+        return run_sync(self.async_client.create_workflow_dispatch(*args, **kwargs))
+
+
+_CLIENT: Optional[GitHubClient] = None
+_CLIENT_OPTIONS: Tuple[Any, ...] = ()
+_CLIENT_LOCK = threading.Lock()
+
+
+def _rate_limit_path(cache_directory: str, token: Optional[str], api_url: str) -> str:
+    """Get the rate limit state file shared by the processes using a token."""
+    digest = hashlib.sha256(f"{api_url}\0{token}".encode()).hexdigest()
+    return os.path.join(cache_directory, "ratelimit", f"{digest[:16]}.json")
+
+
+def get_client() -> GitHubClient:
+    """
+    Get the process wide GitHub client.
+
+    The client is replaced when the configured tokens, API URL or rate limits
+    change. It rotates between the configured tokens, each with a rate
+    limiter sharing the budget of the token with every other process through
+    a state file in the cache directory.
+
+    Returns:
+        GitHubClient: the shared client
+    """
+    global _CLIENT, _CLIENT_OPTIONS
+
+    settings = get_settings()
+    options = (
+        settings["github_token"],
+        settings["github_tokens"],
+        settings["github_owner_tokens"],
+        settings["github_api_url"],
+        settings["cache_directory"],
+        settings["github_write_rate"],
+        settings["github_write_burst"],
+        settings["github_rate_limit_wait"],
+        settings["github_app_id"],
+        settings["github_app_private_key"],
+    )
+    with _CLIENT_LOCK:
+        if _CLIENT is None or _CLIENT_OPTIONS != options:
+            if _CLIENT is not None:
+                _CLIENT.close()
+
+            api_url = settings["github_api_url"]
+            limiters: Dict[str, Optional[RateLimiter]] = {}
+
+            def limited(tokens: List[str]) -> Dict[str, Optional[RateLimiter]]:
+                for token in tokens:
+                    if token not in limiters:
+                        limiters[token] = RateLimiter(
+                            _rate_limit_path(
+                                settings["cache_directory"], token, api_url
+                            ),
+                            settings["github_write_rate"],
+                            settings["github_write_burst"],
+                            settings["github_rate_limit_wait"],
+                        )
+                return {token: limiters[token] for token in tokens}
+
+            app = None
+            if settings["github_app_id"] and settings["github_app_private_key"]:
+                with open(settings["github_app_private_key"]) as key_file:
+                    private_key = key_file.read()
+                app_id = settings["github_app_id"]
+                app = GitHubApp(
+                    app_id,
+                    private_key,
+                    get_app_token_cache(),
+                    lambda owner: RateLimiter(
+                        _rate_limit_path(
+                            settings["cache_directory"],
+                            f"app/{app_id}/{owner}",
+                            api_url,
+                        ),
+                        settings["github_write_rate"],
+                        settings["github_write_burst"],
+                        settings["github_rate_limit_wait"],
+                    ),
+                )
+
+            tokens = settings["github_tokens"]
+            _CLIENT = GitHubClient(
+                tokens[0] if tokens else settings["github_token"],
+                api_url,
+                token_pool=TokenPool(
+                    limited(tokens),
+                    {
+                        owner: limited(owner_tokens)
+                        for owner, owner_tokens in settings[
+                            "github_owner_tokens"
+                        ].items()
+                    },
+                ),
+                app=app,
+            )
+            _CLIENT_OPTIONS = options
+        return _CLIENT
+
+
+def get_async_client() -> AsyncGitHubClient:
+    """
+    Get the process wide asynchronous GitHub client.
+
+    Returns:
+        AsyncGitHubClient: the client behind get_client(), sharing its pool
+    """
+    return get_client().async_client
+
+
+async def async_dispatch_workflow(
     owner: str, repository: str, workflow_id: str, ref: str, inputs: Dict[str, str]
 ) -> Any:
     """
@@ -31,14 +1253,30 @@ def dispatch_workflow(
         inputs (Dict[str, str]): dictionary of key / value pairs to pass as
             inputs to the workflow
     """
-    github_token = get_setting("github.com", "token")
-    api = GhApi(token=github_token)
-
-    return api.actions.create_workflow_dispatch(
+    return await get_async_client().create_workflow_dispatch(
         owner, repository, workflow_id, ref, inputs
     )
 
 
+def dispatch_workflow(
+    owner: str, repository: str, workflow_id: str, ref: str, inputs: Dict[str, str]
+) -> Any:
+    """
+    Trigger target workflow on GitHub.
+
+    Args:
+        owner (str): GitHub owner (user or organization)
+        repository (str): target repository
+        workflow_id (str): ID of the workflow to trigger
+        ref (str): the commit ref to trigger with
+        inputs (Dict[str, str]): dictionary of key / value pairs to pass as
+            inputs to the workflow
+    """
+    return run_sync(
+        async_dispatch_workflow(owner, repository, workflow_id, ref, inputs)
+    )
+
+
 def filter_path(search_filter: str, workflow: Dict[str, str]) -> bool:
     """
     Case insensitive path filter for use in lambda filters.
@@ -58,8 +1296,97 @@ def filter_path(search_filter: str, workflow: Dict[str, str]) -> bool:
     return False
 
 
-def filter_workflows(
-    owner: str, repository: str, search_filter: str, search_required: bool = False
+class WorkflowIndex:
+    """
+    Gerrit workflows of a repository normalized for repeated filtering.
+
+    Paths are lowercased and flagged as required once, and every word of a
+    path maps to the workflows containing it, so a filter is matched against
+    the distinct words of the listing rather than every path. The matches of
+    each filter are kept, filtering the same listing for the next event is a
+    dictionary lookup.
+    """
+
+    def __init__(self, workflows: Iterable[Dict[str, str]]):
+        """
+        Index workflows.
+
+        Args:
+            workflows (Iterable[Dict[str, str]]): the active workflows of a
+                repository
+        """
+        self._gerrit: List[Tuple[str, bool, Dict[str, str]]] = []
+        self._words: Dict[str, List[int]] = {}
+        for workflow in workflows:
+            path = workflow["path"].lower()
+            if "gerrit" not in path:
+                continue
+
+            for word in set(_WORD.findall(path)):
+                self._words.setdefault(word, []).append(len(self._gerrit))
+            self._gerrit.append((path, "required" in path, workflow))
+
+        self._matches: Dict[str, Tuple[List[Dict[str, str]], ...]] = {}
+
+    def __len__(self) -> int:
+        """Get the number of gerrit workflows."""
+        return len(self._gerrit)
+
+    def _match(self, search_filter: str) -> Tuple[List[Dict[str, str]], ...]:
+        """Get the optional and required workflows matching a lowercase filter."""
+        matches = self._matches.get(search_filter)
+        if matches is not None:
+            return matches
+
+        if _WORD.fullmatch(search_filter):
+            # a word can only be found inside the words of a path
+            positions = sorted(
+                {
+                    position
+                    for word, word_positions in self._words.items()
+                    if search_filter in word
+                    for position in word_positions
+                }
+            )
+        else:
+            positions = [
+                position
+                for position, (path, _, _) in enumerate(self._gerrit)
+                if search_filter in path
+            ]
+
+        matches = ([], [])
+        for position in positions:
+            _, required, workflow = self._gerrit[position]
+            matches[required].append(workflow)
+        self._matches[search_filter] = matches
+        return matches
+
+    def lookup(
+        self, search_filter: str, search_required: bool = False
+    ) -> List[Dict[str, str]]:
+        """
+        Get the workflows matching a filter, like filter_workflows.
+
+        Args:
+            search_filter (str): the substring to search for in workflow
+                filenames, case insensitive
+            search_required (bool): if only workflows with "required" in the
+                filename are to be returned, or only those without it
+
+        Returns:
+            List[Dict[str, str]]: the gerrit workflows that meet the search
+                criteria
+        """
+        return list(self._match(search_filter.lower())[search_required])
+
+
+async def async_filter_workflows(
+    owner: str,
+    repository: str,
+    search_filter: str,
+    search_required: bool = False,
+    limit: Optional[int] = None,
 ) -> List[Dict[str, str]]:
     """
     Return a case insensitive filtered list of workflows.
@@ -80,6 +1407,9 @@ def filter_workflows(
         search_required (bool): if workflows with "required" in the filename
             are to be returned. If false, then required workflows will be
             filtered out, if true only required workflows will be returned.
+        limit (Optional[int]): stop listing workflows once this many matched,
+            later pages are then never requested. Without a limit the
+            workflows are looked up in the repository workflow index
 
     Returns:
         List[Dict[str, str]]: list of dictionaries containing all workflows
@@ -87,33 +1417,334 @@ def filter_workflows(
             search_filter substring, and either required or not required
             according to the search_required argument.
     """
-    workflows = get_workflows(owner, repository)
+    if limit is None:
+        index = await async_workflow_index(owner, repository)
+        return index.lookup(search_filter, search_required)
+
     filtered_workflows: List[Dict[str, str]] = []
 
-    filtered_workflows = list(
-        filter(lambda workflow: filter_path(search_filter, workflow), workflows)
+    async for workflow in async_iter_workflows(owner, repository):
+        if (
+            filter_path(search_filter, workflow)
+            and filter_path("gerrit", workflow)
+            and filter_path("required", workflow) == search_required
+        ):
+            filtered_workflows.append(workflow)
+            if limit is not None and len(filtered_workflows) >= limit:
+                break
+
+    return filtered_workflows
+
+
+def filter_workflows(
+    owner: str,
+    repository: str,
+    search_filter: str,
+    search_required: bool = False,
+    limit: Optional[int] = None,
+) -> List[Dict[str, str]]:
+    """
+    Return a case insensitive filtered list of workflows.
+
+    Blocking wrapper of async_filter_workflows, see it for the filtering
+    rules.
+
+    Args:
+        owner (str): GitHub owner (entity or organization)
+        repository (str): target repository
+        search_filter (str): the substring to search for in workflow filenames
+        search_required (bool): if only workflows with "required" in the
+            filename are to be returned, or only those without it
+        limit (Optional[int]): stop listing workflows once this many matched
+
+    Returns:
+        List[Dict[str, str]]: the workflows that meet the search criteria
+    """
+    return run_sync(
+        async_filter_workflows(owner, repository, search_filter, search_required, limit)
+    )
+
+
+# Workflow cache keys of the pages fetched or revalidated in the running
+# discovery session, None outside of one
+_SESSION_PAGES: Optional[Set[str]] = None
+# Locks of the pages being discovered in the running session, all on the
+# event loop of run_sync
+_SESSION_FETCHES: Dict[str, asyncio.Lock] = {}
+_SESSION_LOCK = threading.Lock()
+
+
+@contextmanager
+def discovery_session() -> Iterator[None]:
+    """
+    Revalidate each cached workflow listing page at most once in the with block.
+
+    Pages fetched or revalidated earlier in the session are used as fresh,
+    so a batch of events for the same repositories discovers each of their
+    workflow listings once, even when several events ask for a listing at
+    the same time. Listings changed meanwhile are only seen by the next
+    session. Needs the workflow cache, sessions nest.
+    """
+    global _SESSION_PAGES
+
+    with _SESSION_LOCK:
+        outer = _SESSION_PAGES
+        if outer is None:
+            _SESSION_PAGES = set()
+    try:
+        yield
+    finally:
+        if outer is None:
+            with _SESSION_LOCK:
+                _SESSION_PAGES = None
+                _SESSION_FETCHES.clear()
+
+
+def _session_page(key: str, add: bool = False) -> bool:
+    """Tell if a page is known to the running session, optionally adding it."""
+    with _SESSION_LOCK:
+        if _SESSION_PAGES is None:
+            return False
+        if add:
+            _SESSION_PAGES.add(key)
+        return key in _SESSION_PAGES
+
+
+def _session_fetch(key: str) -> Optional[asyncio.Lock]:
+    """Get the lock serializing the discovery of a page in the session."""
+    with _SESSION_LOCK:
+        if _SESSION_PAGES is None:
+            return None
+        return _SESSION_FETCHES.setdefault(key, asyncio.Lock())
+
+
+def _page_key(api_url: str, owner: str, repository: str, page: int) -> str:
+    """Get the workflow cache key of a page of workflows."""
+    return f"{api_url}/repos/{owner}/{repository}/workflows?page={page}"
+
+
+async def _workflow_page(
+    owner: str, repository: str, page: int
+) -> Tuple[List[Any], bool, Optional[str]]:
+    """
+    Get one page of the workflows of a repository through the workflow cache.
+
+    Cached pages are revalidated with their ETag, an unchanged page is
+    answered with 304 Not Modified which does not count against the rate
+    limit. Pages younger than the configured TTL, or already fetched in the
+    running discovery_session, are used as they are.
+
+    Args:
+        owner (str): GitHub owner (entity or organization)
+        repository (str): target repository
+        page (int): page number, starting at 1
+
+    Returns:
+        Tuple[List[Any], bool, Optional[str]]: the workflows of the page as
+            returned by the API, if there are more pages and the ETag of the
+            page when it is cached
+
+    Raises:
+        GitHubNotFoundError: the repository does not exist
+    """
+    client = get_async_client()
+    lock = _session_fetch(_page_key(client.api_url, owner, repository, page))
+    if lock is None:
+        return await _fetch_workflow_page(owner, repository, page)
+    # concurrent events of the session wait for the first discovery
+    async with lock:
+        return await _fetch_workflow_page(owner, repository, page)
+
+
+async def _fetch_workflow_page(
+    owner: str, repository: str, page: int
+) -> Tuple[List[Any], bool, Optional[str]]:
+    """Get one page of workflows through the workflow cache, see _workflow_page."""
+    client = get_async_client()
+    cache = get_workflow_cache()
+    key = _page_key(client.api_url, owner, repository, page)
+
+    # the cache is a directory of files, read and written off the event loop
+    entry = await asyncio.to_thread(cache.get, key) if cache is not None else None
+    if (
+        entry is not None
+        and cache is not None
+        and (cache.is_fresh(entry) or _session_page(key))
+    ):
+        WORKFLOW_CACHE.inc(platform="github", owner=owner, result="fresh")
+        return entry["data"]["workflows"], entry["data"]["more"], entry["etag"]
+
+    status, headers, response = await client.list_repo_workflows(
+        owner, repository, page=page, etag=entry["etag"] if entry else None
     )
-    filtered_workflows = list(
-        filter(lambda workflow: filter_path("gerrit", workflow), filtered_workflows)
+    if status == 304 and entry is not None and cache is not None:
+        WORKFLOW_CACHE.inc(platform="github", owner=owner, result="revalidated")
+        await asyncio.to_thread(cache.refresh, key, entry)
+        _session_page(key, add=True)
+        return entry["data"]["workflows"], entry["data"]["more"], entry["etag"]
+
+    WORKFLOW_CACHE.inc(platform="github", owner=owner, result="miss")
+    workflows = response["workflows"]
+    more = page * PER_PAGE < response["total_count"] and len(workflows) > 0
+    if cache is None or "etag" not in headers:
+        return workflows, more, None
+
+    await asyncio.to_thread(
+        cache.put, key, headers["etag"], {"workflows": workflows, "more": more}
     )
-    if search_required:
-        filtered_workflows = list(
-            filter(
-                lambda workflow: filter_path("required", workflow), filtered_workflows
-            )
-        )
-    else:
-        filtered_workflows = list(
-            filter(
-                lambda workflow: not filter_path("required", workflow),
-                filtered_workflows,
+    _session_page(key, add=True)
+    return workflows, more, headers["etag"]
+
+
+def workflows_version(owner: str, repository: str) -> Optional[str]:
+    """
+    Get the version of the cached workflow listing of a repository.
+
+    The version is the ETag of the first page of the listing, it changes as
+    soon as any hook process sees the listing change. No request is made.
+
+    Args:
+        owner (str): GitHub owner (entity or organization)
+        repository (str): target repository
+
+    Returns:
+        Optional[str]: the ETag or None if the listing is not cached
+    """
+    cache = get_workflow_cache()
+    if cache is None:
+        return None
+
+    entry = cache.get(_page_key(get_async_client().api_url, owner, repository, 1))
+    return entry["etag"] if entry is not None else None
+
+
+async def async_list_workflows(
+    owner: str, repository: str
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    List the workflows of a repository, fetching pages as they are consumed.
+
+    Args:
+        owner (str): GitHub owner (entity or organization)
+        repository (str): target repository
+
+    Yields:
+        Dict[str, Any]: the workflows as returned by the API
+
+    Raises:
+        GitHubNotFoundError: the repository does not exist
+    """
+    page = 1
+    while True:
+        workflows, more, _ = await _workflow_page(owner, repository, page)
+        for workflow in workflows:
+            yield workflow
+        if not more:
+            return
+        page += 1
+
+
+KEY_IDS = {
+    "node_id",
+    "created_at",
+    "updated_at",
+    "url",
+    "html_url",
+    "badge_url",
+    "state",
+}
+
+
+async def async_iter_workflows(
+    owner: str, repository: str
+) -> AsyncIterator[Dict[str, str]]:
+    """
+    Iterate over the active workflows of a repository.
+
+    Only one page of the listing is held at a time, stopping the iteration
+    early skips the requests for the remaining pages.
+
+    Args:
+        owner (str): GitHub owner (entity or organization)
+        repository (str): target repository
+
+    Yields:
+        Dict[str, str]: data related to each active workflow in the target
+            repository, none if the repository does not exist
+    """
+    try:
+        async for workflow in async_list_workflows(owner, repository):
+            if workflow["state"] == "active":
+                yield _strip_workflow(workflow)
+    except GitHubNotFoundError:
+        return
+
+
+def _strip_workflow(workflow: Dict[str, Any]) -> Dict[str, str]:
+    """Drop the keys of a listed workflow that are never used."""
+    return {key: value for key, value in workflow.items() if key not in KEY_IDS}
+
+
+_WORKFLOW_INDEXES: Dict[Tuple[str, str, str], Tuple[Tuple[str, ...], WorkflowIndex]] = (
+    {}
+)
+_WORKFLOW_INDEXES_LOCK = threading.Lock()
+
+
+async def async_workflow_index(owner: str, repository: str) -> WorkflowIndex:
+    """
+    Get the workflow index of a repository.
+
+    The whole listing is read through the workflow cache. The index is kept
+    in memory with the ETags of the listing pages and reused while they do
+    not change, so long running processes normalize each listing once.
+
+    Args:
+        owner (str): GitHub owner (entity or organization)
+        repository (str): target repository
+
+    Returns:
+        WorkflowIndex: index of the active workflows, empty if the repository
+            does not exist
+    """
+    key = (get_async_client().api_url, owner, repository)
+    pages: List[List[Any]] = []
+    etags: List[Optional[str]] = []
+    try:
+        while True:
+            workflows, more, etag = await _workflow_page(
+                owner, repository, len(pages) + 1
             )
-        )
+            pages.append(workflows)
+            etags.append(etag)
+            if not more:
+                break
+    except GitHubNotFoundError:
+        return WorkflowIndex([])
 
-    return filtered_workflows
+    version = tuple(etag for etag in etags if etag is not None)
+    with _WORKFLOW_INDEXES_LOCK:
+        cached = _WORKFLOW_INDEXES.get(key)
+    if cached is not None and len(version) == len(etags) and cached[0] == version:
+        return cached[1]
 
+    index = WorkflowIndex(
+        _strip_workflow(workflow)
+        for workflows in pages
+        for workflow in workflows
+        if workflow["state"] == "active"
+    )
+    if len(version) == len(etags):
+        with _WORKFLOW_INDEXES_LOCK:
+            _WORKFLOW_INDEXES.pop(key, None)
+            _WORKFLOW_INDEXES[key] = (version, index)
+            while len(_WORKFLOW_INDEXES) > INDEX_SIZE:
+                del _WORKFLOW_INDEXES[next(iter(_WORKFLOW_INDEXES))]
 
-def get_workflows(owner: str, repository: str) -> List[Dict[str, str]]:
+    return index
+
+
+async def async_get_workflows(owner: str, repository: str) -> List[Dict[str, str]]:
     """
     Get all active workflows for specific repository.
 
@@ -125,25 +1756,19 @@ def get_workflows(owner: str, repository: str) -> List[Dict[str, str]]:
         List[Dict[str, str]]: list of dictionaries containing data related to
             active workflows in the target repository.
     """
-    github_token = get_setting("github.com", "token")
-    api = GhApi(token=github_token)
+    return [workflow async for workflow in async_iter_workflows(owner, repository)]
 
-    try:
-        workflows = api.actions.list_repo_workflows(owner, repository)["workflows"]
-    except HTTP404NotFoundError:
-        return []
-
-    workflows = [workflow for workflow in workflows if workflow["state"] == "active"]
-    key_ids = [
-        "node_id",
-        "created_at",
-        "updated_at",
-        "url",
-        "html_url",
-        "badge_url",
-        "state",
-    ]
-    for workflow in workflows:
-        for del_key in key_ids:
-            del workflow[del_key]
-    return workflows
+
+def get_workflows(owner: str, repository: str) -> List[Dict[str, str]]:
+    """
+    Get all active workflows for specific repository.
+
+    Args:
+        owner (str): GitHub owner (entity or organization)
+        repository (str): target repository
+
+    Returns:
+        List[Dict[str, str]]: list of dictionaries containing data related to
+            active workflows in the target repository.
+    """
+    return run_sync(async_get_workflows(owner, repository))
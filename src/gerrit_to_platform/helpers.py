@@ -9,15 +9,36 @@
 ##############################################################################
 """Common helper functions."""
 
+import contextvars
 import re
-from typing import Callable, Dict, Optional, Union
+import time
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypedDict,
+    TypeVar,
+    Union,
+)
 
-import gerrit_to_platform.github as github
+from gerrit_to_platform.cache import get_required_workflow_cache
 from gerrit_to_platform.config import (
     Platform,
     ReplicationRemotes,
     get_replication_remotes,
+    get_settings,
 )
+from gerrit_to_platform.events import CHANGE_MERGED
+from gerrit_to_platform.metrics import DISCOVERIES, DISPATCHES, current_event, stage
+from gerrit_to_platform.profiling import span
+
+T = TypeVar("T")
 
 
 def choose_dispatch(platform: Platform) -> Union[Callable, None]:
@@ -35,6 +56,10 @@ def choose_dispatch(platform: Platform) -> Union[Callable, None]:
             None is returned
     """
     if platform.value == "github":
+        # Imported here so hook runs that never dispatch skip loading the
+        # HTTP client
+        import gerrit_to_platform.github as github
+
         return github.dispatch_workflow
 
     return None
@@ -56,11 +81,84 @@ def choose_filter_workflows(platform: Platform) -> Union[Callable, None]:
             None is returned
     """
     if platform.value == "github":
+        import gerrit_to_platform.github as github
+
         return github.filter_workflows
 
     return None
 
 
+def _to_async(function: Callable) -> Callable[..., Awaitable[Any]]:
+    """Wrap a blocking platform function to run in a worker thread."""
+
+    async def wrapper(*args: Any) -> Any:
+        import asyncio
+
+        return await asyncio.to_thread(function, *args)
+
+    return wrapper
+
+
+def choose_async_dispatch(
+    platform: Platform,
+) -> Union[Callable[..., Awaitable[Any]], None]:
+    """
+    Choose the asynchronous platform job dispatcher.
+
+    Platforms without an asynchronous API get their blocking dispatcher run
+    in a worker thread.
+
+    Args:
+        platform (Platform): the platform that the dispatch is being looked up
+            for
+
+    Returns:
+        Callable: coroutine function matching the dispatch_workflow call
+            signature for the platform
+        None: If no dispatch_workflow is defined for the platform
+    """
+    if platform.value == "github":
+        import gerrit_to_platform.github as github
+
+        return github.async_dispatch_workflow
+
+    dispatcher = choose_dispatch(platform)
+    if dispatcher is None:
+        return None
+
+    return _to_async(dispatcher)
+
+
+def choose_async_filter_workflows(
+    platform: Platform,
+) -> Union[Callable[..., Awaitable[Any]], None]:
+    """
+    Choose the asynchronous platform workflow filter.
+
+    Platforms without an asynchronous API get their blocking filter run in a
+    worker thread.
+
+    Args:
+        platform (Platform): the platform that the filter_workflows is being
+            looked up for
+
+    Returns:
+        Callable: coroutine function matching the filter_workflows call
+            signature for the platform
+        None: If no filter_workflows is defined for the platform
+    """
+    if platform.value == "github":
+        import gerrit_to_platform.github as github
+
+        return github.async_filter_workflows
+
+    filter_workflows = choose_filter_workflows(platform)
+    if filter_workflows is None:
+        return None
+
+    return _to_async(filter_workflows)
+
+
 def convert_repo_name(
     remotes: ReplicationRemotes, platform: Platform, remote: str, repository: str
 ) -> str:
@@ -92,30 +190,62 @@ def convert_repo_name(
     return converted_repository
 
 
-def find_and_dispatch(
-    project: str, workflow_filter: str, inputs: Dict[str, str]
-) -> int:
+class DispatchError(TypedDict):
+    """A failed platform API call of find_and_dispatch."""
+
+    platform: str
+    owner: str
+    repository: str
+    workflow_id: Optional[str]
+    error: str
+
+
+class DispatchReport(TypedDict):
+    """Outcome of find_and_dispatch."""
+
+    dispatched: int
+    errors: List[DispatchError]
+    queued: int
+
+
+class DrainReport(TypedDict):
+    """Outcome of drain_retry_queue."""
+
+    retried: int
+    rescheduled: int
+    dropped: int
+
+
+DispatchTarget = Tuple[Platform, str, str, Callable, Callable]
+
+
+def _dispatch_targets(
+    project: str,
+    dispatch_chooser: Callable[[Platform], Optional[Callable]],
+    filter_chooser: Callable[[Platform], Optional[Callable]],
+) -> List[DispatchTarget]:
     """
-    Find relevant workflows and dispatch them.
+    Get the remotes of a project with the platform functions to use on them.
 
     Args:
         project (str): the project repository name
-        workflow_filter (str): the filter for the workflow names
-        inputs (Dict[str, str]): key / value pair dictionary for inputs to be
-            passed to the target workflow dispatch
+        dispatch_chooser (Callable): picks the dispatcher of a platform
+        filter_chooser (Callable): picks the workflow filter of a platform
 
     Returns:
-        int: The number of workflows dispatched
+        List[DispatchTarget]: platform, owner, repository, dispatcher and
+            workflow filter of every remote replicating the project
     """
-    remotes = get_replication_remotes()
-    dispatched_count = 0
+    with stage("remotes", event=current_event()):
+        remotes = get_replication_remotes(project)
+    targets: List[DispatchTarget] = []
 
     for platform in Platform:
         if platform.value not in remotes:
             continue
 
-        dispatcher = choose_dispatch(platform)
-        filter_workflows = choose_filter_workflows(platform)
+        dispatcher = dispatch_chooser(platform)
+        filter_workflows = filter_chooser(platform)
 
         if dispatcher is None or filter_workflows is None:
             continue
@@ -123,58 +253,587 @@ def find_and_dispatch(
         for remote in remotes[platform.value]:
             owner = remotes[platform.value][remote]["owner"]
             repo = convert_repo_name(remotes, platform, remote, project)
-            workflows = filter_workflows(owner, repo, workflow_filter)
-
-            for workflow in workflows:
-                print(
-                    f"Dispatching workflow '{workflow['name']}', "
-                    + f"id {workflow['id']} on "
-                    + f"{platform.value}:{owner}/{repo} for change "
-                    + f"{inputs['GERRIT_CHANGE_NUMBER']} patch "
-                    + inputs["GERRIT_PATCHSET_NUMBER"]
+            targets.append((platform, owner, repo, dispatcher, filter_workflows))
+
+    return targets
+
+
+def _announce(
+    inputs: Dict[str, str],
+    platform: Platform,
+    owner: str,
+    repo: str,
+    workflow: Dict[str, str],
+    magic_repo: Optional[str] = None,
+) -> None:
+    """Print the workflow about to be dispatched."""
+    if magic_repo is None:
+        print(
+            f"Dispatching workflow '{workflow['name']}', "
+            + f"id {workflow['id']} on "
+            + f"{platform.value}:{owner}/{repo} for change "
+            + f"{inputs['GERRIT_CHANGE_NUMBER']} patch "
+            + inputs["GERRIT_PATCHSET_NUMBER"]
+        )
+    else:
+        print(
+            f"Dispatching required workflow '{workflow['name']}', "
+            + f"id {workflow['id']} on "
+            + f"{platform.value}:{owner}/{magic_repo} for change "
+            + f"{inputs['GERRIT_CHANGE_NUMBER']} patch "
+            + f"{inputs['GERRIT_PATCHSET_NUMBER']} against "
+            + f"{platform.value}:{owner}/{repo}"
+        )
+
+
+def _record_error(
+    report: DispatchReport,
+    platform: Platform,
+    owner: str,
+    repository: str,
+    workflow_id: Optional[str],
+    error: Exception,
+) -> None:
+    """Add a failed call to a dispatch report."""
+    report["errors"].append(
+        {
+            "platform": platform.value,
+            "owner": owner,
+            "repository": repository,
+            "workflow_id": workflow_id,
+            "error": str(error),
+        }
+    )
+
+
+def _queue_retry(
+    platform: Platform,
+    owner: str,
+    repository: str,
+    workflow_id: str,
+    ref: str,
+    inputs: Dict[str, str],
+    error: Exception,
+) -> bool:
+    """
+    Queue a failed dispatch for a later retry when the failure is transient.
+
+    Returns:
+        bool: True if the dispatch was queued
+    """
+    # Imported here so hook runs without failures skip loading sqlite3
+    from gerrit_to_platform.retry import get_retry_queue, is_transient
+
+    if not is_transient(error):
+        return False
+
+    try:
+        retry_queue = get_retry_queue()
+        if retry_queue is None:
+            return False
+        retry_queue.enqueue(
+            platform.value, owner, repository, workflow_id, ref, inputs, error
+        )
+    except Exception as e:
+        print(f"Failed to queue workflow dispatch for retry: {e}")
+        return False
+
+    print(f"Queued workflow {workflow_id} on {owner}/{repository} for retry")
+    return True
+
+
+def _listing_version(platform: Platform, owner: str, repository: str) -> str:
+    """Get the version of the cached workflow listing of a repository."""
+    if platform.value == "github":
+        import gerrit_to_platform.github as github
+
+        return github.workflows_version(owner, repository) or ""
+
+    return ""
+
+
+def _required_key(platform: Platform, owner: str, magic_repo: str) -> str:
+    """Get the cache key of the required workflows of an owner."""
+    return f"{platform.value}/{owner}/{magic_repo}"
+
+
+def _load_required_workflows(
+    platform: Platform, owner: str, magic_repo: str, workflow_filter: str
+) -> Optional[List[Dict[str, str]]]:
+    """
+    Get the required workflows of an owner found by an earlier event.
+
+    Args:
+        platform (Platform): platform of the owner
+        owner (str): the owner (entity or organization)
+        magic_repo (str): the repository holding the required workflows
+        workflow_filter (str): the filter for the workflow names
+
+    Returns:
+        Optional[List[Dict[str, str]]]: the workflows or None if they are not
+            cached, are older than the TTL or were found in a different
+            version of the magic repository workflow listing
+    """
+    cache = get_required_workflow_cache()
+    if cache is None:
+        return None
+
+    entry = cache.get(_required_key(platform, owner, magic_repo))
+    if entry is None or entry["etag"] != _listing_version(platform, owner, magic_repo):
+        return None
+
+    found = entry["data"].get(workflow_filter)
+    if found is None or time.time() - found["fetched"] >= cache.ttl:
+        return None
+
+    return found["workflows"]
+
+
+def _store_required_workflows(
+    platform: Platform,
+    owner: str,
+    magic_repo: str,
+    workflow_filter: str,
+    workflows: List[Dict[str, str]],
+) -> None:
+    """
+    Cache the required workflows of an owner for the following events.
+
+    Every filter of an owner is kept in one entry tagged with the version of
+    the magic repository workflow listing they were found in.
+
+    Args:
+        platform (Platform): platform of the owner
+        owner (str): the owner (entity or organization)
+        magic_repo (str): the repository holding the required workflows
+        workflow_filter (str): the filter for the workflow names
+        workflows (List[Dict[str, str]]): the required workflows found
+    """
+    cache = get_required_workflow_cache()
+    if cache is None:
+        return
+
+    key = _required_key(platform, owner, magic_repo)
+    version = _listing_version(platform, owner, magic_repo)
+    entry = cache.get(key)
+    filters = entry["data"] if entry is not None and entry["etag"] == version else {}
+    filters[workflow_filter] = {"fetched": time.time(), "workflows": workflows}
+    cache.put(key, version, filters)
+
+
+def _forget_required_workflows(targets: List[DispatchTarget], event: str) -> None:
+    """
+    Drop the cached required workflows of owners whose magic repo changed.
+
+    Only a change merged on the magic repository changes its workflows, the
+    other events on it keep the cache.
+    """
+    if event != CHANGE_MERGED:
+        return
+
+    cache = get_required_workflow_cache()
+    if cache is None:
+        return
+
+    for platform, owner, repo, _, _ in targets:
+        magic_repo = get_magic_repo(platform)
+        if magic_repo and repo == magic_repo:
+            cache.delete(_required_key(platform, owner, magic_repo))
+
+
+# Report adding up the find_and_dispatch calls of the event being processed
+_EVENT_REPORT: contextvars.ContextVar[Optional[DispatchReport]] = (
+    contextvars.ContextVar("dispatch_report", default=None)
+)
+
+
+@contextmanager
+def collect_dispatch_report() -> Iterator[DispatchReport]:
+    """
+    Add up the reports of the find_and_dispatch calls made in the with block.
+
+    Lets callers of the event handlers, which only print what they dispatch,
+    report the outcome of each event.
+
+    Yields:
+        DispatchReport: the workflows dispatched and the failed calls so far
+    """
+    report: DispatchReport = {"dispatched": 0, "errors": [], "queued": 0}
+    token = _EVENT_REPORT.set(report)
+    try:
+        yield report
+    finally:
+        _EVENT_REPORT.reset(token)
+
+
+def _collect(report: DispatchReport) -> None:
+    """Add a find_and_dispatch report to the collected one, if any."""
+    collected = _EVENT_REPORT.get()
+    if collected is not None:
+        collected["dispatched"] += report["dispatched"]
+        collected["errors"].extend(report["errors"])
+        collected["queued"] += report["queued"]
+
+
+def find_and_dispatch(
+    project: str, workflow_filter: str, inputs: Dict[str, str]
+) -> int:
+    """
+    Find relevant workflows and dispatch them.
+
+    Args:
+        project (str): the project repository name
+        workflow_filter (str): the filter for the workflow names
+        inputs (Dict[str, str]): key / value pair dictionary for inputs to be
+            passed to the target workflow dispatch
+
+    Returns:
+        int: The number of workflows dispatched
+    """
+    with span("find_and_dispatch", project=project, workflow_filter=workflow_filter):
+        report = find_and_dispatch_report(project, workflow_filter, inputs)
+    _collect(report)
+    return report["dispatched"]
+
+
+def find_and_dispatch_report(
+    project: str, workflow_filter: str, inputs: Dict[str, str]
+) -> DispatchReport:
+    """
+    Find relevant workflows, dispatch them and report every failed call.
+
+    Blocking wrapper of async_find_and_dispatch_report, see it for the
+    concurrency limits and the required workflow lookups. The calls run on
+    the event loop shared with the platform clients, in the context of the
+    caller, so the events of a process reuse the same connections.
+
+    Args:
+        project (str): the project repository name
+        workflow_filter (str): the filter for the workflow names
+        inputs (Dict[str, str]): key / value pair dictionary for inputs to be
+            passed to the target workflow dispatch, never modified
+
+    Returns:
+        DispatchReport: the number of workflows dispatched and the failed
+            discovery and dispatch calls
+    """
+    targets = _dispatch_targets(
+        project, choose_async_dispatch, choose_async_filter_workflows
+    )
+    if not targets:
+        return {"dispatched": 0, "errors": [], "queued": 0}
+
+    # Imported here, only events with a remote to dispatch to need the loop
+    from gerrit_to_platform.github import run_sync
+
+    return run_sync(
+        _in_context(
+            contextvars.copy_context(),
+            _dispatch_report(targets, workflow_filter, inputs),
+        )
+    )
+
+
+async def _in_context(context: contextvars.Context, awaitable: Awaitable[T]) -> T:
+    """Await a coroutine in a task running in a copy of context."""
+    import asyncio
+
+    # a task runs in a copy of the context it is created in
+    return await context.run(asyncio.ensure_future, awaitable)
+
+
+async def async_find_and_dispatch(
+    project: str, workflow_filter: str, inputs: Dict[str, str]
+) -> int:
+    """
+    Find relevant workflows and dispatch them without blocking the event loop.
+
+    Args:
+        project (str): the project repository name
+        workflow_filter (str): the filter for the workflow names
+        inputs (Dict[str, str]): key / value pair dictionary for inputs to be
+            passed to the target workflow dispatch
+
+    Returns:
+        int: The number of workflows dispatched
+    """
+    with span("find_and_dispatch", project=project, workflow_filter=workflow_filter):
+        report = await async_find_and_dispatch_report(project, workflow_filter, inputs)
+    _collect(report)
+    return report["dispatched"]
+
+
+async def async_find_and_dispatch_report(
+    project: str, workflow_filter: str, inputs: Dict[str, str]
+) -> DispatchReport:
+    """
+    Find relevant workflows, dispatch them and report every failed call.
+
+    The calls of every remote run concurrently on the running event loop, at
+    most concurrency at a time for the platform and owner_concurrency at a
+    time for each owner, so many events can be handled on one loop. With the
+    default concurrency of 1 the calls are made one at a time.
+
+    The required workflows of the magic repository are looked up once per
+    owner and, when the cache required_ttl is set, reused by the following
+    events until the TTL expires or the magic repository changes.
+
+    Args:
+        project (str): the project repository name
+        workflow_filter (str): the filter for the workflow names
+        inputs (Dict[str, str]): key / value pair dictionary for inputs to be
+            passed to the target workflow dispatch, never modified
+
+    Returns:
+        DispatchReport: the number of workflows dispatched and the failed
+            discovery and dispatch calls
+    """
+    import asyncio
+
+    targets = await asyncio.to_thread(
+        _dispatch_targets,
+        project,
+        choose_async_dispatch,
+        choose_async_filter_workflows,
+    )
+    if not targets:
+        return {"dispatched": 0, "errors": [], "queued": 0}
+
+    return await _dispatch_report(targets, workflow_filter, inputs)
+
+
+async def _dispatch_report(
+    targets: List[DispatchTarget], workflow_filter: str, inputs: Dict[str, str]
+) -> DispatchReport:
+    """Discover and dispatch the workflows of the targets, see above."""
+    import asyncio
+
+    report: DispatchReport = {"dispatched": 0, "errors": [], "queued": 0}
+    event = current_event()
+    limits = get_settings()["dispatch_limits"]
+    platform_slots = {
+        platform: asyncio.Semaphore(limit["concurrency"])
+        for platform, limit in limits.items()
+    }
+    owner_slots: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+    # the caches are files, read and written off the event loop
+    await asyncio.to_thread(_forget_required_workflows, targets, event)
+    required_memo: Dict[Tuple[str, str, str], asyncio.Future] = {}
+
+    async def call(
+        platform: Platform, owner: str, function: Callable, *args: Any
+    ) -> Any:
+        key = (platform.value, owner)
+        if key not in owner_slots:
+            owner_slots[key] = asyncio.Semaphore(
+                limits[platform.value]["owner_concurrency"]
+            )
+        async with owner_slots[key], platform_slots[platform.value]:
+            return await function(*args)
+
+    async def discover(
+        platform: Platform,
+        owner: str,
+        repository: str,
+        filter_workflows: Callable,
+        search_required: bool,
+    ) -> Optional[List[Dict[str, str]]]:
+        labels = {"event": event, "platform": platform.value, "owner": owner}
+        try:
+            with stage("discovery", **labels):
+                workflows = await call(
+                    platform,
+                    owner,
+                    filter_workflows,
+                    owner,
+                    repository,
+                    workflow_filter,
+                    search_required,
+                )
+        except Exception as e:
+            print(f"Failed to find workflows: {e}")
+            DISCOVERIES.inc(source="error", **labels)
+            _record_error(report, platform, owner, repository, None, e)
+            return None
+        DISCOVERIES.inc(source="api", **labels)
+        return workflows
+
+    async def load_required(
+        platform: Platform, owner: str, magic_repo: str, filter_workflows: Callable
+    ) -> List[Dict[str, str]]:
+        workflows = await asyncio.to_thread(
+            _load_required_workflows, platform, owner, magic_repo, workflow_filter
+        )
+        if workflows is None:
+            workflows = await discover(
+                platform, owner, magic_repo, filter_workflows, True
+            )
+            if workflows is not None:
+                await asyncio.to_thread(
+                    _store_required_workflows,
+                    platform,
+                    owner,
+                    magic_repo,
+                    workflow_filter,
+                    workflows,
                 )
-                try:
-                    dispatcher(
+        else:
+            DISCOVERIES.inc(
+                event=event,
+                platform=platform.value,
+                owner=owner,
+                source="required_cache",
+            )
+        return workflows or []
+
+    def discover_required(
+        platform: Platform, owner: str, magic_repo: str, filter_workflows: Callable
+    ) -> asyncio.Future:
+        key = (platform.value, owner, magic_repo)
+        if key not in required_memo:
+            required_memo[key] = asyncio.ensure_future(
+                load_required(platform, owner, magic_repo, filter_workflows)
+            )
+        return required_memo[key]
+
+    async def dispatch(
+        platform: Platform,
+        owner: str,
+        repository: str,
+        dispatcher: Callable,
+        workflow: Dict[str, str],
+        ref: str,
+        dispatch_inputs: Dict[str, str],
+    ) -> None:
+        labels = {"event": event, "platform": platform.value, "owner": owner}
+        try:
+            with stage("dispatch", **labels):
+                await call(
+                    platform,
+                    owner,
+                    dispatcher,
+                    owner,
+                    repository,
+                    workflow["id"],
+                    ref,
+                    dispatch_inputs,
+                )
+        except Exception as e:
+            print(f"Failed to dispatch workflow: {e}")
+            _record_error(report, platform, owner, repository, str(workflow["id"]), e)
+            queued = await asyncio.to_thread(
+                _queue_retry,
+                platform,
+                owner,
+                repository,
+                str(workflow["id"]),
+                ref,
+                dict(dispatch_inputs),
+                e,
+            )
+            DISPATCHES.inc(result="queued" if queued else "failed", **labels)
+            report["queued"] += queued
+            return
+        DISPATCHES.inc(result="dispatched", **labels)
+        report["dispatched"] += 1
+
+    async def dispatch_remote(target: DispatchTarget) -> None:
+        platform, owner, repo, dispatcher, filter_workflows = target
+        magic_repo = get_magic_repo(platform)
+
+        found = asyncio.ensure_future(
+            discover(platform, owner, repo, filter_workflows, False)
+        )
+        required = None
+        if magic_repo:
+            required = discover_required(platform, owner, magic_repo, filter_workflows)
+
+        dispatches = []
+        for workflow in await found or []:
+            _announce(inputs, platform, owner, repo, workflow)
+            dispatches.append(
+                dispatch(
+                    platform,
+                    owner,
+                    repo,
+                    dispatcher,
+                    workflow,
+                    f"refs/heads/{inputs['GERRIT_BRANCH']}",
+                    dict(inputs),
+                )
+            )
+
+        if magic_repo and required is not None:
+            required_inputs = dict(inputs, TARGET_REPO=f"{owner}/{repo}")
+            for workflow in await required:
+                _announce(inputs, platform, owner, repo, workflow, magic_repo)
+                dispatches.append(
+                    dispatch(
+                        platform,
                         owner,
-                        repo,
-                        workflow["id"],
-                        f"refs/heads/{inputs['GERRIT_BRANCH']}",
-                        inputs,
+                        magic_repo,
+                        dispatcher,
+                        workflow,
+                        "refs/heads/main",
+                        required_inputs,
                     )
-                    dispatched_count += 1
-                except Exception as e:
-                    print(f"Failed to dispatch workflow: {e}")
-
-            magic_repo = get_magic_repo(platform)
-            if magic_repo:
-                required_workflows = filter_workflows(
-                    owner, magic_repo, workflow_filter, True
                 )
 
-                inputs["TARGET_REPO"] = f"{owner}/{repo}"
+        await asyncio.gather(*dispatches)
 
-                for workflow in required_workflows:
-                    print(
-                        f"Dispatching required workflow '{workflow['name']}', "
-                        + f"id {workflow['id']} on "
-                        + f"{platform.value}:{owner}/{magic_repo} for change "
-                        + f"{inputs['GERRIT_CHANGE_NUMBER']} patch "
-                        + f"{inputs['GERRIT_PATCHSET_NUMBER']} against "
-                        + f"{platform.value}:{owner}/{repo}"
-                    )
-                    try:
-                        dispatcher(
-                            owner,
-                            magic_repo,
-                            workflow["id"],
-                            "refs/heads/main",
-                            inputs,
-                        )
-                        dispatched_count += 1
-                    except Exception as e:
-                        print(f"Failed to dispatch workflow: {e}")
-
-    return dispatched_count
+    await asyncio.gather(*(dispatch_remote(target) for target in targets))
+    return report
+
+
+def drain_retry_queue(limit: Optional[int] = None) -> DrainReport:
+    """
+    Retry the queued dispatches that are due.
+
+    A dispatch failing again is rescheduled with a longer backoff, or given
+    up once it failed [retry] max_attempts times or with an error that is
+    not transient. Given up dispatches older than DEAD_RETENTION are deleted.
+
+    Args:
+        limit (Optional[int]): most dispatches to retry, all due when None
+
+    Returns:
+        DrainReport: the dispatches retried successfully, rescheduled and
+            given up
+    """
+    from gerrit_to_platform.retry import get_retry_queue
+
+    report: DrainReport = {"retried": 0, "rescheduled": 0, "dropped": 0}
+    retry_queue = get_retry_queue()
+    if retry_queue is None:
+        return report
+
+    retry_queue.purge()
+    for queued in retry_queue.claim(limit):
+        dispatcher = choose_dispatch(Platform(queued["platform"]))
+        try:
+            if dispatcher is None:
+                raise ValueError(f"No dispatcher for {queued['platform']}")
+            dispatcher(
+                queued["owner"],
+                queued["repository"],
+                queued["workflow_id"],
+                queued["ref"],
+                queued["inputs"],
+            )
+        except Exception as e:
+            print(
+                f"Failed to retry workflow {queued['workflow_id']} on "
+                + f"{queued['owner']}/{queued['repository']}: {e}"
+            )
+            if retry_queue.failed(queued, e):
+                report["rescheduled"] += 1
+            else:
+                report["dropped"] += 1
+        else:
+            retry_queue.succeeded(queued)
+            report["retried"] += 1
+
+    return report
 
 
 def get_change_id(change: str) -> str:
@@ -0,0 +1,484 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Stage latency and counter metrics in the Prometheus text format."""
+
+import abc
+import bisect
+import contextvars
+import fcntl
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from gerrit_to_platform.profiling import span
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# Upper bounds in seconds of the stage latency histogram buckets
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+# Type of the Gerrit event being processed, the event label of the metrics
+_EVENT: contextvars.ContextVar[str] = contextvars.ContextVar("event", default="")
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    """Escape a label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value."""
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _sample_name(name: str, labels: Sequence[Tuple[str, str]]) -> str:
+    """Get the name of a sample with its labels."""
+    if not labels:
+        return name
+    pairs = ",".join(f'{label}="{_escape(value)}"' for label, value in labels)
+    return f"{name}{{{pairs}}}"
+
+
+class Metric(abc.ABC):
+    """Metric family of samples keyed by label values."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        """
+        Create the metric.
+
+        Args:
+            name (str): metric name
+            documentation (str): HELP text of the metric
+            labelnames (Sequence[str]): names of the labels of every sample
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._labelset = frozenset(self.labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        """Get the label values of a sample, missing labels are empty."""
+        if not self._labelset.issuperset(labels):
+            unknown = sorted(set(labels) - self._labelset)
+            raise ValueError(f"Unknown labels for {self.name}: {unknown}")
+        return tuple(str(labels.get(label, "")) for label in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> List[Tuple[str, float]]:
+        """Get the samples of the metric in exposition order."""
+
+    @abc.abstractmethod
+    def reset(self) -> None:
+        """Forget every sample."""
+
+
+class Counter(Metric):
+    """Monotonic counter."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        """Create the counter, name should end with _total."""
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, value: float = 1, /, **labels: str) -> None:
+        """
+        Increase the counter.
+
+        Args:
+            value (float): the increment
+            labels (str): the label values of the sample
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels: str) -> float:
+        """Get the value of a sample."""
+        return self._values.get(self._key(labels), 0)
+
+    def total(self, **labels: str) -> float:
+        """Get the sum of the samples with the given label values."""
+        self._key(labels)
+        positions = [
+            (self.labelnames.index(label), value) for label, value in labels.items()
+        ]
+        with self._lock:
+            return sum(
+                value
+                for key, value in self._values.items()
+                if all(key[index] == wanted for index, wanted in positions)
+            )
+
+    def samples(self) -> List[Tuple[str, float]]:
+        """Get the samples of the counter."""
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            (_sample_name(self.name, list(zip(self.labelnames, key))), value)
+            for key, value in values
+        ]
+
+    def reset(self) -> None:
+        """Forget every sample."""
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        """
+        Create the histogram.
+
+        Args:
+            name (str): metric name
+            documentation (str): HELP text of the metric
+            labelnames (Sequence[str]): names of the labels of every sample
+            buckets (Sequence[float]): sorted bucket upper bounds, +Inf is
+                added
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # label values: per bucket counts, the last one +Inf, and sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, /, **labels: str) -> None:
+        """
+        Record an observed value.
+
+        Args:
+            value (float): the observed value
+            labels (str): the label values of the sample
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the seconds spent in the with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        """Get the number of observations of a sample."""
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self) -> List[Tuple[str, float]]:
+        """Get the bucket, sum and count samples of the histogram."""
+        with self._lock:
+            values = [
+                (key, list(counts), total[0])
+                for key, (counts, total) in self._values.items()
+            ]
+
+        samples: List[Tuple[str, float]] = []
+        for key, counts, total in values:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(
+                    (
+                        _sample_name(
+                            f"{self.name}_bucket",
+                            labels + [("le", _format_value(bound))],
+                        ),
+                        cumulative,
+                    )
+                )
+            samples.append((_sample_name(f"{self.name}_sum", labels), total))
+            samples.append((_sample_name(f"{self.name}_count", labels), cumulative))
+        return samples
+
+    def reset(self) -> None:
+        """Forget every sample."""
+        with self._lock:
+            self._values.clear()
+
+
+MetricType = TypeVar("MetricType", bound=Metric)
+
+
+class Registry:
+    """The metrics exported by a process."""
+
+    def __init__(self) -> None:
+        """Create an empty registry."""
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: MetricType) -> MetricType:
+        """Add a metric to the exported ones."""
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self, previous: Optional[Dict[str, float]] = None) -> str:
+        """
+        Render the metrics in the Prometheus text format.
+
+        Args:
+            previous (Optional[Dict[str, float]]): samples to add the
+                metrics to, eg: read from a textfile written before
+
+        Returns:
+            str: the exposition text
+        """
+        previous = previous or {}
+        lines = []
+        for metric in self.metrics.values():
+            samples = dict(
+                (name, value)
+                for name, value in previous.items()
+                if _family(name) == metric.name
+            )
+            for name, value in metric.samples():
+                samples[name] = samples.get(name, 0) + value
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(
+                f"{name} {_format_value(value)}" for name, value in samples.items()
+            )
+        return "".join(line + "\n" for line in lines)
+
+    def reset(self) -> None:
+        """Forget the samples of every metric."""
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def write_textfile(self, path: str) -> None:
+        """
+        Add the metrics of this process to a textfile collector file.
+
+        Counters and histograms only add up, so every hook process adds its
+        samples to the ones already in the file, under a lock, and the file is
+        replaced atomically for node-exporter. The samples of this process are
+        then forgotten so a later write does not add them twice.
+
+        Args:
+            path (str): the .prom file read by the node-exporter textfile
+                collector
+
+        Raises:
+            OSError: the file could not be written
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(path) as textfile:
+                    previous = parse_samples(textfile.read())
+            except FileNotFoundError:
+                previous = {}
+
+            # node-exporter only reads files ending in .prom
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as temp_file:
+                temp_file.write(self.render(previous))
+            os.replace(temp_path, path)
+            self.reset()
+
+
+def _family(sample: str) -> str:
+    """Get the metric name of a sample."""
+    name = sample.split("{", 1)[0]
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def parse_samples(text: str) -> Dict[str, float]:
+    """
+    Read the samples of a Prometheus text exposition.
+
+    Args:
+        text (str): the exposition text
+
+    Returns:
+        Dict[str, float]: value of every sample by name and labels, in order
+    """
+    samples: Dict[str, float] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name, _, value = line.rpartition(" ")
+        try:
+            samples[name] = float(value)
+        except ValueError:
+            continue
+    return samples
+
+
+def current_event() -> str:
+    """Get the type of the Gerrit event being processed."""
+    return _EVENT.get()
+
+
+@contextmanager
+def event_context(event_type: str) -> Iterator[None]:
+    """Label the metrics recorded in the with block with an event type."""
+    token = _EVENT.set(event_type)
+    try:
+        yield
+    finally:
+        _EVENT.reset(token)
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "gerrit_to_platform_stage_seconds",
+        "Seconds spent in a stage of the event processing.",
+        ("stage", "event", "platform", "owner"),
+    )
+)
+
+DISCOVERIES = REGISTRY.register(
+    Counter(
+        "gerrit_to_platform_workflow_discoveries_total",
+        "Workflow discoveries by the source of the workflows.",
+        ("event", "platform", "owner", "source"),
+    )
+)
+DISPATCHES = REGISTRY.register(
+    Counter(
+        "gerrit_to_platform_dispatches_total",
+        "Workflow dispatches by result.",
+        ("event", "platform", "owner", "result"),
+    )
+)
+WORKFLOW_CACHE = REGISTRY.register(
+    Counter(
+        "gerrit_to_platform_workflow_cache_total",
+        "Workflow listing pages by cache result.",
+        ("platform", "owner", "result"),
+    )
+)
+COOLDOWN_CHECKS = REGISTRY.register(
+    Counter(
+        "gerrit_to_platform_cooldown_checks_total",
+        "ChatOps cooldown checks by result.",
+        ("event", "result"),
+    )
+)
+
+
+@contextmanager
+def stage(name: str, **labels: str) -> Iterator[None]:
+    """
+    Time a stage of the event processing.
+
+    The wall time of the with block is observed in STAGE_SECONDS and, when
+    the process is profiled, recorded as a span of the profile.
+
+    Args:
+        name (str): the stage eg: discovery
+        labels (str): the event, platform and owner labels
+    """
+    with STAGE_SECONDS.time(stage=name, **labels):
+        with span(name, **labels):
+            yield
+
+
+def serve(address: str) -> "ThreadingHTTPServer":
+    """
+    Export the metrics over HTTP from a background thread.
+
+    Args:
+        address (str): host:port to listen on, eg: 127.0.0.1:9464
+
+    Returns:
+        ThreadingHTTPServer: the running server, shutdown() stops it
+    """
+    # Imported here so hook processes never load the HTTP server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    host, _, port = address.rpartition(":")
+    server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -9,9 +9,7 @@
 ##############################################################################
 """Handler for patchset-created events."""
 
-from typing import Annotated
-
-import typer
+from typing import Annotated, Any
 
 from gerrit_to_platform.helpers import (
     find_and_dispatch,
@@ -20,40 +18,90 @@ from gerrit_to_platform.helpers import (
     get_change_refspec,
 )
 
-app = typer.Typer()
-
-
-@app.command()
-def patchset_created(
-    change: Annotated[str, typer.Option(help="change id")],
-    kind: Annotated[str, typer.Option(help="change kind")],
-    change_url: Annotated[str, typer.Option(help="change url")],
-    change_owner: Annotated[str, typer.Option(help="change owner")],
-    change_owner_username: Annotated[str, typer.Option(help="username")],
-    project: Annotated[str, typer.Option(help="project name")],
-    branch: Annotated[str, typer.Option(help="branch")],
-    topic: Annotated[str, typer.Option(help="topic")],
-    uploader: Annotated[str, typer.Option(help="uploader")],
-    uploader_username: Annotated[str, typer.Option(help="username")],
-    commit: Annotated[str, typer.Option(help="sha1")],
-    patchset: Annotated[str, typer.Option(help="patchset id")],
-):
+
+def _command() -> Any:
+    """Build the typer app of the hook command, typer is only loaded for it."""
+    import typer
+
+    app = typer.Typer()
+
+    @app.command()
+    def patchset_created(
+        change: Annotated[str, typer.Option(help="change id")],
+        kind: Annotated[str, typer.Option(help="change kind")],
+        change_url: Annotated[str, typer.Option(help="change url")],
+        change_owner: Annotated[str, typer.Option(help="change owner")],
+        change_owner_username: Annotated[str, typer.Option(help="username")],
+        project: Annotated[str, typer.Option(help="project name")],
+        branch: Annotated[str, typer.Option(help="branch")],
+        topic: Annotated[str, typer.Option(help="topic")],
+        uploader: Annotated[str, typer.Option(help="uploader")],
+        uploader_username: Annotated[str, typer.Option(help="username")],
+        commit: Annotated[str, typer.Option(help="sha1")],
+        patchset: Annotated[str, typer.Option(help="patchset id")],
+    ):
+        """
+        Handle patcheset-created hook.
+
+        Args:
+            change (str): change ID
+            kind (str): type of change
+            change_url (str): change URL
+            change_owner (str): change owner eg: 'Foo <foo@example.com>'
+            change_owner_username (str): change owner username eg: 'foo'
+            project (str): Gerrit project name
+            branch (str): branch change is against
+            topic (str): topic change is part of
+            uploader (str): uploader of change eg: 'Foo <foo@example.com>'
+            uploader_username (str): uploader of change username eg: 'foo'
+            commit (str): SHA1 of commit
+            patchset (str): patchset number
+        """
+        process_patchset_created(
+            change,
+            kind,
+            change_url,
+            change_owner,
+            change_owner_username,
+            project,
+            branch,
+            topic,
+            uploader,
+            uploader_username,
+            commit,
+            patchset,
+        )
+
+    return app
+
+
+def __getattr__(name: str) -> Any:
+    """Build app, the hook command, on first use, see _command."""
+    if name == "app":
+        app = globals()["app"] = _command()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def process_patchset_created(
+    change: str,
+    kind: str,
+    change_url: str,
+    change_owner: str,
+    change_owner_username: str,
+    project: str,
+    branch: str,
+    topic: str,
+    uploader: str,
+    uploader_username: str,
+    commit: str,
+    patchset: str,
+) -> None:
     """
-    Handle patcheset-created hook.
-
-    Args:
-        change (str): change ID
-        kind (str): type of change
-        change_url (str): change URL
-        change_owner (str): change owner eg: 'Foo <foo@example.com>'
-        change_owner_username (str): change owner username eg: 'foo'
-        project (str): Gerrit project name
-        branch (str): branch change is against
-        topic (str): topic change is part of
-        uploader (str): uploader of change eg: 'Foo <foo@example.com>'
-        uploader_username (str): uploader of change username eg: 'foo'
-        commit (str): SHA1 of commit
-        patchset (str): patchset number
+    Dispatch the verify workflows for a patchset-created event.
+
+    Used by the hook command and by anything else that has the hook
+    arguments, such as the daemon. Arguments are those of the hook.
     """
 
     change_id = get_change_id(change)
@@ -76,4 +124,4 @@ def patchset_created(
 
 
 if __name__ == "__main__":
-    app()
+    _command()()
@@ -0,0 +1,393 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Opt-in profiling of the hook invocations."""
+
+import contextvars
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypedDict, TypeVar
+
+# Environment variable enabling the profiling, overrides [profile] directory
+PROFILE_ENV = "G2P_PROFILE_DIR"
+
+PROFILE_SUFFIX = ".prof"
+SPANS_SUFFIX = ".json"
+
+T = TypeVar("T")
+
+
+class Span(TypedDict):
+    """Timed stage of a hook invocation."""
+
+    name: str
+    labels: Dict[str, str]
+    start: float
+    seconds: float
+    children: List["Span"]
+
+
+class ApiCall(TypedDict):
+    """Timed platform API request."""
+
+    verb: str
+    path: str
+    status: int
+    start: float
+    seconds: float
+
+
+class Profile:
+    """Spans and API calls recorded during one hook invocation."""
+
+    def __init__(self, event_type: str):
+        """
+        Start the profile.
+
+        Args:
+            event_type (str): the Gerrit event type of the invocation
+        """
+        self.event_type = event_type
+        self.started = time.time()
+        self._origin = time.perf_counter()
+        self.root: Span = self.new_span(event_type, {})
+        self.api_calls: List[ApiCall] = []
+        # cProfile.Profile of the other threads, see profile_thread
+        self.thread_profilers: List[Any] = []
+        self._lock = threading.Lock()
+
+    def offset(self, at: Optional[float] = None) -> float:
+        """Get the seconds from the start of the profile to at, or now."""
+        return (time.perf_counter() if at is None else at) - self._origin
+
+    def new_span(self, name: str, labels: Dict[str, str]) -> Span:
+        """Create a span starting now."""
+        return {
+            "name": name,
+            "labels": labels,
+            "start": self.offset(),
+            "seconds": 0.0,
+            "children": [],
+        }
+
+    def add_child(self, parent: Span, child: Span) -> None:
+        """Attach a span to its parent, spans may end in any thread."""
+        with self._lock:
+            parent["children"].append(child)
+
+    def add_api_call(self, call: ApiCall) -> None:
+        """Record an API request."""
+        with self._lock:
+            self.api_calls.append(call)
+
+    def add_thread_profiler(self, profiler: Any) -> None:
+        """Add the stopped profiler of another thread to the statistics."""
+        with self._lock:
+            self.thread_profilers.append(profiler)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the JSON document of the profile."""
+        return {
+            "event": self.event_type,
+            "started": self.started,
+            "spans": self.root,
+            "api_calls": self.api_calls,
+        }
+
+
+# The profile of this process, hooks handle a single event per process
+_PROFILE: Optional[Profile] = None
+
+# Span the spans started in this context are children of
+_PARENT: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "profile_span", default=None
+)
+
+
+@contextmanager
+def span(name: str, **labels: str) -> Iterator[None]:
+    """
+    Record the wall time of the with block as a span of the profile.
+
+    Spans nest following the context, spans started in threads that did not
+    inherit it are attached to the root span. Does nothing when the process
+    is not profiled.
+
+    Args:
+        name (str): the stage eg: discovery
+        labels (str): attributes of the span eg: owner
+    """
+    profile = _PROFILE
+    if profile is None:
+        yield
+        return
+
+    parent = _PARENT.get() or profile.root
+    current = profile.new_span(name, labels)
+    token = _PARENT.set(current)
+    try:
+        yield
+    finally:
+        _PARENT.reset(token)
+        current["seconds"] = profile.offset() - current["start"]
+        profile.add_child(parent, current)
+
+
+def record_api_call(verb: str, path: str, status: int, start: float) -> None:
+    """
+    Record an API request in the profile, if the process is profiled.
+
+    Args:
+        verb (str): HTTP method
+        path (str): API path without query string
+        status (int): response status, 0 when no response was received
+        start (float): time.perf_counter() when the request started
+    """
+    profile = _PROFILE
+    if profile is None:
+        return
+
+    profile.add_api_call(
+        {
+            "verb": verb,
+            "path": path,
+            "status": status,
+            "start": profile.offset(start),
+            "seconds": time.perf_counter() - start,
+        }
+    )
+
+
+@contextmanager
+def profile_thread() -> Iterator[None]:
+    """
+    Add the calls of this thread in the with block to the profile.
+
+    cProfile only profiles the thread enabling it, the work of the background
+    event loop and of the request worker threads is added to the statistics of
+    the invocation this way. Does nothing when the process is not profiled, or
+    when a profiler is already active in the thread.
+    """
+    profile = _PROFILE
+    if profile is None or sys.getprofile() is not None:
+        yield
+        return
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+: another profiler is active
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profile.add_thread_profiler(profiler)
+
+
+def profiled_call(function: Callable[..., T], *args: Any) -> T:
+    """Call function in profile_thread, for executors."""
+    with profile_thread():
+        return function(*args)
+
+
+def profile_directory() -> Optional[str]:
+    """
+    Get the directory profiles are written to.
+
+    Returns:
+        Optional[str]: the G2P_PROFILE_DIR environment variable, else the
+            [profile] directory option, None when profiling is disabled
+    """
+    directory = os.environ.get(PROFILE_ENV)
+    if directory:
+        return directory
+
+    # Imported here so the profiling module has no import time cost
+    from gerrit_to_platform.config import get_settings
+
+    try:
+        return get_settings()["profile_directory"]
+    except OSError:
+        return None
+
+
+@contextmanager
+def profiled(event_type: str) -> Iterator[Optional[Profile]]:
+    """
+    Profile the with block when profiling is enabled.
+
+    Writes <event>-<time>-<pid>.prof with the cProfile statistics and a .json
+    file with the span tree and the API calls to the profile directory. The
+    statistics include the calls made in other threads within profile_thread
+    blocks, eg: on the background event loop, which end before the with
+    block.
+
+    Args:
+        event_type (str): the Gerrit event type of the invocation
+
+    Yields:
+        Optional[Profile]: the profile, None when profiling is disabled
+    """
+    global _PROFILE
+
+    directory = profile_directory()
+    if not directory:
+        yield None
+        return
+
+    import cProfile
+
+    profile = Profile(event_type)
+    profiler = cProfile.Profile()
+    _PROFILE = profile
+    token = _PARENT.set(profile.root)
+    profiler.enable()
+    try:
+        yield profile
+    finally:
+        profiler.disable()
+        _PARENT.reset(token)
+        _PROFILE = None
+        profile.root["seconds"] = profile.offset()
+        try:
+            write_profile(directory, profile, profiler)
+        except OSError as e:
+            print(f"Failed to write the profile: {e}")
+
+
+def write_profile(directory: str, profile: Profile, profiler: Any) -> str:
+    """
+    Write the files of a profile.
+
+    Args:
+        directory (str): the profile directory, created on demand
+        profile (Profile): the recorded spans and API calls
+        profiler (cProfile.Profile): the stopped profiler
+
+    Returns:
+        str: path of the profile files without suffix
+    """
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(
+        directory, f"{profile.event_type}-{time.time_ns():020d}-{os.getpid()}"
+    )
+    if profile.thread_profilers:
+        import pstats
+
+        stats = pstats.Stats(profiler)
+        for thread_profiler in profile.thread_profilers:
+            stats.add(thread_profiler)
+        stats.dump_stats(base + PROFILE_SUFFIX)
+    else:
+        profiler.dump_stats(base + PROFILE_SUFFIX)
+    with open(base + SPANS_SUFFIX, "w") as spans_file:
+        json.dump(profile.to_dict(), spans_file)
+    return base
+
+
+class StageSummary(TypedDict):
+    """Wall time of a stage path across profiles."""
+
+    stage: str
+    calls: int
+    total: float
+    max: float
+
+
+def _walk(node: Span, path: str, stages: Dict[str, StageSummary]) -> None:
+    """Add the wall time of a span tree to the stage summaries."""
+    summary = stages.setdefault(
+        path, {"stage": path, "calls": 0, "total": 0.0, "max": 0.0}
+    )
+    summary["calls"] += 1
+    summary["total"] += node["seconds"]
+    summary["max"] = max(summary["max"], node["seconds"])
+    for child in node["children"]:
+        _walk(child, f"{path}/{child['name']}", stages)
+
+
+class ProfileReport(TypedDict):
+    """Profiles merged into ranked stages, API calls and functions."""
+
+    profiles: int
+    stages: List[StageSummary]
+    api_calls: List[StageSummary]
+    functions: List[Dict[str, Any]]
+
+
+def merge_profiles(directory: str, top: int = 20) -> ProfileReport:
+    """
+    Merge the profiles of a directory into a ranked hot path report.
+
+    Stages are keyed by their path in the span tree, eg:
+    patchset-created/find_and_dispatch/dispatch, and API calls by method and
+    path. Functions are ranked by cumulative time over every profile.
+
+    Args:
+        directory (str): the profile directory
+        top (int): number of functions reported
+
+    Returns:
+        ProfileReport: stages and API calls by total wall time, and the top
+            functions by cumulative time
+    """
+    stages: Dict[str, StageSummary] = {}
+    api_calls: Dict[str, StageSummary] = {}
+    documents = sorted(glob.glob(os.path.join(directory, "*" + SPANS_SUFFIX)))
+    for path in documents:
+        with open(path) as spans_file:
+            document = json.load(spans_file)
+        _walk(document["spans"], document["spans"]["name"], stages)
+        for call in document["api_calls"]:
+            key = f"{call['verb']} {call['path']}"
+            summary = api_calls.setdefault(
+                key, {"stage": key, "calls": 0, "total": 0.0, "max": 0.0}
+            )
+            summary["calls"] += 1
+            summary["total"] += call["seconds"]
+            summary["max"] = max(summary["max"], call["seconds"])
+
+    functions: List[Dict[str, Any]] = []
+    stats_files = sorted(glob.glob(os.path.join(directory, "*" + PROFILE_SUFFIX)))
+    if stats_files:
+        import pstats
+
+        # function: (primitive calls, calls, own time, cumulative time, callers)
+        rows = pstats.Stats(*stats_files).stats  # type: ignore
+        for (filename, line, function), row in sorted(
+            rows.items(), key=lambda item: item[1][3], reverse=True
+        )[:top]:
+            functions.append(
+                {
+                    "function": f"{filename}:{line}({function})",
+                    "calls": row[1],
+                    "tottime": row[2],
+                    "cumtime": row[3],
+                }
+            )
+
+    def ranked(summaries: Dict[str, StageSummary]) -> List[StageSummary]:
+        return sorted(summaries.values(), key=lambda item: item["total"], reverse=True)
+
+    return {
+        "profiles": len(documents),
+        "stages": ranked(stages),
+        "api_calls": ranked(api_calls),
+        "functions": functions,
+    }
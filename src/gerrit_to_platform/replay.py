@@ -0,0 +1,367 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Replay of recorded Gerrit events and synthetic load against the handlers."""
+
+import configparser
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypedDict
+
+import gerrit_to_platform.config
+from gerrit_to_platform.config import CONFIG, clear_config_cache, get_config
+from gerrit_to_platform.events import (
+    CHANGE_MERGED,
+    COMMENT_ADDED,
+    EVENT_ARGUMENTS,
+    PATCHSET_CREATED,
+    Event,
+    from_stream_event,
+    load_event,
+    process_event,
+)
+from gerrit_to_platform.fake_github import FakeGitHub, make_workflows
+from gerrit_to_platform.metrics import DISPATCHES
+
+# Share of each event type in the synthetic load
+DEFAULT_MIX = {PATCHSET_CREATED: 0.6, COMMENT_ADDED: 0.3, CHANGE_MERGED: 0.1}
+
+# Comments of the synthetic comment-added events, picked uniformly
+DEFAULT_COMMENTS = ("recheck", "remerge", "gha-run verify", "Looks good to me")
+
+# Workflows every repository of the fake platform API has
+DEFAULT_FAKE_WORKFLOWS = ("gerrit-verify", "gerrit-merge", "gerrit-comment-handler")
+
+GERRIT_URL = "https://gerrit.example.org"
+
+
+def read_events(lines: Iterable[str]) -> Iterator[Event]:
+    """
+    Read recorded events, one JSON document per line.
+
+    Lines may be Gerrit stream-events records or events serialized by the
+    hooks, as found in the spool. Other event types and invalid lines are
+    skipped.
+
+    Args:
+        lines (Iterable[str]): the recorded lines
+
+    Yields:
+        Event: the events to replay
+    """
+    for line in lines:
+        try:
+            data = json.loads(line)
+        except ValueError:
+            continue
+        event = load_event(data) or from_stream_event(data)
+        if event is not None:
+            yield event
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """
+    Parse an event mix, eg: patchset-created=6,comment-added=3.
+
+    Args:
+        text (str): comma separated event type=weight pairs
+
+    Returns:
+        Dict[str, float]: weight of each event type
+
+    Raises:
+        ValueError: an unknown event type or an invalid weight
+    """
+    mix: Dict[str, float] = {}
+    for item in text.split(","):
+        event_type, _, weight = item.strip().partition("=")
+        if event_type not in EVENT_ARGUMENTS:
+            raise ValueError(f"Unknown event type: {event_type}")
+        mix[event_type] = float(weight or 1)
+        if mix[event_type] < 0:
+            raise ValueError(f"Negative weight for {event_type}")
+    if not any(mix.values()):
+        raise ValueError("The event mix has no weight")
+    return mix
+
+
+def generate_events(
+    count: int,
+    projects: List[str],
+    mix: Optional[Dict[str, float]] = None,
+    comments: Iterable[str] = DEFAULT_COMMENTS,
+    skew: float = 1.0,
+    changes: int = 100,
+    seed: Optional[int] = None,
+) -> Iterator[Event]:
+    """
+    Generate a synthetic event stream.
+
+    Projects are picked with a Zipf distribution, the first project of the
+    list being the busiest. Events refer to a pool of open changes, every
+    patchset-created adds a patchset to its change and every change-merged
+    replaces its change with a new one.
+
+    Args:
+        count (int): number of events
+        projects (List[str]): Gerrit project names
+        mix (Optional[Dict[str, float]]): weight of each event type, defaults
+            to DEFAULT_MIX
+        comments (Iterable[str]): comments of the comment-added events
+        skew (float): Zipf exponent of the project distribution, 0 is uniform
+        changes (int): number of open changes
+        seed (Optional[int]): seed of the random generator for a
+            reproducible stream
+
+    Yields:
+        Event: the synthetic events
+    """
+    mix = mix or DEFAULT_MIX
+    comments = list(comments)
+    generator = random.Random(seed)  # nosec B311
+    event_types = list(mix)
+    type_weights = [mix[event_type] for event_type in event_types]
+    project_weights = [1 / (rank**skew) for rank in range(1, len(projects) + 1)]
+
+    # change number: (project, patchset)
+    open_changes: Dict[int, List[Any]] = {}
+    next_number = 1
+    for _ in range(max(changes, 1)):
+        project = generator.choices(projects, project_weights)[0]
+        open_changes[next_number] = [project, 1]
+        next_number += 1
+
+    for _ in range(count):
+        event_type = generator.choices(event_types, type_weights)[0]
+        number = generator.choice(list(open_changes))
+        project, patchset = open_changes[number]
+        if event_type == PATCHSET_CREATED:
+            patchset += 1
+            open_changes[number][1] = patchset
+        elif event_type == CHANGE_MERGED:
+            del open_changes[number]
+            open_changes[next_number] = [
+                generator.choices(projects, project_weights)[0],
+                1,
+            ]
+            next_number += 1
+
+        commit = f"{generator.getrandbits(160):040x}"
+        user = f"user{generator.randrange(50)}"
+        account = f"{user.title()} <{user}@example.org>"
+        comment = generator.choice(comments) if comments else ""
+        arguments = {
+            "change": f"{project}~master~I{number:040x}",
+            "kind": "REWORK",
+            "change_url": f"{GERRIT_URL}/c/{project}/+/{number}",
+            "change_owner": account,
+            "change_owner_username": user,
+            "project": project,
+            "branch": "master",
+            "topic": "",
+            "uploader": account,
+            "uploader_username": user,
+            "author": account,
+            "author_username": user,
+            "submitter": account,
+            "submitter_username": user,
+            "commit": commit,
+            "newrev": commit,
+            "patchset": str(patchset),
+            "comment": f"Patch Set {patchset}:\n\n{comment}",
+        }
+        yield {
+            "type": event_type,
+            "arguments": {
+                name: arguments[name] for name in EVENT_ARGUMENTS[event_type]
+            },
+        }
+
+
+class LoadReport(TypedDict):
+    """Outcome of a replay."""
+
+    events: int
+    failed: int
+    seconds: float
+    target_rate: float
+    throughput: float
+    latency_p50: float
+    latency_p95: float
+    latency_p99: float
+    latency_max: float
+    lag_max: float
+    dispatched: int
+    queued: int
+    dispatch_failed: int
+    by_type: Dict[str, int]
+    errors: Dict[str, int]
+
+
+def percentile(values: List[float], share: float) -> float:
+    """Get the nearest-rank percentile of sorted values, 0 when empty."""
+    if not values:
+        return 0.0
+    index = max(int(round(share * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def run_load(
+    events: Iterable[Event],
+    rate: float = 0.0,
+    workers: int = 1,
+    process: Callable[[Event], Any] = process_event,
+) -> LoadReport:
+    """
+    Process events at a target rate and measure the handlers.
+
+    Events start on an open-loop schedule of rate events per second, so a
+    slow handler does not slow down the arrivals, lag_max tells how late the
+    processing of an event started. With rate 0 events are processed as
+    fast as the workers allow.
+
+    Args:
+        events (Iterable[Event]): the events to process
+        rate (float): events started per second, 0 for the maximum rate
+        workers (int): events processed concurrently
+        process (Callable[[Event], Any]): the event processor
+
+    Returns:
+        LoadReport: throughput, latency percentiles and dispatches
+    """
+    latencies: List[float] = []
+    lags: List[float] = []
+    by_type: Dict[str, int] = {}
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+    # bounds the events waiting for a worker when running at maximum rate
+    slots = threading.BoundedSemaphore(workers * 2)
+    before = {
+        result: DISPATCHES.total(result=result)
+        for result in ("dispatched", "queued", "failed")
+    }
+
+    def run(event: Event, scheduled: float) -> None:
+        start = time.perf_counter()
+        error = None
+        try:
+            process(event)
+        except Exception as e:
+            error = f"{event['type']}: {e.__class__.__name__}: {e}"
+        finally:
+            slots.release()
+        latency = time.perf_counter() - start
+        with lock:
+            latencies.append(latency)
+            lags.append(max(start - scheduled, 0.0))
+            by_type[event["type"]] = by_type.get(event["type"], 0) + 1
+            if error is not None:
+                errors[error] = errors.get(error, 0) + 1
+
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for index, event in enumerate(events):
+            scheduled = begin + index / rate if rate > 0 else time.perf_counter()
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            slots.acquire()
+            executor.submit(run, event, scheduled)
+    seconds = time.perf_counter() - begin
+
+    latencies.sort()
+    return {
+        "events": len(latencies),
+        "failed": sum(errors.values()),
+        "seconds": seconds,
+        "target_rate": rate,
+        "throughput": len(latencies) / seconds if seconds > 0 else 0.0,
+        "latency_p50": percentile(latencies, 0.50),
+        "latency_p95": percentile(latencies, 0.95),
+        "latency_p99": percentile(latencies, 0.99),
+        "latency_max": latencies[-1] if latencies else 0.0,
+        "lag_max": max(lags, default=0.0),
+        "dispatched": int(DISPATCHES.total(result="dispatched") - before["dispatched"]),
+        "queued": int(DISPATCHES.total(result="queued") - before["queued"]),
+        "dispatch_failed": int(DISPATCHES.total(result="failed") - before["failed"]),
+        "by_type": by_type,
+        "errors": errors,
+    }
+
+
+@contextmanager
+def fake_platform(
+    workflows: Optional[List[str]] = None, latency: float = 0.0
+) -> Iterator[FakeGitHub]:
+    """
+    Point the configuration at a local fake GitHub API for the with block.
+
+    The current gerrit_to_platform.ini is copied with the GitHub API URL set
+    to the fake one, a token instead of GitHub App credentials, and the
+    cache, cooldown and retry queue in a temporary directory, so a replay
+    never reaches GitHub or touches the production state. The
+    replication.config is used unchanged.
+
+    Args:
+        workflows (Optional[List[str]]): workflow names of every repository,
+            defaults to DEFAULT_FAKE_WORKFLOWS
+        latency (float): seconds the fake API takes to answer
+
+    Yields:
+        FakeGitHub: the running fake API, recording the dispatches
+    """
+    names = list(workflows or DEFAULT_FAKE_WORKFLOWS)
+    with ExitStack() as stack:
+        directory = stack.enter_context(tempfile.TemporaryDirectory())
+        server = stack.enter_context(
+            FakeGitHub(make_workflows(len(names), names), latency=latency)
+        )
+
+        config = configparser.ConfigParser(interpolation=None)
+        try:
+            current = get_config()
+        except OSError:
+            current = configparser.ConfigParser()
+        for section in current.sections():
+            config[section] = dict(current.items(section, raw=True))
+        if not config.has_section("github.com"):
+            config.add_section("github.com")
+        for option in ("app_id", "app_private_key", "token", "tokens"):
+            config.remove_option("github.com", option)
+        config["github.com"]["token"] = "replay"
+        config["github.com"]["api_url"] = server.url
+        overrides = {
+            "cache": {"directory": os.path.join(directory, "cache")},
+            "cooldown": {"path": os.path.join(directory, "cooldown.sqlite3")},
+            "retry": {"queue": os.path.join(directory, "retry.sqlite3")},
+        }
+        for section, options in overrides.items():
+            if not config.has_section(section):
+                config.add_section(section)
+            config[section].update(options)
+
+        config_path = os.path.join(directory, "gerrit_to_platform.ini")
+        with open(config_path, "w") as config_file:
+            config.write(config_file)
+
+        config_files = gerrit_to_platform.config.CONFIG_FILES
+        original = config_files[CONFIG]
+        config_files[CONFIG] = config_path
+        clear_config_cache()
+        try:
+            yield server
+        finally:
+            config_files[CONFIG] = original
+            clear_config_cache()
@@ -0,0 +1,392 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Durable queue of workflow dispatches to retry."""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple, TypedDict
+
+from gerrit_to_platform.config import get_settings
+
+# Seconds a claimed dispatch is hidden from other drains while it is retried
+CLAIM_LEASE = 300
+
+# Seconds a given up dispatch is kept for inspection after it was queued
+DEAD_RETENTION = 7 * 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dispatches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    platform TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    repository TEXT NOT NULL,
+    workflow_id TEXT NOT NULL,
+    ref TEXT NOT NULL,
+    inputs TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    enqueued REAL NOT NULL,
+    next_attempt REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS dispatches_next_attempt ON dispatches (next_attempt);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+class QueuedDispatch(TypedDict):
+    """Workflow dispatch waiting in the retry queue."""
+
+    id: int
+    platform: str
+    owner: str
+    repository: str
+    workflow_id: str
+    ref: str
+    inputs: Dict[str, str]
+    attempts: int
+    enqueued: float
+    last_error: Optional[str]
+
+
+class QueueStats(TypedDict):
+    """Depth of the retry queue and latency of the successful retries."""
+
+    depth: int
+    due: int
+    dead: int
+    oldest_age: float
+    retried: int
+    dropped: int
+    retry_latency_avg: float
+    retry_latency_max: float
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Indicate if a failed call is worth retrying later.
+
+    Platform errors tell through their retryable attribute, other errors are
+    transient when they come from the network.
+
+    Args:
+        error (Exception): the error raised by the call
+
+    Returns:
+        bool: True if the call may succeed later
+    """
+    return bool(getattr(error, "retryable", isinstance(error, OSError)))
+
+
+def backoff(attempts: int, base: float, cap: float) -> float:
+    """
+    Get the seconds to wait before the next attempt.
+
+    The delay doubles with every attempt up to cap and half of it is
+    randomized, so dispatches that failed together are not all retried at
+    the same moment.
+
+    Args:
+        attempts (int): attempts made so far, at least 1
+        base (float): delay after the first attempt
+        cap (float): maximum delay
+
+    Returns:
+        float: seconds to wait
+    """
+    delay = min(cap, base * 2 ** min(attempts - 1, 32))
+    return delay / 2 + random.uniform(0, delay / 2)  # nosec
+
+
+class RetryQueue:
+    """
+    SQLite queue of failed dispatches, shared by the hook processes.
+
+    Every operation opens its own connection so the queue can be used from
+    any thread or process, SQLite serializes the writers.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_attempts: int,
+        base_backoff: float,
+        max_backoff: float,
+    ):
+        """
+        Create the queue, and its database on first use.
+
+        Args:
+            path (str): path of the SQLite database
+            max_attempts (int): attempts, the original one included, before a
+                dispatch is given up
+            base_backoff (float): seconds before the first retry
+            max_backoff (float): maximum seconds between two attempts
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection that waits for the other writers."""
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def _increment(
+        self, connection: sqlite3.Connection, name: str, value: float = 1
+    ) -> None:
+        """Add to a counter."""
+        connection.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            + "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+            (name, value),
+        )
+
+    def enqueue(
+        self,
+        platform: str,
+        owner: str,
+        repository: str,
+        workflow_id: str,
+        ref: str,
+        inputs: Dict[str, str],
+        error: Exception,
+    ) -> None:
+        """
+        Queue a dispatch that failed for its first retry.
+
+        Args:
+            platform (str): platform value eg: github
+            owner (str): owner of the repository
+            repository (str): repository of the workflow
+            workflow_id (str): the workflow to dispatch
+            ref (str): git ref the workflow runs on
+            inputs (Dict[str, str]): the workflow inputs
+            error (Exception): why the dispatch failed
+        """
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO dispatches (platform, owner, repository, "
+                + "workflow_id, ref, inputs, attempts, enqueued, next_attempt, "
+                + "last_error) VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?)",
+                (
+                    platform,
+                    owner,
+                    repository,
+                    workflow_id,
+                    ref,
+                    json.dumps(inputs),
+                    now,
+                    now + backoff(1, self.base_backoff, self.max_backoff),
+                    str(error),
+                ),
+            )
+
+    def claim(self, limit: Optional[int] = None) -> List[QueuedDispatch]:
+        """
+        Take the dispatches due for a retry.
+
+        Claimed dispatches are hidden from other drains for CLAIM_LEASE
+        seconds, each must then be passed to succeeded or failed.
+
+        Args:
+            limit (Optional[int]): most dispatches to take, all when None
+
+        Returns:
+            List[QueuedDispatch]: the dispatches to retry, oldest first
+        """
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            rows = connection.execute(
+                "SELECT id, platform, owner, repository, workflow_id, ref, "
+                + "inputs, attempts, enqueued, last_error FROM dispatches "
+                + "WHERE next_attempt <= ? ORDER BY next_attempt LIMIT ?",
+                (now, -1 if limit is None else limit),
+            ).fetchall()
+            connection.executemany(
+                "UPDATE dispatches SET next_attempt = ? WHERE id = ?",
+                [(now + CLAIM_LEASE, row[0]) for row in rows],
+            )
+            connection.execute("COMMIT")
+
+        return [
+            {
+                "id": row[0],
+                "platform": row[1],
+                "owner": row[2],
+                "repository": row[3],
+                "workflow_id": row[4],
+                "ref": row[5],
+                "inputs": json.loads(row[6]),
+                "attempts": row[7],
+                "enqueued": row[8],
+                "last_error": row[9],
+            }
+            for row in rows
+        ]
+
+    def succeeded(self, dispatch: QueuedDispatch) -> None:
+        """
+        Remove a dispatch that was retried successfully.
+
+        Args:
+            dispatch (QueuedDispatch): the claimed dispatch
+        """
+        latency = time.time() - dispatch["enqueued"]
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM dispatches WHERE id = ?", (dispatch["id"],))
+            self._increment(connection, "retried")
+            self._increment(connection, "retry_latency_sum", latency)
+            connection.execute(
+                "INSERT INTO counters (name, value) VALUES ('retry_latency_max', ?) "
+                + "ON CONFLICT (name) DO UPDATE "
+                + "SET value = max(value, excluded.value)",
+                (latency,),
+            )
+            connection.execute("COMMIT")
+
+    def failed(self, dispatch: QueuedDispatch, error: Exception) -> bool:
+        """
+        Schedule the next attempt of a dispatch that failed again.
+
+        Dispatches that failed max_attempts times, or with an error that is
+        not transient, are kept without a next attempt so they can be
+        inspected.
+
+        Args:
+            dispatch (QueuedDispatch): the claimed dispatch
+            error (Exception): why the retry failed
+
+        Returns:
+            bool: True if the dispatch will be retried, False if given up
+        """
+        attempts = dispatch["attempts"] + 1
+        retry = attempts < self.max_attempts and is_transient(error)
+        next_attempt = None
+        if retry:
+            next_attempt = time.time() + backoff(
+                attempts, self.base_backoff, self.max_backoff
+            )
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "UPDATE dispatches SET attempts = ?, next_attempt = ?, "
+                + "last_error = ? WHERE id = ?",
+                (attempts, next_attempt, str(error), dispatch["id"]),
+            )
+            if not retry:
+                self._increment(connection, "dropped")
+            connection.execute("COMMIT")
+        return retry
+
+    def purge(self, retention: float = DEAD_RETENTION) -> int:
+        """
+        Delete the given up dispatches queued more than retention seconds ago.
+
+        Args:
+            retention (float): seconds a given up dispatch is kept
+
+        Returns:
+            int: the number of deleted dispatches
+        """
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "DELETE FROM dispatches WHERE next_attempt IS NULL AND enqueued < ?",
+                (time.time() - retention,),
+            )
+        return cursor.rowcount
+
+    def stats(self) -> QueueStats:
+        """
+        Get the queue depth and the latency of the successful retries.
+
+        Returns:
+            QueueStats: pending, due and given up dispatches, age of the
+                oldest pending one, and retry counters since the queue was
+                created
+        """
+        now = time.time()
+        with self._connect() as connection:
+            depth, due, oldest = connection.execute(
+                "SELECT count(*), count(CASE WHEN next_attempt <= ? THEN 1 END), "
+                + "min(enqueued) FROM dispatches WHERE next_attempt IS NOT NULL",
+                (now,),
+            ).fetchone()
+            (dead,) = connection.execute(
+                "SELECT count(*) FROM dispatches WHERE next_attempt IS NULL"
+            ).fetchone()
+            counters = dict(
+                connection.execute("SELECT name, value FROM counters").fetchall()
+            )
+
+        retried = int(counters.get("retried", 0))
+        return {
+            "depth": depth,
+            "due": due,
+            "dead": dead,
+            "oldest_age": now - oldest if oldest is not None else 0.0,
+            "retried": retried,
+            "dropped": int(counters.get("dropped", 0)),
+            "retry_latency_avg": (
+                counters.get("retry_latency_sum", 0.0) / retried if retried else 0.0
+            ),
+            "retry_latency_max": counters.get("retry_latency_max", 0.0),
+        }
+
+
+_QUEUE: Optional[Tuple[Tuple[str, int, float, float], RetryQueue]] = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def get_retry_queue() -> Optional[RetryQueue]:
+    """
+    Get the retry queue for the current settings.
+
+    Returns:
+        Optional[RetryQueue]: the queue or None when the [retry] queue option
+            is set empty
+    """
+    global _QUEUE
+
+    settings = get_settings()
+    if not settings["retry_queue"]:
+        return None
+
+    options = (
+        settings["retry_queue"],
+        settings["retry_max_attempts"],
+        settings["retry_backoff"],
+        settings["retry_max_backoff"],
+    )
+    with _QUEUE_LOCK:
+        if _QUEUE is None or _QUEUE[0] != options:
+            _QUEUE = (options, RetryQueue(*options))
+        return _QUEUE[1]
@@ -0,0 +1,189 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Append-only spool of hook events processed later by a worker."""
+
+import fcntl
+import glob
+import json
+import os
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from gerrit_to_platform.events import Event, load_event
+
+# Name of the log hooks append to, the worker renames it into a segment
+ACTIVE_LOG = "events.log"
+
+SEGMENT_SUFFIX = ".segment"
+OFFSET_SUFFIX = ".offset"
+
+# Patchsets held by the worker's debouncer, processed after a restart
+HELD_EVENTS = "held.json"
+
+
+class Spool:
+    """
+    Directory of newline delimited JSON event logs.
+
+    Hooks append each event with a single write to the active log while
+    holding a shared lock on it. The worker renames the active log into a
+    segment, takes an exclusive lock to wait for the appends still in
+    flight, then processes the segment, recording the offset of the events
+    done so a crashed worker resumes where it stopped. Events are processed
+    at least once.
+    """
+
+    def __init__(self, directory: str, fsync: bool = False):
+        """
+        Create the spool.
+
+        Args:
+            directory (str): directory holding the logs, created on demand
+            fsync (bool): flush every appended event to disk before returning
+        """
+        self.directory = directory
+        self.fsync = fsync
+        self.active_path = os.path.join(directory, ACTIVE_LOG)
+        self.held_path = os.path.join(directory, HELD_EVENTS)
+
+    def append(self, event: Event) -> None:
+        """
+        Append an event to the active log.
+
+        Args:
+            event (Event): the validated event
+
+        Raises:
+            OSError: the event could not be written
+        """
+        line = json.dumps(event, separators=(",", ":")).encode() + b"\n"
+        while True:
+            try:
+                handle = os.open(
+                    self.active_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600
+                )
+            except FileNotFoundError:
+                os.makedirs(self.directory, mode=0o700, exist_ok=True)
+                continue
+
+            try:
+                fcntl.flock(handle, fcntl.LOCK_SH)
+                # the worker may have rotated the log since it was opened
+                try:
+                    current = os.stat(self.active_path).st_ino
+                except FileNotFoundError:
+                    current = None
+                if current != os.fstat(handle).st_ino:
+                    continue
+                os.write(handle, line)
+                if self.fsync:
+                    os.fsync(handle)
+                return
+            finally:
+                os.close(handle)
+
+    def _rotate(self) -> None:
+        """Turn the active log into a segment once its appends are done."""
+        segment = os.path.join(
+            self.directory, f"{time.time_ns():020d}-{os.getpid()}{SEGMENT_SUFFIX}"
+        )
+        try:
+            os.rename(self.active_path, segment)
+        except FileNotFoundError:
+            return
+
+        with open(segment, "rb") as segment_file:
+            # appends that started before the rename hold a shared lock
+            fcntl.flock(segment_file, fcntl.LOCK_EX)
+
+    def segments(self) -> List[str]:
+        """Get the segments waiting to be processed, oldest first."""
+        return sorted(glob.glob(os.path.join(self.directory, "*" + SEGMENT_SUFFIX)))
+
+    def pending(self) -> int:
+        """Count the events waiting in the spool."""
+        count = 0
+        for path in self.segments() + [self.active_path]:
+            try:
+                with open(path, "rb") as log:
+                    log.seek(self._offset(path))
+                    count += sum(1 for _ in log)
+            except FileNotFoundError:
+                pass
+        return count
+
+    def _offset(self, segment: str) -> int:
+        """Get the offset of the events already processed in a segment."""
+        try:
+            with open(segment + OFFSET_SUFFIX) as offset_file:
+                return int(offset_file.read())
+        except (OSError, ValueError):
+            return 0
+
+    def _checkpoint(self, segment: str, offset: int) -> None:
+        """Record the events processed in a segment up to offset."""
+        temp_path = f"{segment}{OFFSET_SUFFIX}.tmp"
+        with open(temp_path, "w") as offset_file:
+            offset_file.write(str(offset))
+        os.replace(temp_path, segment + OFFSET_SUFFIX)
+
+    def _read(self, segment: str) -> Iterator[Tuple[Optional[Event], int]]:
+        """Read the events of a segment after its checkpoint with their end."""
+        with open(segment, "rb") as log:
+            log.seek(self._offset(segment))
+            for line in log:
+                event = None
+                if line.endswith(b"\n"):
+                    try:
+                        event = load_event(json.loads(line))
+                    except ValueError:
+                        pass
+                if event is None:
+                    print(f"Skipping invalid spooled event: {line!r}")
+                yield event, log.tell()
+
+    def drain(self, process: Callable[[List[Event]], None], batch_size: int = 1) -> int:
+        """
+        Process the spooled events.
+
+        Args:
+            process (Callable[[List[Event]], None]): processes a batch of
+                events, the batch is recorded as done once it returns
+            batch_size (int): events passed to process at once
+
+        Returns:
+            int: the number of events processed
+        """
+        if os.path.exists(self.active_path):
+            self._rotate()
+
+        processed = 0
+        for segment in self.segments():
+            batch: List[Event] = []
+            offset = 0
+            for event, offset in self._read(segment):
+                if event is not None:
+                    batch.append(event)
+                if len(batch) >= batch_size:
+                    process(batch)
+                    processed += len(batch)
+                    batch = []
+                    self._checkpoint(segment, offset)
+            if batch:
+                process(batch)
+                processed += len(batch)
+
+            os.unlink(segment)
+            try:
+                os.unlink(segment + OFFSET_SUFFIX)
+            except FileNotFoundError:
+                pass
+
+        return processed
@@ -0,0 +1,295 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Long-lived consumer of the Gerrit stream-events feed."""
+
+import hashlib
+import json
+import os
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple, TypedDict
+
+from gerrit_to_platform.events import Event, from_stream_event, load_event
+
+# Seconds between two reads of a followed file that has no new line
+DEFAULT_FOLLOW_INTERVAL = 0.5
+
+
+def event_key(event: Event, created: Optional[float] = None) -> str:
+    """
+    Get the identity of an event, the same for every copy of it.
+
+    Gerrit emits identical events for eg: the same comment posted twice on a
+    patchset, their eventCreatedOn tells them apart.
+
+    Args:
+        event (Event): the event
+        created (Optional[float]): the eventCreatedOn of the event, None when
+            it has none
+
+    Returns:
+        str: the key of the event
+    """
+    return hashlib.sha256(
+        json.dumps(
+            {"event": event, "created": created},
+            sort_keys=True,
+            separators=(",", ":"),
+        ).encode()
+    ).hexdigest()
+
+
+class Checkpoint:
+    """
+    Position of the consumer in the event stream, kept across restarts.
+
+    The position is the creation time of the oldest event still in flight,
+    or of the newest event done when none is. Events created more than
+    window seconds before the position were handled before, the events done
+    within the window are remembered by key, so events Gerrit emits out of
+    order and events read again after a restart are each processed once.
+    Every completed event rewrites the checkpoint file atomically, an event
+    in flight when the consumer stops is processed again on restart.
+    """
+
+    def __init__(self, path: Optional[str], window: float):
+        """
+        Load the checkpoint.
+
+        Args:
+            path (Optional[str]): the checkpoint file, None keeps it in memory
+            window (float): seconds of done events remembered below the
+                position
+        """
+        self.path = path
+        self.window = window
+        self.position = 0.0
+        # creation time of the newest event done
+        self._newest = 0.0
+        # event key: creation time
+        self._done: Dict[str, float] = {}
+        self._pending: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        if path is None:
+            return
+
+        try:
+            with open(path) as checkpoint_file:
+                data = json.load(checkpoint_file)
+            self.position = self._newest = float(data["position"])
+            self._done = {str(key): float(at) for key, at in data["done"].items()}
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"Ignoring the invalid checkpoint {path}: {e}")
+
+    def start(self, key: str, created: float) -> bool:
+        """
+        Claim an event for processing.
+
+        Args:
+            key (str): the event_key of the event
+            created (float): the creation time of the event
+
+        Returns:
+            bool: True if the event has to be processed, False if it is
+                before the checkpoint, done or already in flight
+        """
+        with self._lock:
+            if (
+                created < self.position - self.window
+                or key in self._done
+                or key in self._pending
+            ):
+                return False
+            self._pending[key] = created
+            return True
+
+    def done(self, key: str) -> None:
+        """
+        Record a claimed event as processed and save the checkpoint.
+
+        Args:
+            key (str): the event_key of the event
+        """
+        with self._lock:
+            created = self._pending.pop(key)
+            self._done[key] = created
+            self._newest = max(self._newest, created)
+            if self._pending:
+                self.position = min(self._pending.values())
+            else:
+                self.position = self._newest
+            horizon = self.position - self.window
+            self._done = {key: at for key, at in self._done.items() if at >= horizon}
+            self._save()
+
+    def _save(self) -> None:
+        """Write the checkpoint file, called with the lock held."""
+        if self.path is None:
+            return
+
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(temp_path, "w") as checkpoint_file:
+                json.dump(
+                    {"position": self.position, "done": self._done}, checkpoint_file
+                )
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Failed to save the checkpoint: {e}")
+
+
+def parse_stream_line(line: str) -> Optional[Tuple[Event, float, str]]:
+    """
+    Parse a line of the stream into an event, its creation time and key.
+
+    Args:
+        line (str): a stream-events JSON line or a serialized hook event
+
+    Returns:
+        Optional[Tuple[Event, float, str]]: the event, its eventCreatedOn,
+            the current time for events without one, and its event_key, or
+            None if the line is not a patchset-created, comment-added or
+            change-merged event
+    """
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return None
+
+    event = load_event(data) or from_stream_event(data)
+    if event is None:
+        return None
+    created = data.get("eventCreatedOn")
+    if not isinstance(created, (int, float)):
+        return event, time.time(), event_key(event)
+    return event, float(created), event_key(event, float(created))
+
+
+def read_lines(
+    source: str,
+    follow: bool = False,
+    stopping: Optional[threading.Event] = None,
+    interval: float = DEFAULT_FOLLOW_INTERVAL,
+) -> Iterator[str]:
+    """
+    Read the lines of stdin, a FIFO or a file.
+
+    Args:
+        source (str): path of the FIFO or file, - for stdin
+        follow (bool): wait for more lines at the end of the input, a FIFO is
+            reopened for the next writer and a file is polled for appends
+        stopping (Optional[threading.Event]): stops following when set
+        interval (float): seconds between two polls of a followed file
+
+    Yields:
+        str: the lines, without the partial last line of a followed file
+    """
+    stopping = stopping or threading.Event()
+    if source == "-":
+        yield from sys.stdin
+        return
+
+    while not stopping.is_set():
+        is_fifo = stat.S_ISFIFO(os.stat(source).st_mode)
+        with open(source) as stream:
+            partial = ""
+            while not stopping.is_set():
+                line = stream.readline()
+                if line.endswith("\n") or (line and not follow):
+                    yield partial + line
+                    partial = ""
+                    continue
+                partial += line
+                if not follow or is_fifo:
+                    break
+                stopping.wait(interval)
+            if partial and (is_fifo or not follow):
+                yield partial
+        if not follow or not is_fifo:
+            return
+
+
+class StreamStats(TypedDict):
+    """Counters of a stream consumer."""
+
+    read: int
+    processed: int
+    skipped: int
+    failed: int
+
+
+def consume(
+    lines: Iterable[str],
+    checkpoint: Checkpoint,
+    process: Callable[[Event], Any],
+    workers: int = 1,
+) -> StreamStats:
+    """
+    Process the events of a stream-events feed.
+
+    Events before the checkpoint or already done are skipped, the others are
+    processed by workers threads sharing the warm configuration, connections
+    and caches of the process. Failed events are reported and counted done,
+    their failed dispatches are in the retry queue. An interrupt stops the
+    reading, the events in flight are finished.
+
+    Args:
+        lines (Iterable[str]): the stream-events JSON lines
+        checkpoint (Checkpoint): the position of the consumer
+        process (Callable[[Event], Any]): the event processor
+        workers (int): number of events processed concurrently
+
+    Returns:
+        StreamStats: events read, processed, skipped and failed
+    """
+    stats: StreamStats = {"read": 0, "processed": 0, "skipped": 0, "failed": 0}
+    lock = threading.Lock()
+    # bounds the events read ahead of the workers
+    slots = threading.BoundedSemaphore(workers * 2)
+
+    def run(event: Event, key: str) -> None:
+        failed = False
+        try:
+            process(event)
+        except Exception as e:
+            print(f"Failed to process {event['type']} event: {e}")
+            failed = True
+        finally:
+            checkpoint.done(key)
+            slots.release()
+            with lock:
+                stats["processed"] += 1
+                stats["failed"] += failed
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for line in lines:
+                parsed = parse_stream_line(line)
+                if parsed is None:
+                    continue
+                event, created, key = parsed
+                with lock:
+                    stats["read"] += 1
+                if not checkpoint.start(key, created):
+                    with lock:
+                        stats["skipped"] += 1
+                    continue
+                slots.acquire()
+                executor.submit(run, event, key)
+        except KeyboardInterrupt:
+            # SIGINT or SIGTERM, finish the events in flight
+            pass
+    return stats
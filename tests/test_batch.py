@@ -0,0 +1,157 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Unit tests for batch processing."""
+
+import json
+
+import pytest
+from typer.testing import CliRunner
+
+import gerrit_to_platform.config
+from gerrit_to_platform.batch import read_batch, run_batch
+from gerrit_to_platform.cli import app
+from gerrit_to_platform.config import CONFIG, REPLICATION
+from gerrit_to_platform.events import (
+    CHANGE_MERGED,
+    EVENT_ARGUMENTS,
+    PATCHSET_CREATED,
+    process_event,
+)
+from gerrit_to_platform.fake_github import FakeGitHub, make_workflows
+
+runner = CliRunner()
+
+
+def hook_event(number, project="example/project", event_type=PATCHSET_CREATED):
+    """Build a serialized hook event of a change."""
+    arguments = {
+        "change": f"{project}~master~I{number:040x}",
+        "kind": "REWORK",
+        "change_url": f"https://gerrit.example.org/c/{project}/+/{number}",
+        "change_owner": "Foo <foo@example.org>",
+        "change_owner_username": "foo",
+        "project": project,
+        "branch": "master",
+        "topic": "",
+        "uploader": "Foo <foo@example.org>",
+        "uploader_username": "foo",
+        "submitter": "Foo <foo@example.org>",
+        "submitter_username": "foo",
+        "commit": f"{number:040x}",
+        "newrev": f"{number:040x}",
+        "patchset": "1",
+    }
+    return {
+        "type": event_type,
+        "arguments": {name: arguments[name] for name in EVENT_ARGUMENTS[event_type]},
+    }
+
+
+@pytest.fixture
+def server(mocker, tmp_path):
+    """Dispatch to a fake GitHub API with the workflow cache enabled."""
+    with FakeGitHub(make_workflows(2, ["gerrit-verify", "gerrit-merge"])) as fake:
+        config_path = tmp_path / "gerrit_to_platform.ini"
+        config_path.write_text(
+            "[github.com]\n"
+            "token = A_TOKEN\n"
+            f"api_url = {fake.url}\n"
+            "write_burst = 1000\n"
+            "[cache]\n"
+            f"directory = {tmp_path}/cache\n"
+        )
+        replication_path = tmp_path / "replication.config"
+        replication_path.write_text(
+            '[remote "github"]\n'
+            "    remoteNameStyle = dash\n"
+            "    url = git@github.com:example/${name}.git\n"
+        )
+        mocker.patch.object(
+            gerrit_to_platform.config,
+            "CONFIG_FILES",
+            {CONFIG: str(config_path), REPLICATION: str(replication_path)},
+        )
+        gerrit_to_platform.config.clear_config_cache()
+        yield fake
+    gerrit_to_platform.config.clear_config_cache()
+
+
+def test_read_batch():
+    """Test that hook and stream events are read, invalid lines reported."""
+    event = hook_event(1)
+    lines = [json.dumps(event), "", "not json", json.dumps({"type": "ref-updated"})]
+    assert read_batch(lines) == [(1, event), (3, None), (4, None)]
+
+
+def test_run_batch(server):
+    """Test that each workflow listing is discovered once for the batch."""
+    server.missing.add("missing-project")
+    events = [
+        (number, hook_event(number, project))
+        for number, project in enumerate(
+            ["example/project"] * 6 + ["other/project"] * 3 + ["missing/project"], 1
+        )
+    ]
+    events.append((11, hook_event(11, event_type=CHANGE_MERGED)))
+    events.append((12, None))
+
+    def process(event):
+        if event["arguments"]["change_url"].endswith("/5"):
+            raise ValueError("broken")
+        process_event(event)
+
+    results = run_batch(events, process, workers=4)
+
+    assert [result["line"] for result in results] == list(range(1, 13))
+    statuses = [result["status"] for result in results]
+    assert statuses == ["dispatched"] * 4 + ["failed"] + ["dispatched"] * 4 + [
+        "nothing-dispatched",
+        "dispatched",
+        "invalid",
+    ]
+    assert results[4]["errors"] == ["ValueError: broken"]
+    assert results[10]["type"] == CHANGE_MERGED
+    assert sum(result["dispatched"] for result in results) == 9
+
+    listings = [
+        path
+        for verb, path in server.request_log
+        if verb == "GET" and path.endswith("/actions/workflows?per_page=100&page=1")
+    ]
+    # every repository and the magic repository of the owner listed once
+    assert sorted(path.split("/")[3] for path in listings) == [
+        ".github",
+        "example-project",
+        "missing-project",
+        "other-project",
+    ]
+
+
+def test_batch_command(server, tmp_path):
+    """Test the batch command and its report."""
+    events_path = tmp_path / "events.json"
+    events_path.write_text(
+        "\n".join(json.dumps(hook_event(number)) for number in range(1, 4))
+    )
+    report_path = tmp_path / "report.json"
+
+    result = runner.invoke(
+        app, ["batch", str(events_path), "--report", str(report_path)]
+    )
+    assert result.exit_code == 0
+    assert "Processed 3 events" in result.stdout
+    assert "Dispatched 3 workflows" in result.stdout
+    report = [json.loads(line) for line in report_path.read_text().splitlines()]
+    assert [line["status"] for line in report] == ["dispatched"] * 3
+
+    events_path.write_text("not json\n" + json.dumps(hook_event(1)))
+    result = runner.invoke(app, ["batch", str(events_path)])
+    assert result.exit_code == 1
+    assert "Line 1: invalid" in result.stdout
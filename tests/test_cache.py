@@ -0,0 +1,97 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Unit tests for cache."""
+
+import os
+
+import gerrit_to_platform.cache  # type: ignore
+from gerrit_to_platform.cache import (  # type: ignore
+    ResponseCache,
+    get_required_workflow_cache,
+    get_workflow_cache,
+)
+
+
+def test_response_cache(mocker, tmp_path):
+    """Test storing, freshness and eviction of cached responses."""
+    mocker.patch.object(gerrit_to_platform.cache, "EVICT_PROBABILITY", 1.0)
+    cache = ResponseCache(str(tmp_path / "workflows"), ttl=60, max_entries=2)
+    assert cache.get("github.com/example/one") is None
+
+    cache.put("github.com/example/one", '"a"', [{"id": 1}])
+    entry = cache.get("github.com/example/one")
+    assert entry["etag"] == '"a"'
+    assert entry["data"] == [{"id": 1}]
+    assert cache.is_fresh(entry)
+
+    cache.ttl = 0
+    assert not cache.is_fresh(entry)
+
+    # make "one" the least recently used entry before the cache overflows
+    cache.put("github.com/example/two", '"b"', [])
+    one = cache._path("github.com/example/one")
+    os.utime(one, (0, 0))
+    cache.put("github.com/example/three", '"c"', [])
+    assert cache.get("github.com/example/one") is None
+    assert cache.get("github.com/example/two") is not None
+    assert cache.get("github.com/example/three") is not None
+    assert len(os.listdir(tmp_path / "workflows")) == 2
+
+
+def test_response_cache_eviction(mocker, tmp_path):
+    """Test that the entries are only counted once they may be over the limit."""
+    mocker.patch.object(gerrit_to_platform.cache, "EVICT_PROBABILITY", 0.0)
+    scandir = mocker.spy(gerrit_to_platform.cache.os, "scandir")
+    directory = tmp_path / "workflows"
+    cache = ResponseCache(str(directory), ttl=0, max_entries=10)
+    for number in range(10):
+        cache.put(f"github.com/example/{number}", '"a"', [])
+    # the count is unknown and only taken on a random share of the puts
+    assert scandir.call_count == 0
+
+    cache._evict()
+    cache.put("github.com/example/10", '"a"', [])
+    # the 11th entry is over the limit, evicted with the slack below it
+    assert scandir.call_count == 2
+    assert len(os.listdir(directory)) == 9
+    cache.put("github.com/example/11", '"a"', [])
+    assert scandir.call_count == 2
+    cache.put("github.com/example/12", '"a"', [])
+    assert scandir.call_count == 3
+    assert len(os.listdir(directory)) == 9
+
+
+def test_get_workflow_cache(mocker, tmp_path):
+    """Test that the cache follows the settings."""
+    settings = {
+        "cache_directory": str(tmp_path),
+        "workflow_cache_size": 10,
+        "workflow_cache_ttl": 0,
+        "required_workflow_cache_ttl": 0,
+    }
+    mocker.patch.object(gerrit_to_platform.cache, "_CACHES", {})
+    mocker.patch.object(gerrit_to_platform.cache, "get_settings", return_value=settings)
+
+    cache = get_workflow_cache()
+    assert cache.directory == os.path.join(str(tmp_path), "workflows")
+    assert get_workflow_cache() is cache
+
+    settings["workflow_cache_ttl"] = 30
+    assert get_workflow_cache().ttl == 30
+
+    assert get_required_workflow_cache() is None
+    settings["required_workflow_cache_ttl"] = 300
+    required = get_required_workflow_cache()
+    assert required.directory == os.path.join(str(tmp_path), "required")
+    assert required.ttl == 300
+
+    settings["workflow_cache_size"] = 0
+    assert get_workflow_cache() is None
+    assert get_required_workflow_cache() is None
@@ -14,7 +14,11 @@ from typing import Dict
 from typer.testing import CliRunner
 
 import gerrit_to_platform.comment_added  # type: ignore
-from gerrit_to_platform.comment_added import app  # type: ignore
+from gerrit_to_platform.comment_added import (  # type: ignore
+    MappingMatcher,
+    app,
+    get_mapping_matcher,
+)
 
 CHANGE1 = [
     "--change=example/project~master~I308b4eda73ff90ee486f14e01db145684889eaae",
@@ -94,3 +98,48 @@ def test_app(mocker):
     result = runner.invoke(app, CHANGE1)
     assert result.exit_code == 0
     assert "" == result.stdout
+
+
+def test_mapping_matcher():
+    """Test matching all mapping keys against a comment."""
+    mapping = {"recheck": "verify", "reverify": "verify", "remerge": "merge"}
+    matcher = MappingMatcher(mapping)
+    assert matcher.match("Patch Set 1:\n\nrecheck") == ["verify"]
+    assert matcher.match("Patch Set 1:\n\nreverify\nrecheck") == ["verify"]
+    assert matcher.match("Patch Set 1:\n\nremerge\nrecheck") == ["verify", "merge"]
+    assert matcher.match("Patch Set 1:\n\nlooks good") == []
+
+    # keys overlapping at the same position are all seen
+    matcher = MappingMatcher({"re": "short", "recheck": "verify", "check": "lint"})
+    assert matcher.match("recheck") == ["short", "verify", "lint"]
+
+    # anchors keep their meaning against the whole comment
+    matcher = MappingMatcher({"^recheck$": "verify", r"(\w+)-run": "run"})
+    assert matcher.match("Patch Set 1:\n\nrecheck") == []
+    assert matcher.match("recheck") == ["verify"]
+    assert matcher.match("please sonar-run") == ["run"]
+
+    # regular expression keys are searched for on their own
+    matcher = MappingMatcher({"(?P<word>recheck)": "verify", "(?P<word>merge)": "m"})
+    assert matcher.match("recheck") == ["verify"]
+
+    assert get_mapping_matcher(mapping) is get_mapping_matcher(dict(mapping))
+
+
+def test_app_dispatches_each_filter_once(mocker):
+    """Test that keys mapping to the same filter dispatch it once."""
+    mocker.patch(
+        "gerrit_to_platform.comment_added.get_mapping",
+        return_value={"recheck": "verify", "reverify": "verify"},
+    )
+    mock_find_and_dispatch = mocker.patch(
+        "gerrit_to_platform.comment_added.find_and_dispatch"
+    )
+    change = (
+        CHANGE1[:-2] + ["--comment=Patch Set 1:\n\nrecheck reverify"] + CHANGE1[-1:]
+    )
+
+    result = runner.invoke(app, change)
+    assert result.exit_code == 0
+    mock_find_and_dispatch.assert_called_once()
+    assert mock_find_and_dispatch.call_args[0][1] == "verify"
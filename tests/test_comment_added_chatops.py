@@ -9,13 +9,14 @@
 ##############################################################################
 """Unit tests for comment_added ChatOps functionality."""
 
-from pathlib import Path
+import time
 from unittest.mock import patch
 
 import pytest
 from typer.testing import CliRunner
 
 from gerrit_to_platform.comment_added import app, check_cooldown
+from gerrit_to_platform.cooldown import SQLiteCooldownStore
 
 # Test fixtures for ChatOps commands
 CHATOPS_CSIT = [
@@ -115,22 +116,15 @@ runner = CliRunner()
 class TestCheckCooldown:
     """Tests for check_cooldown function."""
 
-    def setup_method(self):
-        """Clean up cooldown files before each test."""
-        # Clean up any existing test cooldown files
-        for f in Path("/tmp").glob("gha_cooldown_*"):
-            try:
-                f.unlink()
-            except OSError:
-                pass
-
-    def teardown_method(self):
-        """Clean up cooldown files after each test."""
-        for f in Path("/tmp").glob("gha_cooldown_*"):
-            try:
-                f.unlink()
-            except OSError:
-                pass
+    @pytest.fixture(autouse=True)
+    def store(self, tmp_path):
+        """Use a cooldown store private to each test."""
+        store = SQLiteCooldownStore(str(tmp_path / "cooldown.sqlite3"))
+        with patch(
+            "gerrit_to_platform.comment_added.get_cooldown_store", return_value=store
+        ):
+            yield store
+        store.close()
 
     def test_cooldown_allows_first_trigger(self):
         """Test that cooldown allows first trigger."""
@@ -174,14 +168,27 @@ class TestCheckCooldown:
         assert result1 is True
 
         # Mock time to be COOLDOWN_SECONDS + 1 in the future
+        later = time.time() + 301
         with patch("gerrit_to_platform.comment_added.time") as mock_time:
-            cooldown_file = Path("/tmp/gha_cooldown_12345_test-workflow")
-            original_mtime = cooldown_file.stat().st_mtime
-            mock_time.time.return_value = original_mtime + 301  # COOLDOWN_SECONDS + 1
+            mock_time.time.return_value = later
 
             result2 = check_cooldown("12345", "test-workflow")
             assert result2 is True
 
+    def test_cooldown_fails_open(self):
+        """Test that triggers are allowed when the store is unusable."""
+        with patch(
+            "gerrit_to_platform.comment_added.get_cooldown_store",
+            side_effect=ValueError("Unknown cooldown backend: redis"),
+        ):
+            assert check_cooldown("12345", "test-workflow") is True
+
+    def test_cooldown_rejects_invalid_keys(self, store):
+        """Test that invalid change numbers and workflow names are refused."""
+        assert check_cooldown("12345/..", "test-workflow") is False
+        assert check_cooldown("12345", "../test-workflow") is False
+        assert len(store) == 0
+
 
 class TestChatOpsCommandParsing:
     """Tests for ChatOps command parsing."""
@@ -18,10 +18,13 @@ import gerrit_to_platform.config  # type: ignore
 from gerrit_to_platform.config import (  # type: ignore
     CONFIG,
     REPLICATION,
+    RemoteIndex,
+    clear_config_cache,
     get_config,
     get_mapping,
     get_replication_remotes,
     get_setting,
+    get_settings,
     has_section,
 )
 
@@ -32,6 +35,7 @@ FIXTURE_DIR = os.path.join(
 
 TEST_CONFIG = os.path.join(FIXTURE_DIR, "testconfig.ini")
 REPLICATION_CONFIG = os.path.join(FIXTURE_DIR, "replication.config")
+REPLICATION_PROJECTS_CONFIG = os.path.join(FIXTURE_DIR, "replication_projects.config")
 
 MOCK_CONFIG_FILES = {
     CONFIG: TEST_CONFIG,
@@ -50,6 +54,141 @@ def test_get_config(mocker):
     assert get_config(REPLICATION).has_section('remote "github"')
 
 
+def test_get_config_cache(mocker, tmp_path):
+    """Test that the parsed config is reused until the file changes."""
+    config_file = tmp_path / "gerrit_to_platform.ini"
+    config_file.write_text("[github.com]\ntoken = A_TOKEN\n")
+    mocker.patch.object(
+        gerrit_to_platform.config,
+        "CONFIG_FILES",
+        {CONFIG: str(config_file), REPLICATION: REPLICATION_CONFIG},
+    )
+    clear_config_cache()
+    read_file = mocker.spy(gerrit_to_platform.config.ConfigParser, "read_file")
+
+    first = get_config()
+    assert get_config() is first
+    assert get_setting("github.com", "token") == "A_TOKEN"
+    assert has_section("github.com")
+    assert read_file.call_count == 1
+
+    config_file.write_text("[github.com]\ntoken = B_TOKEN\n")
+    stat = os.stat(config_file)
+    os.utime(config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert get_setting("github.com", "token") == "B_TOKEN"
+    assert get_config() is not first
+    assert read_file.call_count == 2
+
+    clear_config_cache()
+    get_config()
+    assert read_file.call_count == 3
+
+
+def test_get_settings(mocker):
+    """Test the typed settings snapshot."""
+    mocker.patch.object(
+        gerrit_to_platform.config,
+        "CONFIG_FILES",
+        MOCK_CONFIG_FILES,
+    )
+    settings = get_settings()
+    assert settings["github_token"] == "A_TOKEN"
+    assert settings["github_api_url"] == "https://api.github.com"
+    assert settings["workflow_cache_size"] == 1024
+    assert settings["workflow_cache_ttl"] == 0
+    assert settings["required_workflow_cache_ttl"] == 0
+    assert settings["github_write_rate"] == 80.0
+    assert settings["github_write_burst"] == 10
+    assert settings["github_rate_limit_wait"] == 300
+    assert settings["github_app_id"] is None
+    assert settings["github_app_private_key"] is None
+    assert settings["retry_queue"] == os.path.join(
+        settings["cache_directory"], "retry.sqlite3"
+    )
+    assert settings["retry_max_attempts"] == 10
+    assert settings["retry_interval"] == 30
+    assert settings["spool_directory"] is None
+    assert settings["debounce_window"] == 0
+    assert settings["spool_fsync"] is False
+    assert settings["cooldown_backend"] == "sqlite"
+    assert settings["metrics_listen"] is None
+    assert settings["metrics_textfile"] is None
+    assert settings["profile_directory"] is None
+    assert settings["cooldown_path"] == os.path.join(
+        settings["cache_directory"], "cooldown.sqlite3"
+    )
+    assert settings["stream_checkpoint"] == os.path.join(
+        settings["cache_directory"], "stream-checkpoint.json"
+    )
+    assert settings["stream_window"] == 300
+    assert settings["mappings"] == {
+        "comment-added": {"recheck": "verify", "reverify": "verify", "remerge": "merge"}
+    }
+    assert get_settings() is settings
+    assert settings["github_tokens"] == ["A_TOKEN"]
+    assert settings["github_owner_tokens"] == {}
+
+
+def test_get_settings_tokens(mocker, tmp_path):
+    """Test the GitHub token pool settings."""
+    config_file = tmp_path / "gerrit_to_platform.ini"
+    config_file.write_text(
+        "[github.com]\n"
+        "token = A_TOKEN\n"
+        "tokens = B_TOKEN, A_TOKEN\n"
+        "    C_TOKEN\n"
+        '[github.com "Example"]\n'
+        "token = D_TOKEN\n"
+        '[github.com "empty"]\n'
+        "concurrency = 2\n"
+    )
+    mocker.patch.object(
+        gerrit_to_platform.config,
+        "CONFIG_FILES",
+        {CONFIG: str(config_file), REPLICATION: REPLICATION_CONFIG},
+    )
+    clear_config_cache()
+
+    settings = get_settings()
+    assert settings["github_token"] == "A_TOKEN"
+    assert settings["github_tokens"] == ["A_TOKEN", "B_TOKEN", "C_TOKEN"]
+    assert settings["github_owner_tokens"] == {"example": ["D_TOKEN"]}
+    clear_config_cache()
+
+
+def test_get_settings_invalid_values(mocker, tmp_path, capsys):
+    """Test that an invalid value falls back to its default with a warning."""
+    config_file = tmp_path / "gerrit_to_platform.ini"
+    config_file.write_text(
+        "[github.com]\n"
+        "token = A_TOKEN\n"
+        "write_burst = many\n"
+        "concurrency = 4\n"
+        "[retry]\n"
+        "backoff = 1m\n"
+        "[spool]\n"
+        "fsync = sometimes\n"
+    )
+    mocker.patch.object(
+        gerrit_to_platform.config,
+        "CONFIG_FILES",
+        {CONFIG: str(config_file), REPLICATION: REPLICATION_CONFIG},
+    )
+    clear_config_cache()
+
+    settings = get_settings()
+    assert settings["github_token"] == "A_TOKEN"
+    assert settings["github_write_burst"] == 10
+    assert settings["dispatch_limits"]["github"]["concurrency"] == 4
+    assert settings["retry_backoff"] == 30
+    assert settings["spool_fsync"] is False
+    output = capsys.readouterr().out
+    assert "Warning: invalid write_burst in [github.com], using 10" in output
+    assert "Warning: invalid backoff in [retry], using 30.0" in output
+    assert "Warning: invalid fsync in [spool], using False" in output
+    clear_config_cache()
+
+
 def test_get_mapping(mocker):
     """Test get_mapping"""
     mocker.patch.object(
@@ -82,6 +221,64 @@ def test_get_replication_remotes(mocker):
     assert expected == actual
 
 
+def test_get_replication_remotes_projects(mocker):
+    """Test looking up the remotes that replicate a project."""
+    mocker.patch.object(
+        gerrit_to_platform.config,
+        "CONFIG_FILES",
+        {CONFIG: TEST_CONFIG, REPLICATION: REPLICATION_PROJECTS_CONFIG},
+    )
+
+    def remote_names(project):
+        remotes = get_replication_remotes(project)
+        return {platform: list(remotes[platform]) for platform in remotes}
+
+    assert list(get_replication_remotes()["github"]) == [
+        "github",
+        "github-releng",
+        "github-exact",
+    ]
+    assert remote_names("other/project") == {"github": ["github"]}
+    assert remote_names("example/project") == {"github": ["github", "github-exact"]}
+    assert remote_names("releng/builder") == {
+        "github": ["github", "github-releng"],
+        "gitlab": ["gitlab"],
+    }
+    assert remote_names("ci-management") == {"github": ["github", "github-releng"]}
+    assert remote_names("ci-management-old") == {"github": ["github"]}
+    assert get_replication_remotes("releng/builder")["github"]["github-releng"] == {
+        "owner": "releng",
+        "remotenamestyle": "dash",
+        "repo": "${name}.git",
+    }
+    assert get_config(REPLICATION).get('remote "github-releng"', "push") == (
+        "+refs/heads/*:refs/heads/*\n+refs/tags/*:refs/tags/*"
+    )
+
+
+def test_remote_index_invalid_patterns(capsys):
+    """Test that an invalid projects pattern only skips that pattern."""
+    remote = {"owner": "example", "remotenamestyle": "dash", "repo": "${name}.git"}
+    index = RemoteIndex(
+        {"github": {"broken": remote, "named": remote, "all": remote}},
+        {
+            "broken": ["^releng/(builder$", "releng/*"],
+            "named": ["^(?P<name>ci)-management$", "^(?P<name>ci)-tools$"],
+        },
+    )
+
+    def remote_names(project):
+        return list(index.lookup(project).get("github", {}))
+
+    assert remote_names("releng/builder") == ["broken", "all"]
+    assert remote_names("ci-management") == ["named", "all"]
+    assert remote_names("ci-tools") == ["named", "all"]
+    assert remote_names("other") == ["all"]
+    assert "Warning: skipping projects = ^releng/(builder$ of broken" in (
+        capsys.readouterr().out
+    )
+
+
 def test_has_section(mocker):
     """Test has_section function."""
     mocker.patch.object(
@@ -0,0 +1,120 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Unit tests for cooldown."""
+
+import threading
+
+import pytest
+
+import gerrit_to_platform.cooldown  # type: ignore
+from gerrit_to_platform.cooldown import (
+    CooldownError,
+    CooldownStore,
+    MemoryCooldownStore,
+    SQLiteCooldownStore,
+    get_cooldown_store,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    """Cooldown store of each backend."""
+    if request.param == "memory":
+        yield MemoryCooldownStore()
+    else:
+        store = SQLiteCooldownStore(str(tmp_path / "cooldown.sqlite3"))
+        yield store
+        store.close()
+
+
+def test_acquire(store):
+    """Test that a key is only acquired again once its cooldown expired."""
+    assert store.acquire("1/verify", 300, now=1000.0) == 0
+    assert store.acquire("1/verify", 300, now=1100.0) == 200
+    assert store.acquire("1/merge", 300, now=1100.0) == 0
+    assert store.acquire("1/verify", 300, now=1300.0) == 0
+    assert store.acquire("1/verify", 300, now=1301.0) == 299
+    assert len(store) == 2
+
+
+def test_expire(store):
+    """Test that expired cooldowns are removed in bulk."""
+    for change in range(10):
+        store.acquire(f"{change}/verify", change + 1, now=0.0)
+    assert store.expire(now=5.0) == 5
+    assert len(store) == 5
+    assert store.acquire("9/verify", 300, now=5.0) == 5
+
+
+def test_store_is_abstract():
+    """Test that a store must implement every operation."""
+
+    class PartialStore(CooldownStore):
+        def acquire(self, key, ttl, now=None):
+            return 0.0
+
+    with pytest.raises(TypeError):
+        PartialStore()  # type: ignore
+
+
+def test_sqlite_errors(tmp_path):
+    """Test that database errors are raised as CooldownError."""
+    store = SQLiteCooldownStore(str(tmp_path / "cooldown.sqlite3"))
+    store.close()
+    with pytest.raises(CooldownError):
+        store.acquire("1/verify", 300)
+    with pytest.raises(CooldownError):
+        SQLiteCooldownStore(str(tmp_path))
+
+
+def test_acquire_concurrently(tmp_path):
+    """Test that racing processes acquire a key only once."""
+    path = str(tmp_path / "cooldown.sqlite3")
+    stores = [SQLiteCooldownStore(path) for _ in range(8)]
+    barrier = threading.Barrier(len(stores))
+    acquired = []
+
+    def acquire(store):
+        barrier.wait()
+        for change in range(50):
+            if store.acquire(f"{change}/verify", 300) == 0:
+                acquired.append(change)
+
+    threads = [threading.Thread(target=acquire, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for store in stores:
+        store.close()
+
+    assert sorted(acquired) == list(range(50))
+
+
+def test_get_cooldown_store(mocker, tmp_path):
+    """Test that the store follows the [cooldown] settings."""
+    settings = {
+        "cooldown_backend": "sqlite",
+        "cooldown_path": str(tmp_path / "cooldown.sqlite3"),
+    }
+    mocker.patch.object(
+        gerrit_to_platform.cooldown, "get_settings", return_value=settings
+    )
+    store = get_cooldown_store()
+    assert isinstance(store, SQLiteCooldownStore)
+    assert store.path == settings["cooldown_path"]
+    assert get_cooldown_store() is store
+
+    settings["cooldown_backend"] = "memory"
+    assert isinstance(get_cooldown_store(), MemoryCooldownStore)
+
+    settings["cooldown_backend"] = "redis"
+    with pytest.raises(ValueError):
+        get_cooldown_store()
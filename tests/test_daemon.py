@@ -0,0 +1,137 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Unit tests for daemon."""
+
+import socket
+import threading
+
+import pytest
+from typer.testing import CliRunner
+
+from gerrit_to_platform.daemon import (  # type: ignore
+    EventServer,
+    app,
+    remove_stale_socket,
+)
+from gerrit_to_platform.events import PATCHSET_CREATED, send_to_daemon
+
+ARGUMENTS = {
+    "change": "example/project~master~I308b4eda73ff90ee486f14e01db145684889eaae",
+    "kind": "REWORK",
+    "change_url": "https://gerrit.example.org/r/c/example/project/+/1",
+    "change_owner": "Foo <foo@example.org>",
+    "change_owner_username": "foo",
+    "project": "example/project",
+    "branch": "master",
+    "topic": "",
+    "uploader": "Foo <foo@example.org>",
+    "uploader_username": "foo",
+    "commit": "7f0f8a2b05546d5956b0bb1431ba13c8cbe94631",
+    "patchset": "1",
+}
+
+runner = CliRunner()
+
+
+def test_event_server(mocker, tmp_path):
+    """Test events sent to the daemon are processed by its workers."""
+    processed = threading.Event()
+    mock_process = mocker.patch(
+        "gerrit_to_platform.daemon.process_event",
+        side_effect=lambda event: processed.set(),
+    )
+    socket_path = str(tmp_path / "daemon.sock")
+    server = EventServer(socket_path, workers=1)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+
+    try:
+        event = {"type": PATCHSET_CREATED, "arguments": ARGUMENTS}
+        assert send_to_daemon(socket_path, event) is True
+        assert processed.wait(5)
+        mock_process.assert_called_once_with(event)
+
+        # invalid events are refused
+        bad_event = {"type": PATCHSET_CREATED, "arguments": {}}
+        assert send_to_daemon(socket_path, bad_event) is False  # type: ignore
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
+
+    assert not (tmp_path / "daemon.sock").exists()
+
+
+def test_event_server_retries(mocker, tmp_path):
+    """Test the daemon drains the retry queue periodically."""
+    drained = threading.Event()
+    mocker.patch(
+        "gerrit_to_platform.daemon.drain_retry_queue",
+        side_effect=lambda: drained.set()
+        or {"retried": 1, "rescheduled": 0, "dropped": 0},
+    )
+    server = EventServer(str(tmp_path / "daemon.sock"), workers=1, retry_interval=1)
+    try:
+        assert drained.wait(5)
+    finally:
+        server.server_close()
+
+
+def test_event_server_debounce(mocker, tmp_path):
+    """Test the daemon only processes the newest patchset of a burst."""
+    processed = threading.Event()
+    mock_process = mocker.patch(
+        "gerrit_to_platform.daemon.process_event",
+        side_effect=lambda event: processed.set(),
+    )
+    server = EventServer(str(tmp_path / "daemon.sock"), workers=1, debounce_window=0.1)
+    try:
+        for patchset in ("1", "2"):
+            event = {
+                "type": PATCHSET_CREATED,
+                "arguments": dict(ARGUMENTS, patchset=patchset),
+            }
+            assert server.queue_event(event) is True  # type: ignore
+        assert processed.wait(5)
+    finally:
+        server.server_close()
+
+    mock_process.assert_called_once_with(event)
+    assert server.debouncer.stats()["suppressed"] == 1
+
+
+def test_remove_stale_socket(tmp_path):
+    """Test a left over socket is removed but a live one is not."""
+    socket_path = str(tmp_path / "daemon.sock")
+    remove_stale_socket(socket_path)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen()
+    with pytest.raises(RuntimeError, match="already listening"):
+        remove_stale_socket(socket_path)
+
+    listener.close()
+    remove_stale_socket(socket_path)
+    assert not (tmp_path / "daemon.sock").exists()
+
+
+def test_app(mocker):
+    """Test the daemon needs a socket."""
+    result = runner.invoke(app, ["--help"])
+    assert result.exit_code == 0
+
+    mocker.patch(
+        "gerrit_to_platform.daemon.get_settings",
+        return_value={"daemon_socket": None},
+    )
+    result = runner.invoke(app, [])
+    assert result.exit_code == 1
+    assert "No socket given" in result.stdout
@@ -0,0 +1,301 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Unit tests for events."""
+
+import inspect
+import json
+import socket
+import subprocess  # nosec B404
+import sys
+import threading
+import time
+from importlib import import_module
+
+import gerrit_to_platform.events  # type: ignore
+from gerrit_to_platform.events import (  # type: ignore
+    CHANGE_MERGED,
+    COMMENT_ADDED,
+    EVENT_ARGUMENTS,
+    EVENT_HANDLERS,
+    PATCHSET_CREATED,
+    Debouncer,
+    load_event,
+    parse_hook_arguments,
+    process_event,
+    run_hook,
+    send_to_daemon,
+    submit_event,
+)
+from gerrit_to_platform.spool import Spool
+
+PATCHSET_ARGV = [
+    "--change",
+    "example/project~master~I308b4eda73ff90ee486f14e01db145684889eaae",
+    "--kind",
+    "REWORK",
+    "--change-url",
+    "https://gerrit.example.org/r/c/example/project/+/1",
+    "--change-owner",
+    "Foo <foo@example.org>",
+    "--change-owner-username",
+    "foo",
+    "--project",
+    "example/project",
+    "--branch",
+    "master",
+    "--topic",
+    "",
+    "--uploader",
+    "Foo <foo@example.org>",
+    "--uploader-username",
+    "foo",
+    "--commit",
+    "7f0f8a2b05546d5956b0bb1431ba13c8cbe94631",
+    "--patchset=1",
+]
+
+PATCHSET_ARGUMENTS = {
+    "change": "example/project~master~I308b4eda73ff90ee486f14e01db145684889eaae",
+    "kind": "REWORK",
+    "change_url": "https://gerrit.example.org/r/c/example/project/+/1",
+    "change_owner": "Foo <foo@example.org>",
+    "change_owner_username": "foo",
+    "project": "example/project",
+    "branch": "master",
+    "topic": "",
+    "uploader": "Foo <foo@example.org>",
+    "uploader_username": "foo",
+    "commit": "7f0f8a2b05546d5956b0bb1431ba13c8cbe94631",
+    "patchset": "1",
+}
+
+
+def test_event_arguments_match_handlers():
+    """Test that the event arguments are those the handlers take."""
+    for event_type in (PATCHSET_CREATED, COMMENT_ADDED, CHANGE_MERGED):
+        module_name, function_name = EVENT_HANDLERS[event_type]
+        handler = getattr(import_module(module_name), function_name)
+        assert tuple(inspect.signature(handler).parameters) == (
+            EVENT_ARGUMENTS[event_type]
+        )
+
+
+def test_parse_hook_arguments():
+    """Test parsing hook arguments."""
+    assert parse_hook_arguments(PATCHSET_CREATED, PATCHSET_ARGV) == (PATCHSET_ARGUMENTS)
+
+    # approval scores are dropped
+    argv = PATCHSET_ARGV + ["--Code-Review", "-1"]
+    assert parse_hook_arguments(PATCHSET_CREATED, argv) == PATCHSET_ARGUMENTS
+
+    assert parse_hook_arguments(PATCHSET_CREATED, ["--help"]) is None
+    assert parse_hook_arguments(PATCHSET_CREATED, PATCHSET_ARGV[:-1]) is None
+    assert parse_hook_arguments(PATCHSET_CREATED, ["change"]) is None
+
+
+def test_load_event():
+    """Test validating event data."""
+    event = {"type": PATCHSET_CREATED, "arguments": dict(PATCHSET_ARGUMENTS)}
+    assert load_event(event) == event
+
+    event["arguments"]["extra"] = "dropped"
+    assert "extra" not in load_event(event)["arguments"]
+
+    assert load_event([]) is None
+    assert load_event({"type": "ref-updated", "arguments": {}}) is None
+    assert load_event({"type": PATCHSET_CREATED, "arguments": {}}) is None
+
+
+def test_process_event(mocker):
+    """Test processing an event in-process."""
+    mock_process = mocker.patch(
+        "gerrit_to_platform.patchset_created.process_patchset_created"
+    )
+    mocker.patch.object(gerrit_to_platform.events, "get_settings")
+    process_event({"type": PATCHSET_CREATED, "arguments": PATCHSET_ARGUMENTS})
+    mock_process.assert_called_once_with(**PATCHSET_ARGUMENTS)
+
+
+def test_submit_event(mocker):
+    """Test handing events to the daemon."""
+    event = {"type": PATCHSET_CREATED, "arguments": PATCHSET_ARGUMENTS}
+    mock_send = mocker.patch.object(
+        gerrit_to_platform.events, "send_to_daemon", return_value=True
+    )
+
+    mocker.patch.object(
+        gerrit_to_platform.events,
+        "get_settings",
+        return_value={"daemon_socket": None, "spool_directory": None},
+    )
+    assert submit_event(event) is False
+    mock_send.assert_not_called()
+
+    mocker.patch.object(
+        gerrit_to_platform.events,
+        "get_settings",
+        return_value={"daemon_socket": "/run/g2p.sock", "spool_directory": None},
+    )
+    assert submit_event(event) is True
+    mock_send.assert_called_once_with("/run/g2p.sock", event)
+
+    mock_send.return_value = False
+    assert submit_event(event) is False
+
+
+def test_submit_event_spool(mocker, tmp_path):
+    """Test spooling events for the worker."""
+    event = {"type": PATCHSET_CREATED, "arguments": PATCHSET_ARGUMENTS}
+    mock_send = mocker.patch.object(
+        gerrit_to_platform.events, "send_to_daemon", return_value=True
+    )
+    settings = {
+        "daemon_socket": "/run/g2p.sock",
+        "spool_directory": str(tmp_path / "spool"),
+        "spool_fsync": True,
+    }
+    mocker.patch.object(
+        gerrit_to_platform.events, "get_settings", return_value=settings
+    )
+    assert submit_event(event) is True
+    mock_send.assert_not_called()
+    assert Spool(settings["spool_directory"]).pending() == 1
+
+    # the daemon is used when the spool cannot be written
+    (tmp_path / "file").touch()
+    settings["spool_directory"] = str(tmp_path / "file" / "spool")
+    assert submit_event(event) is True
+    mock_send.assert_called_once_with("/run/g2p.sock", event)
+
+
+def test_debouncer(tmp_path):
+    """Test that only the newest patchset of a burst is released."""
+    released = []
+    debouncer = Debouncer(0.2, released.append)
+
+    def patchset(change: int, number: int) -> dict:
+        return {
+            "type": PATCHSET_CREATED,
+            "arguments": dict(
+                PATCHSET_ARGUMENTS,
+                change_url=f"https://gerrit.example.org/r/c/example/project/+/{change}",
+                patchset=str(number),
+            ),
+        }
+
+    comment = {"type": COMMENT_ADDED, "arguments": {}}
+    assert debouncer.submit(comment) is False  # type: ignore
+    for event in (patchset(1, 1), patchset(1, 3), patchset(1, 2), patchset(2, 1)):
+        assert debouncer.submit(event) is True
+    assert debouncer.stats() == {"held": 2, "released": 0, "suppressed": 2}
+
+    start = time.monotonic()
+    while len(released) < 2 and time.monotonic() - start < 5:
+        time.sleep(0.01)
+    assert released == [patchset(1, 3), patchset(2, 1)]
+
+    debouncer.submit(patchset(1, 4))
+    debouncer.close()
+    assert released[-1] == patchset(1, 4)
+    assert debouncer.stats() == {"held": 0, "released": 3, "suppressed": 2}
+    assert debouncer.submit(patchset(1, 5)) is False
+
+    # held patchsets are saved until released, and patchsets without a
+    # valid number are not held
+    path = str(tmp_path / "held.json")
+    released.clear()
+    debouncer = Debouncer(60, released.append, path)
+    assert debouncer.submit(patchset(3, 1)) is True
+    assert debouncer.submit(dict(patchset(4, 1), arguments={})) is False
+    assert debouncer.submit(patchset(5, "")) is False
+    with open(path) as held_file:
+        assert json.load(held_file) == [patchset(3, 1)]
+
+    # a new debouncer holds the events saved by a crashed one
+    restarted = Debouncer(60, released.append, path)
+    assert restarted.stats()["held"] == 1
+    restarted.close()
+    assert released == [patchset(3, 1)]
+    with open(path) as held_file:
+        assert json.load(held_file) == []
+
+
+def test_send_to_daemon_not_running(tmp_path):
+    """Test that a missing daemon is reported as not accepted."""
+    event = {"type": PATCHSET_CREATED, "arguments": PATCHSET_ARGUMENTS}
+    assert send_to_daemon(str(tmp_path / "missing.sock"), event) is False
+
+
+def test_send_to_daemon_without_reply(mocker, tmp_path):
+    """Test that an event written to a daemon not answering is accepted."""
+    mocker.patch.object(gerrit_to_platform.events, "DAEMON_TIMEOUT", 0.1)
+    socket_path = str(tmp_path / "daemon.sock")
+    event = {"type": PATCHSET_CREATED, "arguments": PATCHSET_ARGUMENTS}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(socket_path)
+        server.listen()
+
+        # the reply times out
+        assert send_to_daemon(socket_path, event) is True
+        connection, _ = server.accept()
+        with connection:
+            assert json.loads(connection.makefile("rb").readline()) == event
+
+        # the connection is closed without a reply
+        def close():
+            connection, _ = server.accept()
+            with connection:
+                connection.makefile("rb").readline()
+
+        closer = threading.Thread(target=close)
+        closer.start()
+        assert send_to_daemon(socket_path, event) is True
+        closer.join()
+
+
+def test_handlers_do_not_import_typer():
+    """Test that processing an event does not load the command line framework."""
+    check = (
+        "import sys; "
+        "import gerrit_to_platform.change_merged, gerrit_to_platform.comment_added, "
+        "gerrit_to_platform.patchset_created; "
+        "print('typer' in sys.modules)"
+    )
+    result = subprocess.run(  # nosec B603
+        [sys.executable, "-c", check], capture_output=True, check=True, text=True
+    )
+    assert result.stdout.strip() == "False"
+
+
+def test_run_hook(mocker):
+    """Test the hook falls back to processing the event in-process."""
+    mock_submit = mocker.patch.object(
+        gerrit_to_platform.events, "submit_event", return_value=True
+    )
+    mock_process = mocker.patch(
+        "gerrit_to_platform.patchset_created.process_patchset_created"
+    )
+    mock_app = mocker.patch("gerrit_to_platform.patchset_created.app")
+
+    run_hook(PATCHSET_CREATED, PATCHSET_ARGV)
+    mock_submit.assert_called_once_with(
+        {"type": PATCHSET_CREATED, "arguments": PATCHSET_ARGUMENTS}
+    )
+    mock_process.assert_not_called()
+
+    mock_submit.return_value = False
+    run_hook(PATCHSET_CREATED, PATCHSET_ARGV)
+    mock_process.assert_called_once_with(**PATCHSET_ARGUMENTS)
+    mock_app.assert_not_called()
+
+    mock_submit.reset_mock()
+    run_hook(PATCHSET_CREATED, ["--help"])
+    mock_submit.assert_not_called()
+    mock_app.assert_called_once_with(args=["--help"])
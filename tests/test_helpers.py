@@ -9,23 +9,36 @@
 ##############################################################################
 """Unit tests for github."""
 
+import asyncio
 import json
 import os
-from typing import Any, Callable, Dict, List, Union
+import subprocess  # nosec B404
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple, Union
 
 import gerrit_to_platform.github as github  # type: ignore
 import gerrit_to_platform.helpers  # type: ignore
+from gerrit_to_platform.cache import ResponseCache  # type: ignore
 from gerrit_to_platform.config import Platform  # type: ignore
+from gerrit_to_platform.events import CHANGE_MERGED  # type: ignore
 from gerrit_to_platform.helpers import (  # type: ignore
+    async_find_and_dispatch,
+    async_find_and_dispatch_report,
+    choose_async_dispatch,
+    choose_async_filter_workflows,
     choose_dispatch,
     choose_filter_workflows,
     convert_repo_name,
     find_and_dispatch,
+    find_and_dispatch_report,
     get_change_id,
     get_change_number,
     get_change_refspec,
     get_magic_repo,
 )
+from gerrit_to_platform.metrics import event_context  # type: ignore
 
 FIXTURE_DIR = os.path.join(
     os.path.dirname(os.path.realpath(__file__)),
@@ -54,6 +67,18 @@ REQUIRED_VERIFY_FILTERED_WORKFLOWS = os.path.join(
     FIXTURE_DIR, "github_workflow_list_required_filter_workflows_return.json"
 )
 
+
+def dispatch_limits(concurrency: int, owner_concurrency: int) -> dict:
+    """Build dispatch limits for every platform."""
+    return {
+        platform.value: {
+            "concurrency": concurrency,
+            "owner_concurrency": owner_concurrency,
+        }
+        for platform in Platform
+    }
+
+
 PATCH1_GERRIT_VERIFY = (
     "Dispatching workflow 'Gerrit Verify', id 20937807 on "
     + "github:example/example-project for change 1 patch 1"
@@ -143,11 +168,18 @@ def test_find_and_dispatch(mocker, capfd):
         "gerrit_to_platform.helpers.get_replication_remotes",
         return_value=replication_remotes,
     )
+    mocker.patch(
+        "gerrit_to_platform.helpers.get_settings",
+        return_value={"dispatch_limits": dispatch_limits(1, 1)},
+    )
+    mocker.patch(
+        "gerrit_to_platform.helpers.get_required_workflow_cache", return_value=None
+    )
 
-    def mock_filter_workflows(
+    async def mock_filter_workflows(
         owner: str, repo: str, search_filter: str, search_required: bool = False
     ) -> List[Dict[str, str]]:
-        """Mock of filter_workflows."""
+        """Mock of async_filter_workflows."""
         filter_file = VERIFY_FILTERED_WORKFLOWS
 
         if search_required:
@@ -160,7 +192,7 @@ def test_find_and_dispatch(mocker, capfd):
             return json.load(workflows)
 
     def mock_choose_filter_workflows(platform: Platform) -> Union[Callable, None]:
-        """Mock of choose_filter_workflows."""
+        """Mock of choose_async_filter_workflows."""
         if platform == Platform.GITHUB:
             return mock_filter_workflows
 
@@ -168,18 +200,18 @@ def test_find_and_dispatch(mocker, capfd):
 
     mocker.patch.object(
         gerrit_to_platform.helpers,
-        "choose_filter_workflows",
+        "choose_async_filter_workflows",
         mock_choose_filter_workflows,
     )
 
-    def mock_dispatch_workflow(
+    async def mock_dispatch_workflow(
         owner: str, repository: str, workflow_id: str, ref: str, inputs: Dict[str, str]
     ) -> Any:
-        """Mock of dispach_workflow"""
+        """Mock of async_dispach_workflow"""
         return {}
 
     def mock_choose_dispatch(platform: Platform) -> Union[Callable, None]:
-        """Mock of choose_dispacth."""
+        """Mock of choose_async_dispatch."""
         if platform == Platform.GITHUB:
             return mock_dispatch_workflow
 
@@ -187,7 +219,7 @@ def test_find_and_dispatch(mocker, capfd):
 
     mocker.patch.object(
         gerrit_to_platform.helpers,
-        "choose_dispatch",
+        "choose_async_dispatch",
         mock_choose_dispatch,
     )
 
@@ -217,6 +249,306 @@ def test_find_and_dispatch(mocker, capfd):
     assert actual == ""
 
 
+def test_find_and_dispatch_concurrent(mocker, capfd):
+    """Test concurrent discovery and dispatch with an error report."""
+    inputs = {
+        "GERRIT_BRANCH": "main",
+        "GERRIT_CHANGE_NUMBER": "1",
+        "GERRIT_PATCHSET_NUMBER": "1",
+    }
+    remotes = {
+        "github": {
+            f"github-{owner}": {
+                "owner": owner,
+                "remotenamestyle": "dash",
+                "repo": "${name}",
+            }
+            for owner in ("one", "two", "three", "broken")
+        }
+    }
+    mocker.patch(
+        "gerrit_to_platform.helpers.get_replication_remotes", return_value=remotes
+    )
+    mocker.patch(
+        "gerrit_to_platform.helpers.get_settings",
+        return_value={"dispatch_limits": dispatch_limits(3, 1)},
+    )
+    mocker.patch(
+        "gerrit_to_platform.helpers.get_required_workflow_cache", return_value=None
+    )
+
+    running: Dict[str, int] = {"calls": 0, "peak": 0}
+    owners_in_call: List[str] = []
+
+    async def track(owner: str) -> None:
+        assert owner not in owners_in_call
+        owners_in_call.append(owner)
+        running["calls"] += 1
+        running["peak"] = max(running["peak"], running["calls"])
+        await asyncio.sleep(0.02)
+        owners_in_call.remove(owner)
+        running["calls"] -= 1
+
+    async def mock_filter_workflows(
+        owner: str, repo: str, search_filter: str, search_required: bool = False
+    ) -> List[Dict[str, str]]:
+        await track(owner)
+        if owner == "broken" and not search_required:
+            raise RuntimeError("listing failed")
+        name = "Required Verify" if search_required else "Verify"
+        return [{"id": f"{owner}-{repo}", "name": name}]
+
+    dispatched: List[Tuple[str, str, Dict[str, str]]] = []
+
+    async def mock_dispatch_workflow(
+        owner: str, repository: str, workflow_id: str, ref: str, inputs: Dict[str, str]
+    ) -> Any:
+        await track(owner)
+        if workflow_id == "two-.github":
+            raise RuntimeError("dispatch failed")
+        dispatched.append((workflow_id, ref, inputs))
+
+    mocker.patch.object(
+        gerrit_to_platform.helpers,
+        "choose_async_filter_workflows",
+        lambda platform: mock_filter_workflows,
+    )
+    mocker.patch.object(
+        gerrit_to_platform.helpers,
+        "choose_async_dispatch",
+        lambda platform: mock_dispatch_workflow,
+    )
+
+    report = find_and_dispatch_report("example/project", "verify", inputs)
+    assert report["dispatched"] == 6
+    assert sorted(error["error"] for error in report["errors"]) == [
+        "dispatch failed",
+        "listing failed",
+    ]
+    assert {
+        "platform": "github",
+        "owner": "two",
+        "repository": ".github",
+        "workflow_id": "two-.github",
+        "error": "dispatch failed",
+    } in report["errors"]
+    assert running["peak"] == 3
+    assert "TARGET_REPO" not in inputs
+    assert ("one-example-project", "refs/heads/main", inputs) in dispatched
+    assert (
+        "one-.github",
+        "refs/heads/main",
+        dict(inputs, TARGET_REPO="one/example-project"),
+    ) in dispatched
+    actual = capfd.readouterr().out
+    assert "Failed to find workflows: listing failed" in actual
+    assert "Failed to dispatch workflow: dispatch failed" in actual
+
+    assert find_and_dispatch("example/project", "verify", inputs) == 6
+
+
+def test_choose_async_functions(mocker):
+    """Test choosing the asynchronous platform functions."""
+    assert choose_async_dispatch(Platform.GITHUB) == github.async_dispatch_workflow
+    assert (
+        choose_async_filter_workflows(Platform.GITHUB) == github.async_filter_workflows
+    )
+    assert choose_async_dispatch(Platform.GITLAB) is None
+    assert choose_async_filter_workflows(Platform.GITLAB) is None
+
+    mocker.patch.object(
+        gerrit_to_platform.helpers,
+        "choose_dispatch",
+        lambda platform: lambda *args: threading.current_thread().name,
+    )
+    dispatcher = choose_async_dispatch(Platform.GITLAB)
+    assert asyncio.run(dispatcher("owner", "repo", "1", "ref", {})) != (
+        threading.current_thread().name
+    )
+
+
+def test_async_find_and_dispatch(mocker, capfd):
+    """Test many events dispatched concurrently on one event loop."""
+    inputs = {
+        "GERRIT_BRANCH": "main",
+        "GERRIT_CHANGE_NUMBER": "1",
+        "GERRIT_PATCHSET_NUMBER": "1",
+    }
+    remotes = {
+        "github": {
+            f"github-{owner}": {
+                "owner": owner,
+                "remotenamestyle": "dash",
+                "repo": "${name}",
+            }
+            for owner in ("one", "two")
+        }
+    }
+    mocker.patch(
+        "gerrit_to_platform.helpers.get_replication_remotes", return_value=remotes
+    )
+    mocker.patch(
+        "gerrit_to_platform.helpers.get_settings",
+        return_value={"dispatch_limits": dispatch_limits(100, 100)},
+    )
+    mocker.patch(
+        "gerrit_to_platform.helpers.get_required_workflow_cache", return_value=None
+    )
+
+    dispatched: List[Tuple[str, str, str, Dict[str, str]]] = []
+
+    async def mock_filter_workflows(
+        owner: str, repo: str, search_filter: str, search_required: bool = False
+    ) -> List[Dict[str, str]]:
+        await asyncio.sleep(0.05)
+        if owner == "two" and search_required:
+            raise RuntimeError("listing failed")
+        return [{"id": f"{repo}-{search_required}", "name": "Verify"}]
+
+    async def mock_dispatch_workflow(
+        owner: str, repository: str, workflow_id: str, ref: str, inputs: Dict[str, str]
+    ) -> Any:
+        await asyncio.sleep(0.05)
+        dispatched.append((owner, workflow_id, ref, inputs))
+
+    mocker.patch.object(
+        gerrit_to_platform.helpers,
+        "choose_async_filter_workflows",
+        lambda platform: mock_filter_workflows,
+    )
+    mocker.patch.object(
+        gerrit_to_platform.helpers,
+        "choose_async_dispatch",
+        lambda platform: mock_dispatch_workflow,
+    )
+
+    async def events() -> list:
+        return await asyncio.gather(
+            *(
+                async_find_and_dispatch_report(f"project{n}", "verify", inputs)
+                for n in range(20)
+            )
+        )
+
+    start = time.perf_counter()
+    reports = asyncio.run(events())
+    elapsed = time.perf_counter() - start
+
+    assert [report["dispatched"] for report in reports] == [3] * 20
+    assert reports[0]["errors"] == [
+        {
+            "platform": "github",
+            "owner": "two",
+            "repository": ".github",
+            "workflow_id": None,
+            "error": "listing failed",
+        }
+    ]
+    assert len(dispatched) == 60
+    assert (
+        "one",
+        ".github-True",
+        "refs/heads/main",
+        dict(inputs, TARGET_REPO="one/project0"),
+    ) in dispatched
+    assert "TARGET_REPO" not in inputs
+    # discovery then dispatch, every event overlapping on the same loop
+    assert elapsed < 0.5
+    assert "Failed to find workflows: listing failed" in capfd.readouterr().out
+
+    assert asyncio.run(async_find_and_dispatch("project", "verify", inputs)) == 3
+
+
+def test_required_workflows_memo(mocker, tmp_path):
+    """Test that required workflows are looked up once per owner."""
+    inputs = {
+        "GERRIT_BRANCH": "main",
+        "GERRIT_CHANGE_NUMBER": "1",
+        "GERRIT_PATCHSET_NUMBER": "1",
+    }
+    # one owner mirroring every project twice
+    remotes = {
+        "github": {
+            f"github-{style}": {
+                "owner": "example",
+                "remotenamestyle": style,
+                "repo": "${name}",
+            }
+            for style in ("dash", "underscore")
+        }
+    }
+    cache = ResponseCache(str(tmp_path), ttl=60, max_entries=10)
+    version = mocker.patch(
+        "gerrit_to_platform.helpers._listing_version", return_value='"v1"'
+    )
+    mocker.patch(
+        "gerrit_to_platform.helpers.get_replication_remotes", return_value=remotes
+    )
+    mocker.patch(
+        "gerrit_to_platform.helpers.get_settings",
+        return_value={"dispatch_limits": dispatch_limits(4, 2)},
+    )
+    mocker.patch(
+        "gerrit_to_platform.helpers.get_required_workflow_cache", return_value=cache
+    )
+
+    lookups: List[Tuple[str, bool]] = []
+
+    def mock_filter_workflows(
+        owner: str, repo: str, search_filter: str, search_required: bool = False
+    ) -> List[Dict[str, str]]:
+        lookups.append((repo, search_required))
+        return [{"id": f"{repo}-{search_required}", "name": "Verify"}]
+
+    async def mock_async_filter_workflows(*args: Any) -> List[Dict[str, str]]:
+        return mock_filter_workflows(*args)
+
+    async def mock_async_dispatch_workflow(*args: Any) -> None:
+        return None
+
+    mocker.patch.multiple(
+        gerrit_to_platform.helpers,
+        choose_filter_workflows=lambda platform: mock_filter_workflows,
+        choose_dispatch=lambda platform: lambda *args: None,
+        choose_async_filter_workflows=lambda platform: mock_async_filter_workflows,
+        choose_async_dispatch=lambda platform: mock_async_dispatch_workflow,
+    )
+
+    # within an event, both remotes dispatch the required workflow
+    assert find_and_dispatch("example/project", "verify", dict(inputs)) == 4
+    assert lookups.count((".github", True)) == 1
+
+    # across events, until the magic repository listing changes
+    assert find_and_dispatch("example/other", "verify", dict(inputs)) == 4
+    assert lookups.count((".github", True)) == 1
+    assert asyncio.run(async_find_and_dispatch("example/p", "verify", inputs)) == 4
+    assert lookups.count((".github", True)) == 1
+
+    # one entry per owner holding every filter
+    assert find_and_dispatch("example/project", "merge", dict(inputs)) == 4
+    assert find_and_dispatch("example/project", "verify", dict(inputs)) == 4
+    assert lookups.count((".github", True)) == 2
+
+    version.return_value = '"v2"'
+    assert find_and_dispatch("example/project", "verify", dict(inputs)) == 4
+    assert lookups.count((".github", True)) == 3
+
+    # only a change merged on the magic repository drops the cache
+    find_and_dispatch(".github", "verify", dict(inputs))
+    assert lookups.count((".github", True)) == 3
+    with event_context(CHANGE_MERGED):
+        find_and_dispatch(".github", "merge", dict(inputs))
+    assert find_and_dispatch("example/project", "verify", dict(inputs)) == 4
+    assert lookups.count((".github", True)) == 5
+
+    # without the cache the lookup is only shared within the event
+    cache.ttl = 0
+    lookups.clear()
+    assert asyncio.run(async_find_and_dispatch("example/p", "verify", inputs)) == 4
+    find_and_dispatch_report("example/project", "verify", dict(inputs))
+    assert lookups.count((".github", True)) == 2
+
+
 def test_get_change_id(mocker):
     """Test get_change_id"""
     expected = "Ibaz"
@@ -255,3 +587,17 @@ def test_get_magic_repo(mocker):
     expected = None
     actual = get_magic_repo(Platform.GITLAB)
     assert expected == actual
+
+
+def test_hooks_do_not_import_platform_modules():
+    """Test that the hook modules only load platform libraries on dispatch."""
+    check = (
+        "import sys; "
+        "import gerrit_to_platform.change_merged, gerrit_to_platform.comment_added, "
+        "gerrit_to_platform.patchset_created; "
+        "print('gerrit_to_platform.github' in sys.modules)"
+    )
+    result = subprocess.run(  # nosec B603
+        [sys.executable, "-c", check], capture_output=True, check=True, text=True
+    )
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,185 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Unit tests for metrics."""
+
+import urllib.error
+import urllib.request
+
+import pytest
+
+from gerrit_to_platform.comment_added import check_cooldown
+from gerrit_to_platform.cooldown import MemoryCooldownStore
+from gerrit_to_platform.events import PATCHSET_CREATED, run_hook
+from gerrit_to_platform.metrics import (
+    COOLDOWN_CHECKS,
+    REGISTRY,
+    Counter,
+    Histogram,
+    Metric,
+    Registry,
+    event_context,
+    parse_samples,
+    serve,
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    """Start every test without samples."""
+    REGISTRY.reset()
+    yield
+    REGISTRY.reset()
+
+
+def test_render():
+    """Test the Prometheus text format of counters and histograms."""
+    registry = Registry()
+    counter = registry.register(Counter("calls_total", "Calls.", ("owner",)))
+    histogram = registry.register(
+        Histogram("call_seconds", "Call time.", ("owner",), buckets=(0.1, 1.0))
+    )
+    counter.inc(owner='ex"ample')
+    counter.inc(2, owner='ex"ample')
+    histogram.observe(0.05, owner="example")
+    histogram.observe(0.5, owner="example")
+    histogram.observe(5, owner="example")
+
+    assert registry.render() == (
+        "# HELP calls_total Calls.\n"
+        "# TYPE calls_total counter\n"
+        'calls_total{owner="ex\\"ample"} 3\n'
+        "# HELP call_seconds Call time.\n"
+        "# TYPE call_seconds histogram\n"
+        'call_seconds_bucket{owner="example",le="0.1"} 1\n'
+        'call_seconds_bucket{owner="example",le="1"} 2\n'
+        'call_seconds_bucket{owner="example",le="+Inf"} 3\n'
+        'call_seconds_sum{owner="example"} 5.55\n'
+        'call_seconds_count{owner="example"} 3\n'
+    )
+    with pytest.raises(ValueError):
+        counter.inc(repository="example")
+
+
+def test_write_textfile(tmp_path):
+    """Test that the samples of successive processes add up in the textfile."""
+    path = str(tmp_path / "textfile" / "gerrit_to_platform.prom")
+    registry = Registry()
+    counter = registry.register(Counter("calls_total", "Calls.", ("owner",)))
+    histogram = registry.register(
+        Histogram("call_seconds", "Call time.", (), buckets=(1.0,))
+    )
+
+    counter.inc(owner="a")
+    histogram.observe(0.5)
+    registry.write_textfile(path)
+    assert counter.value(owner="a") == 0
+
+    counter.inc(owner="a")
+    counter.inc(owner="b")
+    histogram.observe(2)
+    registry.write_textfile(path)
+
+    with open(path) as textfile:
+        samples = parse_samples(textfile.read())
+    assert samples == {
+        'calls_total{owner="a"}': 2,
+        'calls_total{owner="b"}': 1,
+        'call_seconds_bucket{le="1"}': 1,
+        'call_seconds_bucket{le="+Inf"}': 2,
+        "call_seconds_sum": 2.5,
+        "call_seconds_count": 2,
+    }
+    assert sorted(path.name for path in (tmp_path / "textfile").iterdir()) == [
+        "gerrit_to_platform.prom",
+        "gerrit_to_platform.prom.lock",
+    ]
+
+
+def test_serve():
+    """Test the HTTP endpoint of the long-running modes."""
+    COOLDOWN_CHECKS.inc(event="comment-added", result="allowed")
+    server = serve("127.0.0.1:0")
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics") as response:  # nosec
+            body = response.read().decode()
+        assert (
+            'gerrit_to_platform_cooldown_checks_total{event="comment-added",'
+            + 'result="allowed"} 1\n'
+        ) in body
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/other")  # nosec
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_cooldown_metrics(mocker):
+    """Test that cooldown checks are counted by event and result."""
+    mocker.patch(
+        "gerrit_to_platform.comment_added.get_cooldown_store",
+        return_value=MemoryCooldownStore(),
+    )
+    with event_context("comment-added"):
+        check_cooldown("12345", "verify")
+        check_cooldown("12345", "verify")
+        check_cooldown("change", "verify")
+
+    for result in ("allowed", "blocked", "invalid"):
+        assert COOLDOWN_CHECKS.value(event="comment-added", result=result) == 1
+
+
+def test_run_hook_writes_textfile(mocker, tmp_path):
+    """Test that a hook adds the metrics of its event to the textfile."""
+    path = tmp_path / "gerrit_to_platform.prom"
+    mocker.patch(
+        "gerrit_to_platform.events.get_settings",
+        return_value={
+            "metrics_textfile": str(path),
+            "spool_directory": None,
+            "daemon_socket": "daemon.sock",
+        },
+    )
+
+    def send_to_daemon(socket_path, event):
+        COOLDOWN_CHECKS.inc(event=event["type"], result="allowed")
+        return True
+
+    mocker.patch("gerrit_to_platform.events.parse_hook_arguments", return_value={})
+    mocker.patch("gerrit_to_platform.events.send_to_daemon", side_effect=send_to_daemon)
+    run_hook(PATCHSET_CREATED, [])
+
+    samples = parse_samples(path.read_text())
+    assert (
+        samples[
+            'gerrit_to_platform_cooldown_checks_total{event="patchset-created",'
+            + 'result="allowed"}'
+        ]
+        == 1
+    )
+    # the configuration load of the hook is timed
+    assert (
+        samples[
+            'gerrit_to_platform_stage_seconds_count{stage="config",'
+            + 'event="patchset-created",platform="",owner=""}'
+        ]
+        == 1
+    )
+
+
+def test_metric_is_abstract():
+    """Test that a metric must implement its samples and reset."""
+
+    class Gauge(Metric):
+        def samples(self):
+            return []
+
+    with pytest.raises(TypeError):
+        Gauge("gauge", "A gauge.", ())  # type: ignore
@@ -0,0 +1,154 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Unit tests for profiling."""
+
+import json
+import pstats
+import threading
+import time
+
+from typer.testing import CliRunner
+
+from gerrit_to_platform.cli import app
+from gerrit_to_platform.events import PATCHSET_CREATED, run_hook
+from gerrit_to_platform.github import run_sync
+from gerrit_to_platform.metrics import stage
+from gerrit_to_platform.profiling import (
+    PROFILE_ENV,
+    merge_profiles,
+    profiled,
+    profiled_call,
+    record_api_call,
+    span,
+)
+
+runner = CliRunner()
+
+
+def test_profiled_disabled(mocker, monkeypatch):
+    """Test that nothing is recorded unless profiling is enabled."""
+    monkeypatch.delenv(PROFILE_ENV, raising=False)
+    mocker.patch(
+        "gerrit_to_platform.config.get_settings",
+        return_value={"profile_directory": None},
+    )
+    with profiled(PATCHSET_CREATED) as profile:
+        with span("find_and_dispatch"):
+            record_api_call("GET", "/repos/example/repo", 200, time.perf_counter())
+    assert profile is None
+
+
+def record_orphan():
+    """Record a span in a thread that did not inherit the context."""
+    with span("orphan"):
+        pass
+
+
+def test_profiled(monkeypatch, tmp_path):
+    """Test the span tree and API calls written for an invocation."""
+    monkeypatch.setenv(PROFILE_ENV, str(tmp_path))
+
+    with profiled(PATCHSET_CREATED):
+        with span("find_and_dispatch", project="example"):
+            with stage("discovery", event=PATCHSET_CREATED, owner="example"):
+                record_api_call(
+                    "GET", "/repos/example/repo/actions/workflows", 200, 0.0
+                )
+            # spans of threads without the context attach to the root
+            thread = threading.Thread(target=record_orphan)
+            thread.start()
+            thread.join()
+            with stage("dispatch", event=PATCHSET_CREATED, owner="example"):
+                pass
+
+    (spans_path,) = tmp_path.glob("patchset-created-*.json")
+    assert spans_path.with_suffix(".prof").exists()
+    document = json.loads(spans_path.read_text())
+    assert document["event"] == PATCHSET_CREATED
+    orphan, find_and_dispatch = document["spans"]["children"]
+    assert orphan["name"] == "orphan"
+    assert find_and_dispatch["labels"] == {"project": "example"}
+    assert [child["name"] for child in find_and_dispatch["children"]] == [
+        "discovery",
+        "dispatch",
+    ]
+    assert (
+        document["spans"]["seconds"]
+        >= find_and_dispatch["seconds"]
+        >= find_and_dispatch["children"][0]["seconds"]
+    )
+    assert [call["status"] for call in document["api_calls"]] == [200]
+
+
+async def loop_work():
+    """Coroutine run on the background event loop."""
+    return threading.current_thread().name
+
+
+def thread_work():
+    """Function run in a worker thread."""
+    return threading.current_thread().name
+
+
+def test_profiled_threads(monkeypatch, tmp_path):
+    """Test the calls of the event loop and worker threads are profiled."""
+    monkeypatch.setenv(PROFILE_ENV, str(tmp_path))
+
+    with profiled(PATCHSET_CREATED):
+        assert run_sync(loop_work()) == "github-io"
+        thread = threading.Thread(target=profiled_call, args=(thread_work,))
+        thread.start()
+        thread.join()
+
+    (stats_path,) = tmp_path.glob("patchset-created-*.prof")
+    stats = pstats.Stats(str(stats_path)).stats  # type: ignore
+    functions = {function for _, _, function in stats}
+    assert {"loop_work", "thread_work"} <= functions
+
+
+def test_merge_profiles(mocker, monkeypatch, tmp_path):
+    """Test the ranked report over the profiles of several hook invocations."""
+    monkeypatch.setenv(PROFILE_ENV, str(tmp_path))
+    mocker.patch("gerrit_to_platform.events.parse_hook_arguments", return_value={})
+    mocker.patch(
+        "gerrit_to_platform.events.get_settings",
+        return_value={"metrics_textfile": None},
+    )
+
+    def submit_event(event):
+        with span("find_and_dispatch"):
+            with stage("dispatch", event=event["type"]):
+                time.sleep(0.01)
+            record_api_call("POST", "/repos/example/repo", 204, time.perf_counter())
+        return True
+
+    mocker.patch("gerrit_to_platform.events.submit_event", side_effect=submit_event)
+    for _ in range(3):
+        run_hook(PATCHSET_CREATED, [])
+
+    report = merge_profiles(str(tmp_path), top=5)
+    assert report["profiles"] == 3
+    stages = {summary["stage"]: summary for summary in report["stages"]}
+    assert report["stages"][0]["stage"] == PATCHSET_CREATED
+    dispatch = stages["patchset-created/find_and_dispatch/dispatch"]
+    assert dispatch["calls"] == 3
+    assert dispatch["total"] >= 0.03
+    assert report["api_calls"][0]["stage"] == "POST /repos/example/repo"
+    assert report["api_calls"][0]["calls"] == 3
+    assert len(report["functions"]) == 5
+    assert report["functions"][0]["cumtime"] >= report["functions"][-1]["cumtime"]
+
+    result = runner.invoke(app, ["profile-report", str(tmp_path), "--top", "3"])
+    assert result.exit_code == 0
+    assert "3 profiled hook invocations" in result.stdout
+    assert "patchset-created/find_and_dispatch/dispatch" in result.stdout
+
+    result = runner.invoke(app, ["profile-report", str(tmp_path), "--json"])
+    assert json.loads(result.stdout)["profiles"] == 3
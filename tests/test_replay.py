@@ -0,0 +1,246 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Unit tests for the event replay and load generator."""
+
+import json
+import time
+
+import pytest
+from typer.testing import CliRunner
+
+import gerrit_to_platform.config
+from gerrit_to_platform.cli import app
+from gerrit_to_platform.config import CONFIG, REPLICATION, get_settings
+from gerrit_to_platform.events import (
+    CHANGE_MERGED,
+    COMMENT_ADDED,
+    EVENT_ARGUMENTS,
+    PATCHSET_CREATED,
+    from_stream_event,
+)
+from gerrit_to_platform.replay import (
+    fake_platform,
+    generate_events,
+    parse_mix,
+    read_events,
+    run_load,
+)
+
+runner = CliRunner()
+
+STREAM_EVENT = {
+    "type": "comment-added",
+    "author": {"name": "Foo", "email": "foo@example.org", "username": "foo"},
+    "comment": "Patch Set 2:\n\nrecheck",
+    "patchSet": {"number": 2, "revision": "abc123", "kind": "REWORK"},
+    "change": {
+        "project": "example/project",
+        "branch": "master",
+        "id": "I1234",
+        "number": 12,
+        "url": "https://gerrit.example.org/c/example/project/+/12",
+        "owner": {"name": "Bar", "email": "bar@example.org", "username": "bar"},
+    },
+    "project": "example/project",
+    "eventCreatedOn": 1700000000,
+}
+
+
+@pytest.fixture
+def config_files(mocker, tmp_path):
+    """Use a configuration dispatching to the example GitHub organization."""
+    config_path = tmp_path / "gerrit_to_platform.ini"
+    config_path.write_text(
+        '[mapping "comment-added"]\n'
+        "recheck = verify\n"
+        "[github.com]\n"
+        "token = A_TOKEN\n"
+        "app_id = 1\n"
+        "write_burst = 1000\n"
+        "[cache]\n"
+        f"directory = {tmp_path}/production-cache\n"
+    )
+    replication_path = tmp_path / "replication.config"
+    replication_path.write_text(
+        '[remote "github"]\n'
+        "    remoteNameStyle = dash\n"
+        "    url = git@github.com:example/${name}.git\n"
+    )
+    mocker.patch.object(
+        gerrit_to_platform.config,
+        "CONFIG_FILES",
+        {CONFIG: str(config_path), REPLICATION: str(replication_path)},
+    )
+    gerrit_to_platform.config.clear_config_cache()
+    yield tmp_path
+    gerrit_to_platform.config.clear_config_cache()
+
+
+def test_from_stream_event():
+    """Test the hook arguments built from a stream-events record."""
+    assert from_stream_event(STREAM_EVENT) == {
+        "type": COMMENT_ADDED,
+        "arguments": {
+            "change": "example/project~master~I1234",
+            "change_url": "https://gerrit.example.org/c/example/project/+/12",
+            "change_owner": "Bar <bar@example.org>",
+            "change_owner_username": "bar",
+            "project": "example/project",
+            "branch": "master",
+            "topic": "",
+            "author": "Foo <foo@example.org>",
+            "author_username": "foo",
+            "commit": "abc123",
+            "comment": "Patch Set 2:\n\nrecheck",
+        },
+    }
+    assert from_stream_event({"type": "ref-updated", "refUpdate": {}}) is None
+    assert from_stream_event(dict(STREAM_EVENT, change=None)) is None
+
+
+def test_read_events():
+    """Test that stream-events and spooled events are read, others skipped."""
+    spooled = from_stream_event(STREAM_EVENT)
+    lines = [
+        json.dumps(STREAM_EVENT),
+        "not json",
+        json.dumps({"type": "ref-updated"}),
+        json.dumps(spooled),
+    ]
+    assert list(read_events(lines)) == [spooled, spooled]
+
+
+def test_parse_mix():
+    """Test the event mix option."""
+    assert parse_mix("patchset-created=3, comment-added") == {
+        PATCHSET_CREATED: 3.0,
+        COMMENT_ADDED: 1.0,
+    }
+    for text in ("ref-updated=1", "change-merged=-1", "change-merged=0"):
+        with pytest.raises(ValueError):
+            parse_mix(text)
+
+
+def test_generate_events():
+    """Test that synthetic events are valid, reproducible and skewed."""
+    events = list(
+        generate_events(
+            2000,
+            ["busy/project", "quiet/project"],
+            {PATCHSET_CREATED: 1, COMMENT_ADDED: 1, CHANGE_MERGED: 1},
+            ["recheck"],
+            skew=2,
+            seed=1,
+        )
+    )
+    assert events == list(
+        generate_events(
+            2000,
+            ["busy/project", "quiet/project"],
+            {PATCHSET_CREATED: 1, COMMENT_ADDED: 1, CHANGE_MERGED: 1},
+            ["recheck"],
+            skew=2,
+            seed=1,
+        )
+    )
+    for event in events:
+        assert tuple(event["arguments"]) == EVENT_ARGUMENTS[event["type"]]
+    projects = [event["arguments"]["project"] for event in events]
+    assert projects.count("busy/project") > 2 * projects.count("quiet/project")
+
+    patchsets = {}
+    for event in events:
+        if event["type"] == PATCHSET_CREATED:
+            change_url = event["arguments"]["change_url"]
+            patchset = int(event["arguments"]["patchset"])
+            assert patchset > patchsets.get(change_url, 1)
+            patchsets[change_url] = patchset
+        if event["type"] == COMMENT_ADDED:
+            assert event["arguments"]["comment"].endswith("\n\nrecheck")
+
+
+def test_run_load_rate():
+    """Test the throughput, failures and lag at a target rate."""
+
+    def process(event):
+        if event["arguments"]["patchset"] == "3":
+            raise ValueError("broken")
+        time.sleep(0.01)
+
+    events = [
+        {"type": PATCHSET_CREATED, "arguments": {"patchset": str(index)}}
+        for index in range(20)
+    ]
+    report = run_load(events, rate=100, workers=4, process=process)
+
+    assert report["events"] == 20
+    assert report["failed"] == 1
+    assert report["errors"] == {"patchset-created: ValueError: broken": 1}
+    assert report["by_type"] == {PATCHSET_CREATED: 20}
+    # 20 events at 100 per second start over 0.19 s
+    assert 0.19 <= report["seconds"] < 1
+    assert report["latency_p50"] >= 0.01
+    assert report["latency_max"] >= report["latency_p99"] >= report["latency_p50"]
+
+
+def test_fake_platform(config_files):
+    """Test that replays dispatch to the fake API with a temporary state."""
+    with fake_platform(latency=0.001) as server:
+        settings = get_settings()
+        assert settings["github_api_url"] == server.url
+        assert settings["github_token"] == "replay"
+        assert settings["github_app_id"] is None
+        assert settings["mappings"] == {"comment-added": {"recheck": "verify"}}
+        assert not settings["cache_directory"].startswith(str(config_files))
+
+        report = run_load([from_stream_event(STREAM_EVENT)] * 3)
+
+    assert report["failed"] == 0
+    assert report["dispatched"] == 3
+    assert [dispatch["repository"] for dispatch in server.dispatches] == [
+        "example-project"
+    ] * 3
+    assert get_settings()["github_api_url"] == "https://api.github.com"
+
+
+def test_replay_command(config_files):
+    """Test the replay command on recorded and synthetic events."""
+    events_path = config_files / "events.json"
+    events_path.write_text(json.dumps(STREAM_EVENT) + "\n")
+    result = runner.invoke(app, ["replay", str(events_path), "--json"])
+    assert result.exit_code == 0
+    report = json.loads(result.stdout)
+    assert report["events"] == 1
+    assert report["dispatched"] == 1
+
+    result = runner.invoke(
+        app,
+        [
+            "replay",
+            "--synthetic",
+            "30",
+            "--mix",
+            "patchset-created",
+            "--workflow",
+            "gerrit-verify",
+            "--workflow",
+            "gerrit-verify-arm",
+            "--seed",
+            "1",
+        ],
+    )
+    assert result.exit_code == 0
+    assert "Processed 30 events" in result.stdout
+    assert "Dispatches: 60 dispatched" in result.stdout
+
+    result = runner.invoke(app, ["replay"])
+    assert result.exit_code == 1
+    result = runner.invoke(app, ["replay", "--synthetic", "1", "--mix", "foo=1"])
+    assert result.exit_code == 1
@@ -0,0 +1,200 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Unit tests for retry."""
+
+import asyncio
+import json
+
+from typer.testing import CliRunner
+
+import gerrit_to_platform.cli  # type: ignore
+import gerrit_to_platform.retry  # type: ignore
+from gerrit_to_platform.cli import app
+from gerrit_to_platform.fake_github import FakeGitHub
+from gerrit_to_platform.github import (  # type: ignore
+    GitHubClient,
+    GitHubError,
+    GitHubNotFoundError,
+    GitHubRateLimitError,
+)
+from gerrit_to_platform.helpers import drain_retry_queue, find_and_dispatch_report
+from gerrit_to_platform.metrics import DISPATCHES, event_context
+from gerrit_to_platform.retry import RetryQueue, backoff, is_transient
+
+INPUTS = {
+    "GERRIT_BRANCH": "master",
+    "GERRIT_CHANGE_NUMBER": "1",
+    "GERRIT_PATCHSET_NUMBER": "1",
+}
+
+runner = CliRunner()
+
+
+def test_is_transient():
+    """Test which failures are retried."""
+    assert is_transient(GitHubError(502, "Bad Gateway"))
+    assert is_transient(GitHubRateLimitError(403, "Forbidden"))
+    assert is_transient(ConnectionResetError())
+    assert not is_transient(GitHubNotFoundError(404, "Not Found"))
+    assert not is_transient(GitHubError(422, "Unprocessable Entity"))
+    assert not is_transient(RuntimeError("bug"))
+
+
+def test_backoff():
+    """Test that the backoff doubles up to the cap with half of it jittered."""
+    for attempts, low, high in ((1, 5, 10), (2, 10, 20), (3, 20, 40), (9, 30, 60)):
+        for _ in range(20):
+            assert low <= backoff(attempts, 10, 60) <= high
+
+
+def test_retry_queue(tmp_path):
+    """Test that dispatches are retried until they succeed or are given up."""
+    retry_queue = RetryQueue(str(tmp_path / "retry.sqlite3"), 3, 0, 0)
+    retry_queue.enqueue(
+        "github", "example", "repo", "1", "refs/heads/main", INPUTS, OSError("reset")
+    )
+    retry_queue.enqueue(
+        "github", "example", "repo", "2", "refs/heads/main", {}, OSError("reset")
+    )
+    assert retry_queue.stats()["depth"] == 2
+
+    first, second = retry_queue.claim()
+    assert first["inputs"] == INPUTS
+    assert (first["workflow_id"], first["attempts"]) == ("1", 1)
+    # claimed dispatches are leased to this drain
+    assert retry_queue.claim() == []
+
+    retry_queue.succeeded(first)
+    assert retry_queue.failed(second, GitHubError(502, "Bad Gateway")) is True
+    (second,) = retry_queue.claim()
+    assert (second["attempts"], second["last_error"]) == (2, "HTTP 502 Bad Gateway")
+    assert retry_queue.failed(second, GitHubError(502, "Bad Gateway")) is False
+
+    stats = RetryQueue(retry_queue.path, 3, 0, 0).stats()
+    assert (stats["depth"], stats["due"], stats["dead"]) == (0, 0, 1)
+    assert (stats["retried"], stats["dropped"]) == (1, 1)
+    assert 0 <= stats["retry_latency_avg"] <= stats["retry_latency_max"]
+
+
+def test_retry_queue_purge(tmp_path):
+    """Test that only the given up dispatches past their retention are purged."""
+    retry_queue = RetryQueue(str(tmp_path / "retry.sqlite3"), 1, 0, 0)
+    for workflow_id in ("1", "2"):
+        retry_queue.enqueue(
+            "github", "example", "repo", workflow_id, "refs/heads/main", {}, OSError()
+        )
+    first, second = retry_queue.claim()
+    assert retry_queue.failed(first, OSError("reset")) is False
+
+    assert retry_queue.purge() == 0
+    assert retry_queue.purge(retention=-1) == 1
+    stats = retry_queue.stats()
+    assert (stats["depth"], stats["dead"]) == (1, 0)
+
+
+def test_drain_retry_queue(mocker, tmp_path):
+    """Test that failed dispatches are queued and retried by a drain."""
+    retry_queue = RetryQueue(str(tmp_path / "retry.sqlite3"), 5, 0, 0)
+    mocker.patch.object(
+        gerrit_to_platform.retry, "get_retry_queue", return_value=retry_queue
+    )
+    mocker.patch.object(
+        gerrit_to_platform.cli, "get_retry_queue", return_value=retry_queue
+    )
+    mocker.patch.multiple(
+        "gerrit_to_platform.helpers",
+        get_replication_remotes=mocker.Mock(
+            return_value={
+                "github": {
+                    "github": {
+                        "owner": "example",
+                        "remotenamestyle": "dash",
+                        "repo": "${name}",
+                    }
+                }
+            }
+        ),
+        get_magic_repo=mocker.Mock(return_value=None),
+        get_required_workflow_cache=mocker.Mock(return_value=None),
+        get_settings=mocker.Mock(
+            return_value={
+                "dispatch_limits": {
+                    "github": {"concurrency": 1, "owner_concurrency": 1},
+                    "gitlab": {"concurrency": 1, "owner_concurrency": 1},
+                }
+            }
+        ),
+    )
+
+    with FakeGitHub() as server:
+        client = GitHubClient("A_TOKEN", server.url)
+
+        def dispatch(owner, repository, workflow_id, ref, inputs):
+            if workflow_id == "missing":
+                raise GitHubNotFoundError(404, "Not Found")
+            return client.create_workflow_dispatch(
+                owner, repository, workflow_id, ref, inputs
+            )
+
+        async def async_dispatch(*args):
+            return await asyncio.to_thread(dispatch, *args)
+
+        async def async_filter_workflows(*args):
+            return [
+                {"id": "1", "name": "Verify"},
+                {"id": "2", "name": "Verify"},
+                {"id": "missing", "name": "Verify"},
+            ]
+
+        mocker.patch.multiple(
+            "gerrit_to_platform.helpers",
+            choose_dispatch=mocker.Mock(return_value=dispatch),
+            choose_async_dispatch=mocker.Mock(return_value=async_dispatch),
+            choose_async_filter_workflows=mocker.Mock(
+                return_value=async_filter_workflows
+            ),
+        )
+        server.dispatch_failures = 2
+        labels = {"event": "patchset-created", "platform": "github", "owner": "example"}
+        queued = DISPATCHES.value(result="queued", **labels)
+        with event_context("patchset-created"):
+            report = find_and_dispatch_report("project", "verify", dict(INPUTS))
+        assert (report["dispatched"], report["queued"]) == (0, 2)
+        assert DISPATCHES.value(result="queued", **labels) == queued + 2
+        assert len(report["errors"]) == 3
+        assert retry_queue.stats()["depth"] == 2
+
+        server.dispatch_failures = 1
+        assert drain_retry_queue() == {"retried": 1, "rescheduled": 1, "dropped": 0}
+        assert drain_retry_queue() == {"retried": 1, "rescheduled": 0, "dropped": 0}
+        # the first retry of workflow 1 failed, workflow 2 went through
+        assert [dispatch["workflow_id"] for dispatch in server.dispatches] == [
+            "2",
+            "1",
+        ]
+        assert server.dispatches[0]["inputs"] == INPUTS
+        assert server.dispatches[0]["ref"] == "refs/heads/master"
+        client.close()
+
+    stats = retry_queue.stats()
+    assert (stats["depth"], stats["retried"]) == (0, 2)
+
+    result = runner.invoke(app, ["stats", "--json"])
+    assert result.exit_code == 0
+    assert json.loads(result.stdout)["retried"] == 2
+
+    result = runner.invoke(app, ["drain"])
+    assert result.exit_code == 0
+    assert "Retried 0 dispatches" in result.stdout
+
+    mocker.patch.object(gerrit_to_platform.retry, "get_retry_queue", return_value=None)
+    mocker.patch.object(gerrit_to_platform.cli, "get_retry_queue", return_value=None)
+    assert drain_retry_queue() == {"retried": 0, "rescheduled": 0, "dropped": 0}
+    assert runner.invoke(app, ["drain"]).exit_code == 1
@@ -0,0 +1,149 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Unit tests for spool."""
+
+import json
+import threading
+
+import pytest
+from typer.testing import CliRunner
+
+from gerrit_to_platform.cli import app
+from gerrit_to_platform.events import PATCHSET_CREATED
+from gerrit_to_platform.spool import Spool
+
+ARGUMENTS = {
+    "change": "example/project~master~I308b4eda73ff90ee486f14e01db145684889eaae",
+    "kind": "REWORK",
+    "change_url": "https://gerrit.example.org/r/c/example/project/+/1",
+    "change_owner": "Foo <foo@example.org>",
+    "change_owner_username": "foo",
+    "project": "example/project",
+    "branch": "master",
+    "topic": "",
+    "uploader": "Foo <foo@example.org>",
+    "uploader_username": "foo",
+    "commit": "7f0f8a2b05546d5956b0bb1431ba13c8cbe94631",
+    "patchset": "1",
+}
+
+runner = CliRunner()
+
+
+def make_event(patchset: int) -> dict:
+    """Get a patchset-created event."""
+    return {
+        "type": PATCHSET_CREATED,
+        "arguments": dict(ARGUMENTS, patchset=str(patchset)),
+    }
+
+
+def test_spool(tmp_path):
+    """Test that spooled events are processed once, in order."""
+    spool = Spool(str(tmp_path / "spool"))
+    for patchset in range(5):
+        spool.append(make_event(patchset))
+    # a torn write left by a crash and garbage are skipped
+    with open(spool.active_path, "ab") as log:
+        log.write(b"not json\n{")
+    assert spool.pending() == 7
+
+    processed = []
+    assert spool.drain(processed.extend, batch_size=2) == 5
+    assert processed == [make_event(patchset) for patchset in range(5)]
+    assert spool.pending() == 0
+    assert spool.drain(processed.extend) == 0
+
+
+def test_spool_resumes(tmp_path):
+    """Test that a failed worker resumes after the last completed batch."""
+    spool = Spool(str(tmp_path / "spool"))
+    for patchset in range(6):
+        spool.append(make_event(patchset))
+
+    processed = []
+
+    def crash(batch):
+        if make_event(3) in batch:
+            raise RuntimeError("worker died")
+        processed.extend(batch)
+
+    with pytest.raises(RuntimeError):
+        spool.drain(crash, batch_size=2)
+    spool.append(make_event(6))
+    assert spool.pending() == 5
+
+    assert spool.drain(processed.extend, batch_size=2) == 5
+    assert processed == [make_event(patchset) for patchset in range(7)]
+
+
+def test_spool_concurrent_appends(tmp_path):
+    """Test that events appended while the worker drains are not lost."""
+    spool = Spool(str(tmp_path / "spool"))
+    processed = []
+
+    def hook(first: int) -> None:
+        for patchset in range(first, first + 50):
+            Spool(spool.directory).append(make_event(patchset))
+
+    hooks = [threading.Thread(target=hook, args=(n * 50,)) for n in range(4)]
+    for thread in hooks:
+        thread.start()
+    while any(thread.is_alive() for thread in hooks):
+        spool.drain(processed.extend, batch_size=10)
+    for thread in hooks:
+        thread.join()
+    spool.drain(processed.extend, batch_size=10)
+
+    assert sorted(int(event["arguments"]["patchset"]) for event in processed) == list(
+        range(200)
+    )
+
+
+def test_worker(mocker, tmp_path):
+    """Test the worker processes the spooled events."""
+    spool = Spool(str(tmp_path / "spool"))
+    spool.append(make_event(1))
+    spool.append(make_event(2))
+    settings = {
+        "debounce_window": 0,
+        "retry_interval": 0,
+        "spool_directory": spool.directory,
+    }
+    mocker.patch("gerrit_to_platform.cli.get_settings", return_value=settings)
+    mock_process = mocker.patch(
+        "gerrit_to_platform.cli.process_event",
+        side_effect=[None, RuntimeError("dispatch failed")],
+    )
+
+    result = runner.invoke(app, ["worker", "--once", "--workers", "1"])
+    assert result.exit_code == 0
+    assert mock_process.call_count == 2
+    assert "Failed to process patchset-created event: dispatch failed" in (
+        result.stdout
+    )
+    assert spool.pending() == 0
+
+    # superseded patchsets are skipped
+    mock_process.reset_mock(side_effect=True)
+    settings["debounce_window"] = 60
+    spool.append(make_event(1))
+    spool.append(make_event(2))
+    spool.append(make_event(3))
+    result = runner.invoke(app, ["worker", "--once"])
+    assert result.exit_code == 0
+    mock_process.assert_called_once_with(make_event(3))
+    assert "2 superseded" in result.stdout
+    with open(spool.held_path) as held_file:
+        assert json.load(held_file) == []
+
+    settings["spool_directory"] = None
+    result = runner.invoke(app, ["worker", "--once"])
+    assert result.exit_code == 1
@@ -0,0 +1,185 @@
+# SPDX-License-Identifier: Apache-2.0
+##############################################################################
+# Copyright (c) 2023 The Linux Foundation and others.
+#
+# All rights reserved. This program and the accompanying materials are made
+# available under the terms of the Apache-2.0 license which accompanies this
+# distribution, and is available at
+# https://opensource.org/licenses/Apache-2.0
+##############################################################################
+"""Unit tests for the stream-events consumer."""
+
+import json
+import os
+import threading
+
+from typer.testing import CliRunner
+
+from gerrit_to_platform.cli import app
+from gerrit_to_platform.events import PATCHSET_CREATED
+from gerrit_to_platform.stream import Checkpoint, consume, event_key, read_lines
+
+runner = CliRunner()
+
+
+def stream_event(number, created, patchset=1):
+    """Build a patchset-created stream-events line."""
+    account = {"name": "Foo", "email": "foo@example.org", "username": "foo"}
+    return json.dumps(
+        {
+            "type": PATCHSET_CREATED,
+            "uploader": account,
+            "patchSet": {"number": patchset, "revision": f"{number:040x}"},
+            "change": {
+                "project": "example/project",
+                "branch": "master",
+                "id": f"I{number:040x}",
+                "url": f"https://gerrit.example.org/c/example/project/+/{number}",
+                "owner": account,
+            },
+            "eventCreatedOn": created,
+        }
+    )
+
+
+def test_checkpoint(tmp_path):
+    """Test that done events are skipped across restarts, within the window."""
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = Checkpoint(path, window=10)
+    assert checkpoint.start("a", 100)
+    assert checkpoint.start("b", 105)
+    assert not checkpoint.start("a", 100)
+    checkpoint.done("b")
+    # a is still in flight, the position stays before it
+    assert checkpoint.position == 100
+
+    restarted = Checkpoint(path, window=10)
+    assert not restarted.start("b", 105)
+    assert restarted.start("a", 100)
+
+    checkpoint.done("a")
+    assert checkpoint.position == 105
+    assert checkpoint.start("c", 120)
+    checkpoint.done("c")
+
+    restarted = Checkpoint(path, window=10)
+    # older than the window, done within it, and out of order but new
+    assert not restarted.start("d", 109)
+    assert not restarted.start("c", 120)
+    assert restarted.start("e", 115)
+    with open(path) as checkpoint_file:
+        assert json.load(checkpoint_file) == {"position": 120, "done": {"c": 120}}
+
+    (tmp_path / "invalid.json").write_text("{")
+    assert Checkpoint(str(tmp_path / "invalid.json"), window=10).position == 0
+
+
+def test_consume(tmp_path):
+    """Test that a restarted consumer does not process events twice."""
+    lines = [
+        stream_event(1, 100),
+        '{"type": "ref-updated", "eventCreatedOn": 100}',
+        "not json",
+        stream_event(2, 101),
+        stream_event(1, 100),
+        stream_event(3, 102),
+        # the same event created again, eg: a second identical comment
+        stream_event(3, 103),
+    ]
+    processed = []
+
+    def process(event):
+        processed.append(event["arguments"]["change_url"])
+        if event["arguments"]["change_url"].endswith("/2"):
+            raise ValueError("broken")
+
+    path = str(tmp_path / "checkpoint.json")
+    stats = consume(lines, Checkpoint(path, 300), process, workers=2)
+    assert stats == {"read": 5, "processed": 4, "skipped": 1, "failed": 1}
+    assert sorted(url[-1] for url in processed) == ["1", "2", "3", "3"]
+
+    processed.clear()
+    stats = consume(lines + [stream_event(4, 103)], Checkpoint(path, 300), process)
+    assert stats == {"read": 6, "processed": 1, "skipped": 5, "failed": 0}
+    assert processed == ["https://gerrit.example.org/c/example/project/+/4"]
+
+
+def test_event_key():
+    """Test that the key identifies the event content."""
+    event = {"type": PATCHSET_CREATED, "arguments": {"a": "1", "b": "2"}}
+    reordered = {"arguments": {"b": "2", "a": "1"}, "type": PATCHSET_CREATED}
+    assert event_key(event) == event_key(reordered)
+    assert event_key(event) != event_key(dict(event, type="change-merged"))
+    # the same event created again is not a copy
+    assert event_key(event, 100) == event_key(reordered, 100)
+    assert event_key(event, 100) != event_key(event, 101)
+
+
+def test_read_lines_follow(tmp_path):
+    """Test following a FIFO across writers and a file being appended."""
+    fifo = str(tmp_path / "events.fifo")
+    os.mkfifo(fifo)
+    stopping = threading.Event()
+    lines = []
+
+    def read():
+        for line in read_lines(fifo, follow=True, stopping=stopping):
+            lines.append(line)
+            if len(lines) == 3:
+                stopping.set()
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    with open(fifo, "w") as writer:
+        writer.write("one\ntwo\n")
+    with open(fifo, "w") as writer:
+        writer.write("three")
+    reader.join(5)
+    assert lines == ["one\n", "two\n", "three"]
+
+    path = tmp_path / "events.json"
+    path.write_text("one\ntw")
+    stopping = threading.Event()
+    lines = []
+
+    def follow():
+        for line in read_lines(str(path), follow=True, stopping=stopping, interval=0):
+            lines.append(line)
+
+    reader = threading.Thread(target=follow)
+    reader.start()
+    with open(path, "a") as writer:
+        writer.write("o\n")
+    while len(lines) < 2 and reader.is_alive():
+        stopping.wait(0.01)
+    stopping.set()
+    reader.join(5)
+    assert lines == ["one\n", "two\n"]
+    assert list(read_lines(str(path))) == ["one\n", "two\n"]
+
+
+def test_stream_command(mocker, tmp_path):
+    """Test the stream command on piped events."""
+    mocker.patch(
+        "gerrit_to_platform.cli.get_settings",
+        return_value={
+            "stream_checkpoint": str(tmp_path / "checkpoint.json"),
+            "stream_window": 300.0,
+            "metrics_listen": None,
+            "retry_interval": 0,
+        },
+    )
+    process_event = mocker.patch("gerrit_to_platform.cli.process_event")
+    events = "\n".join(stream_event(number, 100 + number) for number in range(3))
+
+    result = runner.invoke(app, ["stream", "--workers", "1"], input=events)
+    assert result.exit_code == 0
+    assert "Read 3 events: 3 processed, 0 skipped" in result.stdout
+    assert process_event.call_count == 3
+
+    result = runner.invoke(app, ["stream"], input=events + "\n" + stream_event(3, 103))
+    assert "Read 4 events: 1 processed, 3 skipped" in result.stdout
+    assert process_event.call_count == 4
+
+    result = runner.invoke(app, ["stream", str(tmp_path / "missing")])
+    assert result.exit_code == 1